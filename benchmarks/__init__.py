@@ -0,0 +1,12 @@
+"""
+مجموعه benchmark مسیرهای پرتکرار پروژه (TPC، انرژی، پیش‌پردازش، predict مدل‌ها و کل run_pipeline).
+
+اجرا (از ریشه پروژه):
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1e3 1e4 1e5 1e6 1e7 --save-baseline
+    python -m benchmarks.run --compare --threshold 0.25
+
+- harness.py: اندازه‌گیری زمان/حافظه، ذخیره JSON و مقایسه با baseline
+- cases.py:   تعریف caseها (هر case برای یک اندازه ورودی n داده می‌سازد و یک تابع را اجرا می‌کند)
+- run.py:     CLI
+"""
@@ -0,0 +1,296 @@
+"""
+تعریف caseهای benchmark.
+
+هر Case یک setup(n) دارد که داده ورودی با n سطر را می‌سازد (خارج از زمان‌سنجی) و یک تابع
+بدون ورودی برمی‌گرداند که فقط همان مسیر پرتکرار را اجرا می‌کند.
+
+داده ورودی از تکرار سطرهای دیتاست واقعی (data/raw) تا n سطر ساخته می‌شود تا توزیع
+مقادیر (SF، طول payload، SNR) مانند داده پروژه باشد.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import shutil
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.dataset_cache import cache_dir_for
+from src.device_controller import DeviceTPCController
+from src.energy import normalized_energy, normalized_toa_energy, payload_bytes_from_length
+from src.flat_forest import FOREST_SUFFIX, FlatForest
+from src.io_utils import align_features_for_model, load_dataset, safe_numeric_X, save_csv
+from src.model_registry import default_registry
+from src.numpy_predictor import NPZ_SUFFIX, NumpyPredictor
+from src.online_model import RLSRegressor
+from src.preprocessing import FeaturePreprocessor
+from src.rolling_features import RollingFeatureState, rolling_features
+from src.tpc import decide_tpc, decide_tpc_batch
+from src.tpc_table import get_decision_table
+
+
+# caseهای اسکالر (حلقه Python به ازای هر سطر) بالاتر از این اندازه اجرا نمی‌شوند
+SCALAR_MAX_ROWS = 100_000
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+    max_rows: int | None = None
+
+
+# -----------------------------------------------------------------------------
+# داده ورودی
+# -----------------------------------------------------------------------------
+@lru_cache(maxsize=1)
+def _base_frame() -> pd.DataFrame:
+    """دیتاست خام با نوع‌های DATASET_SCHEMA و بدون ستون‌های DROP_COLS."""
+    return load_dataset(prefer_processed=False, drop_unused=True)
+
+
+@lru_cache(maxsize=2)
+def uplink_frame(n: int) -> pd.DataFrame:
+    """n سطر uplink (تکرار سطرهای دیتاست)."""
+    base = _base_frame()
+    return base.iloc[np.resize(np.arange(len(base)), n)].reset_index(drop=True)
+
+
+def feature_frame(n: int) -> pd.DataFrame:
+    return uplink_frame(n).drop(columns=[config.TARGET_COL])
+
+
+def snr_values(n: int) -> np.ndarray:
+    """SNR پیش‌بینی‌شده مصنوعی در بازه‌ای که همه شاخه‌های تصمیم TPC را پوشش می‌دهد."""
+    return np.random.default_rng(0).uniform(-25.0, 20.0, size=n)
+
+
+def history_frame(n: int, n_devices: int) -> pd.DataFrame:
+    """log مصنوعی n uplink از n_devices دستگاه (ستون‌های SOURCE_COLS) به ترتیب زمان."""
+    rng = np.random.default_rng(4)
+    return pd.DataFrame({
+        "timestamp": pd.Timestamp("2022-01-01") + pd.to_timedelta(np.arange(n) * 30, unit="s"),
+        "device_id": np.array([f"EN{i}" for i in range(n_devices)], dtype=object)[rng.integers(0, n_devices, size=n)],
+        "counter": np.arange(n),
+        config.TARGET_COL: rng.normal(0.0, 8.0, size=n),
+        "rssi": rng.integers(-120, -60, size=n).astype(np.float64),
+    })
+
+
+def tpc_grid_values(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """(TP, SF) تصادفی روی grid معتبر config."""
+    rng = np.random.default_rng(1)
+    tp = rng.integers(config.TP_MIN, config.TP_MAX + 1, size=n).astype(np.float64)
+    sf = rng.integers(config.SF_MIN, config.SF_MAX + 1, size=n)
+    return tp, sf
+
+
+# -----------------------------------------------------------------------------
+# TPC و انرژی
+# -----------------------------------------------------------------------------
+def _decide_tpc_scalar(n: int):
+    snr = snr_values(n).tolist()
+    return lambda: [decide_tpc(s) for s in snr]
+
+
+def _decide_tpc_batch(n: int):
+    snr = snr_values(n)
+    return lambda: decide_tpc_batch(snr)
+
+
+def _device_controller(n: int):
+    # حدود 10 uplink برای هر دستگاه (n/10 دستگاه)؛ هر اجرا با وضعیت خالی شروع می‌شود
+    snr = snr_values(n)
+    names = np.array([f"D{i:07d}" for i in range(max(1, n // 10))], dtype=object)
+    devices = names[np.random.default_rng(2).integers(0, len(names), size=n)]
+    return lambda: DeviceTPCController().process_log(devices, snr)
+
+
+def _device_controller_few(n: int):
+    # 4 دستگاه با تاریخچه طولانی (مانند دیتاست واقعی)؛ مسیر حلقه اسکالر هر دستگاه
+    snr = snr_values(n)
+    devices = np.array([f"EN{i}" for i in range(1, 5)], dtype=object)[np.random.default_rng(2).integers(0, 4, size=n)]
+    return lambda: DeviceTPCController().process_log(devices, snr)
+
+
+def _tpc_table_lookup(n: int):
+    snr = snr_values(n)
+    table = get_decision_table(config.TPC_TABLE_PATH)
+    return lambda: table.lookup(snr)
+
+
+def _normalized_energy_scalar(n: int):
+    tp, sf = tpc_grid_values(n)
+    pairs = list(zip(tp.tolist(), sf.tolist()))
+    return lambda: [normalized_energy(t, s) for t, s in pairs]
+
+
+def _normalized_energy_array(n: int):
+    tp, sf = tpc_grid_values(n)
+    return lambda: normalized_energy(tp, sf)
+
+
+def _normalized_toa_energy(n: int):
+    tp, sf = tpc_grid_values(n)
+    payload = payload_bytes_from_length(uplink_frame(n)[config.PAYLOAD_LENGTH_COL].to_numpy())
+    return lambda: normalized_toa_energy(tp, sf, payload)
+
+
+# -----------------------------------------------------------------------------
+# پیش‌پردازش و مدل‌ها
+# -----------------------------------------------------------------------------
+def _safe_numeric_X(n: int):
+    X = feature_frame(n)
+    return lambda: safe_numeric_X(X)
+
+
+def _align_features(n: int):
+    model = default_registry().load(config.SELECTED_TRAINED_MODEL)
+    # ترتیب برعکس + یک ستون اضافی تا مسیر انتخاب/مرتب‌سازی ستون‌ها اجرا شود
+    X = feature_frame(n)
+    X = X[X.columns[::-1]].assign(extra=0.0)
+    return lambda: align_features_for_model(X, model)
+
+
+def _preprocessor_transform(n: int):
+    pre = default_registry().preprocessor(config.SELECTED_TRAINED_MODEL)
+    if pre is None:
+        raise RuntimeError(f"no preprocessor next to {config.SELECTED_TRAINED_MODEL}")
+    X = feature_frame(n)
+    return lambda: pre.transform(X)
+
+
+def _rolling_batch(n: int):
+    df = history_frame(n, 4)
+    return lambda: rolling_features(df)
+
+
+def _rolling_online(n_devices: int):
+    # یک chunk طولانی روی وضعیت خالی؛ با 1 دستگاه هر uplink به تاریخچه uplinkهای قبلی همان chunk وابسته است
+    def setup(n: int):
+        df = history_frame(n, n_devices)
+        return lambda: RollingFeatureState().update_frame(df)
+    return setup
+
+
+def _rls_partial_fit(n: int):
+    # پیش‌بینی + به‌روزرسانی prequential هر uplink (O(d²))؛ هر اجرا از یک مدل خالی شروع می‌شود
+    X = feature_frame(n)
+    pre = default_registry().preprocessor(config.SELECTED_TRAINED_MODEL) or FeaturePreprocessor.fit(X)
+    Xn = pre.transform(X)
+    y = uplink_frame(n)[config.TARGET_COL].to_numpy(dtype=np.float64)
+    return lambda: RLSRegressor().predict_partial_fit(Xn, y)
+
+
+def _predict(artifact: str):
+    def setup(n: int):
+        registry = default_registry()
+        model = registry.load(artifact)
+        pre = registry.preprocessor(artifact)
+        X = feature_frame(n)
+        X = safe_numeric_X(X) if pre is None else pre.transform_frame(X)
+        return lambda: model.predict(X)
+    return setup
+
+
+def _numpy_predict(path: Path, single_row: bool = False, loader: Callable = NumpyPredictor.load):
+    # فایل صادرشده (export_numpy.py: .npz یا با loader=FlatForest.load فایل .forest.bin)؛
+    # single_row: حلقه predict_one (مسیر gateway، یک uplink در هر فراخوانی)
+    def setup(n: int):
+        predictor = loader(path)
+        if predictor.medians is None:
+            X = safe_numeric_X(feature_frame(n))[predictor.feature_names].to_numpy(dtype=np.float64)
+        else:
+            X = FeaturePreprocessor(predictor.feature_names, {}, predictor.medians).transform(feature_frame(n))
+        if single_row:
+            return lambda: [predictor.predict_one(x) for x in X]
+        return lambda: predictor.predict(X)
+    return setup
+
+
+# -----------------------------------------------------------------------------
+# کل پایپ‌لاین
+# -----------------------------------------------------------------------------
+_PIPELINE_TMP: list[Path] = []
+
+
+def _run_pipeline(n: int):
+    """
+    اجرای کامل run_pipeline روی یک CSV با n سطر (خروجی‌ها در پوشه موقت، نه outputs/).
+
+    یک اجرای گرم‌کننده (خارج از زمان‌سنجی) کش ستونی دیتاست را می‌سازد؛ زمان‌سنجی مسیر پایدار
+    (کش گرم) را اندازه می‌گیرد.
+    """
+    from src import run_pipeline
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    _PIPELINE_TMP.append(tmp)
+    csv = tmp / f"uplinks_{n}.csv"
+    save_csv(uplink_frame(n), csv)
+    argv = ["--input", str(csv), "--out-dir", str(tmp / "out")]
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_pipeline.main(argv)
+
+    run()
+    return run
+
+
+def cleanup() -> None:
+    """حذف پوشه‌های موقت پایپ‌لاین و کش ستونی CSVهای موقت."""
+    for tmp in _PIPELINE_TMP:
+        for csv in tmp.glob("*.csv"):
+            shutil.rmtree(cache_dir_for(csv), ignore_errors=True)
+        shutil.rmtree(tmp, ignore_errors=True)
+    _PIPELINE_TMP.clear()
+
+
+def all_cases() -> list[Case]:
+    cases = [
+        Case("tpc.decide_tpc[scalar]", _decide_tpc_scalar, max_rows=SCALAR_MAX_ROWS),
+        Case("tpc.decide_tpc_batch", _decide_tpc_batch),
+        Case("tpc_table.lookup", _tpc_table_lookup),
+        Case("device_controller.process_log", _device_controller),
+        Case("device_controller.process_log[4 devices]", _device_controller_few),
+        Case("energy.normalized_energy[scalar]", _normalized_energy_scalar, max_rows=SCALAR_MAX_ROWS),
+        Case("energy.normalized_energy", _normalized_energy_array),
+        Case("energy.normalized_toa_energy", _normalized_toa_energy),
+        Case("io_utils.safe_numeric_X", _safe_numeric_X),
+        Case("io_utils.align_features_for_model", _align_features),
+        Case("preprocessing.transform", _preprocessor_transform),
+        Case("rolling_features.rolling_features", _rolling_batch),
+        Case("rolling_features.update_frame[1 device]", _rolling_online(1)),
+        Case("rolling_features.update_frame[10k devices]", _rolling_online(10_000)),
+        Case("online_model.predict_partial_fit", _rls_partial_fit, max_rows=SCALAR_MAX_ROWS),
+    ]
+
+    # predict برای هر مدل ذخیره‌شده در models_trained/
+    for path in sorted(config.TRAINED_MODELS_DIR.glob("*.joblib")):
+        if not path.name.endswith(".preprocessor.joblib"):
+            cases.append(Case(f"predict[{path.name}]", _predict(path.name)))
+
+    # پیش‌بینی NumPy برای هر فایل صادرشده (python -m src.export_numpy)
+    for path in sorted(config.TRAINED_MODELS_DIR.glob(f"*{NPZ_SUFFIX}")):
+        cases.append(Case(f"numpy_predictor.predict[{path.name}]", _numpy_predict(path)))
+        cases.append(Case(
+            f"numpy_predictor.predict_one[{path.name}]", _numpy_predict(path, single_row=True), max_rows=SCALAR_MAX_ROWS
+        ))
+    for path in sorted(config.TRAINED_MODELS_DIR.glob(f"*{FOREST_SUFFIX}")):
+        cases.append(Case(f"flat_forest.predict[{path.name}]", _numpy_predict(path, loader=FlatForest.load)))
+        cases.append(Case(
+            f"flat_forest.predict_one[{path.name}]",
+            _numpy_predict(path, single_row=True, loader=FlatForest.load),
+            max_rows=SCALAR_MAX_ROWS,
+        ))
+
+    cases.append(Case("run_pipeline", _run_pipeline))
+    return cases
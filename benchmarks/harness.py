@@ -0,0 +1,149 @@
+"""
+ابزار اندازه‌گیری benchmarkها.
+
+- measure: اجرای یک تابع چند بار و ثبت میانه/کمینه زمان؛ سپس (اختیاری) یک اجرای جداگانه
+  زیر tracemalloc برای اوج حافظه تخصیص‌یافته (tracemalloc سربار دارد، پس با زمان‌سنجی مخلوط نمی‌شود)
+- save_results / load_results: فایل JSON نتایج (outputs/benchmarks)
+- compare: مقایسه نتایج با یک baseline و فهرست regressionهایی که از آستانه بیشترند
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import sklearn
+
+
+# حداقل زمان کل اندازه‌گیری هر case (ثانیه)؛ caseهای سریع تا رسیدن به این زمان تکرار می‌شوند
+# (حداکثر MAX_REPEATS بار)
+MIN_TOTAL_S = 0.2
+MAX_REPEATS = 1000
+
+# زمان‌های کمتر از این مقدار (ثانیه) نویز زیادی دارند و در مقایسه با baseline نادیده گرفته می‌شوند
+MIN_COMPARABLE_S = 1e-3
+
+
+@dataclass
+class BenchResult:
+    case: str
+    n: int
+    seconds_median: float
+    seconds_min: float
+    repeats: int
+    rows_per_s: float
+    peak_mem_mb: float | None
+
+
+def measure(case: str, n: int, func: Callable[[], object], min_repeats: int = 3, memory: bool = True) -> BenchResult:
+    """
+    اندازه‌گیری زمان و حافظه یک تابع بدون ورودی (داده قبلاً در setup ساخته شده است).
+
+    - حداقل min_repeats بار اجرا می‌شود؛ caseهای سریع تا رسیدن مجموع زمان به MIN_TOTAL_S تکرار می‌شوند
+    - seconds_min (کمترین زمان) کم‌نویزترین تخمین است و در مقایسه با baseline استفاده می‌شود
+    - peak_mem_mb: اوج حافظه تخصیص‌یافته در طول یک اجرا (tracemalloc؛ شامل آرایه‌های numpy)
+    """
+    times = []
+    total = 0.0
+    while len(times) < min_repeats or (total < MIN_TOTAL_S and len(times) < MAX_REPEATS):
+        t0 = time.perf_counter()
+        func()
+        dt = time.perf_counter() - t0
+        times.append(dt)
+        total += dt
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = peak / (1024.0 * 1024.0)
+
+    median = float(np.median(times))
+    return BenchResult(
+        case=case,
+        n=int(n),
+        seconds_median=median,
+        seconds_min=float(np.min(times)),
+        repeats=len(times),
+        rows_per_s=n / median if median > 0 else float("inf"),
+        peak_mem_mb=peak_mb,
+    )
+
+
+def environment() -> dict:
+    """اطلاعات محیط اجرا برای ثبت کنار نتایج (مقایسه بین ماشین‌های مختلف معتبر نیست)."""
+    return {
+        "timestamp_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_results(results: list[BenchResult], path: Path) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"environment": environment(), "results": [asdict(r) for r in results]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
+def load_results(path: Path) -> list[BenchResult]:
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    return [BenchResult(**r) for r in payload["results"]]
+
+
+def compare(
+    current: list[BenchResult],
+    baseline: list[BenchResult],
+    threshold: float,
+    memory_threshold: float | None = None
+) -> tuple[list[dict], list[str]]:
+    """
+    مقایسه نتایج فعلی با baseline برای caseهای مشترک (case, n).
+
+    - regression زمانی: seconds_min فعلی > baseline × (1 + threshold)
+      (فقط وقتی یکی از دو زمان از MIN_COMPARABLE_S بیشتر باشد)
+    - regression حافظه (اختیاری): peak_mem_mb فعلی > baseline × (1 + memory_threshold)
+
+    خروجی:
+    - (سطرهای مقایسه برای چاپ، لیست پیام regressionها)
+    """
+    base = {(r.case, r.n): r for r in baseline}
+    rows, regressions = [], []
+
+    for cur in current:
+        ref = base.get((cur.case, cur.n))
+        if ref is None:
+            continue
+        ratio = cur.seconds_min / ref.seconds_min if ref.seconds_min > 0 else float("inf")
+        rows.append({"case": cur.case, "n": cur.n, "baseline_s": ref.seconds_min, "current_s": cur.seconds_min, "ratio": ratio})
+
+        comparable = max(cur.seconds_min, ref.seconds_min) >= MIN_COMPARABLE_S
+        if comparable and ratio > 1.0 + threshold:
+            regressions.append(f"{cur.case} n={cur.n}: {ratio:.2f}x slower than baseline")
+
+        if (
+            memory_threshold is not None
+            and cur.peak_mem_mb is not None
+            and ref.peak_mem_mb
+            and cur.peak_mem_mb > ref.peak_mem_mb * (1.0 + memory_threshold)
+        ):
+            regressions.append(f"{cur.case} n={cur.n}: peak memory {cur.peak_mem_mb:.1f} MB vs {ref.peak_mem_mb:.1f} MB")
+
+    return rows, regressions
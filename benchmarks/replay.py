@@ -0,0 +1,146 @@
+"""
+benchmark بازپخش (replay) یک log مرتب‌شده بر اساس زمان: مدل افزایشی RLS در برابر بازآموزی دوره‌ای ridge.joblib.
+
+    python -m benchmarks.replay                                   # دیتاست خام
+    python -m benchmarks.replay --retrain-every 10 100 --initial 50
+    python -m benchmarks.replay --input data/synth/uplinks.csv --retrain-every 10000
+
+روش (prequential؛ هر uplink قبل از اینکه مدل آن را ببیند پیش‌بینی می‌شود):
+- log بر اساس timestamp مرتب (پایدار) و ستون‌های DROP_COLS حذف می‌شوند
+- اولین --initial سطر: آموزش اولیه همه مدل‌ها و fit پیش‌پردازنده (ثابت در ادامه، مانند serve)
+- rls:                 online_model.RLSRegressor؛ predict_partial_fit روی بقیه log (پیش‌بینی + به‌روزرسانی هر uplink)
+- ridge/retrain=R:     clone(ridge.joblib)؛ هر R سطر از صفر روی همه سطرهای دیده‌شده تا آن لحظه بازآموزی
+                       و R سطر بعدی با همان مدل پیش‌بینی می‌شوند
+- ridge/static:        فقط آموزش اولیه (مرجع بدون به‌روزرسانی)
+
+خروجی:
+- جدول RMSE prequential، تعداد به‌روزرسانی/بازآموزی، زمان کل و سرعت (uplink بر ثانیه)
+- outputs/benchmarks/replay-<timestamp>.json (یا مسیر --out)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from src import config
+from src.io_utils import detect_target_col, load_dataset
+from src.model_registry import default_registry
+from src.online_model import RLSRegressor
+from src.preprocessing import FeaturePreprocessor
+
+from .harness import environment
+
+
+def replay_log(path: Path | None = None) -> tuple[pd.DataFrame, np.ndarray]:
+    """(X, y) کل log به ترتیب زمان (بدون ستون‌های DROP_COLS)."""
+    df = load_dataset(prefer_processed=False, path=path)
+    df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+    target = detect_target_col(df)
+    X = df.drop(columns=[target] + [c for c in config.DROP_COLS if c in df.columns])
+    return X, df[target].to_numpy(dtype=np.float64)
+
+
+def rmse(y: np.ndarray, pred: np.ndarray) -> float:
+    ok = ~np.isnan(y)
+    return float(np.sqrt(np.mean((y[ok] - pred[ok]) ** 2)))
+
+
+def replay_rls(X: np.ndarray, y: np.ndarray, initial: int) -> dict:
+    """RLS: آموزش اولیه، سپس پیش‌بینی + به‌روزرسانی هر uplink."""
+    model = RLSRegressor().fit(X[:initial], y[:initial])
+    t0 = time.perf_counter()
+    pred = model.predict_partial_fit(X[initial:], y[initial:])
+    seconds = time.perf_counter() - t0
+    n = len(y) - initial
+    return {
+        "model": "rls",
+        "rmse": rmse(y[initial:], pred),
+        "updates": n,
+        "seconds": seconds,
+        "rows_per_s": n / seconds if seconds > 0 else float("inf"),
+    }
+
+
+def replay_retrain(template, X: np.ndarray, y: np.ndarray, initial: int, every: int | None) -> dict:
+    """
+    بازآموزی دوره‌ای template روی همه سطرهای دیده‌شده (every=None: فقط آموزش اولیه).
+
+    زمان شامل همه fitها (به جز آموزش اولیه، مانند RLS) و پیش‌بینی‌هاست.
+    """
+    n = len(y)
+    pred = np.empty(n - initial)
+    model = clone(template).fit(X[:initial], y[:initial])
+    retrains = 0
+    seconds = 0.0
+    step = n if every is None else every
+
+    for start in range(initial, n, step):
+        t0 = time.perf_counter()
+        if start > initial:
+            seen = ~np.isnan(y[:start])
+            model = clone(template).fit(X[:start][seen], y[:start][seen])
+            retrains += 1
+        end = min(start + step, n)
+        pred[start - initial:end - initial] = model.predict(X[start:end])
+        seconds += time.perf_counter() - t0
+
+    return {
+        "model": "ridge/static" if every is None else f"ridge/retrain={every}",
+        "rmse": rmse(y[initial:], pred),
+        "updates": retrains,
+        "seconds": seconds,
+        "rows_per_s": (n - initial) / seconds if seconds > 0 else float("inf"),
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Prequential replay: online RLS vs periodic full retrains of ridge.joblib")
+    parser.add_argument("--input", type=Path, default=None, help="uplink CSV (default: config.DATA_RAW)")
+    parser.add_argument("--initial", type=int, default=config.ONLINE_WARMUP, help="rows used for the initial fit")
+    parser.add_argument("--retrain-every", nargs="+", type=int, default=[10, 100], help="ridge retrain periods (rows)")
+    parser.add_argument("--out", type=Path, default=None, help="result JSON (default: outputs/benchmarks/replay-<time>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    X_frame, y = replay_log(args.input)
+    if not 0 < args.initial < len(y):
+        raise SystemExit(f"--initial must be in (0, {len(y)}), got {args.initial}")
+
+    # پیش‌پردازنده فقط از سطرهای آموزش اولیه (NaNهای بعدی با همان میانه‌ها پر می‌شوند)
+    preprocessor = FeaturePreprocessor.fit(X_frame.iloc[:args.initial])
+    X = preprocessor.transform(X_frame)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        template = default_registry().load("ridge.joblib")
+
+    rows = [replay_rls(X, y, args.initial)]
+    for every in sorted(set(args.retrain_every)):
+        rows.append(replay_retrain(template, X, y, args.initial, every))
+    rows.append(replay_retrain(template, X, y, args.initial, None))
+
+    table = pd.DataFrame(rows)
+    print(f"Replay: {len(y)} uplinks in timestamp order, initial fit on {args.initial}, {X.shape[1]} features")
+    with pd.option_context("display.width", 200):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+    out = args.out or config.BENCHMARK_DIR / f"replay-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "rows": len(y), "initial": args.initial, "results": rows}, f, indent=2)
+    print("Saved replay results:", out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""
+CLI مجموعه benchmark.
+
+    python -m benchmarks.run                                  # اندازه‌های پیش‌فرض، ذخیره JSON
+    python -m benchmarks.run --cases tpc energy --sizes 1e3 1e6
+    python -m benchmarks.run --save-baseline                  # ذخیره به عنوان baseline
+    python -m benchmarks.run --compare --threshold 0.25       # خطا (exit 1) در صورت regression
+
+خروجی:
+- outputs/benchmarks/bench-<timestamp>.json (یا مسیر --out)
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+from src import config
+
+from .cases import all_cases, cleanup
+from .harness import compare, load_results, measure, save_results
+
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the TPC/energy/preprocessing/predict hot paths")
+    parser.add_argument("--sizes", nargs="+", type=float, default=DEFAULT_SIZES, help="input sizes in rows (e.g. 1e3 1e7)")
+    parser.add_argument("--cases", nargs="+", default=None, help="run only cases whose name contains one of these substrings")
+    parser.add_argument("--repeats", type=int, default=3, help="minimum timed repeats per case and size (fast cases repeat more)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the extra tracemalloc run for peak memory")
+    parser.add_argument("--out", type=Path, default=None, help="result JSON (default: outputs/benchmarks/bench-<time>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to config.BENCHMARK_BASELINE")
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        type=Path,
+        const=config.BENCHMARK_BASELINE,
+        default=None,
+        help="compare with a baseline JSON (default: config.BENCHMARK_BASELINE) and exit 1 on regressions",
+    )
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before a regression (0.25 = +25%%)")
+    parser.add_argument("--memory-threshold", type=float, default=None, help="allowed peak-memory growth (disabled by default)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    sizes = sorted({int(s) for s in args.sizes})
+    cases = [c for c in all_cases() if args.cases is None or any(s in c.name for s in args.cases)]
+
+    results = []
+    try:
+        for case in cases:
+            for n in sizes:
+                if case.max_rows is not None and n > case.max_rows:
+                    continue
+                with warnings.catch_warnings():
+                    # هشدار نسخه sklearn در بارگذاری مدل‌ها یک بار در ModelRegistry گزارش می‌شود
+                    warnings.simplefilter("ignore")
+                    func = case.setup(n)
+                    res = measure(case.name, n, func, min_repeats=args.repeats, memory=not args.no_memory)
+                results.append(res)
+                mem = "" if res.peak_mem_mb is None else f", peak {res.peak_mem_mb:9.1f} MB"
+                print(f"{case.name:38s} n={n:>10,d}  {res.seconds_median * 1e3:10.2f} ms  {res.rows_per_s:14,.0f} rows/s{mem}")
+    finally:
+        cleanup()
+
+    out = args.out or config.BENCHMARK_DIR / f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    save_results(results, out)
+    print("Saved benchmark results:", out)
+    if args.save_baseline:
+        save_results(results, config.BENCHMARK_BASELINE)
+        print("Saved baseline:", config.BENCHMARK_BASELINE)
+
+    if args.compare is None:
+        return 0
+
+    rows, regressions = compare(results, load_results(args.compare), args.threshold, args.memory_threshold)
+    if rows:
+        with pd.option_context("display.width", 200):
+            print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    for msg in regressions:
+        print("REGRESSION:", msg)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,11 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 DATA_RAW = PROJECT_ROOT / "data" / "raw" / "subsampled_data.csv"
 DATA_PROCESSED = PROJECT_ROOT / "data" / "processed" / "dataset_clean.csv"
 
+# کش ستونی باینری دیتاست‌ها (هر ستون یک فایل .npy قابل memory-map؛ ساخته‌شده توسط dataset_cache.py)
+# اگر False باشد load_dataset همیشه مستقیماً CSV را parse می‌کند.
+DATASET_CACHE_DIR = PROJECT_ROOT / "data" / "processed" / "cache"
+USE_DATASET_CACHE = True
+
 # مسیر مدل‌های اولیه مقاله (پسوند .sav) — در مسیر نهایی پروژه عموماً استفاده نمی‌شوند
 MODELS_DIR = PROJECT_ROOT / "models"
 
@@ -36,8 +41,30 @@ TABLE_DIR = OUTPUT_DIR / "tables"      # جدول‌های خروجی (اگر ب
 
 # فایل‌های خروجی استاندارد (برای اینکه همه اسکریپت‌ها از یک نام ثابت استفاده کنند)
 MODEL_METRICS_CSV = PRED_DIR / "model_metrics.csv"
+TUNING_RESULTS_CSV = TABLE_DIR / "tuning_results.csv"
+MODEL_COSTS_CSV = TABLE_DIR / "model_costs.csv"
 SNR_PREDICTIONS_CSV = PRED_DIR / "snr_predictions.csv"
 TPC_DECISIONS_CSV = PRED_DIR / "tpc_decisions.csv"
+DEVICE_TPC_DECISIONS_CSV = PRED_DIR / "device_tpc_decisions.csv"
+
+# نتایج benchmarkها (benchmarks/) و baseline ذخیره‌شده برای تشخیص regression
+BENCHMARK_DIR = OUTPUT_DIR / "benchmarks"
+BENCHMARK_BASELINE = BENCHMARK_DIR / "baseline.json"
+
+# دیتاست‌های مصنوعی ساخته‌شده توسط synth.py (برای تست مقیاس پایپ‌لاین و benchmarkها؛ در git نیستند)
+SYNTH_DATA_DIR = PROJECT_ROOT / "data" / "synthetic"
+
+# trace مراحل اجرای اسکریپت‌ها (instrument.py؛ با --trace یا متغیر محیطی TRACE_ENV_VAR فعال می‌شود)
+TRACE_DIR = OUTPUT_DIR / "traces"
+TRACE_ENV_VAR = "ML_IOT_TRACE"
+TRACE_MEMORY_ENV_VAR = "ML_IOT_TRACE_MEMORY"
+
+# cache محتوایی مراحل پایپ‌لاین (dag.py): manifest و stdout آخرین اجرای هر مرحله
+DAG_CACHE_DIR = OUTPUT_DIR / "dag"
+
+# جدول تصمیم TPC از پیش محاسبه‌شده (فایل باینری قابل memory-map، ساخته‌شده توسط tpc_table.py)
+# اگر مقادیر بخش 5 (SF/TP/LM/SNR_limit) تغییر کنند، این فایل خودکار بازسازی می‌شود.
+TPC_TABLE_PATH = PROJECT_ROOT / "models_trained" / "tpc_table.bin"
 
 
 # =============================================================================
@@ -52,6 +79,24 @@ RANDOM_STATE = 42
 # مثال: 0.2 یعنی 80% آموزش و 20% آزمون
 TEST_SIZE = 0.2
 
+# تعداد سطر هر chunk در حالت جریانی run_pipeline (--stream)
+# حافظه مصرفی متناسب با این عدد است، نه با اندازه کل فایل ورودی.
+STREAM_CHUNK_ROWS = 100_000
+
+# جستجوی hyperparameter (tune.py، successive halving):
+# - TUNE_CV_FOLDS: تعداد foldهای cross-validation روی داده آموزش
+# - TUNE_HALVING_FACTOR: در هر دور فقط 1/factor بهترین کاندیداها باقی می‌مانند و
+#   تعداد سطر آموزش هر کاندیدا factor برابر می‌شود
+# - TUNE_WALL_BUDGET_S / TUNE_CPU_BUDGET_S: بودجه زمان دیواری/CPU کل جستجو (None یعنی بدون محدودیت)
+TUNE_CV_FOLDS = 5
+TUNE_HALVING_FACTOR = 3
+TUNE_WALL_BUDGET_S = 600.0
+TUNE_CPU_BUDGET_S = None
+
+# ارزیابی repeated k-fold هزینه/دقت مدل‌ها (evaluate_models.py)
+EVAL_CV_FOLDS = 5
+EVAL_CV_REPEATS = 3
+
 
 # =============================================================================
 # 3) Target / Feature selection (هدف و انتخاب ویژگی‌ها)
@@ -68,6 +113,35 @@ TARGET_CANDIDATES = ["snr"]
 # ستون‌هایی که برای یادگیری مناسب نیستند یا باعث نشت اطلاعات می‌شوند:
 DROP_COLS = ["num", "timestamp", "device_id", "counter"]
 
+# شِمای (schema) ستون‌های دیتاست تله‌متری LoRa: نوع داده فشرده هر ستون
+# به جای اینکه pandas نوع‌ها را حدس بزند (int64 / float64 / رشته‌های object)،
+# هر ستون با کوچک‌ترین نوعی که دقت آن را حفظ می‌کند خوانده می‌شود:
+# - اندازه‌گیری‌های با 1 تا 6 رقم معنادار => float32
+# - log_distance یک مقدار مشتق‌شده با دقت کامل است => float64
+# - device_id => category ، timestamp => datetime64
+# اگر یک ستون صحیح مقدار گمشده داشته باشد، به جای آن float32 استفاده می‌شود.
+# ستون‌هایی که در این schema نیستند با نوع پیش‌فرض pandas خوانده می‌شوند.
+DATASET_SCHEMA = {
+    "num": "int64",
+    "timestamp": "datetime64[ns]",
+    "counter": "int32",
+    "device_id": "category",
+    "distance": "float32",
+    "rssi": "int16",
+    "snr": "float32",
+    "sf": "int8",
+    "frequency": "int32",
+    "airtime": "float32",
+    "energy": "float32",
+    "length": "int16",
+    "temperature": "float32",
+    "rh": "float32",
+    "bp": "float32",
+    "pm2_5": "float32",
+    "pm10": "float32",
+    "log_distance": "float64",
+}
+
 # =============================================================================
 # 4) Models configuration (مدل‌ها)
 # =============================================================================
@@ -87,6 +161,13 @@ SELECTED_TRAINED_MODEL = "ridge.joblib"
 # مسیر مدل‌های آموزش‌داده‌شده توسط اسکریپت train_baselines.py
 TRAINED_MODELS_DIR = PROJECT_ROOT / "models_trained"
 
+# رجیستری مدل (model_registry.py):
+# - تعداد مدل‌هایی که در کش LRU درون‌پروسه‌ای نگه داشته می‌شوند
+# - mmap_mode برای joblib.load ("r" => آرایه‌های بزرگ memory-map و بین workerها مشترک؛ None => کپی کامل)
+#   نکته: درخت‌های sklearn هنگام unpickle آرایه گره‌ها را کپی می‌کنند، پس RandomForest از mmap سودی نمی‌برد
+MODEL_CACHE_SIZE = 4
+MODEL_MMAP_MODE = "r"
+
 
 # =============================================================================
 # 5) LoRa / TPC parameters (پارامترهای LoRaWAN و منطق TPC)
@@ -123,6 +204,166 @@ SNR_LIMIT_BY_SF = {
 BASELINE_SF = 12
 BASELINE_TP = 14
 
-# پهنای باند LoRa (صرفاً برای مستندسازی فرضیات)
-# چون SNR_limit ها معمولاً بر اساس BW تعریف می‌شوند.
+# حالت تصمیم‌گیری TPC در run_pipeline:
+# - "greedy":  الگوریتم decide_tpc (ابتدا SF و سپس TP را کم می‌کند)
+# - "optimal": جستجوی کامل روی همه (SF, TP)ها و انتخاب کم‌مصرف‌ترین نقطه با Me >= 0
+TPC_MODE = "greedy"
+
+# حالت optimal یک آرایه (N × |SF| × |TP|) می‌سازد؛ برای محدود کردن حافظه،
+# N در بسته‌هایی با این اندازه پردازش می‌شود (50k سطر ≈ 30MB برای grid پیش‌فرض 6×13)
+TPC_OPTIMAL_CHUNK_ROWS = 50_000
+
+# پهنای باند LoRa
+# چون SNR_limit ها معمولاً بر اساس BW تعریف می‌شوند؛ در مدل انرژی Time-on-Air هم استفاده می‌شود.
 LORA_BW_HZ = 125_000
+
+
+# =============================================================================
+# 6) Energy model (مدل انرژی)
+# =============================================================================
+
+# مدل انرژی مورد استفاده در run_pipeline:
+# - "proxy": شاخص ساده 10^(TP/10) * 2^SF (بدون واحد، مستقل از طول payload)
+# - "toa":   مدل فیزیکی Time-on-Air LoRa × توان مصرفی فرستنده (ژول، وابسته به طول payload)
+ENERGY_MODEL = "proxy"
+
+# پارامترهای فرمول استاندارد Time-on-Air (Semtech AN1200.13)
+LORA_CODING_RATE = 1          # 1..4 یعنی CR = 4/5 .. 4/8
+LORA_PREAMBLE_SYMBOLS = 8     # طول preamble (سمبل)
+LORA_EXPLICIT_HEADER = True   # هدر صریح (در LoRaWAN uplink همیشه فعال است)
+LORA_CRC = True               # CRC payload (در LoRaWAN uplink همیشه فعال است)
+
+# ستون length در دیتاست بر حسب «بیت» و فقط payload کاربردی است؛
+# برای Time-on-Air باید سربار فریم LoRaWAN (MHDR + FHDR + FPort + MIC = 13 بایت) اضافه شود.
+PAYLOAD_LENGTH_COL = "length"
+PAYLOAD_LENGTH_IN_BITS = True
+LORAWAN_OVERHEAD_BYTES = 13
+
+# جریان مصرفی رادیو در حالت ارسال بر حسب TP (mA) — جدول رایج SX1272 (مانند شبیه‌ساز FLoRa)
+TX_CURRENT_MA_BY_DBM = {
+    2: 24.0,
+    3: 24.0,
+    4: 24.0,
+    5: 25.0,
+    6: 25.0,
+    7: 25.0,
+    8: 25.0,
+    9: 26.0,
+    10: 31.0,
+    11: 32.0,
+    12: 34.0,
+    13: 35.0,
+    14: 44.0,
+}
+
+# ولتاژ تغذیه رادیو (V)
+SUPPLY_VOLTAGE_V = 3.3
+
+
+# =============================================================================
+# 7) Serving (سرویس پیش‌بینی + TPC؛ src/serve.py)
+# =============================================================================
+
+# آدرس و پورت HTTP سرویس (فقط local به صورت پیش‌فرض)
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+
+# micro-batching: درخواست‌های هم‌زمان تا این تعداد سطر در یک batch جمع می‌شوند
+SERVE_MAX_BATCH = 256
+
+# بودجه تأخیر (میلی‌ثانیه): حداکثر زمانی که اولین درخواست یک batch منتظر درخواست‌های بعدی می‌ماند
+SERVE_MAX_LATENCY_MS = 2.0
+
+
+# =============================================================================
+# 8) Synthetic data (داده مصنوعی برای تست مقیاس؛ src/synth.py)
+# =============================================================================
+
+# تعداد end-deviceهای مصنوعی و بازه زمانی uplinkها (تاریخ شروع شامل، تاریخ پایان غیرشامل)
+SYNTH_DEVICES = 100
+SYNTH_START = "2021-10-01"
+SYNTH_END = "2022-04-01"
+
+# تعداد سطر هر chunk (حافظه ≈ chunk × ~300 بایت در لحظه نوشتن)
+SYNTH_CHUNK_ROWS = 250_000
+
+
+# =============================================================================
+# 9) Figures (نمودارهای گزارش run_pipeline؛ src/figures.py)
+# =============================================================================
+
+# وضوح PNGها
+FIG_DPI = 200
+
+# نمودارها از histogramهای از پیش جمع‌شده (نه نقاط خام) رسم می‌شوند؛ عرض bin ریز هر ستون:
+# - FIG_SNR_BIN_DB: bin دوبعدی SNR واقعی × پیش‌بینی‌شده (نمودار چگالی)
+# - FIG_ME_BIN_DB / FIG_ENERGY_BIN: histogram ریز margin و energy_norm که هنگام رسم
+#   به حدود FIG_HIST_BINS ستون در بازه مشاهده‌شده ادغام می‌شود
+FIG_SNR_BIN_DB = 0.25
+FIG_ME_BIN_DB = 0.1
+FIG_ENERGY_BIN = 0.001
+FIG_HIST_BINS = 20
+
+# بازه ثابت هر histogram؛ مقادیر بیرون از آن در bin لبه شمرده می‌شوند تا چند پیش‌بینی پرت
+# آرایه شمارش را بی‌حد بزرگ نکنند (حداکثر 400×400 خانه برای SNR، 1200 و 2000 bin برای margin و energy_norm)
+FIG_SNR_RANGE_DB = (-60.0, 40.0)
+FIG_ME_RANGE_DB = (-80.0, 40.0)
+FIG_ENERGY_RANGE = (0.0, 2.0)
+
+# تعداد پروسه‌های رسم هم‌زمان (None یعنی min(تعداد نمودارهای لازم، تعداد هسته‌ها))
+FIG_WORKERS = None
+
+
+# =============================================================================
+# 10) KPI summaries (خلاصه یک‌گذره tpc_decisions.csv؛ src/kpi_stream.py)
+# =============================================================================
+
+# اندازه تقریبی هر بلوک خواندن CSV (بایت)؛ حافظه summarize_results مستقل از اندازه فایل است
+# (parser pandas حدود 5 تا 6 برابر اندازه بلوک حافظه موقت می‌گیرد؛ 16MB => اوج ~150MB)
+KPI_CHUNK_BYTES = 16 << 20
+
+# خطای نسبی quantileهای تقریبی (میانه energy_norm و me) در sketch لگاریتمی
+# 0.001 یعنی حداکثر 0.1% خطای نسبی؛ حافظه ≈ ln(max/min) / (2·alpha) bucket برای هر ستون
+KPI_SKETCH_ALPHA = 0.001
+
+# تعداد پروسه‌های جمع‌کننده (هر فایل به همین تعداد shard بایتی تقسیم می‌شود)
+KPI_WORKERS = 1
+
+
+# =============================================================================
+# 11) Per-device TPC controller (کنترل‌کننده حالت‌دار هر دستگاه؛ src/device_controller.py)
+# =============================================================================
+
+# تعداد آخرین uplinkهای هر دستگاه که میانگین SNR پیش‌بینی‌شده آن‌ها ورودی تصمیم است
+DEVICE_SNR_WINDOW = 8
+
+# hysteresis (dB): تا وقتی margin تنظیم فعلی در بازه [0, DEVICE_HYSTERESIS_DB) است، SF/TP تغییر نمی‌کند
+# (margin منفی => افزایش فوری robustness؛ margin بزرگ‌تر => کاهش SF/TP)
+DEVICE_HYSTERESIS_DB = 3.0
+
+
+# =============================================================================
+# 12) Rolling features (ویژگی‌های تاریخچه هر دستگاه؛ src/rolling_features.py)
+# =============================================================================
+
+# تعداد آخرین uplinkهای هر دستگاه در میانگین/واریانس SNR و RSSI و تعداد فاصله‌های counter در loss_rate
+# (فقط هنگام آموزش با train_baselines --rolling-features خوانده می‌شود؛ مقدار آن در پیش‌پردازنده مدل
+#  ذخیره می‌شود و serve/run_pipeline همان را به کار می‌برند)
+ROLLING_WINDOW = 8
+
+
+# =============================================================================
+# 13) Online model (مدل SNR افزایشی RLS؛ src/online_model.py)
+# =============================================================================
+
+# جریمه ridge ضرایب (P₀ = I/alpha، intercept بدون جریمه)؛ با ONLINE_FORGETTING = 1 نتیجه همان Ridge روی ویژگی‌های استانداردشده است
+ONLINE_ALPHA = 1.0
+
+# ضریب فراموشی λ در (0, 1]؛ مقدار کمتر از 1 (مثلاً 0.999) وزن uplinkهای قدیمی را به تدریج کم می‌کند
+ONLINE_FORGETTING = 1.0
+
+# تعداد اولین نمونه‌هایی که میانگین/انحراف معیار ویژگی‌ها از آن‌ها یاد گرفته می‌شود
+ONLINE_WARMUP = 50
+
+# run_pipeline --online-update --stream: ذخیره checkpoint مدل پس از هر این تعداد سطر (و در پایان)
+ONLINE_CHECKPOINT_ROWS = 100_000
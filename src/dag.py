@@ -0,0 +1,426 @@
+"""
+هدف این فایل:
+- اجرای مرحله‌ای پایپ‌لاین پروژه (آموزش → پیش‌بینی SNR → TPC → خلاصه‌ها) به صورت یک DAG کوچک
+- cache محتوایی (content-addressed) هر مرحله: اگر ورودی‌های یک مرحله تغییر نکرده باشند، اجرا نمی‌شود
+
+مثال:
+    python -m src.dag                      # اجرای فقط مراحلی که ورودی‌شان تغییر کرده
+    python -m src.dag --dry-run            # نمایش اینکه کدام مرحله اجرا/رد می‌شود و چرا
+    python -m src.dag summarize            # فقط summarize و مراحل بالادستی آن
+    python -m src.dag --force tpc          # اجرای دوباره tpc حتی اگر cache معتبر باشد
+    python -m src.dag --no-train           # مدل‌های موجود models_trained/ ورودی ثابت فرض می‌شوند
+
+مراحل:
+    train     -> python -m src.train_baselines
+    predict   -> python -m src.run_pipeline --stage predict   (snr_predictions.csv)
+    tpc       -> python -m src.run_pipeline --stage tpc       (tpc_decisions.csv + نمودارها)
+    summarize -> python -m src.summarize_results
+    analyze   -> python -m src.analyze_tpc_vs_baseline
+
+کلید cache هر مرحله = sha256 روی:
+- محتوای فایل‌های ورودی (دیتاست، مدل منتخب، خروجی مراحل بالادستی)
+- مقدار کلیدهای config که مرحله واقعاً به آن‌ها وابسته است (نه کل config.py)
+- کد منبع ماژول‌هایی که خروجی مرحله را تعیین می‌کنند، ماژول و آرگومان‌های اجرا
+
+مثلاً تغییر فقط LINK_MARGIN_DB در config.py کلید tpc، summarize و analyze را عوض می‌کند
+ولی train و predict از cache رد می‌شوند.
+
+وابستگی بین مراحل از روی فایل‌ها ساخته می‌شود (ورودی یک مرحله = خروجی مرحله دیگر).
+چون ورودی مراحل پایین‌دستی hash «محتوای» خروجی بالادستی است، اگر اجرای دوباره یک مرحله
+همان خروجی قبلی را بسازد، مراحل بعدی رد می‌شوند (early cutoff).
+
+فایل‌های cache (config.DAG_CACHE_DIR):
+- <stage>.json      : کلید، اجزای کلید و hash خروجی‌های آخرین اجرای موفق
+- <stage>.log       : stdout آخرین اجرا (summarize/analyze خروجی‌شان فقط چاپی است؛ --show-cached)
+- file_hashes.json  : hash فایل‌ها به ازای (اندازه، mtime) تا فایل‌های بزرگ در هر اجرا دوباره خوانده نشوند
+
+محدودیت:
+- مراحل در پروسه جدا اجرا می‌شوند و همان config.py را می‌خوانند؛ تغییر config یعنی ویرایش همان فایل
+- تغییر کد خارج از فهرست code هر مرحله (مثلاً instrument.py) cache را باطل نمی‌کند
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import config
+from .figures import FIGURE_NAMES
+from .instrument import session, stage
+from .model_registry import SIDECAR_SUFFIX, file_sha256
+from .preprocessing import preprocessor_path
+
+
+# با تغییر این عدد همه cacheها باطل می‌شوند (مثلاً اگر قالب manifest عوض شود)
+DAG_VERSION = 1
+
+SRC_DIR = Path(__file__).resolve().parent
+
+# کلیدهای config که روی خروجی هر گروه از مراحل اثر دارند
+DATA_KEYS = ("TARGET_COL", "DROP_COLS", "DATASET_SCHEMA")
+TRAIN_KEYS = DATA_KEYS + ("RANDOM_STATE", "TEST_SIZE", "ONLINE_ALPHA", "ONLINE_FORGETTING", "ONLINE_WARMUP")
+PREDICT_KEYS = DATA_KEYS + ("SELECTED_TRAINED_MODEL",)
+TPC_KEYS = (
+    "SF_MIN", "SF_MAX", "TP_MIN", "TP_MAX", "LINK_MARGIN_DB", "SNR_LIMIT_BY_SF",
+    "BASELINE_SF", "BASELINE_TP", "TPC_MODE", "ENERGY_MODEL", "LORA_BW_HZ",
+)
+ENERGY_KEYS = (
+    "LORA_CODING_RATE", "LORA_PREAMBLE_SYMBOLS", "LORA_EXPLICIT_HEADER", "LORA_CRC",
+    "PAYLOAD_LENGTH_COL", "PAYLOAD_LENGTH_IN_BITS", "LORAWAN_OVERHEAD_BYTES",
+    "TX_CURRENT_MA_BY_DBM", "SUPPLY_VOLTAGE_V",
+)
+FIGURE_KEYS = (
+    "FIG_DPI", "FIG_SNR_BIN_DB", "FIG_ME_BIN_DB", "FIG_ENERGY_BIN", "FIG_HIST_BINS",
+    "FIG_SNR_RANGE_DB", "FIG_ME_RANGE_DB", "FIG_ENERGY_RANGE",
+)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    تعریف یک مرحله DAG.
+
+    - module/args: دستور اجرا (python -m module *args، در ریشه پروژه)
+    - inputs: فایل‌هایی که محتوایشان در کلید می‌آید (خروجی مراحل دیگر => وابستگی)
+    - config_keys: نام متغیرهای config که مقدارشان در کلید می‌آید
+    - code: فایل‌های src/ که خروجی مرحله را تعیین می‌کنند
+    - outputs: فایل‌هایی که مرحله می‌سازد (برای cache و وابستگی مراحل بعدی)
+    """
+    name: str
+    module: str
+    args: tuple[str, ...] = ()
+    inputs: tuple[Path, ...] = ()
+    config_keys: tuple[str, ...] = ()
+    code: tuple[str, ...] = ()
+    outputs: tuple[Path, ...] = ()
+
+
+def model_files(model_name: str) -> tuple[Path, Path]:
+    """فایل مدل و پیش‌پردازنده کنار آن در models_trained/."""
+    path = config.TRAINED_MODELS_DIR / model_name
+    return path, preprocessor_path(path)
+
+
+def build_stages(with_train: bool = True) -> list[Stage]:
+    """
+    فهرست مراحل پایپ‌لاین به ترتیب اجرا (ترتیب topological).
+
+    - with_train=False: مرحله train حذف می‌شود و فایل‌های مدل ورودی ثابت predict هستند
+    - دیتاست خام فقط وقتی ورودی tpc است که مدل انرژی toa باشد (طول payload از آن خوانده می‌شود)
+    - metadata مدل‌ها (.meta.json) و model_metrics.csv زمان آموزش دارند، پس ورودی هیچ مرحله‌ای نیستند
+    """
+    train_outputs = [config.MODEL_METRICS_CSV]
+    for name in config.PRIMARY_MODELS:
+        model_path, prep_path = model_files(name)
+        train_outputs += [model_path, prep_path, model_path.with_name(model_path.stem + SIDECAR_SUFFIX)]
+
+    tpc_inputs = [config.SNR_PREDICTIONS_CSV]
+    if config.ENERGY_MODEL == "toa":
+        tpc_inputs.append(config.DATA_RAW)
+
+    stages = [
+        Stage(
+            name="train",
+            module="src.train_baselines",
+            inputs=(config.DATA_RAW,),
+            config_keys=TRAIN_KEYS,
+            code=(
+                "train_baselines.py", "io_utils.py", "dataset_cache.py", "preprocessing.py",
+                "rolling_features.py", "device_slots.py", "online_model.py", "model_registry.py",
+            ),
+            outputs=tuple(train_outputs),
+        ),
+        Stage(
+            name="predict",
+            module="src.run_pipeline",
+            args=("--stage", "predict"),
+            inputs=(config.DATA_RAW, *model_files(config.SELECTED_TRAINED_MODEL)),
+            config_keys=PREDICT_KEYS,
+            code=(
+                "run_pipeline.py", "io_utils.py", "dataset_cache.py", "preprocessing.py",
+                "rolling_features.py", "device_slots.py", "online_model.py", "model_registry.py",
+            ),
+            outputs=(config.SNR_PREDICTIONS_CSV,),
+        ),
+        Stage(
+            name="tpc",
+            module="src.run_pipeline",
+            args=("--stage", "tpc"),
+            inputs=tuple(tpc_inputs),
+            config_keys=TPC_KEYS + ENERGY_KEYS + FIGURE_KEYS,
+            code=("run_pipeline.py", "io_utils.py", "tpc.py", "energy.py", "figures.py"),
+            outputs=(config.TPC_DECISIONS_CSV, *(config.FIG_DIR / f"{name}.png" for name in FIGURE_NAMES)),
+        ),
+        Stage(
+            name="summarize",
+            module="src.summarize_results",
+            inputs=(config.TPC_DECISIONS_CSV,),
+            code=("summarize_results.py", "kpi_stream.py"),
+        ),
+        Stage(
+            name="analyze",
+            module="src.analyze_tpc_vs_baseline",
+            inputs=(config.TPC_DECISIONS_CSV, config.SNR_PREDICTIONS_CSV),
+            config_keys=("BASELINE_SF", "BASELINE_TP", "LINK_MARGIN_DB", "SNR_LIMIT_BY_SF"),
+            code=("analyze_tpc_vs_baseline.py", "tpc.py", "energy.py"),
+        ),
+    ]
+    return stages if with_train else stages[1:]
+
+
+def producers(stages: list[Stage]) -> dict[Path, str]:
+    """نگاشت هر فایل خروجی به نام مرحله‌ای که آن را می‌سازد."""
+    return {path: st.name for st in stages for path in st.outputs}
+
+
+def upstream(stages: list[Stage], targets: list[str]) -> list[Stage]:
+    """مراحل لازم برای targets (خودشان و همه مراحل بالادستی)، به ترتیب اجرا."""
+    by_name = {st.name: st for st in stages}
+    made_by = producers(stages)
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        todo += [made_by[p] for p in by_name[name].inputs if p in made_by]
+    return [st for st in stages if st.name in needed]
+
+
+def _rel(path: Path) -> str:
+    """مسیر نسبی به ریشه پروژه (کلیدهای cache به محل checkout وابسته نیستند)."""
+    try:
+        return Path(path).resolve().relative_to(config.PROJECT_ROOT).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_json(path: Path, payload: dict) -> None:
+    """نوشتن اتمیک JSON (اول فایل موقت، سپس replace) تا manifest نیمه‌کاره نماند."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class FileHashes:
+    """
+    hash محتوای فایل‌ها با حافظه (size, mtime_ns) بین اجراها.
+
+    فایل‌های بزرگ (دیتاست‌های چند گیگابایتی) فقط وقتی دوباره خوانده می‌شوند که اندازه یا
+    زمان تغییرشان عوض شده باشد.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries = _read_json(self.path) or {}
+
+    def __call__(self, file: Path) -> str | None:
+        """sha256 فایل؛ برای فایل ناموجود None."""
+        try:
+            st = os.stat(file)
+        except FileNotFoundError:
+            return None
+        key = _rel(file)
+        entry = self.entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        sha = file_sha256(Path(file))
+        self.entries[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+        return sha
+
+    def save(self) -> None:
+        _write_json(self.path, self.entries)
+
+
+def stage_components(st: Stage, hashes: FileHashes) -> dict[str, str]:
+    """
+    اجزای کلید cache یک مرحله (نام جزء => digest).
+
+    اجزا جداگانه در manifest ذخیره می‌شوند تا دلیل اجرای دوباره قابل گزارش باشد
+    (مثلاً "config LINK_MARGIN_DB").
+    """
+    comps = {
+        "dag_version": str(DAG_VERSION),
+        "command": _digest(json.dumps([st.module, *st.args])),
+    }
+    for key in st.config_keys:
+        comps[f"config {key}"] = _digest(json.dumps(getattr(config, key), sort_keys=True, default=str))
+    for path in st.inputs:
+        sha = hashes(path)
+        if sha is None:
+            raise FileNotFoundError(f"stage '{st.name}': input {path} does not exist")
+        comps[f"input {_rel(path)}"] = sha
+    for name in st.code:
+        comps[f"code {name}"] = hashes(SRC_DIR / name)
+    return comps
+
+
+def stage_key(components: dict[str, str]) -> str:
+    return _digest(json.dumps(components, sort_keys=True))
+
+
+def stale_reasons(st: Stage, components: dict[str, str], manifest: dict | None, hashes: FileHashes) -> list[str]:
+    """
+    دلایل اجرای دوباره یک مرحله (لیست خالی یعنی cache معتبر است).
+
+    - manifest قبلی وجود ندارد
+    - یکی از اجزای کلید تغییر کرده (ورودی، config، کد، دستور)
+    - یکی از خروجی‌ها حذف یا بیرون از DAG تغییر کرده است
+    """
+    if manifest is None:
+        return ["no cached run"]
+    reasons = []
+    if manifest.get("key") != stage_key(components):
+        old = manifest.get("components", {})
+        changed = sorted(k for k in set(old) | set(components) if old.get(k) != components.get(k))
+        reasons += [f"{k} changed" for k in changed] or ["key changed"]
+    for rel, sha in manifest.get("outputs", {}).items():
+        current = hashes(config.PROJECT_ROOT / rel)
+        if current is None:
+            reasons.append(f"output {rel} missing")
+        elif current != sha:
+            reasons.append(f"output {rel} modified")
+    return reasons
+
+
+def run_stage(st: Stage, log_path: Path) -> float:
+    """
+    اجرای یک مرحله در پروسه جدا؛ stdout هم چاپ و هم در log_path ذخیره می‌شود.
+
+    خروجی:
+    - زمان اجرا (ثانیه)؛ در صورت خطای مرحله CalledProcessError
+    """
+    cmd = [sys.executable, "-m", st.module, *st.args]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=config.PROJECT_ROOT, stdout=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - t0
+
+    sys.stdout.write(proc.stdout)
+    sys.stdout.flush()
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    log_path.write_text(proc.stdout, encoding="utf-8")
+    proc.check_returncode()
+    return elapsed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    names = [st.name for st in build_stages()]
+    parser = argparse.ArgumentParser(description="Run the pipeline stages whose inputs changed (content-addressed cache)")
+    parser.add_argument("targets", nargs="*", metavar="STAGE", help=f"stages to bring up to date: {', '.join(names)} (default: all)")
+    parser.add_argument("--force", nargs="+", default=[], choices=names, metavar="STAGE", help="rerun these stages even if cached")
+    parser.add_argument("--no-train", action="store_true", help="treat the models in models_trained/ as fixed inputs (no train stage)")
+    parser.add_argument("--dry-run", action="store_true", help="only print which stages would run and why")
+    parser.add_argument("--show-cached", action="store_true", help="reprint the saved stdout of skipped stages")
+    parser.add_argument("--trace", action="store_true", help="record per-stage timings to config.TRACE_DIR (instrument.py)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """نقطه شروع: خواندن آرگومان‌ها و اجرای run (با --trace داخل یک session ثبت مراحل)."""
+    args = parse_args(argv)
+    with session("dag", enabled=args.trace):
+        return run(args)
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    به‌روز کردن مراحل هدف.
+
+    مراحل:
+    1) ساخت DAG و انتخاب مراحل هدف و بالادستی آن‌ها
+    2) برای هر مرحله به ترتیب: محاسبه کلید از روی ورودی‌ها (پس از اجرای مراحل قبلی)
+    3) مقایسه با manifest؛ رد کردن مرحله یا اجرای آن و ثبت manifest جدید
+    """
+    stages = build_stages(with_train=not args.no_train)
+    names = [st.name for st in stages]
+    for name in args.targets + args.force:
+        if name not in names:
+            raise SystemExit(f"stage '{name}' is not part of this DAG (--no-train?)")
+    selected = upstream(stages, args.targets or names)
+    made_by = producers(stages)
+
+    hashes = FileHashes(config.DAG_CACHE_DIR / "file_hashes.json")
+    pending = set()  # در --dry-run: مراحلی که اجرا می‌شوند (ورودی پایین‌دستی‌ها هنوز معلوم نیست)
+    n_run = n_skip = 0
+    try:
+        for st in selected:
+            manifest_path = config.DAG_CACHE_DIR / f"{st.name}.json"
+            log_path = config.DAG_CACHE_DIR / f"{st.name}.log"
+
+            waiting = sorted({made_by[p] for p in st.inputs if made_by.get(p) in pending})
+            if waiting:
+                print(f"[run ] {st.name:10s} after {', '.join(waiting)} (inputs not known until then)")
+                pending.add(st.name)
+                continue
+
+            with stage("dag.hash", stage=st.name):
+                components = stage_components(st, hashes)
+                manifest = _read_json(manifest_path)
+                reasons = stale_reasons(st, components, manifest, hashes)
+            if st.name in args.force:
+                reasons.insert(0, "forced")
+
+            if not reasons:
+                print(f"[skip] {st.name:10s} cached ({stage_key(components)[:12]})")
+                n_skip += 1
+                if args.show_cached and log_path.exists():
+                    sys.stdout.write(log_path.read_text(encoding="utf-8"))
+                continue
+
+            print(f"[run ] {st.name:10s} {'; '.join(reasons)}")
+            if args.dry_run:
+                pending.add(st.name)
+                continue
+
+            with stage(f"dag.{st.name}"):
+                elapsed = run_stage(st, log_path)
+            n_run += 1
+
+            missing = [p for p in st.outputs if not p.exists()]
+            if missing:
+                raise FileNotFoundError(f"stage '{st.name}' did not produce {', '.join(map(str, missing))}")
+            _write_json(manifest_path, {
+                "stage": st.name,
+                "key": stage_key(components),
+                "components": components,
+                "outputs": {_rel(p): hashes(p) for p in st.outputs},
+                "seconds": round(elapsed, 3),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+            print(f"       {st.name} done in {elapsed:.2f} s")
+    except subprocess.CalledProcessError as exc:
+        print(f"Stage failed (exit {exc.returncode}): {' '.join(exc.cmd)}", file=sys.stderr)
+        return 1
+    finally:
+        hashes.save()
+
+    if args.dry_run:
+        print(f"{len(pending)} stage(s) would run, {n_skip} up to date")
+    else:
+        print(f"{n_run} stage(s) run, {n_skip} up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
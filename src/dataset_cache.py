@@ -0,0 +1,244 @@
+"""
+هدف این فایل:
+- ساخت و استفاده مجدد از یک «کش ستونی باینری» برای دیتاست‌های CSV
+
+مشکل:
+- همه نقاط ورود (train_baselines, run_pipeline, sanity_check, نوت‌بوک) هر بار فایل CSV را
+  از متن parse می‌کنند؛ برای فایل‌های بزرگ این مرحله از خود محاسبات کندتر است.
+
+راه‌حل:
+- بار اول، CSV یک بار parse می‌شود و هر ستون به صورت یک فایل .npy جداگانه زیر
+  data/processed/cache/ ذخیره می‌شود (ستون‌های متنی به صورت codes + categories).
+- بارهای بعدی فایل‌ها با np.load(mmap_mode="r") باز می‌شوند: بدون parse متن و فقط
+  برای ستون‌هایی که واقعاً لازم است.
+
+اعتبارسنجی کش (کلید کش):
+- مسیر فایل منبع، اندازه، mtime و hash محتوای فایل در manifest.json ذخیره می‌شود.
+- reader_key (مثلاً hash شِمای نوع ستون‌ها) هم ذخیره می‌شود؛ اگر روش parse تغییر کند کش بازسازی می‌شود.
+- اگر اندازه و mtime یکسان باشند کش بدون hash مجدد معتبر است (سریع).
+- اگر mtime تغییر کرده ولی اندازه یکسان است، hash محتوا دوباره محاسبه می‌شود؛
+  اگر محتوا همان باشد کش حفظ و فقط mtime به‌روزرسانی می‌شود، وگرنه کش بازسازی می‌شود.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+
+# نسخه فرمت کش؛ اگر ساختار فایل‌ها تغییر کند این عدد افزایش می‌یابد تا کش‌های قدیمی بازسازی شوند
+CACHE_FORMAT_VERSION = 2
+
+
+def file_content_hash(path: Path, block_size: int = 1 << 20) -> str:
+    """
+    hash محتوای یک فایل (blake2b) با خواندن بلوک به بلوک (بدون بارگذاری کل فایل در حافظه).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_dir_for(source: Path) -> Path:
+    """
+    پوشه کش مربوط به یک فایل منبع: <DATASET_CACHE_DIR>/<نام فایل>-<hash مسیر>/
+
+    hash مسیر باعث می‌شود دو فایل هم‌نام در مسیرهای مختلف کش جداگانه داشته باشند.
+    """
+    source = Path(source).resolve()
+    tag = hashlib.blake2b(str(source).encode("utf-8"), digest_size=6).hexdigest()
+    return config.DATASET_CACHE_DIR / f"{source.stem}-{tag}"
+
+
+def _read_manifest(cache_dir: Path) -> dict | None:
+    try:
+        with open(cache_dir / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(cache_dir: Path, manifest: dict) -> None:
+    tmp = cache_dir / "manifest.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    tmp.replace(cache_dir / "manifest.json")
+
+
+def _is_valid(manifest: dict | None, source: Path, cache_dir: Path, reader_key: str) -> bool:
+    """
+    بررسی معتبر بودن کش برای فایل منبع (بر اساس مسیر، اندازه، mtime، hash محتوا و reader_key).
+    """
+    if manifest is None or manifest.get("version") != CACHE_FORMAT_VERSION:
+        return False
+    if manifest.get("reader_key") != reader_key:
+        return False
+
+    st = source.stat()
+    if manifest.get("source") != str(source.resolve()) or manifest.get("size") != st.st_size:
+        return False
+
+    if manifest.get("mtime_ns") == st.st_mtime_ns:
+        return True
+
+    # mtime تغییر کرده (مثلاً فایل کپی یا touch شده): محتوا را مقایسه می‌کنیم
+    if file_content_hash(source) != manifest.get("content_hash"):
+        return False
+
+    manifest["mtime_ns"] = st.st_mtime_ns
+    _write_manifest(cache_dir, manifest)
+    return True
+
+
+def build_cache(source: Path, reader: Callable[[Path], pd.DataFrame], reader_key: str = "") -> dict:
+    """
+    parse کامل فایل منبع (با reader) و ذخیره هر ستون در یک فایل .npy.
+
+    - ستون‌های عددی/زمانی: مستقیماً np.save
+    - ستون‌های غیرعددی (متن/category): codes (int32، -1 برای NaN) + categories (رشته ثابت‌طول)
+      تا همه فایل‌ها بدون pickle و قابل memory-map باشند.
+
+    خروجی:
+    - manifest ساخته‌شده
+    """
+    source = Path(source)
+    cache_dir = cache_dir_for(source)
+    st = source.stat()
+    content_hash = file_content_hash(source)
+
+    df = reader(source)
+
+    # ساخت در یک پوشه موقت یکتا (mkdtemp) کنار کش و جایگزینی اتمی، تا کش نیمه‌کاره هرگز خوانده نشود
+    # و دو پروسه که هم‌زمان کش را می‌سازند فایل‌های یکدیگر را پاک نکنند
+    cache_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f"{cache_dir.name}.", suffix=".tmp", dir=cache_dir.parent))
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        stem = f"c{i:04d}"
+        if pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_datetime64_dtype(col.dtype):
+            np.save(tmp_dir / f"{stem}.npy", col.to_numpy())
+            columns.append({"name": name, "kind": "array", "file": f"{stem}.npy", "dtype": str(col.dtype)})
+        else:
+            cat = pd.Categorical(col)
+            np.save(tmp_dir / f"{stem}.codes.npy", cat.codes.astype(np.int32))
+            np.save(tmp_dir / f"{stem}.categories.npy", np.asarray(cat.categories.astype(str), dtype=str))
+            columns.append({
+                "name": name,
+                "kind": "category",
+                "codes": f"{stem}.codes.npy",
+                "categories": f"{stem}.categories.npy",
+                "dtype": str(col.dtype),
+            })
+
+    manifest = {
+        "version": CACHE_FORMAT_VERSION,
+        "source": str(source.resolve()),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "content_hash": content_hash,
+        "reader_key": reader_key,
+        "n_rows": int(len(df)),
+        "columns": columns,
+    }
+    _write_manifest(tmp_dir, manifest)
+    _swap_in(tmp_dir, cache_dir)
+    return manifest
+
+
+def _swap_in(tmp_dir: Path, cache_dir: Path) -> None:
+    """
+    جایگزینی cache_dir با tmp_dir فقط با rename (اتمی روی یک filesystem).
+
+    پوشه قدیمی اول به یک نام یکتا منتقل و بعد پاک می‌شود؛ readerهایی که ستون‌های آن را با mmap باز کرده‌اند
+    تا بسته شدن فایل‌ها همان داده را می‌بینند. اگر builder دیگری زودتر کش تازه را گذاشته باشد،
+    همان نگه داشته و نسخه این پروسه دور ریخته می‌شود (هر دو از یک منبع ساخته شده‌اند).
+    """
+    old_dir = None
+    if cache_dir.exists():
+        old_dir = Path(tempfile.mkdtemp(prefix=f"{cache_dir.name}.", suffix=".old", dir=cache_dir.parent))
+        try:
+            cache_dir.replace(old_dir)
+        except OSError:  # builder دیگری هم‌زمان کش را جابه‌جا کرد
+            pass
+    try:
+        tmp_dir.replace(cache_dir)
+    except OSError:  # cache_dir دوباره (توسط builder دیگری) ساخته شده است
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _load_column(cache_dir: Path, spec: dict) -> pd.Series | np.ndarray:
+    """بارگذاری یک ستون از کش (با memory-map)."""
+    if spec["kind"] == "array":
+        return np.load(cache_dir / spec["file"], mmap_mode="r")
+
+    codes = np.load(cache_dir / spec["codes"], mmap_mode="r")
+    categories = np.load(cache_dir / spec["categories"], mmap_mode="r")
+    cat = pd.Categorical.from_codes(np.asarray(codes), categories=pd.Index(np.asarray(categories)))
+    series = pd.Series(cat)
+    # ستون متنی با همان dtype زمان parse برگردانده می‌شود (مثلاً str/object)
+    if spec["dtype"] != "category":
+        series = series.astype(spec["dtype"])
+    return series
+
+
+def cached_columns(source: Path, reader_key: str = "") -> list[str] | None:
+    """
+    لیست ستون‌های فایل منبع از manifest کش (بدون خواندن CSV)؛ اگر کش معتبر نباشد None.
+    """
+    source = Path(source)
+    cache_dir = cache_dir_for(source)
+    manifest = _read_manifest(cache_dir)
+    if not _is_valid(manifest, source, cache_dir, reader_key):
+        return None
+    return [c["name"] for c in manifest["columns"]]
+
+
+def load_cached(
+    source: Path,
+    reader: Callable[[Path], pd.DataFrame],
+    columns: list[str] | None = None,
+    reader_key: str = ""
+) -> pd.DataFrame:
+    """
+    بارگذاری دیتاست از کش ستونی؛ اگر کش وجود نداشته یا نامعتبر باشد ابتدا ساخته می‌شود.
+
+    ورودی‌ها:
+    - source: مسیر فایل CSV منبع
+    - reader: تابعی که CSV را parse می‌کند (فقط هنگام ساخت کش صدا زده می‌شود)
+    - columns: فقط این ستون‌ها بارگذاری می‌شوند (None یعنی همه ستون‌ها، به ترتیب فایل)
+    - reader_key: شناسه روش parse (مثلاً hash شِما)؛ با تغییر آن کش بازسازی می‌شود
+    """
+    source = Path(source)
+    cache_dir = cache_dir_for(source)
+    manifest = _read_manifest(cache_dir)
+    if not _is_valid(manifest, source, cache_dir, reader_key):
+        manifest = build_cache(source, reader, reader_key)
+
+    specs = {c["name"]: c for c in manifest["columns"]}
+    wanted = list(specs) if columns is None else list(columns)
+    missing = [c for c in wanted if c not in specs]
+    if missing:
+        raise KeyError(f"Columns not found in {source.name}: {missing}")
+
+    try:
+        data = {name: _load_column(cache_dir, specs[name]) for name in wanted}
+    except FileNotFoundError:
+        # کش بین خواندن manifest و باز کردن ستون‌ها توسط پروسه دیگری جایگزین شد: دوباره از manifest تازه
+        return load_cached(source, reader, columns, reader_key)
+    # copy=False: ستون‌های عددی همان آرایه‌های memory-map (فقط‌خواندنی) می‌مانند و در حافظه کپی نمی‌شوند
+    return pd.DataFrame(data, columns=wanted, copy=False)
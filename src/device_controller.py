@@ -0,0 +1,363 @@
+"""
+هدف این فایل:
+- کنترل‌کننده TPC «حالت‌دار» برای هر end-device روی جریان زمان‌دار uplinkها
+  (decide_tpc هر سطر را مستقل و همیشه از BASELINE_SF/BASELINE_TP شروع می‌کند؛
+  در شبکه واقعی هر دستگاه SF/TP فعلی خود را از یک uplink به uplink بعدی نگه می‌دارد)
+
+ایده:
+- وضعیت هر دستگاه (SF/TP فعلی، پنجره لغزان SNR، آخرین frame counter) در آرایه‌های NumPy
+  نگه داشته می‌شود؛ یک دیکشنری device_id => شماره slot آرایه‌ها را ایندکس می‌کند
+  (برای صدها هزار دستگاه فقط چند ده MB حافظه)
+- هر تصمیم از (SF, TP) فعلی همان دستگاه شروع می‌شود (sf_start/tp_start در decide_tpc_batch)
+- ورودی تصمیم، میانگین SNR پیش‌بینی‌شده در پنجره آخرین DEVICE_SNR_WINDOW uplink دستگاه است
+- hysteresis: با margin فعلی Me (روی میانگین پنجره و تنظیم فعلی دستگاه)
+    Me < 0                        => لینک ناامن است؛ فوراً تصمیم جدید (افزایش robustness)
+    0 <= Me < DEVICE_HYSTERESIS_DB => ناحیه مرده؛ تنظیم فعلی حفظ می‌شود (جلوگیری از نوسان SF/TP)
+    Me >= DEVICE_HYSTERESIS_DB     => حاشیه کافی؛ تصمیم جدید (کاهش SF/TP و انرژی)
+- اگر frame counter دستگاه کمتر از مقدار قبلی شود (rejoin/reset دستگاه)، وضعیت آن به baseline برمی‌گردد
+
+پردازش برداری log مرتب‌شده بر اساس زمان (process_log):
+- پنجره SNR به تصمیم‌ها وابسته نیست: میانگین پنجره همه uplinkها (با resetها) یک‌جا و برداری ساخته می‌شود
+- فقط تصمیم/hysteresis ترتیبی است:
+  * دستگاه‌های زیاد: uplinkها بر اساس «شماره uplink همان دستگاه در batch» به دورها (round) تقسیم می‌شوند؛
+    در هر دور هر دستگاه حداکثر یک uplink دارد، پس همه با یک decide_tpc_batch برداری پردازش می‌شوند
+  * چند دستگاه با تاریخچه طولانی (تعداد دورها نزدیک n؛ مثل دیتاست واقعی با 4 دستگاه): حلقه اسکالر
+    decide_tpc روی uplinkهای هر دستگاه، چون هزینه ثابت هر دور NumPy بر چند uplink سرشکن نمی‌شود
+- نتیجه دقیقاً همان پردازش uplink به uplink به ترتیب زمان است (update برای حالت online)
+
+اجرا:
+    python -m src.device_controller                 # پیش‌بینی SNR + کنترل‌کننده روی دیتاست خام
+    python -m src.device_controller --window 4 --hysteresis-db 2
+
+خروجی:
+- outputs/predictions/device_tpc_decisions.csv (timestamp, device_id, counter, sf, tp, me, energy_norm)
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .device_slots import DeviceSlots
+from .energy import normalized_energy_batch
+from .instrument import session, stage
+from .io_utils import detect_target_col, ensure_dirs, load_dataset, save_csv
+from .model_registry import default_registry
+from .rolling_features import rolling_features, uses_rolling_features
+from .tpc import TPCBatchDecision, TPCDecision, decide_tpc, decide_tpc_batch, snr_limit_array
+
+
+# حداقل میانگین uplink در هر دور برای مسیر برداری دورها؛ کمتر از آن (چند دستگاه پرترافیک) حلقه اسکالر
+# هر دستگاه سریع‌تر است: یک دور (چند decide_tpc_batch) حدود 0.5 میلی‌ثانیه، یک uplink اسکالر حدود 2 میکروثانیه
+_ROUND_MIN_UPLINKS = 200
+
+
+class DeviceTPCController(DeviceSlots):
+    """
+    وضعیت TPC همه دستگاه‌ها در آرایه‌های فشرده (یک slot برای هر device_id).
+
+    آرایه‌های وضعیت (طول = ظرفیت؛ slotها و رشد آرایه‌ها در DeviceSlots):
+    - sf (int8)، tp (float64): تنظیم فعلی دستگاه
+    - window (ظرفیت × W، float64) و pos/count: پنجره حلقوی آخرین W مقدار SNR
+    - last_counter (int64): آخرین frame counter دیده‌شده (-1 یعنی نامعلوم)
+    """
+
+    def __init__(self, window: int | None = None, hysteresis_db: float | None = None, capacity: int = 1024):
+        self.window = int(config.DEVICE_SNR_WINDOW if window is None else window)
+        self.hysteresis_db = float(config.DEVICE_HYSTERESIS_DB if hysteresis_db is None else hysteresis_db)
+        if self.window < 1:
+            raise ValueError(f"window must be >= 1, got {self.window}")
+        if self.hysteresis_db < 0:
+            raise ValueError(f"hysteresis_db must be >= 0, got {self.hysteresis_db}")
+
+        super().__init__(capacity)
+        self._state("sf", config.BASELINE_SF, np.int8)
+        self._state("tp", float(config.BASELINE_TP), np.float64)
+        self._state("snr_window", 0.0, np.float64, width=self.window)
+        self._state("pos", 0, np.int32)
+        self._state("count", 0, np.int64)
+        self._state("last_counter", -1, np.int64)
+        self._state("changes", 0, np.int64)
+
+    def reset(self, slots: np.ndarray) -> None:
+        """بازگرداندن وضعیت دستگاه‌ها به baseline و خالی کردن پنجره SNR."""
+        self.sf[slots] = config.BASELINE_SF
+        self.tp[slots] = float(config.BASELINE_TP)
+        self.snr_window[slots] = 0.0
+        self.pos[slots] = 0
+        self.count[slots] = 0
+
+    # -------------------------------------------------------------------------
+    # پنجره SNR: مستقل از تصمیم‌ها، پس برای کل chunk یک‌جا
+    # -------------------------------------------------------------------------
+    def _windows(self, slots: np.ndarray, snr: np.ndarray, counters: np.ndarray | None, first: np.ndarray):
+        """
+        میانگین پنجره SNR و پرچم reset هر uplink (ورودی مرتب بر اساس slot و سپس زمان) و به‌روزرسانی
+        وضعیت پنجره/counter دستگاه‌ها.
+
+        محتوای بافر حلقوی بعد از هر uplink بدون حلقه روی uplinkها ساخته می‌شود: خانه p بافر
+        آخرین SNR نوشته‌شده در p از شروع «قطعه» فعلی است (قطعه = از اول chunk یا از آخرین reset)،
+        وگرنه محتوای قبلی بافر (قطعه اول بدون reset) یا صفر (بعد از reset).
+        جمع هر سطر با همان .sum(axis=1) روی همان چیدمان بافر است => نتیجه بیت‌به‌بیت مانند پردازش uplink به uplink.
+        """
+        n, window = len(slots), self.window
+        if counters is None:
+            reset = np.zeros(n, dtype=bool)
+        else:
+            prev = np.empty(n, dtype=np.int64)
+            prev[1:] = counters[:-1]
+            prev[first] = self.last_counter[slots[first]]
+            reset = (counters < prev) & (prev >= 0)
+
+        seg_starts = np.flatnonzero(first | reset)
+        seg_start = np.repeat(seg_starts, np.diff(np.r_[seg_starts, n]))
+        j = np.arange(n) - seg_start  # شماره uplink در قطعه
+        carry = first[seg_start] & ~reset[seg_start]  # قطعه ادامه وضعیت قبلی دستگاه است
+        pos0 = np.where(carry, self.pos[slots], 0)
+        count = np.where(carry, self.count[slots], 0) + j + 1
+        cur = (pos0 + j) % window
+
+        rows = np.arange(n)
+        buf = np.empty((n, window), dtype=np.float64)
+        for lag in range(window):
+            p = (cur - lag) % window
+            vals = np.where(carry, self.snr_window[slots, p], 0.0)
+            own = j >= lag
+            vals[own] = snr[rows[own] - lag]
+            buf[rows, p] = vals
+        snr_mean = buf.sum(axis=1) / np.minimum(count, window)
+
+        last = np.r_[np.flatnonzero(first)[1:], n] - 1
+        self.snr_window[slots[last]] = buf[last]
+        self.pos[slots[last]] = (cur[last] + 1) % window
+        self.count[slots[last]] = count[last]
+        if counters is not None:
+            self.last_counter[slots[last]] = counters[last]
+        return snr_mean, reset
+
+    # -------------------------------------------------------------------------
+    # تصمیم‌ها: ترتیبی برای هر دستگاه
+    # -------------------------------------------------------------------------
+    def _decide_round(self, slots: np.ndarray, snr_mean: np.ndarray, reset: np.ndarray) -> tuple[np.ndarray, ...]:
+        """یک دور برداری: یک uplink برای هر slot (slotها در این فراخوانی یکتا هستند)."""
+        if reset.any():
+            self.sf[slots[reset]] = config.BASELINE_SF
+            self.tp[slots[reset]] = float(config.BASELINE_TP)
+
+        # margin تنظیم فعلی با همان ترتیب عملیات decide_tpc
+        sf, tp = self.sf[slots].astype(np.int64), self.tp[slots]
+        me_now = (snr_mean + (tp - config.BASELINE_TP)) - snr_limit_array(sf) - config.LINK_MARGIN_DB
+
+        # hysteresis: تصمیم جدید فقط برای لینک ناامن یا حاشیه بیشتر از DEVICE_HYSTERESIS_DB
+        act = (me_now < 0) | (me_now >= self.hysteresis_db)
+        if act.any():
+            dec = decide_tpc_batch(snr_mean[act], sf_start=sf[act], tp_start=tp[act])
+            moved = (dec.sf != sf[act]) | (dec.tp != tp[act])
+            changed = slots[act][moved]
+            self.changes[changed] += 1
+            sf[act], tp[act], me_now[act] = dec.sf, dec.tp, dec.me
+            self.sf[slots[act]] = dec.sf
+            self.tp[slots[act]] = dec.tp
+        return sf, tp, me_now
+
+    def _decide_scalar(self, slot: int, snr_mean: list, reset: list) -> tuple[list, ...]:
+        """حلقه اسکالر روی uplinkهای متوالی یک دستگاه (decide_tpc؛ همان نتیجه _decide_round)."""
+        sf, tp = int(self.sf[slot]), float(self.tp[slot])
+        changes = 0
+        out_sf, out_tp, out_me = [], [], []
+        for mean, rejoined in zip(snr_mean, reset):
+            if rejoined:
+                sf, tp = config.BASELINE_SF, float(config.BASELINE_TP)
+            me_now = (mean + (tp - config.BASELINE_TP)) - config.SNR_LIMIT_BY_SF[sf] - config.LINK_MARGIN_DB
+            if me_now < 0 or me_now >= self.hysteresis_db:
+                dec = decide_tpc(mean, sf_start=sf, tp_start=tp)
+                changes += dec.sf != sf or dec.tp != tp
+                sf, tp, me_now = dec.sf, dec.tp, dec.me
+            out_sf.append(sf)
+            out_tp.append(tp)
+            out_me.append(me_now)
+        self.sf[slot], self.tp[slot] = sf, tp
+        self.changes[slot] += changes
+        return out_sf, out_tp, out_me
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+    def process_log(self, device_ids, snr_pred, counters=None) -> TPCBatchDecision:
+        """
+        پردازش یک log مرتب‌شده بر اساس زمان (یا یک chunk از آن؛ وضعیت بین فراخوانی‌ها حفظ می‌شود).
+
+        ورودی‌ها:
+        - device_ids: شناسه دستگاه هر uplink
+        - snr_pred: SNR پیش‌بینی‌شده هر uplink
+        - counters: frame counter هر uplink (اختیاری؛ برای تشخیص rejoin)
+
+        خروجی:
+        - TPCBatchDecision (sf, tp, me) هر uplink به همان ترتیب ورودی، پس از اعمال تصمیم
+        """
+        snr = np.asarray(snr_pred, dtype=np.float64).ravel()
+        slots = self.slots(device_ids)
+        counters = None if counters is None else np.asarray(counters, dtype=np.int64).ravel()
+        n = len(snr)
+        if len(slots) != n or (counters is not None and len(counters) != n):
+            raise ValueError("device_ids, snr_pred and counters must have the same length")
+
+        out_sf = np.empty(n, dtype=np.int64)
+        out_tp = np.empty(n, dtype=np.float64)
+        out_me = np.empty(n, dtype=np.float64)
+        if n == 0:
+            return TPCBatchDecision(sf=out_sf, tp=out_tp, me=out_me)
+
+        # uplinkهای هر دستگاه پشت سر هم، با حفظ ترتیب زمانی
+        order = np.argsort(slots, kind="stable")
+        slots = slots[order]
+        first = np.r_[True, slots[1:] != slots[:-1]]
+        starts = np.flatnonzero(first)
+        ends = np.r_[starts[1:], n]
+        snr_mean, reset = self._windows(slots, snr[order], None if counters is None else counters[order], first)
+
+        sf = np.empty(n, dtype=np.int64)
+        tp = np.empty(n, dtype=np.float64)
+        me = np.empty(n, dtype=np.float64)
+        rounds = int((ends - starts).max())
+        if rounds * _ROUND_MIN_UPLINKS <= n:
+            # دستگاه‌های زیاد: دور r = همه uplinkهایی که r-امین uplink دستگاه خود هستند (یک decide_tpc_batch در هر دور)
+            rank = np.arange(n) - np.repeat(starts, ends - starts)
+            by_round = np.argsort(rank, kind="stable")
+            bounds = np.r_[0, np.cumsum(np.bincount(rank))]
+            for r in range(rounds):
+                idx = by_round[bounds[r]:bounds[r + 1]]
+                sf[idx], tp[idx], me[idx] = self._decide_round(slots[idx], snr_mean[idx], reset[idx])
+        else:
+            # چند دستگاه با تاریخچه طولانی: هزینه هر دور NumPy بر چند uplink سرشکن نمی‌شود => حلقه اسکالر
+            mean_list, reset_list = snr_mean.tolist(), reset.tolist()
+            for a, b in zip(starts.tolist(), ends.tolist()):
+                sf[a:b], tp[a:b], me[a:b] = self._decide_scalar(int(slots[a]), mean_list[a:b], reset_list[a:b])
+
+        out_sf[order], out_tp[order], out_me[order] = sf, tp, me
+        return TPCBatchDecision(sf=out_sf, tp=out_tp, me=out_me)
+
+    def update(self, device_id: str, snr_pred: float, counter: int | None = None) -> TPCDecision:
+        """
+        پردازش یک uplink (حالت online؛ مثلاً در serve). نتیجه برابر process_log روی همان ترتیب است.
+        """
+        dec = self.process_log([device_id], [snr_pred], None if counter is None else [counter])
+        return TPCDecision(sf=int(dec.sf[0]), tp=float(dec.tp[0]), me=float(dec.me[0]))
+
+    def state(self, device_id: str) -> dict:
+        """وضعیت فعلی یک دستگاه (برای گزارش/دیباگ)."""
+        slot = self.slot_of[device_id]
+        filled = int(min(self.count[slot], self.window))
+        return {
+            "sf": int(self.sf[slot]),
+            "tp": float(self.tp[slot]),
+            "uplinks": int(self.count[slot]),
+            "snr_mean": float(self.snr_window[slot].sum() / filled) if filled else float("nan"),
+            "changes": int(self.changes[slot]),
+            "last_counter": int(self.last_counter[slot]),
+        }
+
+
+def setting_changes(groups: list[np.ndarray], dec: TPCBatchDecision) -> int:
+    """تعداد دفعاتی که (SF, TP) یک دستگاه بین دو uplink متوالی‌اش تغییر کرده (groups: اندیس سطرهای هر دستگاه به ترتیب زمان)."""
+    return int(sum(np.count_nonzero((np.diff(dec.sf[g]) != 0) | (np.diff(dec.tp[g]) != 0)) for g in groups))
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stateful per-device TPC over the time-ordered uplink log")
+    parser.add_argument("--input", type=Path, default=None, help="input CSV (default: config.DATA_RAW)")
+    parser.add_argument("--window", type=int, default=config.DEVICE_SNR_WINDOW, help="uplinks in the per-device SNR window")
+    parser.add_argument(
+        "--hysteresis-db",
+        type=float,
+        default=config.DEVICE_HYSTERESIS_DB,
+        help="keep the current SF/TP while its margin is in [0, hysteresis)",
+    )
+    parser.add_argument("--out", type=Path, default=config.DEVICE_TPC_DECISIONS_CSV, help="output CSV")
+    parser.add_argument("--trace", action="store_true", help="record per-stage timings to config.TRACE_DIR (instrument.py)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    """نقطه شروع: خواندن آرگومان‌ها و اجرای run (با --trace داخل یک session ثبت مراحل)."""
+    args = parse_args(argv)
+    with session("device_controller", enabled=args.trace):
+        run(args)
+
+
+def run(args: argparse.Namespace):
+    """
+    مراحل:
+    1) خواندن دیتاست (همه ستون‌ها، شامل timestamp/device_id/counter) و مرتب‌سازی بر اساس زمان
+    2) پیش‌بینی SNR با مدل منتخب (همان پیش‌پردازنده run_pipeline)
+    3) اجرای DeviceTPCController روی log و محاسبه energy_norm
+    4) ذخیره CSV و چاپ مقایسه با تصمیم بدون حالت (decide_tpc_batch از baseline)
+    """
+    ensure_dirs()
+
+    # -------------------------------------------------------------------------
+    # 1) Load + sort by time (مرتب‌سازی پایدار؛ uplinkهای هم‌زمان ترتیب فایل را حفظ می‌کنند)
+    # -------------------------------------------------------------------------
+    with stage("load_dataset") as st:
+        df = load_dataset(prefer_processed=False, path=args.input)
+        df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+        st.rows = len(df)
+
+    # -------------------------------------------------------------------------
+    # 2) Predict SNR
+    # -------------------------------------------------------------------------
+    registry = default_registry()
+    with stage("load_model", model=config.SELECTED_TRAINED_MODEL):
+        model = registry.load(config.SELECTED_TRAINED_MODEL)
+        preprocessor = registry.preprocessor(config.SELECTED_TRAINED_MODEL)
+
+    target = detect_target_col(df)
+    X = df.drop(columns=[target] + [c for c in config.DROP_COLS if c in df.columns])
+    if uses_rolling_features(preprocessor):
+        with stage("rolling_features", rows=len(df)):
+            X = X.join(rolling_features(df, preprocessor.rolling_window))
+    with stage("predict", rows=len(X)):
+        Xn = X if preprocessor is None else preprocessor.transform_frame(X)
+        snr_pred = model.predict(Xn)
+
+    # -------------------------------------------------------------------------
+    # 3) Stateful TPC
+    # -------------------------------------------------------------------------
+    controller = DeviceTPCController(window=args.window, hysteresis_db=args.hysteresis_db)
+    counters = df["counter"].to_numpy() if "counter" in df.columns else None
+    with stage("process_log", rows=len(df)):
+        dec = controller.process_log(df["device_id"].astype(str).to_numpy(), snr_pred, counters)
+    energy = normalized_energy_batch(dec.tp, dec.sf, tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+
+    # -------------------------------------------------------------------------
+    # 4) Save + compare with the stateless decision
+    # -------------------------------------------------------------------------
+    out = pd.DataFrame({
+        "timestamp": df["timestamp"],
+        "device_id": df["device_id"],
+        "counter": df["counter"] if "counter" in df.columns else np.arange(len(df)),
+        "sf": dec.sf,
+        "tp": dec.tp,
+        "me": dec.me,
+        "energy_norm": energy,
+    })
+    with stage("save_decisions", rows=len(out)):
+        save_csv(out, args.out)
+
+    stateless = decide_tpc_batch(snr_pred)
+    groups = list(df.groupby("device_id", observed=True).indices.values())
+    stateless_energy = normalized_energy_batch(stateless.tp, stateless.sf, tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+
+    print(f"Devices: {len(controller)}, uplinks: {len(df)} (window={controller.window}, hysteresis={controller.hysteresis_db} dB)")
+    print(f"SF/TP changes between uplinks: stateful {setting_changes(groups, dec)} vs stateless {setting_changes(groups, stateless)}")
+    print(f"pct_me_ge_0: stateful {np.mean(dec.me >= 0) * 100:.2f} % vs stateless {np.mean(stateless.me >= 0) * 100:.2f} %")
+    print(f"energy_norm mean: stateful {energy.mean():.4f} vs stateless {stateless_energy.mean():.4f}")
+    print("Saved decisions:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+هدف این فایل:
+- نگاشت device_id => slot و آرایه‌های وضعیت فشرده هر دستگاه، مشترک بین وضعیت‌های per-device
+  (device_controller.DeviceTPCController و rolling_features.RollingFeatureState)
+
+ایده:
+- هر دستگاه یک شماره slot ثابت دارد؛ وضعیت همه دستگاه‌ها در آرایه‌های NumPy هم‌طول (طول = ظرفیت) است
+  تا به‌روزرسانی‌ها با fancy indexing روی slotها برداری باشند
+- آرایه‌ها با دو برابر شدن ظرفیت رشد می‌کنند => افزودن دستگاه O(1) سرشکن
+- کار Python در slots فقط به ازای device_idهای متمایز ورودی است (pd.factorize)، نه هر سطر
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+class DeviceSlots:
+    """
+    پایه وضعیت‌های per-device: registry دستگاه‌ها و رشد آرایه‌های وضعیت.
+
+    زیرکلاس‌ها آرایه‌های خود را با _state(name, fill, dtype, width) می‌سازند (یک attribute به همان نام)؛
+    هنگام رشد، خانه‌های جدید با همان fill (وضعیت اولیه یک دستگاه تازه) پر می‌شوند.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.slot_of: dict[str, int] = {}
+        self.device_ids: list[str] = []
+        self.capacity = max(1, int(capacity))
+        self._fills: dict[str, object] = {}
+
+    def __len__(self) -> int:
+        return len(self.device_ids)
+
+    def _state(self, name: str, fill, dtype, width: int | None = None) -> None:
+        """ساخت آرایه وضعیت name با شکل (ظرفیت,) یا (ظرفیت, width) و مقدار اولیه fill."""
+        shape = (self.capacity,) if width is None else (self.capacity, width)
+        setattr(self, name, np.full(shape, fill, dtype=dtype))
+        self._fills[name] = fill
+
+    def _grow(self, needed: int) -> None:
+        """دو برابر کردن ظرفیت همه آرایه‌های وضعیت تا حداقل needed slot."""
+        if needed <= self.capacity:
+            return
+        new_cap = max(needed, 2 * self.capacity)
+        for name, fill in self._fills.items():
+            arr = getattr(self, name)
+            out = np.full((new_cap,) + arr.shape[1:], fill, dtype=arr.dtype)
+            out[:self.capacity] = arr
+            setattr(self, name, out)
+        self.capacity = new_cap
+
+    def slots(self, device_ids) -> np.ndarray:
+        """شماره slot هر device_id (دستگاه‌های جدید با وضعیت اولیه اضافه می‌شوند)."""
+        codes, uniques = pd.factorize(np.asarray(device_ids, dtype=object))
+        slot_of_unique = np.empty(len(uniques), dtype=np.int64)
+        for i, dev in enumerate(uniques.tolist()):
+            slot = self.slot_of.get(dev)
+            if slot is None:
+                slot = len(self.device_ids)
+                self.slot_of[dev] = slot
+                self.device_ids.append(dev)
+            slot_of_unique[i] = slot
+        self._grow(len(self.device_ids))
+        return slot_of_unique[codes]
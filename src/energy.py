@@ -9,10 +9,28 @@
 منطق کلی Proxy:
 - توان ارسال بالاتر => مصرف انرژی بیشتر (تقریباً نمایی نسبت به dBm)
 - SF بالاتر => Time-on-Air بیشتر => مصرف انرژی بیشتر (تقریباً نمایی نسبت به SF)
+
+نسخه‌های آرایه‌ای (batch):
+- relative_energy و normalized_energy هم اسکالر و هم آرایه NumPy می‌پذیرند (broadcast مانند ufunc).
+- برای آرایه‌ها، انرژی نرمال‌شده همه ترکیب‌های (SF_MIN..SF_MAX, TP_MIN..TP_MAX) یک بار
+  در یک جدول (grid) محاسبه و کش می‌شود؛ نرمال‌سازی میلیون‌ها تصمیم فقط یک gather است.
+
+مدل دوم (فیزیکی، "toa"):
+- انرژی واقعی یک ارسال = ولتاژ × جریان فرستنده در TP انتخابی × Time-on-Air
+- Time-on-Air با فرمول استاندارد LoRa (SF, BW, CR, preamble, طول payload) محاسبه می‌شود.
+- Time-on-Air برای هر (SF, BW, CR, طول payload) یک بار در یک جدول حافظه‌سازی (memoize) می‌شود؛
+  ارزیابی انرژی روی لاگ‌های بزرگ فقط یک gather به ازای هر سطر است.
 """
 
 from __future__ import annotations
 
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from . import config
+
 
 def relative_energy(tp_dbm: float, sf: int) -> float:
     """
@@ -35,6 +53,8 @@ def relative_energy(tp_dbm: float, sf: int) -> float:
     - یک عدد مثبت که فقط «برای مقایسه» استفاده می‌شود (واحد فیزیکی واقعی ندارد).
       مقدار بزرگ‌تر یعنی انرژی نسبی بیشتر.
     """
+    if np.ndim(tp_dbm) or np.ndim(sf):
+        return relative_energy_batch(tp_dbm, sf)
     return (10 ** (tp_dbm / 10.0)) * (2 ** int(sf))
 
 
@@ -61,4 +81,285 @@ def normalized_energy(tp_dbm: float, sf: int, tp_ref: float = 14.0, sf_ref: int
     خروجی:
     - انرژی نرمال‌شده (یک عدد مثبت و قابل مقایسه)
     """
+    if np.ndim(tp_dbm) or np.ndim(sf):
+        return normalized_energy_batch(tp_dbm, sf, tp_ref=tp_ref, sf_ref=sf_ref)
     return relative_energy(tp_dbm, sf) / relative_energy(tp_ref, sf_ref)
+
+
+def relative_energy_batch(tp_dbm: np.ndarray, sf: np.ndarray) -> np.ndarray:
+    """
+    نسخه آرایه‌ای relative_energy (با broadcast بین tp_dbm و sf).
+
+    همان فرمول 10^(TP/10) * 2^SF است؛ SF مانند int() به عدد صحیح تبدیل (truncate) می‌شود.
+    """
+    tp = np.asarray(tp_dbm, dtype=np.float64)
+    sf_int = np.asarray(sf).astype(np.int64)
+    return np.power(10.0, tp / 10.0) * np.exp2(sf_int)
+
+
+@lru_cache(maxsize=16)
+def _energy_grid(
+    sf_min: int,
+    sf_max: int,
+    tp_min: int,
+    tp_max: int,
+    tp_ref: float,
+    sf_ref: int
+) -> np.ndarray:
+    """
+    ساخت جدول انرژی نرمال‌شده برای همه ترکیب‌های SF × TP (سطر = SF، ستون = TP).
+
+    هر خانه دقیقاً با normalized_energy اسکالر محاسبه می‌شود تا نتیجه gather
+    بیت‌به‌بیت با نسخه اسکالر برابر باشد. جدول فقط خواندنی است چون در کش نگه داشته می‌شود.
+    """
+    grid = np.array([
+        [normalized_energy(float(tp), sf, tp_ref=tp_ref, sf_ref=sf_ref) for tp in range(tp_min, tp_max + 1)]
+        for sf in range(sf_min, sf_max + 1)
+    ], dtype=np.float64)
+    grid.setflags(write=False)
+    return grid
+
+
+def energy_grid(tp_ref: float = 14.0, sf_ref: int = 12) -> np.ndarray:
+    """
+    جدول کش‌شده انرژی نرمال‌شده روی بازه config (SF_MIN..SF_MAX × TP_MIN..TP_MAX).
+
+    کلید کش شامل بازه‌های config است؛ اگر بازه‌ها تغییر کنند جدول جدید ساخته می‌شود.
+    خروجی: آرایه با شکل (تعداد SF, تعداد TP) که grid[sf - SF_MIN, tp - TP_MIN] است.
+    """
+    return _energy_grid(
+        int(config.SF_MIN),
+        int(config.SF_MAX),
+        int(config.TP_MIN),
+        int(config.TP_MAX),
+        float(tp_ref),
+        int(sf_ref),
+    )
+
+
+def normalized_energy_batch(
+    tp_dbm: np.ndarray,
+    sf: np.ndarray,
+    tp_ref: float = 14.0,
+    sf_ref: int = 12
+) -> np.ndarray:
+    """
+    نسخه آرایه‌ای normalized_energy (با broadcast بین tp_dbm و sf).
+
+    روش:
+    - برای تصمیم‌هایی که روی grid هستند (SF صحیح در بازه و TP با گام 1 dBm در بازه)
+      مقدار با یک gather از energy_grid خوانده می‌شود (مخرج baseline یک بار محاسبه شده است).
+    - بقیه نقاط (مثلاً TP غیرصحیح یا خارج از بازه) با فرمول برداری محاسبه می‌شوند.
+
+    خروجی:
+    - آرایه انرژی نرمال‌شده با شکل broadcast شده ورودی‌ها
+    """
+    tp, sf_arr = np.broadcast_arrays(np.asarray(tp_dbm, dtype=np.float64), np.asarray(sf))
+    sf_int = sf_arr.astype(np.int64)
+
+    grid = energy_grid(tp_ref=tp_ref, sf_ref=sf_ref)
+    sf_idx = sf_int - config.SF_MIN
+    tp_idx = tp - config.TP_MIN
+
+    on_grid = (
+        (sf_idx >= 0) & (sf_idx < grid.shape[0])
+        & (tp_idx >= 0) & (tp_idx < grid.shape[1])
+        & (tp_idx == np.floor(tp_idx))
+    )
+
+    out = np.empty(tp.shape, dtype=np.float64)
+    out[on_grid] = grid[sf_idx[on_grid], tp_idx[on_grid].astype(np.int64)]
+
+    off = ~on_grid
+    if off.any():
+        out[off] = relative_energy_batch(tp[off], sf_int[off]) / relative_energy(float(tp_ref), int(sf_ref))
+
+    return out
+
+
+# =============================================================================
+# مدل فیزیکی: LoRa Time-on-Air × توان فرستنده
+# =============================================================================
+
+# بیشترین طول payload فیزیکی LoRa (بایت)؛ جدول airtime برای 0..255 ساخته می‌شود
+MAX_PHY_PAYLOAD_BYTES = 255
+
+# علامت طول payload نامعتبر (length گمشده/منفی یا payload بیشتر از MAX_PHY_PAYLOAD_BYTES)
+INVALID_PAYLOAD = -1
+
+
+def lora_airtime(
+    sf: int,
+    payload_bytes: int,
+    bw_hz: int | None = None,
+    cr: int | None = None,
+    preamble: int | None = None,
+    explicit_header: bool | None = None,
+    crc: bool | None = None
+) -> float:
+    """
+    محاسبه Time-on-Air یک فریم LoRa (ثانیه) با فرمول استاندارد Semtech.
+
+    فرمول:
+        T_sym      = 2^SF / BW
+        T_preamble = (n_preamble + 4.25) * T_sym
+        n_payload  = 8 + max(ceil((8PL - 4SF + 28 + 16CRC - 20IH) / (4(SF - 2DE))) * (CR + 4), 0)
+        ToA        = T_preamble + n_payload * T_sym
+
+    که DE (Low Data Rate Optimize) وقتی T_sym > 16ms باشد فعال است (مثلاً SF11/SF12 در 125kHz).
+
+    پارامترهای None از config خوانده می‌شوند؛ نتیجه برای هر ترکیب (SF, BW, CR, PL, ...) کش می‌شود.
+    """
+    return _lora_airtime(
+        int(sf),
+        int(payload_bytes),
+        int(config.LORA_BW_HZ if bw_hz is None else bw_hz),
+        int(config.LORA_CODING_RATE if cr is None else cr),
+        int(config.LORA_PREAMBLE_SYMBOLS if preamble is None else preamble),
+        bool(config.LORA_EXPLICIT_HEADER if explicit_header is None else explicit_header),
+        bool(config.LORA_CRC if crc is None else crc),
+    )
+
+
+@lru_cache(maxsize=None)
+def _lora_airtime(
+    sf: int,
+    payload_bytes: int,
+    bw_hz: int,
+    cr: int,
+    preamble: int,
+    explicit_header: bool,
+    crc: bool
+) -> float:
+    """پیاده‌سازی کش‌شده lora_airtime (همه پارامترها صریح هستند تا کلید کش کامل باشد)."""
+    t_sym = (2 ** sf) / float(bw_hz)
+    de = 1 if t_sym > 0.016 else 0
+    ih = 0 if explicit_header else 1
+
+    num = 8 * payload_bytes - 4 * sf + 28 + 16 * int(crc) - 20 * ih
+    n_payload = 8 + max(math.ceil(num / (4 * (sf - 2 * de))) * (cr + 4), 0)
+
+    return (preamble + 4.25) * t_sym + n_payload * t_sym
+
+
+@lru_cache(maxsize=16)
+def _airtime_table(
+    sf_min: int,
+    sf_max: int,
+    bw_hz: int,
+    cr: int,
+    preamble: int,
+    explicit_header: bool,
+    crc: bool
+) -> np.ndarray:
+    """
+    جدول Time-on-Air برای همه SFها (سطر) و همه طول‌های payload 0..255 بایت (ستون).
+
+    هر خانه با نسخه اسکالر (_lora_airtime) ساخته می‌شود تا gather دقیقاً برابر نسخه اسکالر باشد.
+    """
+    table = np.array([
+        [_lora_airtime(sf, pl, bw_hz, cr, preamble, explicit_header, crc) for pl in range(MAX_PHY_PAYLOAD_BYTES + 1)]
+        for sf in range(sf_min, sf_max + 1)
+    ], dtype=np.float64)
+    table.setflags(write=False)
+    return table
+
+
+def airtime_table() -> np.ndarray:
+    """
+    جدول کش‌شده Time-on-Air برای تنظیمات فعلی config.
+
+    خروجی: آرایه با شکل (تعداد SF, 256) که table[sf - SF_MIN, payload_bytes] است.
+    """
+    return _airtime_table(
+        int(config.SF_MIN),
+        int(config.SF_MAX),
+        int(config.LORA_BW_HZ),
+        int(config.LORA_CODING_RATE),
+        int(config.LORA_PREAMBLE_SYMBOLS),
+        bool(config.LORA_EXPLICIT_HEADER),
+        bool(config.LORA_CRC),
+    )
+
+
+def lora_airtime_batch(sf: np.ndarray, payload_bytes: np.ndarray) -> np.ndarray:
+    """
+    نسخه آرایه‌ای lora_airtime (با broadcast بین sf و payload_bytes) با تنظیمات config.
+
+    مقادیر داخل جدول با یک gather خوانده می‌شوند؛ نقاط خارج از جدول (SF خارج از بازه config)
+    به صورت اسکالر و با همان کش lora_airtime محاسبه می‌شوند.
+    payload خارج از 0..MAX_PHY_PAYLOAD_BYTES (مثلاً INVALID_PAYLOAD) => NaN برای همان نقطه.
+    """
+    sf_arr, pl_arr = np.broadcast_arrays(np.asarray(sf).astype(np.int64), np.asarray(payload_bytes).astype(np.int64))
+
+    valid = (pl_arr >= 0) & (pl_arr <= MAX_PHY_PAYLOAD_BYTES)
+    table = airtime_table()
+    sf_idx = sf_arr - config.SF_MIN
+    on_table = valid & (sf_idx >= 0) & (sf_idx < table.shape[0])
+
+    out = np.full(sf_arr.shape, np.nan, dtype=np.float64)
+    out[on_table] = table[sf_idx[on_table], pl_arr[on_table]]
+
+    off = valid & ~on_table
+    if off.any():
+        out[off] = [lora_airtime(int(s), int(p)) for s, p in zip(sf_arr[off], pl_arr[off])]
+
+    return out
+
+
+def payload_bytes_from_length(length: np.ndarray) -> np.ndarray:
+    """
+    تبدیل ستون length دیتاست به طول payload فیزیکی (بایت) برای فرمول Time-on-Air.
+
+    - اگر config.PAYLOAD_LENGTH_IN_BITS باشد، length بر حسب بیت است و بر 8 تقسیم می‌شود.
+    - سربار فریم LoRaWAN (config.LORAWAN_OVERHEAD_BYTES) اضافه می‌شود.
+    - length گمشده (NaN/inf) یا منفی، یا payload بیشتر از MAX_PHY_PAYLOAD_BYTES => INVALID_PAYLOAD؛
+      airtime و انرژی Time-on-Air این سطرها NaN می‌شود (به جای cast بی‌معنی یا توقف کل batch)
+    """
+    length = np.asarray(length, dtype=np.float64)
+    app_bytes = np.ceil(length / 8.0) if config.PAYLOAD_LENGTH_IN_BITS else length
+    payload = app_bytes + int(config.LORAWAN_OVERHEAD_BYTES)
+    valid = np.isfinite(payload) & (length >= 0) & (payload <= MAX_PHY_PAYLOAD_BYTES)
+    return np.where(valid, payload, INVALID_PAYLOAD).astype(np.int64)
+
+
+def tx_current_ma(tp_dbm: np.ndarray) -> np.ndarray:
+    """
+    جریان مصرفی فرستنده (mA) برای TP داده‌شده از جدول config.TX_CURRENT_MA_BY_DBM.
+
+    برای TPهای صحیح داخل جدول مقدار دقیق جدول برمی‌گردد؛ برای TP کسری درون‌یابی خطی
+    و برای TP خارج از بازه، نزدیک‌ترین مقدار جدول استفاده می‌شود.
+    """
+    keys = np.array(sorted(config.TX_CURRENT_MA_BY_DBM), dtype=np.float64)
+    vals = np.array([config.TX_CURRENT_MA_BY_DBM[int(k)] for k in keys], dtype=np.float64)
+    return np.interp(np.asarray(tp_dbm, dtype=np.float64), keys, vals)
+
+
+def toa_energy(tp_dbm: np.ndarray, sf: np.ndarray, payload_bytes: np.ndarray) -> np.ndarray:
+    """
+    انرژی فیزیکی یک ارسال (ژول) بر اساس Time-on-Air:
+
+        E = V_supply * I_tx(TP) * ToA(SF, BW, CR, PL)
+
+    ورودی‌ها اسکالر یا آرایه هستند و با هم broadcast می‌شوند.
+    """
+    current_a = tx_current_ma(tp_dbm) / 1000.0
+    return config.SUPPLY_VOLTAGE_V * current_a * lora_airtime_batch(sf, payload_bytes)
+
+
+def normalized_toa_energy(
+    tp_dbm: np.ndarray,
+    sf: np.ndarray,
+    payload_bytes: np.ndarray,
+    tp_ref: float = 14.0,
+    sf_ref: int = 12
+) -> np.ndarray:
+    """
+    انرژی Time-on-Air نرمال‌شده نسبت به baseline با «همان طول payload».
+
+        energy_norm = toa_energy(tp, sf, PL) / toa_energy(tp_ref, sf_ref, PL)
+
+    تفسیر مانند normalized_energy است (کمتر از 1 یعنی بهتر از baseline)،
+    با این تفاوت که اثر واقعی SF روی Time-on-Air (برای هر طول payload) لحاظ می‌شود.
+    """
+    return toa_energy(tp_dbm, sf, payload_bytes) / toa_energy(tp_ref, sf_ref, payload_bytes)
@@ -0,0 +1,209 @@
+"""
+هدف این فایل:
+- ارزیابی مدل‌های train_baselines با repeated k-fold و ثبت «هزینه عملیاتی» هر مدل
+  در کنار دقت آن
+
+train_baselines فقط یک train_test_split و دو عدد (RMSE, R²) گزارش می‌کند؛ برای انتخاب
+config.SELECTED_TRAINED_MODEL باید هزینه اجرای مدل در سرویس هم دیده شود.
+
+برای هر مدل و هر fold ثبت می‌شود:
+- rmse, r2                      : دقت روی fold اعتبارسنجی
+- fit_wall_s, fit_cpu_s         : زمان آموزش
+- predict_rows_per_s            : throughput پیش‌بینی batch (روی THROUGHPUT_ROWS سطر)
+- single_row_latency_us         : میانه تأخیر پیش‌بینی یک سطر
+- peak_rss_mb, rss_delta_mb     : اوج حافظه پروسه (resource.getrusage) و افزایش آن در این fold
+- artifact_kb                   : اندازه مدل سریال‌شده با joblib
+
+اجرای موازی:
+- هر (مدل، fold) در یک پروسه fork‌شده جداگانه اجرا می‌شود (Pool با maxtasksperchild=1)
+  تا peak RSS هر fold مستقل اندازه‌گیری شود
+- داده یک بار در حافظه پروسه اصلی است و با fork (copy-on-write) به workerها می‌رسد؛ pickle نمی‌شود
+
+خروجی:
+- outputs/tables/model_costs.csv (config.MODEL_COSTS_CSV)
+
+اجرا:
+    python -m src.evaluate_models --folds 5 --repeats 3 --n-jobs 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing as mp
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import RepeatedKFold
+from threadpoolctl import threadpool_limits
+
+from . import config
+from .instrument import max_rss_mb
+from .io_utils import ensure_dirs, load_dataset, save_csv, split_xy
+from .preprocessing import FeaturePreprocessor
+from .train_baselines import build_models
+
+
+# تعداد سطر برای اندازه‌گیری throughput پیش‌بینی batch (fold اعتبارسنجی تکرار می‌شود)
+THROUGHPUT_ROWS = 10_000
+
+# تعداد تکرار پیش‌بینی تک‌سطری برای اندازه‌گیری تأخیر
+SINGLE_ROW_REPEATS = 50
+
+# داده مشترک بین workerها (قبل از fork مقداردهی می‌شود)
+_SHARED: dict = {}
+
+
+def evaluate_fold(name: str, repeat: int, fold: int, train_idx: np.ndarray, val_idx: np.ndarray) -> dict:
+    """
+    آموزش و اندازه‌گیری یک مدل روی یک fold (داده از _SHARED).
+
+    پیش‌پردازنده روی بخش آموزش همین fold fit می‌شود (مانند train_baselines).
+    """
+    rss_start = max_rss_mb()
+    X, y = _SHARED["X"], _SHARED["y"]
+    X_tr, X_va = X.iloc[train_idx], X.iloc[val_idx]
+    y_tr, y_va = y[train_idx], y[val_idx]
+
+    pre = FeaturePreprocessor.fit(X_tr)
+    X_tr, X_va = pre.transform_frame(X_tr), pre.transform_frame(X_va)
+
+    # یک thread برای هر fold (موازی‌سازی در سطح foldهاست)
+    model = build_models(rf_n_jobs=1)[name]
+    with threadpool_limits(limits=1):
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        model.fit(X_tr, y_tr)
+        fit_wall, fit_cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+        pred = model.predict(X_va)
+
+        # throughput: fold اعتبارسنجی تا THROUGHPUT_ROWS سطر تکرار می‌شود
+        X_big = X_va.iloc[np.resize(np.arange(len(X_va)), THROUGHPUT_ROWS)]
+        t0 = time.perf_counter()
+        model.predict(X_big)
+        rows_per_s = THROUGHPUT_ROWS / (time.perf_counter() - t0)
+
+        # تأخیر تک‌سطری (مسیر inference یک uplink)
+        row = X_va.iloc[:1]
+        single = np.empty(SINGLE_ROW_REPEATS)
+        for i in range(SINGLE_ROW_REPEATS):
+            t0 = time.perf_counter()
+            model.predict(row)
+            single[i] = time.perf_counter() - t0
+
+    buf = io.BytesIO()
+    joblib.dump(model, buf)
+    peak = max_rss_mb()
+
+    return {
+        "model": name,
+        "repeat": repeat,
+        "fold": fold,
+        "rmse": float(np.sqrt(mean_squared_error(y_va, pred))),
+        "r2": float(r2_score(y_va, pred)),
+        "fit_wall_s": fit_wall,
+        "fit_cpu_s": fit_cpu,
+        "predict_rows_per_s": rows_per_s,
+        "single_row_latency_us": float(np.median(single)) * 1e6,
+        "peak_rss_mb": peak,
+        "rss_delta_mb": peak - rss_start,
+        "artifact_kb": buf.getbuffer().nbytes / 1024.0,
+    }
+
+
+def _run_task(task: tuple) -> dict:
+    return evaluate_fold(*task)
+
+
+def evaluate(
+    X: pd.DataFrame,
+    y: np.ndarray,
+    models: list[str],
+    n_folds: int,
+    n_repeats: int,
+    n_jobs: int | None = None
+) -> pd.DataFrame:
+    """
+    اجرای repeated k-fold برای همه مدل‌ها.
+
+    - n_jobs=1: همه foldها در همین پروسه (peak RSS تجمعی است، نه مستقل برای هر fold)
+    - در غیر این صورت: Pool با context "fork" و maxtasksperchild=1
+    """
+    splitter = RepeatedKFold(n_splits=n_folds, n_repeats=n_repeats, random_state=config.RANDOM_STATE)
+    splits = list(splitter.split(X))
+    tasks = [
+        (name, k // n_folds, k % n_folds, tr, va)
+        for name in models
+        for k, (tr, va) in enumerate(splits)
+    ]
+
+    _SHARED.update(X=X, y=np.asarray(y, dtype=np.float64))
+    try:
+        if n_jobs == 1 or "fork" not in mp.get_all_start_methods():
+            rows = [_run_task(t) for t in tasks]
+        else:
+            ctx = mp.get_context("fork")
+            with ctx.Pool(processes=n_jobs or os.cpu_count(), maxtasksperchild=1) as pool:
+                rows = pool.map(_run_task, tasks, chunksize=1)
+    finally:
+        _SHARED.clear()
+
+    return pd.DataFrame(rows)
+
+
+def summarize(costs: pd.DataFrame) -> pd.DataFrame:
+    """خلاصه هر مدل روی همه foldها (میانگین/میانه/بیشینه بسته به ستون؛ مرتب بر اساس RMSE)."""
+    summary = costs.groupby("model").agg(
+        rmse_mean=("rmse", "mean"),
+        rmse_std=("rmse", "std"),
+        r2=("r2", "mean"),
+        fit_wall_s=("fit_wall_s", "mean"),
+        predict_rows_per_s=("predict_rows_per_s", "median"),
+        single_row_latency_us=("single_row_latency_us", "median"),
+        peak_rss_mb=("peak_rss_mb", "max"),
+        artifact_kb=("artifact_kb", "mean"),
+    )
+    return summary.sort_values("rmse_mean")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Repeated k-fold accuracy and serving-cost evaluation of the baseline models")
+    parser.add_argument("--models", nargs="+", default=list(build_models()), help="model names from train_baselines.build_models")
+    parser.add_argument("--folds", type=int, default=config.EVAL_CV_FOLDS)
+    parser.add_argument("--repeats", type=int, default=config.EVAL_CV_REPEATS)
+    parser.add_argument("--n-jobs", type=int, default=None, help="parallel worker processes (default: all cores; 1 = in-process)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    """
+    مراحل:
+    1) بارگذاری دیتاست و جداسازی X/y (مانند train_baselines)
+    2) repeated k-fold موازی برای همه مدل‌ها
+    3) ذخیره نتایج هر fold در config.MODEL_COSTS_CSV و چاپ خلاصه هر مدل
+    """
+    args = parse_args(argv)
+    ensure_dirs()
+
+    df = load_dataset(prefer_processed=False, drop_unused=True)
+    X, y, _ = split_xy(df)
+
+    t0 = time.perf_counter()
+    costs = evaluate(X, y.to_numpy(), args.models, args.folds, args.repeats, n_jobs=args.n_jobs)
+    wall = time.perf_counter() - t0
+
+    save_csv(costs, config.MODEL_COSTS_CSV)
+
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(summarize(costs))
+    print(f"Evaluated {len(costs)} model-folds in {wall:.1f} s")
+    print("Saved model costs:", config.MODEL_COSTS_CSV)
+
+
+if __name__ == "__main__":
+    # اجرای مستقیم فایل: python -m src.evaluate_models
+    main()
@@ -0,0 +1,260 @@
+"""
+هدف این فایل:
+- صادر کردن (export) مدل‌های آموزش‌داده‌شده برای پیش‌بینی بدون sklearn (numpy_predictor.py و flat_forest.py)
+
+مدل‌های قابل صدور:
+- خطی: Ridge (و LinearRegression / Lasso / ElasticNet با یک خروجی)       => .npz، kind = "linear"
+- SVR با kernel RBF                                                       => .npz، kind = "svr_rbf"
+  (هر دو می‌توانند داخل Pipeline با یک StandardScaler قبل از مدل باشند، مانند svr.joblib)
+- RandomForestRegressor / ExtraTreesRegressor                             => .forest.bin (FlatForest)
+
+خروجی:
+- models_trained/<name>.npz یا <name>.forest.bin کنار <name>.joblib
+- میانه‌ها و ترتیب ستون‌های FeaturePreprocessor هم در فایل ذخیره می‌شوند (predict_record روی gateway)
+- مدل‌های دیگر (مثلاً RLS) با ValueError رد می‌شوند؛ در اجرای CLI فقط گزارش و رد می‌شوند
+
+بررسی دقت (parity):
+- بعد از هر صدور، فایل با NumpyPredictor (یا FlatForest) دوباره بارگذاری و روی کل دیتاست (batch) و چند سطر تکی
+  (predict_one و predict_record) با model.predict مقایسه می‌شود؛ اختلاف بیش از PARITY_ATOL => ValueError
+
+استفاده:
+    python -m src.export_numpy                       # همه مدل‌های قابل صدور models_trained/
+    python -m src.export_numpy ridge.joblib svr.joblib rf.joblib
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.linear_model import ElasticNet, Lasso, LinearRegression, Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from .flat_forest import FOREST_SUFFIX, FlatForest, source_fingerprint
+from .io_utils import detect_target_col, load_dataset, safe_numeric_X
+from .model_registry import ModelRegistry, default_registry, file_sha256
+from .numpy_predictor import FORMAT_VERSION, NPZ_SUFFIX, NumpyPredictor
+from .preprocessing import FeaturePreprocessor
+from .rolling_features import SOURCE_COLS, rolling_features, uses_rolling_features
+
+
+LINEAR_MODELS = (Ridge, LinearRegression, Lasso, ElasticNet)
+FOREST_MODELS = (RandomForestRegressor, ExtraTreesRegressor)
+
+# حداکثر اختلاف مجاز پیش‌بینی NumPy با sklearn (dB)؛ اختلاف واقعی در حد خطای گرد کردن (~1e-13) است
+PARITY_ATOL = 1e-9
+
+# تعداد سطرهایی که مسیرهای تک‌سطری (predict_one / predict_record) روی آن‌ها بررسی می‌شوند
+PARITY_SINGLE_ROWS = 25
+
+
+def npz_path(model_path: Path) -> Path:
+    """مسیر فایل صادرشده مربوط به یک فایل مدل (ridge.joblib => ridge.npz)."""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + NPZ_SUFFIX)
+
+
+def forest_path(model_path: Path) -> Path:
+    """مسیر جنگل تخت مربوط به یک فایل مدل (rf.joblib => rf.forest.bin)."""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + FOREST_SUFFIX)
+
+
+# -----------------------------------------------------------------------------
+# estimator => آرایه‌ها
+# -----------------------------------------------------------------------------
+def _split_pipeline(model) -> tuple[StandardScaler | None, object]:
+    """(scaler یا None، estimator نهایی)؛ Pipeline فقط با یک StandardScaler قبل از مدل پذیرفته می‌شود."""
+    if not isinstance(model, Pipeline):
+        return None, model
+    steps = [step for _, step in model.steps if step is not None and step != "passthrough"]
+    *transforms, estimator = steps
+    if len(transforms) > 1 or (transforms and not isinstance(transforms[0], StandardScaler)):
+        names = [type(step).__name__ for step in transforms]
+        raise ValueError(f"Only a single StandardScaler before the model can be exported, got {names}")
+    return (transforms[0] if transforms else None), estimator
+
+
+def model_arrays(model, preprocessor: FeaturePreprocessor | None = None) -> dict[str, np.ndarray]:
+    """آرایه‌های فایل .npz برای یک مدل fit‌شده (کلیدها مطابق numpy_predictor.NumpyPredictor)."""
+    scaler, estimator = _split_pipeline(model)
+
+    if preprocessor is not None:
+        names = list(preprocessor.feature_names)
+    elif getattr(model, "feature_names_in_", None) is not None:
+        names = [str(c) for c in model.feature_names_in_]
+    else:
+        raise ValueError("Feature names are unknown: the model has no preprocessor and no feature_names_in_")
+    n = len(names)
+
+    arrays = {
+        "format_version": np.array(FORMAT_VERSION),
+        "feature_names": np.array(names, dtype=str),
+    }
+    if preprocessor is not None:
+        arrays["medians"] = np.asarray(preprocessor.medians, dtype=np.float64)
+    if scaler is not None:
+        # with_mean/with_std=False => mean_/scale_ = None؛ صفر و یک همان نتیجه را دقیقاً می‌دهند
+        arrays["scaler_mean"] = np.zeros(n) if scaler.mean_ is None else np.asarray(scaler.mean_, dtype=np.float64)
+        arrays["scaler_scale"] = np.ones(n) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+
+    if isinstance(estimator, LINEAR_MODELS):
+        coef = np.asarray(estimator.coef_, dtype=np.float64)
+        if coef.ndim != 1:
+            raise ValueError(f"Only single-output linear models can be exported, coef_ has shape {coef.shape}")
+        arrays.update(kind=np.array("linear"), coef=coef, intercept=np.array(float(estimator.intercept_)))
+    elif isinstance(estimator, SVR):
+        if estimator.kernel != "rbf":
+            raise ValueError(f"Only the RBF kernel can be exported, got kernel={estimator.kernel!r}")
+        arrays.update(
+            kind=np.array("svr_rbf"),
+            support_vectors=np.asarray(estimator.support_vectors_, dtype=np.float64),
+            dual_coef=np.asarray(estimator.dual_coef_, dtype=np.float64).ravel(),
+            # gamma="scale"/"auto" هنگام fit به عدد تبدیل و در _gamma ذخیره می‌شود
+            gamma=np.array(float(estimator._gamma)),
+            intercept=np.array(float(estimator.intercept_[0])),
+        )
+    else:
+        raise ValueError(
+            f"{type(estimator).__name__} cannot be exported to .npz (supported: {[c.__name__ for c in LINEAR_MODELS]}, SVR; "
+            "forests: export_forest)"
+        )
+
+    width = len(arrays["coef"]) if "coef" in arrays else arrays["support_vectors"].shape[1]
+    if width != n:
+        raise ValueError(f"The model does not match the {n} features of its preprocessor")
+    return arrays
+
+
+def export_model(model, path: Path, preprocessor: FeaturePreprocessor | None = None, source: Path | None = None) -> Path:
+    """
+    نوشتن فایل .npz (بدون فشرده‌سازی؛ بارگذاری سریع‌تر).
+
+    source: فایل مدل اصلی؛ نام و sha256 آن برای ردیابی در فایل ذخیره می‌شود
+    """
+    arrays = model_arrays(model, preprocessor)
+    if source is not None:
+        arrays["source"] = np.array(Path(source).name)
+        arrays["source_sha256"] = np.array(file_sha256(source))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # فایل موقت و جایگزینی اتمی (مانند ModelRegistry.register)؛ np.savez با file object پسوند اضافه نمی‌کند
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    tmp.replace(path)
+    return path
+
+
+def export_forest(model, path: Path, preprocessor: FeaturePreprocessor | None = None, source: Path | None = None) -> Path:
+    """
+    نوشتن جنگل تخت (FlatForest، قابل memory-map).
+
+    source: فایل مدل اصلی؛ 8 بایت اول sha256 آن در header ذخیره می‌شود (تشخیص فایل کهنه در serve)
+    """
+    if not isinstance(model, FOREST_MODELS):
+        raise ValueError(f"{type(model).__name__} is not a regression forest (supported: {[c.__name__ for c in FOREST_MODELS]})")
+    forest = FlatForest.from_sklearn(
+        model,
+        feature_names=None if preprocessor is None else list(preprocessor.feature_names),
+        medians=None if preprocessor is None else preprocessor.medians,
+        source=b"" if source is None else source_fingerprint(file_sha256(source)),
+    )
+    forest.save(path)
+    return Path(path)
+
+
+# -----------------------------------------------------------------------------
+# parity با sklearn
+# -----------------------------------------------------------------------------
+def parity_frame(preprocessor: FeaturePreprocessor | None, path: Path | None = None) -> pd.DataFrame:
+    """ویژگی‌های دیتاست (همان مسیر run_pipeline، شامل rolling_features در صورت نیاز) بدون ستون هدف."""
+    df = load_dataset(prefer_processed=False, path=path)
+    X = df.drop(columns=[detect_target_col(df)])
+    if uses_rolling_features(preprocessor):
+        X = X.join(rolling_features(df[list(SOURCE_COLS)], preprocessor.rolling_window))
+    return X
+
+
+def check_parity(model, predictor: NumpyPredictor | FlatForest, X: pd.DataFrame, preprocessor: FeaturePreprocessor | None) -> dict:
+    """
+    بیشترین اختلاف مطلق predictor با model.predict: batch روی همه سطرها، predict_one و predict_record
+    روی PARITY_SINGLE_ROWS سطر با فاصله یکسان (predict_record فقط اگر میانه‌ها در فایل باشند).
+    """
+    if preprocessor is None:
+        X_model = safe_numeric_X(X)[predictor.feature_names]
+    else:
+        X_model = preprocessor.transform_frame(X)
+    expected = np.asarray(model.predict(X_model), dtype=np.float64)
+    values = X_model.to_numpy(dtype=np.float64)
+
+    result = {"rows": len(values), "batch": float(np.max(np.abs(predictor.predict(values) - expected)))}
+    rows = np.unique(np.linspace(0, len(values) - 1, min(PARITY_SINGLE_ROWS, len(values))).astype(int))
+    result["one"] = max(abs(predictor.predict_one(values[i]) - expected[i]) for i in rows)
+    if predictor.medians is not None:
+        records = X.iloc[rows].to_dict("records")
+        result["record"] = max(abs(predictor.predict_record(r) - expected[i]) for r, i in zip(records, rows))
+    return result
+
+
+def export_artifact(registry: ModelRegistry, name: str, X: pd.DataFrame | None = None) -> dict:
+    """
+    صدور یک مدل registry به <stem>.npz (یا <stem>.forest.bin برای جنگل‌ها) و بررسی parity.
+
+    X: ویژگی‌های parity (پیش‌فرض: parity_frame روی دیتاست خام)
+    خروجی: {"model", "file", "size_kb", "kind", "rows", "batch", "one", "record"}
+    """
+    model = registry.load(name)
+    preprocessor = registry.preprocessor(name)
+    model_path = registry.path(name)
+    if isinstance(model, FOREST_MODELS):
+        path = export_forest(model, forest_path(model_path), preprocessor, source=model_path)
+        predictor, kind = FlatForest.load(path), "forest"
+    else:
+        path = export_model(model, npz_path(model_path), preprocessor, source=model_path)
+        predictor = NumpyPredictor.load(path)
+        kind = predictor.kind
+    parity = check_parity(model, predictor, parity_frame(preprocessor) if X is None else X, preprocessor)
+    worst = max(v for k, v in parity.items() if k != "rows")
+    if not worst <= PARITY_ATOL:
+        raise ValueError(f"{path.name}: NumPy predictions differ from {name} by {worst:.3g} (> {PARITY_ATOL:g})")
+    return {"model": name, "file": path.name, "size_kb": path.stat().st_size / 1024.0, "kind": kind, **parity}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export trained models to NumPy-only inference files (.npz / .forest.bin)")
+    parser.add_argument("models", nargs="*", help="model files in models_trained/ (default: every exportable model)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    registry = default_registry()
+    names = args.models or [
+        p.name for p in sorted(registry.root.glob("*.joblib")) if not p.name.endswith(".preprocessor.joblib")
+    ]
+
+    rows = []
+    for name in names:
+        try:
+            rows.append(export_artifact(registry, name))
+        except ValueError as e:
+            # در حالت پیش‌فرض (همه مدل‌ها) مدل غیرقابل صدور فقط گزارش می‌شود
+            if args.models:
+                raise
+            print(f"Skipped {name}: {e}")
+
+    if rows:
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+        print("Saved NumPy exports to:", registry.root)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,363 @@
+"""
+هدف این فایل:
+- ساخت نمودارهای گزارش run_pipeline (مرحله 9) به صورتی که برای میلیون‌ها سطر هم سریع باشد
+
+نمودارها (همان نام‌های قبلی در outputs/figures):
+- snr_true_vs_pred.png : چگالی دوبعدی SNR واقعی × پیش‌بینی‌شده (به جای scatter همه نقاط)
+- sf_distribution.png  : تعداد هر SF انتخابی
+- tp_distribution.png  : تعداد هر TP انتخابی
+- me_distribution.png  : histogram margin
+- energy_norm_hist.png : histogram انرژی نرمال‌شده
+
+ایده‌ها:
+1) تجمیع قبل از رسم:
+   داده خام هرگز به matplotlib داده نمی‌شود؛ FigureAggregates شمارش‌های NumPy (bincount روی
+   binهای با عرض ثابت) را نگه می‌دارد. add() را می‌توان chunk به chunk صدا زد (حالت --stream)
+   و حافظه فقط به تعداد binها بستگی دارد، نه به تعداد سطرها.
+2) رسم موازی:
+   هر نمودار در یک پروسه جداگانه (ProcessPoolExecutor) با backend «Agg» رسم می‌شود؛
+   ورودی هر پروسه فقط آرایه‌های کوچک شمارش است.
+3) رد کردن نمودارهای بدون تغییر:
+   برای هر نمودار یک hash از داده تجمیع‌شده (و تنظیمات رسم) در
+   <fig_dir>/.figures_manifest.json ذخیره می‌شود؛ اگر hash تغییر نکرده و PNG موجود باشد
+   آن نمودار دوباره رسم نمی‌شود.
+
+تفاوت با نسخه قبلی:
+- histogramهای me و energy_norm از binهای ریز (config.FIG_ME_BIN_DB و config.FIG_ENERGY_BIN)
+  به حدود config.FIG_HIST_BINS ستون ادغام می‌شوند؛ مرز ستون‌ها حداکثر یک bin ریز با np.hist روی
+  داده خام فرق دارد
+- بازه هر histogram به config.FIG_SNR_RANGE_DB / FIG_ME_RANGE_DB / FIG_ENERGY_RANGE محدود است (مقادیر
+  بیرون از بازه در bin لبه شمرده می‌شوند)، پس حافظه شمارش‌ها با مقادیر پرت بی‌حد رشد نمی‌کند
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from . import config
+from .instrument import stage
+
+
+MANIFEST_NAME = ".figures_manifest.json"
+
+# با هر تغییر در ظاهر نمودارها افزایش یابد تا PNGهای قدیمی دوباره رسم شوند
+FIGURES_VERSION = 1
+
+
+# =============================================================================
+# 1) histogramهای قابل تجمیع (chunk به chunk)
+# =============================================================================
+def _bin_index(values: np.ndarray, width: float, origin: float) -> np.ndarray:
+    return np.floor((values - origin) / width).astype(np.int64)
+
+
+@dataclass
+class Histogram1D:
+    """
+    histogram با عرض bin ثابت و بازه پویا.
+
+    bin i بازه [origin + i·width, origin + (i+1)·width) است؛ counts از bin شماره lo شروع می‌شود
+    و با رسیدن مقادیر جدید خارج از بازه فعلی بزرگ می‌شود. مقادیر NaN/inf نادیده گرفته می‌شوند.
+    bounds=(min, max): مقادیر پیش از bin شدن به این بازه clip می‌شوند، پس تعداد binها محدود می‌ماند.
+    """
+
+    width: float
+    origin: float = 0.0
+    lo: int = 0
+    counts: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    bounds: tuple[float, float] | None = None
+
+    def add(self, values: np.ndarray) -> None:
+        v = np.asarray(values, dtype=np.float64).ravel()
+        v = v[np.isfinite(v)]
+        if len(v) == 0:
+            return
+        if self.bounds is not None:
+            v = np.clip(v, *self.bounds)
+        idx = _bin_index(v, self.width, self.origin)
+        lo = int(idx.min())
+        self._merge(lo, np.bincount(idx - lo))
+
+    def _merge(self, lo: int, counts: np.ndarray) -> None:
+        if len(self.counts) == 0:
+            self.lo, self.counts = lo, counts.astype(np.int64)
+            return
+        new_lo = min(self.lo, lo)
+        new_hi = max(self.lo + len(self.counts), lo + len(counts))
+        out = np.zeros(new_hi - new_lo, dtype=np.int64)
+        out[self.lo - new_lo:self.lo - new_lo + len(self.counts)] += self.counts
+        out[lo - new_lo:lo - new_lo + len(counts)] += counts
+        self.lo, self.counts = new_lo, out
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def edges(self) -> np.ndarray:
+        return self.origin + self.width * np.arange(self.lo, self.lo + len(self.counts) + 1)
+
+    def trimmed(self) -> tuple[np.ndarray, np.ndarray]:
+        """(edges, counts) بدون binهای خالی ابتدا و انتها."""
+        nz = np.flatnonzero(self.counts)
+        if len(nz) == 0:
+            return np.array([self.origin, self.origin + self.width]), np.zeros(1, dtype=np.int64)
+        a, b = nz[0], nz[-1] + 1
+        return self.edges()[a:b + 1], self.counts[a:b]
+
+    def rebinned(self, n_bins: int) -> tuple[np.ndarray, np.ndarray]:
+        """ادغام binهای ریز (بدون binهای خالی دو طرف) به حداکثر n_bins ستون هم‌عرض."""
+        edges, counts = self.trimmed()
+        k = max(1, -(-len(counts) // n_bins))
+        pad = (-len(counts)) % k
+        counts = np.concatenate([counts, np.zeros(pad, dtype=np.int64)]).reshape(-1, k).sum(axis=1)
+        step = edges[1] - edges[0]
+        return edges[0] + step * k * np.arange(len(counts) + 1), counts
+
+
+@dataclass
+class Histogram2D:
+    """
+    histogram دوبعدی با عرض bin ثابت در هر محور و بازه پویا (مانند Histogram1D).
+
+    bounds=(min, max) برای هر دو محور: بدون آن چند مقدار پرت آرایه شمارش را در هر دو بعد بزرگ می‌کنند.
+    """
+
+    width: float
+    origin: float = 0.0
+    lo: tuple[int, int] = (0, 0)
+    counts: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.int64))
+    bounds: tuple[float, float] | None = None
+
+    def add(self, x: np.ndarray, y: np.ndarray) -> None:
+        x = np.asarray(x, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        ok = np.isfinite(x) & np.isfinite(y)
+        if not ok.any():
+            return
+        x, y = x[ok], y[ok]
+        if self.bounds is not None:
+            x, y = np.clip(x, *self.bounds), np.clip(y, *self.bounds)
+        ix = _bin_index(x, self.width, self.origin)
+        iy = _bin_index(y, self.width, self.origin)
+        lx, ly = int(ix.min()), int(iy.min())
+        shape = (int(ix.max()) - lx + 1, int(iy.max()) - ly + 1)
+        flat = np.bincount((ix - lx) * shape[1] + (iy - ly), minlength=shape[0] * shape[1])
+        self._merge((lx, ly), flat.reshape(shape))
+
+    def _merge(self, lo: tuple[int, int], counts: np.ndarray) -> None:
+        if self.counts.size == 0:
+            self.lo, self.counts = lo, counts.astype(np.int64)
+            return
+        new_lo = (min(self.lo[0], lo[0]), min(self.lo[1], lo[1]))
+        new_hi = (
+            max(self.lo[0] + self.counts.shape[0], lo[0] + counts.shape[0]),
+            max(self.lo[1] + self.counts.shape[1], lo[1] + counts.shape[1]),
+        )
+        out = np.zeros((new_hi[0] - new_lo[0], new_hi[1] - new_lo[1]), dtype=np.int64)
+        for start, c in ((self.lo, self.counts), (lo, counts)):
+            ox, oy = start[0] - new_lo[0], start[1] - new_lo[1]
+            out[ox:ox + c.shape[0], oy:oy + c.shape[1]] += c
+        self.lo, self.counts = new_lo, out
+
+    def edges(self) -> tuple[np.ndarray, np.ndarray]:
+        ex = self.origin + self.width * np.arange(self.lo[0], self.lo[0] + self.counts.shape[0] + 1)
+        ey = self.origin + self.width * np.arange(self.lo[1], self.lo[1] + self.counts.shape[1] + 1)
+        return ex, ey
+
+
+@dataclass
+class FigureAggregates:
+    """
+    همه داده لازم برای نمودارهای مرحله 9، به صورت شمارش.
+
+    add() برای کل داده (حالت عادی) یا برای هر chunk (حالت --stream) صدا زده می‌شود؛
+    نتیجه در هر دو حالت یکسان است.
+    """
+
+    snr: Histogram2D = field(default_factory=lambda: Histogram2D(config.FIG_SNR_BIN_DB, bounds=config.FIG_SNR_RANGE_DB))
+    sf: Histogram1D = field(default_factory=lambda: Histogram1D(1.0, origin=-0.5))
+    tp: Histogram1D = field(default_factory=lambda: Histogram1D(1.0, origin=-0.5))
+    me: Histogram1D = field(default_factory=lambda: Histogram1D(config.FIG_ME_BIN_DB, bounds=config.FIG_ME_RANGE_DB))
+    energy: Histogram1D = field(default_factory=lambda: Histogram1D(config.FIG_ENERGY_BIN, bounds=config.FIG_ENERGY_RANGE))
+    rows: int = 0
+
+    def add(self, snr_true: np.ndarray, snr_pred: np.ndarray, decisions: dict) -> None:
+        """
+        افزودن یک batch.
+
+        - decisions: ستون‌های خروجی run_pipeline.tpc_decisions (sf_new, tp_new, me, energy_norm)
+        """
+        self.snr.add(snr_true, snr_pred)
+        self.sf.add(decisions["sf_new"])
+        self.tp.add(decisions["tp_new"])
+        self.me.add(decisions["me"])
+        self.energy.add(decisions["energy_norm"])
+        self.rows += len(snr_pred)
+
+    def payloads(self) -> dict[str, dict]:
+        """
+        ورودی تابع رسم هر نمودار (فقط آرایه‌های کوچک؛ قابل pickle برای پروسه‌های رسم).
+        """
+        xe, ye = self.snr.edges()
+        sf_edges, sf_counts = self.sf.trimmed()
+        tp_edges, tp_counts = self.tp.trimmed()
+        me_edges, me_counts = self.me.rebinned(config.FIG_HIST_BINS)
+        en_edges, en_counts = self.energy.rebinned(config.FIG_HIST_BINS)
+        return {
+            "snr_true_vs_pred": {"counts": self.snr.counts, "xedges": xe, "yedges": ye},
+            "sf_distribution": {"values": (sf_edges[:-1] + 0.5).astype(np.int64), "counts": sf_counts},
+            "tp_distribution": {"edges": tp_edges, "counts": tp_counts},
+            "me_distribution": {"edges": me_edges, "counts": me_counts},
+            "energy_norm_hist": {"edges": en_edges, "counts": en_counts},
+        }
+
+
+# =============================================================================
+# 2) رسم (هر تابع در یک پروسه جداگانه یا در همین پروسه اجرا می‌شود)
+# =============================================================================
+def _pyplot():
+    """matplotlib با backend غیرتعاملی Agg (بدون نیاز به display؛ امن در پروسه‌های worker)."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _plot_snr_true_vs_pred(plt, p: dict) -> None:
+    from matplotlib.colors import LogNorm
+
+    counts = np.ma.masked_equal(p["counts"], 0)
+    mesh = plt.pcolormesh(p["xedges"], p["yedges"], counts.T, norm=LogNorm(vmin=1), cmap="viridis")
+    plt.colorbar(mesh, label="Count")
+    lo = max(p["xedges"][0], p["yedges"][0])
+    hi = min(p["xedges"][-1], p["yedges"][-1])
+    plt.plot([lo, hi], [lo, hi], color="red", linewidth=0.8, label="y = x")
+    plt.legend(loc="upper left")
+    plt.xlabel("SNR true (dB)")
+    plt.ylabel("SNR predicted (dB)")
+    plt.title("SNR: True vs Predicted")
+
+
+def _plot_sf_distribution(plt, p: dict) -> None:
+    plt.bar([str(v) for v in p["values"]], p["counts"])
+    plt.xlabel("SF chosen")
+    plt.ylabel("Count")
+    plt.title("TPC Output: SF Distribution")
+
+
+def _plot_hist(plt, p: dict, xlabel: str, title: str) -> None:
+    edges = p["edges"]
+    plt.bar(edges[:-1], p["counts"], width=np.diff(edges), align="edge", edgecolor="none")
+    plt.xlabel(xlabel)
+    plt.ylabel("Count")
+    plt.title(title)
+
+
+_PLOTTERS = {
+    "snr_true_vs_pred": _plot_snr_true_vs_pred,
+    "sf_distribution": _plot_sf_distribution,
+    "tp_distribution": lambda plt, p: _plot_hist(plt, p, "TP chosen (dBm)", "TPC Output: TP Distribution"),
+    "me_distribution": lambda plt, p: _plot_hist(plt, p, "Margin Me (dB)", "Margin Distribution after TPC"),
+    "energy_norm_hist": lambda plt, p: _plot_hist(
+        plt, p, "Normalized energy (vs baseline SF=12, TP=14)", "Energy Reduction Proxy"
+    ),
+}
+
+# نام نمودارها (فایل <name>.png در پوشه نمودارها)
+FIGURE_NAMES = tuple(_PLOTTERS)
+
+
+def render_one(name: str, payload: dict, path: Path, dpi: int = config.FIG_DPI) -> str:
+    """رسم و ذخیره یک نمودار؛ خروجی: name (برای جمع‌آوری نتایج پروسه‌ها)."""
+    plt = _pyplot()
+    plt.figure()
+    try:
+        _PLOTTERS[name](plt, payload)
+        plt.savefig(path, dpi=dpi, bbox_inches="tight")
+    finally:
+        plt.close()
+    return name
+
+
+# =============================================================================
+# 3) hash داده و manifest
+# =============================================================================
+def payload_digest(name: str, payload: dict, dpi: int) -> str:
+    """hash محتوای یک نمودار: نسخه کد رسم، dpi و آرایه‌های ورودی (نه مسیر یا زمان)."""
+    h = hashlib.sha256(f"{FIGURES_VERSION}:{name}:{dpi}".encode())
+    for key in sorted(payload):
+        arr = np.ascontiguousarray(payload[key])
+        h.update(f"{key}:{arr.dtype.str}:{arr.shape}".encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def _read_manifest(fig_dir: Path) -> dict:
+    try:
+        with open(fig_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(fig_dir: Path, manifest: dict) -> None:
+    with open(fig_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def render_figures(
+    aggregates: FigureAggregates,
+    fig_dir: Path,
+    workers: int | None = config.FIG_WORKERS,
+    force: bool = False,
+    dpi: int = config.FIG_DPI
+) -> dict[str, str]:
+    """
+    رسم همه نمودارها از داده تجمیع‌شده.
+
+    - نمودارهایی که hash آن‌ها با manifest برابر است و PNG آن‌ها موجود است رد می‌شوند (مگر force)
+    - بقیه در workers پروسه موازی رسم می‌شوند (workers=1 یا فقط یک نمودار: در همین پروسه)
+
+    خروجی:
+    - {نام نمودار: "rendered" یا "unchanged"}
+    """
+    fig_dir = Path(fig_dir)
+    fig_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(fig_dir)
+
+    payloads = aggregates.payloads()
+    digests = {name: payload_digest(name, p, dpi) for name, p in payloads.items()}
+    todo = [
+        name for name in FIGURE_NAMES
+        if force or manifest.get(name) != digests[name] or not (fig_dir / f"{name}.png").exists()
+    ]
+
+    n_workers = min(len(todo), workers or os.cpu_count() or 1)
+    with stage("figures.render", rows=aggregates.rows, figures=len(todo), workers=n_workers):
+        if n_workers <= 1:
+            for name in todo:
+                with stage(f"figure.{name}"):
+                    render_one(name, payloads[name], fig_dir / f"{name}.png", dpi)
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = [
+                    pool.submit(render_one, name, payloads[name], fig_dir / f"{name}.png", dpi)
+                    for name in todo
+                ]
+                for fut in futures:
+                    fut.result()
+
+    # manifest فقط پس از رسم موفق به‌روز می‌شود
+    manifest.update({name: digests[name] for name in todo})
+    _write_manifest(fig_dir, manifest)
+
+    return {name: ("rendered" if name in todo else "unchanged") for name in FIGURE_NAMES}
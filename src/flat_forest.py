@@ -0,0 +1,383 @@
+"""
+هدف این فایل:
+- نسخه «تخت» (flattened) از RandomForestRegressor برای پیش‌بینی سریع فقط با NumPy (FlatForest)
+
+مشکل:
+- rf.joblib (300 درخت) کندترین مدل در بارگذاری (unpickle همه درخت‌ها) و پیش‌بینی است.
+- پیش‌بینی یک uplink با model.predict از اعتبارسنجی ورودی sklearn و پخش کار روی thread pool
+  (n_jobs=-1، joblib) می‌گذرد؛ سربار این دو از خود پیمایش درخت‌ها بسیار بیشتر است.
+
+راه‌حل:
+- همه گره‌های همه درخت‌ها پشت سر هم در چند آرایه پیوسته (اندیس سراسری گره‌ها):
+    feature (int32)، threshold (float32)، children (int64؛ [چپ, راست] هر گره کنار هم)،
+    value (float64؛ پیش‌بینی برگ)، missing_left (uint8؛ مسیر NaN مانند sklearn)، roots (ریشه هر درخت)
+- برگ‌ها به خودشان اشاره می‌کنند؛ پس همه (درخت، سطر)های یک گروه هم‌زمان و به تعداد عمق گروه گام برمی‌دارند:
+    idx ← children[2·idx + (x[feature[idx]] > threshold[idx])]
+  هر گام چند gather برداری روی ماتریس (درخت‌های گروه، سطرهای بلوک) است (بدون حلقه Python روی سطرها)
+- درخت‌ها بر اساس عمق (depth) مرتب و در گروه‌های _GROUP_TREES تایی پیمایش می‌شوند: درخت‌های کم‌عمق
+  گام‌های بی‌اثر در برگ را برای عمیق‌ترین درخت جنگل تکرار نمی‌کنند و بلوک (گروه × سطرها) در cache جا می‌شود
+  (روی rf.joblib پروژه حدود 3.4 برابر سریع‌تر از پیمایش هم‌زمان همه درخت‌ها تا max_depth)
+- predict_one: همان پیمایش روی یک سطر (برداری روی درخت‌ها؛ در گام k فقط درخت‌های عمیق‌تر از k)،
+  بدون اعتبارسنجی sklearn و بدون thread pool
+
+برابری دقیق با sklearn:
+- sklearn ورودی را به float32 تبدیل و با threshold (float64) مقایسه می‌کند؛ threshold اینجا به
+  «بزرگ‌ترین float32 کوچک‌تر یا مساوی» گرد می‌شود، پس برای هر x از نوع float32 نتیجه x <= threshold
+  دقیقاً همان است (نه فقط تقریباً)
+- میانگین درخت‌ها مانند ForestRegressor.predict به ترتیب درخت‌ها و به صورت متوالی جمع و سپس بر
+  تعداد درخت‌ها تقسیم می‌شود (cumsum؛ جمع pairwise نتیجه را در بیت آخر تغییر می‌داد)
+
+فرمت فایل باینری (مانند tpc_table.py؛ برای memory-map در gatewayها):
+- header ثابت 64 بایتی (magic, version, n_trees, n_nodes, n_features, max_depth, names_bytes, has_medians, source)
+  source: 8 بایت اول sha256 فایل مدل اصلی (rf.joblib)؛ serve با آن فایل کهنه را تشخیص می‌دهد
+- نام ویژگی‌ها (JSON، پرشده تا مضرب 8 بایت)، medians (اختیاری)، سپس آرایه‌ها به ترتیب:
+  value (f8), children (i8), threshold (f4), feature (i4), roots (i4), depth (i4), missing_left (u1)
+  (children از نوع int64 است: اندیس گره بعدی هر گام مستقیماً اندیس gather بعدی است و تبدیل نوع لازم ندارد)
+
+این ماژول مانند numpy_predictor.py فقط numpy لازم دارد؛ from_sklearn فقط ویژگی‌های tree_ را می‌خواند.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Mapping
+
+import numpy as np
+
+from .numpy_predictor import record_to_row
+
+
+# پسوند فایل جنگل تخت در کنار فایل مدل (rf.joblib => rf.forest.bin)
+FOREST_SUFFIX = ".forest.bin"
+
+# -----------------------------------------------------------------------------
+# ساختار header فایل باینری (دقیقاً 64 بایت، little-endian)
+# -----------------------------------------------------------------------------
+_MAGIC = b"FRST"
+_VERSION = 1
+_HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("n_trees", "<u8"),
+    ("n_nodes", "<u8"),
+    ("n_features", "<u8"),
+    ("max_depth", "<u8"),
+    ("names_bytes", "<u8"),
+    ("has_medians", "<u8"),
+    ("source", "S8"),
+])
+
+# تعداد درخت‌های هر گروه و حداکثر اندازه ماتریس (درخت‌های گروه × سطرهای بلوک) در پیمایش batch
+_GROUP_TREES = 16
+_BLOCK_CELLS = 1 << 14
+
+# sklearn.tree._tree.TREE_LEAF
+_TREE_LEAF = -1
+
+
+def source_fingerprint(sha256: str) -> bytes:
+    """فیلد source فایل: 8 بایت اول sha256 (hex) فایل مدل اصلی (مثلاً از metadata در ModelRegistry)."""
+    return bytes.fromhex(sha256)[:8]
+
+
+def _floor_float32(threshold: np.ndarray) -> np.ndarray:
+    """بزرگ‌ترین float32 که از threshold (float64) بزرگ‌تر نیست."""
+    t = threshold.astype(np.float32)
+    over = t.astype(np.float64) > threshold
+    t[over] = np.nextafter(t[over], np.float32(-np.inf))
+    return t
+
+
+class FlatForest:
+    """
+    جنگل رگرسیون با آرایه‌های تخت (قابل memory-map).
+
+    فیلدها:
+    - feature_names، n_features، n_trees، max_depth
+    - medians: میانه‌های FeaturePreprocessor برای predict_record (None اگر ذخیره نشده باشد)
+    - source: 8 بایت اول sha256 فایل مدل اصلی (خالی اگر معلوم نباشد)
+    - آرایه‌های گره: feature، threshold، children، value، missing_left، roots و depth هر درخت (شرح در بالای فایل)
+
+    استفاده:
+        forest = FlatForest.from_sklearn(rf, feature_names, medians)
+        forest.save("models_trained/rf.forest.bin")
+        forest = FlatForest.load("models_trained/rf.forest.bin")   # np.memmap
+        forest.predict(X) / forest.predict_one(x) / forest.predict_record(record)
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        value: np.ndarray,
+        missing_left: np.ndarray,
+        roots: np.ndarray,
+        depth: np.ndarray,
+        feature_names: list[str],
+        medians: np.ndarray | None = None,
+        source: bytes = b"",
+    ):
+        # np.asarray: ndarray بدون کپی روی np.memmap (gather روی زیرکلاس memmap سربار هر فراخوانی دارد)
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.children = np.asarray(children)
+        self.value = np.asarray(value)
+        self.missing_left = np.asarray(missing_left)
+        self.roots = roots
+        self.depth = depth
+        self.feature_names = [str(name) for name in feature_names]
+        self.medians = None if medians is None else np.asarray(medians, dtype=np.float64)
+        self.source = bytes(source)
+
+        # ترتیب پیمایش: درخت‌ها به ترتیب عمق (پایدار)
+        self._order = np.argsort(np.asarray(depth), kind="stable")
+        self._sorted_roots = np.asarray(roots, dtype=np.int64)[self._order]
+        self._sorted_depth = np.asarray(depth, dtype=np.int64)[self._order]
+        # predict_one: در گام k فقط درخت‌های مرتب‌شده از _step_start[k] به بعد هنوز به برگ نرسیده‌اند
+        self._step_start = np.searchsorted(self._sorted_depth, np.arange(self.max_depth), side="right")
+        self._groups = [
+            (self._order[i:i + _GROUP_TREES], self._sorted_roots[i:i + _GROUP_TREES], int(self._sorted_depth[i:i + _GROUP_TREES].max()))
+            for i in range(0, self.n_trees, _GROUP_TREES)
+        ]
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def max_depth(self) -> int:
+        return int(np.max(self.depth)) if self.n_trees else 0
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.value)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    # -------------------------------------------------------------------------
+    # ساخت از مدل sklearn
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_sklearn(
+        cls,
+        forest,
+        feature_names: list[str] | None = None,
+        medians: np.ndarray | None = None,
+        source: bytes = b""
+    ) -> "FlatForest":
+        """
+        تبدیل یک RandomForestRegressor (یا هر جنگل رگرسیون sklearn با estimators_) fit‌شده.
+
+        feature_names: ترتیب ستون‌های ورودی (پیش‌فرض: feature_names_in_ مدل یا x0, x1, ...)
+        """
+        trees = [est.tree_ for est in getattr(forest, "estimators_", [])]
+        if not trees:
+            raise ValueError(f"{type(forest).__name__} is not a fitted tree ensemble")
+        if any(t.n_outputs != 1 or t.value.shape[2] != 1 for t in trees):
+            raise ValueError("Only single-output regression forests can be flattened")
+
+        n_features = int(forest.n_features_in_)
+        if feature_names is None:
+            names = getattr(forest, "feature_names_in_", None)
+            feature_names = [f"x{j}" for j in range(n_features)] if names is None else [str(c) for c in names]
+        if len(feature_names) != n_features:
+            raise ValueError(f"{len(feature_names)} feature names for a forest with {n_features} features")
+
+        sizes = np.array([t.node_count for t in trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        feature = np.empty(n_nodes, dtype=np.int32)
+        threshold = np.empty(n_nodes, dtype=np.float32)
+        children = np.empty(2 * n_nodes, dtype=np.int64)
+        value = np.empty(n_nodes, dtype=np.float64)
+        missing_left = np.zeros(n_nodes, dtype=np.uint8)
+
+        for t, off in zip(trees, offsets):
+            nodes = slice(off, off + t.node_count)
+            ids = np.arange(off, off + t.node_count)
+            left = np.asarray(t.children_left, dtype=np.int64)
+            right = np.asarray(t.children_right, dtype=np.int64)
+            leaf = left == _TREE_LEAF
+
+            # برگ: هر دو فرزند خود گره (پیمایش در برگ می‌ماند)؛ feature/threshold آن بی‌اثر است
+            feature[nodes] = np.where(leaf, 0, t.feature)
+            threshold[nodes] = np.where(leaf, np.float32(0.0), _floor_float32(np.asarray(t.threshold, dtype=np.float64)))
+            children[2 * off:2 * (off + t.node_count):2] = np.where(leaf, ids, left + off)
+            children[2 * off + 1:2 * (off + t.node_count):2] = np.where(leaf, ids, right + off)
+            value[nodes] = t.value[:, 0, 0]
+            # درخت‌های نسخه‌های قدیمی‌تر sklearn (بدون پشتیبانی NaN) این ویژگی را ندارند: NaN به راست
+            if hasattr(t, "missing_go_to_left"):
+                missing_left[nodes] = np.asarray(t.missing_go_to_left, dtype=np.uint8)
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children=children,
+            value=value,
+            missing_left=missing_left,
+            roots=offsets.astype(np.int32),
+            depth=np.array([t.max_depth for t in trees], dtype=np.int32),
+            feature_names=feature_names,
+            medians=medians,
+            source=source,
+        )
+
+    # -------------------------------------------------------------------------
+    # پیمایش
+    # -------------------------------------------------------------------------
+    def _step(self, idx: np.ndarray, x: np.ndarray, has_nan: bool) -> np.ndarray:
+        """یک گام پایین رفتن برای همه اندیس‌ها؛ x مقدار ویژگی گره فعلی هر اندیس (float32)."""
+        right = x > self.threshold[idx]
+        if has_nan:
+            # NaN > threshold همیشه False است (چپ)؛ مسیر NaN از missing_left همان گره
+            right |= np.isnan(x) & (self.missing_left[idx] == 0)
+        return self.children[2 * idx + right]
+
+    def predict(self, X) -> np.ndarray:
+        """پیش‌بینی batch؛ X با شکل (n, n_features) به ترتیب feature_names."""
+        X = np.asarray(X, dtype=np.float32)  # همان تبدیل ورودی درخت‌های sklearn
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X must have shape (n, {self.n_features}), got {X.shape}")
+        if len(X) == 1:
+            # یک سطر (مثلاً batch تک‌درخواستی serve): مسیر predict_one حدود 10 برابر سریع‌تر و با همان نتیجه
+            return np.array([self.predict_one(X[0])])
+
+        out = np.empty(len(X), dtype=np.float64)
+        block = max(1, _BLOCK_CELLS // _GROUP_TREES)
+        for start in range(0, len(X), block):
+            Xb = np.ascontiguousarray(X[start:start + block])
+            flat = Xb.ravel()
+            base = np.arange(len(Xb), dtype=np.int64) * self.n_features
+            has_nan = bool(np.isnan(flat).any())
+
+            # leaves[t, i]: برگ درخت t برای سطر i؛ هر گروه ماتریس (درخت‌های گروه، سطرها) را depth گام جلو می‌برد
+            leaves = np.empty((self.n_trees, len(Xb)), dtype=np.int64)
+            for trees, roots, depth in self._groups:
+                idx = np.repeat(roots[:, None], len(Xb), axis=1)
+                for _ in range(depth):
+                    idx = self._step(idx, flat[base + self.feature[idx]], has_nan)
+                leaves[trees] = idx
+
+            # جمع متوالی در ترتیب درخت‌ها (مانند ForestRegressor.predict) و سپس تقسیم
+            out[start:start + len(Xb)] = np.cumsum(self.value[leaves], axis=0)[-1] / self.n_trees
+        return out
+
+    def predict_one(self, x) -> float:
+        """مسیر سریع یک سطر (آرایه با n_features مقدار)؛ برداری روی درخت‌ها."""
+        x = np.asarray(x, dtype=np.float32).ravel()
+        if len(x) != self.n_features:
+            raise ValueError(f"x must have {self.n_features} values, got {len(x)}")
+        has_nan = bool(np.isnan(x).any())
+        idx = self._sorted_roots.copy()
+        for start in self._step_start:
+            active = idx[start:]
+            idx[start:] = self._step(active, x[self.feature[active]], has_nan)
+        leaves = np.empty_like(idx)
+        leaves[self._order] = idx
+        return float(np.cumsum(self.value[leaves])[-1] / self.n_trees)
+
+    def transform_one(self, record: Mapping[str, object]) -> np.ndarray:
+        """یک uplink (dict) به آرایه float64 با شکل (n_features,) (record_to_row)."""
+        return record_to_row(record, self.feature_names, self.medians)
+
+    def predict_record(self, record: Mapping[str, object]) -> float:
+        """پیش‌بینی یک uplink (dict از نام ستون به مقدار)."""
+        return self.predict_one(self.transform_one(record))
+
+    # -------------------------------------------------------------------------
+    # ذخیره/بارگذاری باینری
+    # -------------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        """ذخیره در یک فایل باینری (header + نام‌ها + آرایه‌های پشت سر هم)؛ جایگزینی اتمی."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        names = json.dumps(self.feature_names).encode("utf-8")
+        names += b" " * (-len(names) % 8)  # هم‌ترازی 8 بایتی آرایه‌های بعدی
+
+        header = np.zeros(1, dtype=_HEADER_DTYPE)
+        header["magic"] = _MAGIC
+        header["version"] = _VERSION
+        header["n_trees"] = self.n_trees
+        header["n_nodes"] = self.n_nodes
+        header["n_features"] = self.n_features
+        header["max_depth"] = self.max_depth  # برای گزارش؛ عمق هر درخت در آرایه depth
+        header["names_bytes"] = len(names)
+        header["has_medians"] = self.medians is not None
+        header["source"] = self.source
+
+        # فایل موقت و جایگزینی اتمی: نسخه قبلی ممکن است همین حالا در پروسه‌ای memory-map شده باشد
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            header.tofile(f)
+            f.write(names)
+            if self.medians is not None:
+                np.ascontiguousarray(self.medians, dtype="<f8").tofile(f)
+            np.ascontiguousarray(self.value, dtype="<f8").tofile(f)
+            np.ascontiguousarray(self.children, dtype="<i8").tofile(f)
+            np.ascontiguousarray(self.threshold, dtype="<f4").tofile(f)
+            np.ascontiguousarray(self.feature, dtype="<i4").tofile(f)
+            np.ascontiguousarray(self.roots, dtype="<i4").tofile(f)
+            np.ascontiguousarray(self.depth, dtype="<i4").tofile(f)
+            np.ascontiguousarray(self.missing_left, dtype="u1").tofile(f)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "FlatForest":
+        """
+        بارگذاری از فایل باینری.
+
+        اگر mmap=True باشد آرایه‌ها np.memmap (فقط خواندنی) هستند: بارگذاری فقط خواندن header است و
+        چند پروسه روی یک gateway صفحات حافظه یکسانی را به اشتراک می‌گذارند.
+        """
+        path = Path(path)
+        header = np.fromfile(path, dtype=_HEADER_DTYPE, count=1)
+        if len(header) != 1 or header["magic"][0] != _MAGIC:
+            raise ValueError(f"Not a flattened forest file: {path}")
+        if int(header["version"][0]) != _VERSION:
+            raise ValueError(f"Unsupported flattened forest version {int(header['version'][0])} in {path}")
+
+        n_trees = int(header["n_trees"][0])
+        n_nodes = int(header["n_nodes"][0])
+        n_features = int(header["n_features"][0])
+        names_bytes = int(header["names_bytes"][0])
+        with open(path, "rb") as f:
+            f.seek(_HEADER_DTYPE.itemsize)
+            feature_names = json.loads(f.read(names_bytes).decode("utf-8"))
+        offset = _HEADER_DTYPE.itemsize + names_bytes
+
+        def read(dtype: str, count: int):
+            nonlocal offset
+            if mmap:
+                arr = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+            else:
+                arr = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+            offset += np.dtype(dtype).itemsize * count
+            return arr
+
+        medians = np.array(read("<f8", n_features)) if header["has_medians"][0] else None
+        value = read("<f8", n_nodes)
+        children = read("<i8", 2 * n_nodes)
+        threshold = read("<f4", n_nodes)
+        feature = read("<i4", n_nodes)
+        roots = read("<i4", n_trees)
+        depth = read("<i4", n_trees)
+        missing_left = read("u1", n_nodes)
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children=children,
+            value=value,
+            missing_left=missing_left,
+            roots=roots,
+            depth=depth,
+            feature_names=feature_names,
+            medians=medians,
+            source=bytes(header["source"][0]),
+        )
@@ -0,0 +1,365 @@
+"""
+هدف این فایل:
+- اندازه‌گیری سبک «مرحله به مرحله» (stage) اسکریپت‌های پروژه: زمان wall، زمان CPU،
+  حافظه و تعداد سطرها برای هر مرحله نام‌دار
+
+مثال:
+    from .instrument import session, stage, traced
+
+    with session("run_pipeline", enabled=args.trace):
+        with stage("load_dataset") as st:
+            df = load_dataset(...)
+            st.rows = len(df)
+
+    @traced("tpc_decisions", rows_from=0)
+    def tpc_decisions(snr_pred, ...): ...
+
+فعال‌سازی:
+- با session(..., enabled=True) (فلگ --trace در run_pipeline، train_baselines و summarize_results)
+- یا با متغیر محیطی ML_IOT_TRACE=1 (config.TRACE_ENV_VAR)
+- حافظه هر مرحله:
+  - پیش‌فرض (getrusage؛ تقریباً بدون سربار):
+    process_rss_hwm_mb = اوج RSS «کل پروسه» از شروع آن تا پایان مرحله (high-water mark، نه اوج خود مرحله)
+    rss_hwm_growth_mb  = افزایش همان اوج در طول مرحله؛ بزرگ‌تر از صفر فقط اگر این مرحله رکورد حافظه پروسه را
+                         بالا برده باشد (مرحله‌ای زیر اوج قبلی، هر قدر حافظه بگیرد، صفر نشان می‌دهد)
+  - با ML_IOT_TRACE_MEMORY=1 (یا --trace-memory): alloc_peak_mb = اوج حافظه تخصیص‌یافته
+    «در طول همان مرحله» با tracemalloc (دقیق ولی با سربار قابل توجه)
+
+وقتی غیرفعال است، stage یک شیء no-op مشترک برمی‌گرداند و traced فقط یک شرط اضافه دارد.
+
+خروجی (پس از پایان session، در out_dir یا config.TRACE_DIR):
+- <name>-<timestamp>.jsonl      : یک خط JSON برای هر مرحله
+- <name>-<timestamp>.trace.json : فرمت Chrome trace (chrome://tracing یا https://ui.perfetto.dev)
+- و یک جدول خلاصه (جمع زمان هر نام مرحله) در stdout
+
+محدودیت:
+- مراحل داخل پروسه‌های فرزند (مثلاً fit_parallel) ثبت نمی‌شوند؛ کل فراخوانی در پروسه اصلی یک مرحله است
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from . import config
+
+
+def max_rss_mb() -> float:
+    """اوج RSS پروسه فعلی (MB). ru_maxrss در Linux بر حسب KB و در macOS بر حسب بایت است."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() not in ("", "0", "false", "no")
+
+
+@dataclass
+class StageRecord:
+    """نتیجه یک مرحله (یک خط JSONL)."""
+
+    name: str
+    start_s: float                       # نسبت به شروع session
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    rows: int | None = None
+    process_rss_hwm_mb: float = 0.0
+    rss_hwm_growth_mb: float = 0.0
+    alloc_peak_mb: float | None = None
+    depth: int = 0
+    parent: str | None = None
+    thread: int = 0
+    attrs: dict = field(default_factory=dict)
+
+
+class _State:
+    """وضعیت سراسری ثبت (یک session در هر لحظه)."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.t0 = 0.0
+        self.records: list[StageRecord] = []
+        self.local = threading.local()
+
+    def stack(self) -> list:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+
+_STATE = _State()
+
+
+class _Stage:
+    """context manager یک مرحله فعال."""
+
+    __slots__ = ("record", "_wall0", "_cpu0", "_hwm0", "_alloc_max")
+
+    def __init__(self, name: str, rows: int | None, attrs: dict):
+        self.record = StageRecord(name=name, start_s=0.0, rows=rows, attrs=attrs)
+
+    # تعداد سطرها معمولاً بعد از اجرای مرحله معلوم می‌شود: `st.rows = len(df)`
+    @property
+    def rows(self) -> int | None:
+        return self.record.rows
+
+    @rows.setter
+    def rows(self, value: int | None):
+        self.record.rows = None if value is None else int(value)
+
+    def __enter__(self) -> "_Stage":
+        stack = _STATE.stack()
+        rec = self.record
+        rec.depth = len(stack)
+        rec.parent = stack[-1].record.name if stack else None
+        rec.thread = threading.get_ident()
+
+        if _STATE.trace_memory:
+            # اوج حافظه والد تا این لحظه حفظ می‌شود؛ سپس شمارنده اوج برای این مرحله صفر می‌شود
+            if stack:
+                parent = stack[-1]
+                parent._alloc_max = max(parent._alloc_max, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._alloc_max = 0
+
+        stack.append(self)
+        self._hwm0 = max_rss_mb()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        rec.start_s = self._wall0 - _STATE.t0
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        rec = self.record
+        rec.wall_s = time.perf_counter() - self._wall0
+        rec.cpu_s = time.process_time() - self._cpu0
+        rec.process_rss_hwm_mb = max_rss_mb()
+        rec.rss_hwm_growth_mb = rec.process_rss_hwm_mb - self._hwm0
+        if exc_type is not None:
+            rec.attrs["error"] = exc_type.__name__
+
+        stack = _STATE.stack()
+        stack.pop()
+        if _STATE.trace_memory:
+            peak = max(self._alloc_max, tracemalloc.get_traced_memory()[1])
+            rec.alloc_peak_mb = peak / (1024.0 * 1024.0)
+            if stack:
+                stack[-1]._alloc_max = max(stack[-1]._alloc_max, peak)
+
+        _STATE.records.append(rec)
+        return False
+
+
+class _NoopStage:
+    """نسخه غیرفعال: هیچ اندازه‌گیری‌ای انجام نمی‌شود (rows نادیده گرفته می‌شود)."""
+
+    __slots__ = ()
+    rows = None
+
+    def __enter__(self) -> "_NoopStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NOOP = _NoopStage()
+
+
+def enabled() -> bool:
+    return _STATE.enabled
+
+
+def stage(name: str, rows: int | None = None, **attrs):
+    """
+    context manager یک مرحله نام‌دار.
+
+    - rows: تعداد سطرهای پردازش‌شده (اختیاری؛ داخل بلوک هم با st.rows = ... قابل تنظیم است)
+    - attrs: مقادیر اضافی برای ثبت (مثلاً model="ridge.joblib")
+    """
+    if not _STATE.enabled:
+        return _NOOP
+    return _Stage(name, rows, attrs)
+
+
+def traced(name: str | None = None, rows_from: int | None = None) -> Callable:
+    """
+    دکوراتور: هر فراخوانی تابع یک مرحله ثبت می‌کند.
+
+    - name: نام مرحله (پیش‌فرض: __qualname__ تابع)
+    - rows_from: اندیس آرگومان موقعیتی که len آن تعداد سطرهاست (مثلاً 0 برای اولین آرگومان)
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _STATE.enabled:
+                return func(*args, **kwargs)
+            rows = len(args[rows_from]) if rows_from is not None and len(args) > rows_from else None
+            with _Stage(label, rows, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def iterate(name: str, iterable: Iterable) -> Iterator:
+    """
+    پیمایش iterable و ثبت زمان تولید هر آیتم به عنوان یک مرحله (مثلاً خواندن هر chunk در حالت --stream).
+
+    rows هر مرحله = len(item) (اگر تعریف شده باشد).
+    """
+    if not _STATE.enabled:
+        yield from iterable
+        return
+
+    it = iter(iterable)
+    while True:
+        with _Stage(name, None, {}) as st:
+            try:
+                item = next(it)
+            except StopIteration:
+                st.record.attrs["exhausted"] = True
+                break
+            st.rows = len(item) if hasattr(item, "__len__") else None
+        yield item
+
+
+# =============================================================================
+# session: فعال‌سازی، نوشتن خروجی‌ها و خلاصه
+# =============================================================================
+def chrome_trace(records: list[StageRecord]) -> dict:
+    """تبدیل مراحل به رویدادهای کامل ("ph": "X") فرمت Chrome trace (زمان‌ها بر حسب میکروثانیه)."""
+    pid = os.getpid()
+    events = []
+    for r in records:
+        args = {
+            "cpu_s": round(r.cpu_s, 6),
+            "process_rss_hwm_mb": round(r.process_rss_hwm_mb, 2),
+            "rss_hwm_growth_mb": round(r.rss_hwm_growth_mb, 2),
+        }
+        if r.rows is not None:
+            args["rows"] = r.rows
+        if r.alloc_peak_mb is not None:
+            args["alloc_peak_mb"] = round(r.alloc_peak_mb, 3)
+        args.update(r.attrs)
+        events.append({
+            "name": r.name,
+            "ph": "X",
+            "ts": r.start_s * 1e6,
+            "dur": r.wall_s * 1e6,
+            "pid": pid,
+            "tid": r.thread,
+            "args": args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_traces(records: list[StageRecord], jsonl_path: Path, chrome_path: Path) -> None:
+    jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(asdict(r)) + "\n")
+    with open(chrome_path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(records), f)
+
+
+def summarize(records: list[StageRecord]) -> list[dict]:
+    """
+    جمع مراحل هم‌نام (به ترتیب اولین اجرا): تعداد، زمان wall/CPU کل، سطرها، high-water mark پروسه در پایان
+    آخرین اجرا و جمع افزایش آن در اجراهای این مرحله.
+    """
+    summary: dict[str, dict] = {}
+    for r in sorted(records, key=lambda r: r.start_s):
+        s = summary.setdefault(r.name, {
+            "stage": r.name, "depth": r.depth, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0,
+            "process_rss_hwm_mb": 0.0, "rss_hwm_growth_mb": 0.0,
+        })
+        s["calls"] += 1
+        s["wall_s"] += r.wall_s
+        s["cpu_s"] += r.cpu_s
+        s["rows"] += r.rows or 0
+        s["process_rss_hwm_mb"] = max(s["process_rss_hwm_mb"], r.process_rss_hwm_mb)
+        s["rss_hwm_growth_mb"] += r.rss_hwm_growth_mb
+        if r.alloc_peak_mb is not None:
+            s["alloc_peak_mb"] = max(s.get("alloc_peak_mb", 0.0), r.alloc_peak_mb)
+    return list(summary.values())
+
+
+def print_summary(records: list[StageRecord]) -> None:
+    rows = summarize(records)
+    if not rows:
+        return
+    has_alloc = any("alloc_peak_mb" in r for r in rows)
+    print(
+        f"{'stage':40s} {'calls':>6s} {'wall_s':>9s} {'cpu_s':>9s} {'rows':>12s} {'hwm_mb':>8s} {'+hwm_mb':>8s}"
+        + (f" {'alloc_mb':>9s}" if has_alloc else "")
+    )
+    for r in rows:
+        label = "  " * r["depth"] + r["stage"]
+        line = (
+            f"{label:40s} {r['calls']:6d} {r['wall_s']:9.4f} {r['cpu_s']:9.4f} {r['rows']:12,d} "
+            f"{r['process_rss_hwm_mb']:8.1f} {r['rss_hwm_growth_mb']:8.1f}"
+        )
+        if has_alloc:
+            line += f" {r.get('alloc_peak_mb', 0.0):9.2f}"
+        print(line)
+
+
+@contextlib.contextmanager
+def session(name: str, enabled: bool = False, trace_memory: bool = False, out_dir: Path | None = None):
+    """
+    فعال‌سازی ثبت مراحل برای یک اجرای کامل اسکریپت.
+
+    - enabled یا متغیر محیطی config.TRACE_ENV_VAR ثبت را فعال می‌کند؛ در غیر این صورت هیچ کاری انجام نمی‌شود
+    - trace_memory یا config.TRACE_MEMORY_ENV_VAR: اندازه‌گیری حافظه هر مرحله با tracemalloc
+    - out_dir: پوشه فایل‌های trace (پیش‌فرض config.TRACE_DIR)
+    - کل session خودش یک مرحله (با همان name) است
+    - در پایان (حتی در صورت خطا) فایل‌های JSONL و Chrome trace نوشته و خلاصه چاپ می‌شود
+    """
+    if not (enabled or _env_flag(config.TRACE_ENV_VAR)) or _STATE.enabled:
+        yield
+        return
+
+    trace_memory = trace_memory or _env_flag(config.TRACE_MEMORY_ENV_VAR)
+    started_tracemalloc = trace_memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+
+    _STATE.enabled = True
+    _STATE.trace_memory = trace_memory
+    _STATE.t0 = time.perf_counter()
+    _STATE.records = []
+    try:
+        with _Stage(name, None, {"argv": " ".join(sys.argv[1:])}):
+            yield
+    finally:
+        records = _STATE.records
+        _STATE.enabled = False
+        _STATE.trace_memory = False
+        _STATE.records = []
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        out_dir = Path(out_dir or config.TRACE_DIR)
+        stem = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        write_traces(records, out_dir / f"{stem}.jsonl", out_dir / f"{stem}.trace.json")
+        print_summary(records)
+        print("Saved trace:", out_dir / f"{stem}.trace.json")
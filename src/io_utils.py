@@ -9,7 +9,9 @@
   5) بارگذاری مدل (joblib یا pickle)
   6) همسان‌سازی ستون‌های ورودی با مدل (feature alignment)
   7) تبدیل امن ویژگی‌ها به عددی (numeric coercion)
-  8) ذخیره فایل‌های CSV
+  8) ذخیره فایل‌های CSV (یکجا یا افزایشی/append)
+  9) خواندن دیتاست به صورت جریانی (chunk به chunk) برای ورودی‌های خیلی بزرگ
+  10) کش ستونی باینری دیتاست (dataset_cache.py) تا CSV هر بار از نو parse نشود
 
 مزیت:
 - کدهای اصلی مثل run_pipeline.py و train_baselines.py تمیز می‌مانند
@@ -19,12 +21,15 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Iterator
+import hashlib
+import json
 import pandas as pd
-import numpy as np
 import joblib
 import pickle
 
 from . import config
+from .dataset_cache import cached_columns, load_cached
 
 
 def ensure_dirs() -> None:
@@ -41,11 +46,113 @@ def ensure_dirs() -> None:
     config.TABLE_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def load_dataset(prefer_processed: bool = True) -> pd.DataFrame:
+def _drop_junk_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    حذف ستون‌های ناخواسته‌ای مثل "Unnamed: 0" (ستون ایندکس ذخیره‌شده) و ستون با نام خالی "".
+    """
+    df = df.loc[:, ~df.columns.str.contains(r"^Unnamed", case=False, regex=True)]
+    if "" in df.columns:
+        df = df.drop(columns=[""])
+    return df
+
+
+def _schema_fingerprint() -> str:
+    """شناسه کوتاه شِمای config.DATASET_SCHEMA (کلید کش: تغییر شِما => بازسازی کش)."""
+    blob = json.dumps(sorted(config.DATASET_SCHEMA.items())).encode("utf-8")
+    return "schema-" + hashlib.blake2b(blob, digest_size=8).hexdigest()
+
+
+def _csv_dtypes(columns: list[str]) -> dict[str, str]:
+    """
+    نوع‌هایی که مستقیماً به pd.read_csv داده می‌شوند (float و category).
+
+    ستون‌های صحیح و زمانی بعد از parse در apply_schema تبدیل می‌شوند، چون ممکن است
+    مقدار گمشده داشته باشند (int با NaN در read_csv خطا می‌دهد).
+    """
+    out = {}
+    for c in columns:
+        dtype = config.DATASET_SCHEMA.get(c)
+        if dtype is not None and (dtype == "category" or dtype.startswith("float")):
+            out[c] = dtype
+    return out
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    تبدیل ستون‌های df به نوع‌های فشرده config.DATASET_SCHEMA.
+
+    - صحیح (int8/int16/...): اگر ستون مقدار گمشده داشته باشد به float32 تبدیل می‌شود
+    - datetime64: با pd.to_datetime (مقادیر نامعتبر => NaT)
+    - float/category: اگر قبلاً در read_csv اعمال نشده باشد، همینجا تبدیل می‌شود
+      (مقادیر غیرعددی در ستون float به NaN تبدیل می‌شوند، مانند safe_numeric_X)
+    ستون‌هایی که در schema نیستند دست‌نخورده می‌مانند.
+    """
+    for c in df.columns:
+        dtype = config.DATASET_SCHEMA.get(c)
+        if dtype is None or str(df[c].dtype) == dtype:
+            continue
+
+        if dtype.startswith("datetime64"):
+            df[c] = pd.to_datetime(df[c], errors="coerce").astype(dtype)
+        elif dtype == "category":
+            df[c] = df[c].astype("category")
+        else:
+            col = df[c] if pd.api.types.is_numeric_dtype(df[c].dtype) else pd.to_numeric(df[c], errors="coerce")
+            if dtype.startswith("int") and col.isna().any():
+                dtype = "float32"
+            df[c] = col.astype(dtype)
+    return df
+
+
+def _read_csv_clean(path: Path, usecols: list[str] | None = None, **kwargs):
+    """
+    parse CSV با شِمای نوع‌ها و حذف ستون‌های ناخواسته (reader مورد استفاده در ساخت کش).
+
+    - usecols: فقط این ستون‌ها از متن ساخته می‌شوند (بقیه هرگز در حافظه ساخته نمی‌شوند)
+    - kwargs اضافی (مثلاً chunksize) مستقیماً به pd.read_csv داده می‌شود
+    """
+    if usecols is None:
+        usecols = list(_drop_junk_columns(pd.read_csv(path, nrows=0)).columns)
+
+    try:
+        return pd.read_csv(path, usecols=usecols, dtype=_csv_dtypes(usecols), **kwargs)
+    except (ValueError, TypeError):
+        # مقدار غیرعددی در یک ستون float: بدون dtype می‌خوانیم و apply_schema با coerce تبدیل می‌کند
+        return pd.read_csv(path, usecols=usecols, **kwargs)
+
+
+def _read_dataset(path: Path) -> pd.DataFrame:
+    """parse کامل یک فایل با شِمای کامل (برای ساخت کش)."""
+    return apply_schema(_read_csv_clean(path))
+
+
+def dataset_columns(path: Path, use_cache: bool | None = None) -> list[str]:
+    """
+    لیست ستون‌های یک دیتاست بدون parse کامل فایل.
+
+    - اگر کش ستونی معتبر باشد از manifest آن خوانده می‌شود
+    - در غیر این صورت فقط سطر عنوان CSV خوانده می‌شود (nrows=0)
+    """
+    use_cache = config.USE_DATASET_CACHE if use_cache is None else use_cache
+    if use_cache:
+        cols = cached_columns(path, reader_key=_schema_fingerprint())
+        if cols is not None:
+            return cols
+    return list(_drop_junk_columns(pd.read_csv(path, nrows=0)).columns)
+
+
+def load_dataset(
+    prefer_processed: bool = True,
+    path: Path | None = None,
+    columns: list[str] | None = None,
+    use_cache: bool | None = None,
+    drop_unused: bool = False
+) -> pd.DataFrame:
     """
     بارگذاری دیتاست از data/raw یا data/processed.
 
     منطق انتخاب فایل:
+    - اگر path صریحاً داده شود => همان فایل خوانده می‌شود
     - اگر prefer_processed=True و فایل processed وجود داشته باشد => processed را می‌خوانیم
     - در غیر این صورت => raw را می‌خوانیم
 
@@ -56,27 +163,69 @@ def load_dataset(prefer_processed: bool = True) -> pd.DataFrame:
     Fallback مهم:
     - اگر فایل processed وجود داشته باشد ولی ستون هدف (مثلاً snr) داخلش نباشد،
       آن را «خراب/ناقص» فرض می‌کنیم و به raw برمی‌گردیم.
-    """
-    # انتخاب مسیر دیتاست بر اساس prefer_processed و وجود فایل processed
-    path = config.DATA_PROCESSED if (prefer_processed and config.DATA_PROCESSED.exists()) else config.DATA_RAW
-    df = pd.read_csv(path)
+      (این بررسی فقط روی لیست ستون‌ها انجام می‌شود، پس فایل دو بار parse نمی‌شود)
 
-    # حذف ستون‌های ایندکس تصادفی مانند Unnamed: 0
-    df = df.loc[:, ~df.columns.str.contains(r"^Unnamed", case=False, regex=True)]
+    نوع ستون‌ها (config.DATASET_SCHEMA):
+    - به جای حدس pandas، هر ستون با نوع فشرده شِما خوانده می‌شود
+      (sf=int8, frequency=int32, device_id=category, timestamp=datetime64, اندازه‌گیری‌ها=float32)
 
-    # حذف ستون با نام خالی "" اگر موجود باشد
-    if "" in df.columns:
-        df = df.drop(columns=[""])
+    کش ستونی (use_cache، پیش‌فرض config.USE_DATASET_CACHE):
+    - بار اول CSV parse و در data/processed/cache به صورت ستون‌های .npy ذخیره می‌شود
+    - بارهای بعدی بدون parse متن و با memory-map خوانده می‌شوند (dataset_cache.py)
+
+    انتخاب ستون‌ها:
+    - columns: اگر داده شود فقط همین ستون‌ها (به همین ترتیب) بارگذاری می‌شوند
+    - drop_unused=True: ستون‌های config.DROP_COLS اصلاً خوانده/ساخته نمی‌شوند (usecols)
+    """
+    use_cache = config.USE_DATASET_CACHE if use_cache is None else use_cache
 
-    # --- Fallback: اگر processed ستون هدف را نداشت، از raw استفاده می‌کنیم ---
+    # انتخاب مسیر دیتاست بر اساس path / prefer_processed و وجود فایل processed
+    if path is None:
+        path = config.DATA_PROCESSED if (prefer_processed and config.DATA_PROCESSED.exists()) else config.DATA_RAW
+
+    # --- Fallback: اگر فایل ستون هدف را نداشت، از raw استفاده می‌کنیم ---
+    available = dataset_columns(path, use_cache=use_cache)
     target = config.TARGET_COL or None
-    if target and target not in df.columns:
-        df = pd.read_csv(config.DATA_RAW)
-        df = df.loc[:, ~df.columns.str.contains(r"^Unnamed", case=False, regex=True)]
-        if "" in df.columns:
-            df = df.drop(columns=[""])
+    if target and target not in available:
+        path = config.DATA_RAW
+        available = dataset_columns(path, use_cache=use_cache)
 
-    return df
+    if columns is None and drop_unused:
+        columns = [c for c in available if c not in config.DROP_COLS]
+
+    if use_cache:
+        return load_cached(path, reader=_read_dataset, columns=columns, reader_key=_schema_fingerprint())
+
+    return apply_schema(_read_csv_clean(path, usecols=columns))
+
+
+def iter_dataset(
+    chunk_size: int,
+    path: Path | None = None,
+    drop_unused: bool = False
+) -> Iterator[pd.DataFrame]:
+    """
+    خواندن دیتاست به صورت جریانی: هر بار فقط chunk_size سطر در حافظه است.
+
+    برای ورودی‌های بسیار بزرگ (صدها میلیون uplink) که load_dataset کل فایل را
+    در حافظه بارگذاری می‌کند، این تابع حافظه را مستقل از اندازه فایل نگه می‌دارد.
+
+    ورودی‌ها:
+    - chunk_size: تعداد سطر هر chunk
+    - path: مسیر CSV (پیش‌فرض: config.DATA_RAW)
+    - drop_unused: مانند load_dataset؛ ستون‌های config.DROP_COLS خوانده نمی‌شوند
+
+    خروجی:
+    - iterator از DataFrameها (با همان پاک‌سازی و شِمای نوع load_dataset)
+    """
+    path = config.DATA_RAW if path is None else path
+    usecols = list(_drop_junk_columns(pd.read_csv(path, nrows=0)).columns)
+    if drop_unused:
+        usecols = [c for c in usecols if c not in config.DROP_COLS]
+
+    with _read_csv_clean(path, usecols=usecols, chunksize=int(chunk_size)) as reader:
+        for chunk in reader:
+            yield apply_schema(chunk)
 
 
 def detect_target_col(df: pd.DataFrame) -> str:
@@ -206,17 +355,20 @@ def safe_numeric_X(X: pd.DataFrame) -> pd.DataFrame:
        اگر تبدیل نشد => NaN می‌شود
     2) در پایان، NaNها را با میانه ستون پر می‌کند (روش سریع/ساده)
        (این روش برای ارائه و dataset کوچک مناسب است)
+    3) اگر همه ستون‌ها از قبل عددی باشند و NaN نداشته باشند (حالت رایج با شِمای نوع‌ها)
+       هیچ کپی‌ای از داده ساخته نمی‌شود
     """
-    X2 = X.copy()
-
-    # تلاش برای تبدیل ستون‌های غیرعددی به عددی
-    for col in X2.columns:
-        if not np.issubdtype(X2[col].dtype, np.number):
-            X2[col] = pd.to_numeric(X2[col], errors="coerce")
-
-    # پر کردن NaNها با میانه ستون‌های عددی
-    X2 = X2.fillna(X2.median(numeric_only=True))
-    return X2
+    # ستون‌های غیرعددی (رشته/category/زمان). is_numeric_dtype با CategoricalDtype هم درست کار می‌کند
+    non_numeric = [c for c in X.columns if not pd.api.types.is_numeric_dtype(X[c].dtype)]
+    if non_numeric:
+        X = X.copy()
+        for col in non_numeric:
+            X[col] = pd.to_numeric(X[col], errors="coerce")
+
+    # پر کردن NaNها با میانه ستون‌های عددی (فقط اگر NaN وجود داشته باشد)
+    if X.isna().to_numpy().any():
+        X = X.fillna(X.median(numeric_only=True))
+    return X
 
 
 def save_csv(df: pd.DataFrame, path: Path) -> None:
@@ -229,3 +381,14 @@ def save_csv(df: pd.DataFrame, path: Path) -> None:
     """
     path.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(path, index=False)
+
+
+def append_csv(df: pd.DataFrame, path: Path, header: bool) -> None:
+    """
+    افزودن (append) یک DataFrame به انتهای فایل CSV؛ برای نوشتن افزایشی خروجی‌ها در حالت stream.
+
+    - header=True یعنی این اولین chunk است: فایل از نو ساخته (truncate) و سطر عنوان نوشته می‌شود
+    - header=False یعنی فقط سطرها به انتهای فایل موجود اضافه می‌شوند
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False, mode="w" if header else "a", header=header)
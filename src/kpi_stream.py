@@ -0,0 +1,505 @@
+"""
+هدف این فایل:
+- محاسبه همه KPIهای summarize_results در «یک گذر» روی tpc_decisions.csv، chunk به chunk و با حافظه ثابت
+- قابل ادغام (merge) بودن نتایج جزئی: هر shard (بخشی از فایل یا چند فایل) جدا جمع می‌شود
+  و نتیجه‌ها در پایان با هم ادغام می‌شوند؛ بنابراین خلاصه میلیاردها تصمیم با چند پروسه ممکن است
+
+اجزا:
+- Moments: تعداد، جمع، min/max و M2 (واریانس) با ادغام Chan/Welford
+- CountTable: جدول تعداد مقادیر گسسته (SF و TP)؛ mode، top-k و quantile «دقیق» از روی همین جدول
+- QuantileSketch: sketch لگاریتمی شبیه DDSketch برای quantile تقریبی ستون‌های پیوسته
+  (energy_norm و me) با خطای نسبی حداکثر alpha؛ حافظه فقط به بازه مقادیر بستگی دارد، نه به N
+- KPIAggregator: ترکیب موارد بالا برای ستون‌های tpc_decisions.csv + شمارنده‌های آستانه‌ای
+- aggregate_csv: یک shard (بازه بایتی) از فایل CSV را بلوک به بلوک می‌خواند و جمع می‌کند
+
+نکته درباره tp_new:
+- TP فقط مقادیر صحیح TP_MIN..TP_MAX را دارد، پس میانه آن از CountTable به صورت دقیق محاسبه می‌شود
+  (یک sketch تقریبی برای ستونی با 13 مقدار ممکن فقط خطا اضافه می‌کند)
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+
+REQUIRED_COLUMNS = ("sf_new", "tp_new", "me", "energy_norm")
+OPTIMAL_COLUMNS = ("sf_opt", "tp_opt", "me_opt", "energy_norm_opt")
+
+
+def _finite(values) -> np.ndarray:
+    """آرایه float64 بدون NaN (همانند pandas که NaN را در mean/median نادیده می‌گیرد)."""
+    values = np.asarray(values, dtype=np.float64)
+    return values[~np.isnan(values)]
+
+
+def _interpolated(value_at, n: int, q: float) -> float:
+    """
+    quantile با درون‌یابی خطی بین دو rank مجاور (همان روش پیش‌فرض pandas/NumPy).
+
+    value_at(k) مقدار k-امین عضو مرتب‌شده (0-based) را برمی‌گرداند.
+    """
+    if n == 0:
+        return float("nan")
+    pos = q * (n - 1)
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, n - 1)
+    v_lo = value_at(lo)
+    frac = pos - lo
+    if frac == 0.0 or hi == lo:
+        return float(v_lo)
+    return float(v_lo + (value_at(hi) - v_lo) * frac)
+
+
+@dataclass
+class Moments:
+    """
+    گشتاورهای جاری یک ستون (بدون نگه داشتن مقادیر).
+
+    - total جمع مستقیم مقادیر است (برای نسبت‌هایی مثل صرفه‌جویی انرژی کل)
+    - m2 = Σ(x - mean)² با فرمول ادغام Chan؛ پایدار برای N بزرگ
+    """
+    count: int = 0
+    total: float = 0.0
+    m2: float = 0.0
+    min: float = math.inf
+    max: float = -math.inf
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else float("nan")
+
+    @property
+    def std(self) -> float:
+        """انحراف معیار نمونه (ddof=1، مانند pandas)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float("nan")
+
+    def add(self, values) -> None:
+        values = _finite(values)
+        if len(values) == 0:
+            return
+        mean = float(values.mean())
+        self.merge(Moments(
+            count=len(values),
+            total=float(values.sum()),
+            m2=float(np.square(values - mean).sum()),
+            min=float(values.min()),
+            max=float(values.max()),
+        ))
+
+    def merge(self, other: Moments) -> None:
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.total, self.m2, self.min, self.max = other.count, other.total, other.m2, other.min, other.max
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+
+class CountTable:
+    """
+    جدول تعداد مقادیر یک ستون گسسته (مثلاً sf_new یا tp_new گرد‌شده).
+
+    حافظه به تعداد مقادیر متمایز بستگی دارد (برای SF و TP حداکثر چند ده)، نه به N.
+    """
+
+    def __init__(self):
+        self.counts: dict[float, int] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, values) -> None:
+        uniq, cnt = np.unique(_finite(values), return_counts=True)
+        for value, c in zip(uniq.tolist(), cnt.tolist()):
+            self.counts[value] = self.counts.get(value, 0) + c
+
+    def merge(self, other: CountTable) -> None:
+        for value, c in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + c
+
+    def top(self, n: int) -> list[tuple[float, int]]:
+        """n مقدار پرتکرار (تعداد نزولی؛ در تساوی، مقدار کوچک‌تر اول)."""
+        return sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))[:n]
+
+    def mode(self) -> float:
+        """پرتکرارترین مقدار (در تساوی کوچک‌ترین، مانند Series.mode().iloc[0])."""
+        return self.top(1)[0][0]
+
+    def quantile(self, q: float) -> float:
+        """quantile دقیق از روی جدول تعداد."""
+        values = np.array(sorted(self.counts))
+        cum = np.cumsum([self.counts[v] for v in values])
+        n = int(cum[-1]) if len(cum) else 0
+        return _interpolated(lambda k: values[np.searchsorted(cum, k, side="right")], n, q)
+
+
+class _BucketStore:
+    """آرایه متراکم تعداد bucketها با offset (اندیس bucket اول)؛ در صورت نیاز بزرگ می‌شود."""
+
+    def __init__(self):
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _cover(self, lo: int, hi: int) -> None:
+        """بزرگ کردن آرایه تا بازه اندیس‌های [lo, hi] را پوشش دهد."""
+        if len(self.counts) == 0:
+            self.offset, self.counts = lo, np.zeros(hi - lo + 1, dtype=np.int64)
+            return
+        new_lo = min(lo, self.offset)
+        new_hi = max(hi, self.offset + len(self.counts) - 1)
+        if new_lo == self.offset and new_hi == self.offset + len(self.counts) - 1:
+            return
+        grown = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+        grown[self.offset - new_lo:self.offset - new_lo + len(self.counts)] = self.counts
+        self.offset, self.counts = new_lo, grown
+
+    def add(self, index: np.ndarray) -> None:
+        if len(index) == 0:
+            return
+        lo, hi = int(index.min()), int(index.max())
+        self._cover(lo, hi)
+        self.counts[lo - self.offset:hi - self.offset + 1] += np.bincount(index - lo, minlength=hi - lo + 1)
+
+    def merge(self, other: _BucketStore) -> None:
+        if len(other.counts) == 0:
+            return
+        self._cover(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        self.counts[start:start + len(other.counts)] += other.counts
+
+    def nonzero(self) -> tuple[np.ndarray, np.ndarray]:
+        """(اندیس bucketها، تعداد) فقط برای bucketهای غیرخالی، به ترتیب صعودی اندیس."""
+        idx = np.flatnonzero(self.counts)
+        return idx + self.offset, self.counts[idx]
+
+
+class QuantileSketch:
+    """
+    sketch quantile با خطای نسبی محدود (ایده DDSketch).
+
+    - هر مقدار x > 0 در bucket i = ceil(log_γ x) قرار می‌گیرد، γ = (1+α)/(1-α)
+    - نماینده bucket i مقدار 2γ^i/(γ+1) است؛ خطای نسبی quantile حداکثر α است
+    - مقادیر منفی در store جداگانه (با |x|) و مقادیر نزدیک صفر (|x| < min_value) در یک شمارنده صفر
+    - دو sketch با α یکسان با جمع ساده تعداد bucketها ادغام می‌شوند (نتیجه مستقل از ترتیب/تقسیم داده)
+    """
+
+    def __init__(self, alpha: float | None = None, min_value: float = 1e-9):
+        self.alpha = config.KPI_SKETCH_ALPHA if alpha is None else float(alpha)
+        if not 0.0 < self.alpha < 1.0:
+            raise ValueError(f"alpha must be in (0, 1), got {self.alpha}")
+        self.gamma = (1.0 + self.alpha) / (1.0 - self.alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = float(min_value)
+        self.positive = _BucketStore()
+        self.negative = _BucketStore()
+        self.zero = 0
+        self.count = 0
+
+    def _index(self, magnitude: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(magnitude) / self._log_gamma).astype(np.int64)
+
+    def _value(self, index: np.ndarray) -> np.ndarray:
+        return 2.0 * np.power(self.gamma, index.astype(np.float64)) / (self.gamma + 1.0)
+
+    def add(self, values) -> None:
+        values = _finite(values)
+        pos = values[values >= self.min_value]
+        neg = values[values <= -self.min_value]
+        self.positive.add(self._index(pos))
+        self.negative.add(self._index(-neg))
+        self.zero += len(values) - len(pos) - len(neg)
+        self.count += len(values)
+
+    def merge(self, other: QuantileSketch) -> None:
+        if other.gamma != self.gamma:
+            raise ValueError(f"Cannot merge sketches with different alpha ({self.alpha} vs {other.alpha})")
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero += other.zero
+        self.count += other.count
+
+    def _sorted_buckets(self) -> tuple[np.ndarray, np.ndarray]:
+        """(مقدار نماینده، تعداد) همه bucketهای غیرخالی به ترتیب صعودی مقدار."""
+        n_idx, n_cnt = self.negative.nonzero()
+        p_idx, p_cnt = self.positive.nonzero()
+        values = np.concatenate([-self._value(n_idx[::-1]), [0.0], self._value(p_idx)])
+        counts = np.concatenate([n_cnt[::-1], [self.zero], p_cnt])
+        return values, counts
+
+    def quantile(self, q: float) -> float:
+        values, counts = self._sorted_buckets()
+        cum = np.cumsum(counts)
+        return _interpolated(lambda k: values[np.searchsorted(cum, k, side="right")], self.count, q)
+
+
+class KPIAggregator:
+    """
+    همه KPIهای tpc_decisions.csv در یک گذر.
+
+    - add(chunk): افزودن یک DataFrame (هر تعداد سطر)
+    - merge(other): ادغام نتیجه یک shard دیگر (با همان with_optimal و alpha)
+    - summary(): دیکشنری KPIها با همان کلیدهای summarize_results
+    """
+
+    def __init__(self, with_optimal: bool = False, alpha: float | None = None):
+        self.with_optimal = with_optimal
+        self.rows = 0
+        self.moments = {c: Moments() for c in ("energy_norm", "tp_new", "me")}
+        self.tables = {"sf_new": CountTable(), "tp_new": CountTable()}
+        self.sketches = {c: QuantileSketch(alpha) for c in ("energy_norm", "me")}
+        self.thresholds = dict.fromkeys(("energy_below_1", "energy_below_0_5", "me_ge_0"), 0)
+        if with_optimal:
+            self.moments["energy_norm_opt"] = Moments()
+            self.sketches["energy_norm_opt"] = QuantileSketch(alpha)
+            self.thresholds.update(dict.fromkeys(("me_opt_ge_0", "opt_better"), 0))
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        energy = chunk["energy_norm"].to_numpy(dtype=np.float64)
+        me = chunk["me"].to_numpy(dtype=np.float64)
+        tp = chunk["tp_new"].to_numpy(dtype=np.float64)
+
+        self.rows += len(chunk)
+        self.moments["energy_norm"].add(energy)
+        self.moments["tp_new"].add(tp)
+        self.moments["me"].add(me)
+        self.tables["sf_new"].add(chunk["sf_new"].to_numpy(dtype=np.float64))
+        # گام TP معمولاً 1 dBm است؛ round(1) مقادیر float را یکتا می‌کند
+        self.tables["tp_new"].add(np.round(tp, 1))
+        self.sketches["energy_norm"].add(energy)
+        self.sketches["me"].add(me)
+
+        self.thresholds["energy_below_1"] += int(np.count_nonzero(energy < 1.0))
+        self.thresholds["energy_below_0_5"] += int(np.count_nonzero(energy < 0.5))
+        self.thresholds["me_ge_0"] += int(np.count_nonzero(me >= 0.0))
+
+        if self.with_optimal:
+            opt_e = chunk["energy_norm_opt"].to_numpy(dtype=np.float64)
+            self.moments["energy_norm_opt"].add(opt_e)
+            self.sketches["energy_norm_opt"].add(opt_e)
+            self.thresholds["me_opt_ge_0"] += int(np.count_nonzero(chunk["me_opt"].to_numpy() >= 0.0))
+            self.thresholds["opt_better"] += int(np.count_nonzero(opt_e < energy))
+
+    def merge(self, other: KPIAggregator) -> KPIAggregator:
+        if other.with_optimal != self.with_optimal:
+            raise ValueError("Cannot merge aggregates with and without the *_opt columns")
+        self.rows += other.rows
+        for name, m in other.moments.items():
+            self.moments[name].merge(m)
+        for name, t in other.tables.items():
+            self.tables[name].merge(t)
+        for name, s in other.sketches.items():
+            self.sketches[name].merge(s)
+        for name, c in other.thresholds.items():
+            self.thresholds[name] += c
+        return self
+
+    def _pct(self, name: str) -> float:
+        return self.thresholds[name] / self.rows * 100 if self.rows else float("nan")
+
+    def summary(self) -> dict:
+        """
+        KPIهای خلاصه (میانه‌های energy_norm و me تقریبی با خطای نسبی alpha؛ بقیه دقیق).
+        """
+        sf, tp = self.tables["sf_new"], self.tables["tp_new"]
+        summary = {
+            "count": int(self.rows),
+
+            # -----------------------------
+            # Energy (Proxy) KPIs
+            # -----------------------------
+            # میانگین energy_norm (نسبت به baseline)
+            "energy_norm_mean": self.moments["energy_norm"].mean,
+
+            # میانه energy_norm (از sketch؛ گاهی از میانگین مقاوم‌تر است، مخصوصاً اگر outlier داشته باشیم)
+            "energy_norm_median": self.sketches["energy_norm"].quantile(0.5),
+
+            # درصد نمونه‌هایی که energy_norm < 1 => بهتر از baseline
+            "pct_energy_below_1": self._pct("energy_below_1"),
+
+            # درصد نمونه‌هایی که energy_norm < 0.5 => حداقل 50% بهتر از baseline (proxy)
+            "pct_energy_below_0_5": self._pct("energy_below_0_5"),
+
+            # -----------------------------
+            # SF KPIs (از جدول تعداد)
+            # -----------------------------
+            "sf_mode": int(sf.mode()),
+            "sf_min": int(min(sf.counts)),
+            "sf_max": int(max(sf.counts)),
+            "sf_top_counts": {str(int(v)): c for v, c in sf.top(6)},
+
+            # -----------------------------
+            # TP KPIs (میانه دقیق از جدول تعداد)
+            # -----------------------------
+            "tp_mean": self.moments["tp_new"].mean,
+            "tp_median": tp.quantile(0.5),
+            "tp_min": self.moments["tp_new"].min,
+            "tp_max": self.moments["tp_new"].max,
+            "tp_top_counts": {str(v): c for v, c in tp.top(8)},
+
+            # -----------------------------
+            # Margin (Me) KPIs
+            # -----------------------------
+            "me_mean": self.moments["me"].mean,
+            "me_median": self.sketches["me"].quantile(0.5),
+
+            # درصد نمونه‌هایی که margin غیرمنفی است (یعنی لینک از نظر شرط ما “ایمن/قابل قبول” است)
+            "pct_me_ge_0": self._pct("me_ge_0"),
+        }
+
+        # Greedy vs Optimal (فقط اگر ستون‌های *_opt در فایل باشند)
+        if self.with_optimal:
+            greedy_total = self.moments["energy_norm"].total
+            summary.update({
+                "energy_norm_opt_mean": self.moments["energy_norm_opt"].mean,
+                "energy_norm_opt_median": self.sketches["energy_norm_opt"].quantile(0.5),
+                "pct_me_opt_ge_0": self._pct("me_opt_ge_0"),
+
+                # کاهش انرژی کل optimal نسبت به greedy (درصد)
+                "energy_opt_vs_greedy_saving_pct": (1.0 - self.moments["energy_norm_opt"].total / greedy_total) * 100,
+
+                # درصد نمونه‌هایی که optimal تصمیمی کم‌مصرف‌تر از greedy یافته است
+                "pct_opt_better_than_greedy": self._pct("opt_better"),
+            })
+        return summary
+
+
+# =============================================================================
+# خواندن shardهای CSV
+# =============================================================================
+
+def csv_header(path: Path) -> tuple[list[str], int]:
+    """(نام ستون‌ها، offset بایتی اولین سطر داده)."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        return header.decode("utf-8").strip().split(","), f.tell()
+
+
+def csv_shards(path: Path, n_shards: int) -> list[tuple[int, int]]:
+    """
+    تقسیم بخش داده یک CSV به n_shards بازه بایتی [start, end) که هر کدام دقیقاً روی ابتدای سطر شروع می‌شوند.
+
+    (ستون‌های tpc_decisions.csv عددی‌اند، پس newline داخل مقدار نقل‌قول‌شده وجود ندارد.)
+    """
+    _, data_start = csv_header(path)
+    size = os.path.getsize(path)
+    bounds = [data_start]
+    with open(path, "rb") as f:
+        for k in range(1, n_shards):
+            target = data_start + (size - data_start) * k // n_shards
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()  # تا ابتدای سطر بعدی (اگر target دقیقاً ابتدای سطر باشد همان‌جا می‌ماند)
+            if f.tell() < size:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def iter_csv_range(
+    path: Path,
+    start: int,
+    end: int,
+    columns: list[str],
+    usecols: list[str],
+    block_bytes: int
+) -> Iterator[pd.DataFrame]:
+    """
+    خواندن بازه بایتی [start, end) یک CSV به صورت بلوک‌های حدوداً block_bytes بایتی (هر بلوک تا پایان سطر).
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        while f.tell() < end:
+            block = f.read(min(block_bytes, end - f.tell()))
+            if f.tell() < end and not block.endswith(b"\n"):
+                block += f.readline()
+            yield pd.read_csv(io.BytesIO(block), header=None, names=columns, usecols=usecols)
+
+
+def aggregate_csv(
+    path: Path,
+    start: int | None = None,
+    end: int | None = None,
+    block_bytes: int | None = None,
+    alpha: float | None = None
+) -> KPIAggregator:
+    """
+    جمع کردن KPIهای یک فایل (یا یک shard بایتی از آن) در یک KPIAggregator.
+
+    - start/end: بازه بایتی (پیش‌فرض کل بخش داده)؛ خروجی csv_shards
+    - حافظه: حدود block_bytes (config.KPI_CHUNK_BYTES) به علاوه اندازه ثابت sketchها
+    """
+    path = Path(path)
+    block_bytes = config.KPI_CHUNK_BYTES if block_bytes is None else int(block_bytes)
+    columns, data_start = csv_header(path)
+
+    missing = set(REQUIRED_COLUMNS) - set(columns)
+    if missing:
+        raise ValueError(f"Missing required columns in {path.name}: {missing}")
+    with_optimal = set(OPTIMAL_COLUMNS).issubset(columns)
+    usecols = list(REQUIRED_COLUMNS) + (list(OPTIMAL_COLUMNS) if with_optimal else [])
+
+    start = data_start if start is None else start
+    end = os.path.getsize(path) if end is None else end
+    agg = KPIAggregator(with_optimal=with_optimal, alpha=alpha)
+    for chunk in iter_csv_range(path, start, end, columns, usecols, block_bytes):
+        agg.add(chunk)
+    return agg
+
+
+def _aggregate_shard(task: tuple[str, int, int, int, float | None]) -> KPIAggregator:
+    path, start, end, block_bytes, alpha = task
+    return aggregate_csv(Path(path), start, end, block_bytes=block_bytes, alpha=alpha)
+
+
+def _merge_all(parts: Iterator[KPIAggregator]) -> KPIAggregator:
+    result = next(parts)
+    for part in parts:
+        result.merge(part)
+    return result
+
+
+def aggregate_files(
+    paths: list[Path],
+    workers: int = 1,
+    block_bytes: int | None = None,
+    alpha: float | None = None
+) -> KPIAggregator:
+    """
+    KPIهای یک یا چند فایل تصمیم (مثلاً خروجی چند اجرای جداگانه) در یک KPIAggregator ادغام‌شده.
+
+    - workers > 1: هر فایل به workers بازه بایتی تقسیم و shardها در یک process pool جمع می‌شوند
+    - نتیجه ادغام مستقل از تعداد shardهاست (جز خطای گرد کردن ممیز شناور در جمع‌ها)
+    """
+    block_bytes = config.KPI_CHUNK_BYTES if block_bytes is None else int(block_bytes)
+    workers = max(1, int(workers))
+    tasks = [
+        (str(p), start, end, block_bytes, alpha)
+        for p in paths
+        for start, end in csv_shards(Path(p), workers)
+    ]
+    if not tasks:
+        raise ValueError("No decision rows to summarize")
+
+    if workers == 1 or len(tasks) == 1:
+        return _merge_all(map(_aggregate_shard, tasks))
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return _merge_all(pool.map(_aggregate_shard, tasks))
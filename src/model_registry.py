@@ -0,0 +1,327 @@
+"""
+هدف این فایل:
+- یک «رجیستری مدل» (ModelRegistry) روی پوشه config.TRAINED_MODELS_DIR
+
+مشکل:
+- run_pipeline (و serve) مستقیماً joblib.load صدا می‌زنند؛ io_utils.load_model هم بعد از joblib
+  به pickle کامل برمی‌گردد. هیچ‌کدام کش ندارند و قبل از unpickle کامل سازگاری را بررسی نمی‌کنند.
+- برای یک RandomForest با 300 درخت، همین بارگذاری زمان شروع را کند می‌کند.
+
+راه‌حل:
+1) فایل metadata کنار هر مدل (sidecar JSON؛ مثلاً ridge.meta.json) شامل:
+   نسخه sklearn، کلاس مدل، نام ویژگی‌ها، sha256 و اندازه فایل، متریک‌های آموزش
+   => سازگاری بدون unpickle بررسی می‌شود (check)
+2) بارگذاری با joblib.load(mmap_mode="r"): آرایه‌های بزرگ numpy به صورت memory-map باز می‌شوند
+   و workerهای fork‌شده صفحات حافظه را به اشتراک می‌گذارند
+3) کش LRU درون‌پروسه‌ای از مدل‌های بارگذاری‌شده (config.MODEL_CACHE_SIZE)
+4) ثبت زمان بارگذاری هر مدل (load_times و report)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import platform
+import time
+import warnings
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import sklearn
+from sklearn.exceptions import InconsistentVersionWarning
+
+from . import config
+from .preprocessing import FeaturePreprocessor, load_preprocessor, preprocessor_path
+
+
+# پسوند فایل metadata کنار فایل مدل (ridge.joblib => ridge.meta.json)
+SIDECAR_SUFFIX = ".meta.json"
+
+
+def sidecar_path(model_path: Path) -> Path:
+    """مسیر فایل metadata مربوط به یک فایل مدل (در همان پوشه)."""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + SIDECAR_SUFFIX)
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """sha256 محتوای فایل (بلوک به بلوک)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _feature_names(model, preprocessor: FeaturePreprocessor | None) -> list[str] | None:
+    if preprocessor is not None:
+        return list(preprocessor.feature_names)
+    names = getattr(model, "feature_names_in_", None)
+    return None if names is None else [str(c) for c in names]
+
+
+def build_metadata(
+    model_path: Path,
+    model,
+    metrics: dict | None = None,
+    preprocessor: FeaturePreprocessor | None = None,
+    sklearn_version: str | None = None
+) -> dict:
+    """
+    ساخت metadata یک فایل مدل ذخیره‌شده.
+
+    sklearn_version: نسخه sklearn که مدل با آن ساخته شده (پیش‌فرض: نسخه نصب‌شده)
+    """
+    model_path = Path(model_path)
+    return {
+        "artifact": model_path.name,
+        "model_class": f"{type(model).__module__}.{type(model).__qualname__}",
+        "sklearn_version": sklearn_version or sklearn.__version__,
+        "python_version": platform.python_version(),
+        "feature_names": _feature_names(model, preprocessor),
+        "preprocessor": preprocessor_path(model_path).name if preprocessor is not None else None,
+        "sha256": file_sha256(model_path),
+        "size_bytes": model_path.stat().st_size,
+        "metrics": metrics or {},
+        "created_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write_sidecar(model_path: Path, metadata: dict) -> None:
+    path = sidecar_path(model_path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    tmp.replace(path)
+
+
+def read_sidecar(model_path: Path) -> dict | None:
+    """خواندن metadata (بدون unpickle مدل)؛ اگر فایل نباشد None."""
+    try:
+        with open(sidecar_path(model_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _minor(version: str) -> tuple[str, ...]:
+    return tuple(version.split(".")[:2])
+
+
+class ModelRegistry:
+    """
+    دسترسی به مدل‌های ذخیره‌شده در یک پوشه با metadata، memory-map و کش LRU.
+
+    استفاده:
+        registry = default_registry()
+        model = registry.load("ridge.joblib")
+        pre = registry.preprocessor("ridge.joblib")
+        print(registry.report())
+    """
+
+    def __init__(self, root: Path | None = None, capacity: int | None = None, mmap_mode: str | None = "default"):
+        self.root = Path(root or config.TRAINED_MODELS_DIR)
+        self.capacity = int(config.MODEL_CACHE_SIZE if capacity is None else capacity)
+        self.mmap_mode = config.MODEL_MMAP_MODE if mmap_mode == "default" else mmap_mode
+
+        # کش LRU: name -> (mtime_ns, model)؛ ترتیب OrderedDict = ترتیب استفاده اخیر
+        self._cache: OrderedDict[str, tuple[int, object]] = OrderedDict()
+        self._preprocessors: dict[str, tuple[int, FeaturePreprocessor | None]] = {}
+
+        # زمان بارگذاری (ثانیه) آخرین بار که هر مدل از دیسک خوانده شد
+        self.load_times: dict[str, float] = {}
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    # -------------------------------------------------------------------------
+    # ثبت مدل (در train_baselines)
+    # -------------------------------------------------------------------------
+    def register(
+        self,
+        name: str,
+        model,
+        metrics: dict | None = None,
+        preprocessor: FeaturePreprocessor | None = None
+    ) -> dict:
+        """
+        ذخیره مدل (بدون فشرده‌سازی تا قابل memory-map باشد)، پیش‌پردازنده و فایل metadata.
+
+        خروجی:
+        - metadata نوشته‌شده
+        """
+        model_path = self.path(name)
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        # نوشتن در فایل موقت و جایگزینی اتمی (مانند write_sidecar): مدلی که همین حالا با mmap از
+        # همین فایل بارگذاری شده (مثلاً checkpoint مدل online) حین نوشتن خوانده می‌شود و
+        # نباید فایل زیر پایش کوتاه شود؛ خواننده‌های دیگر هم هیچ‌وقت فایل نیمه‌نوشته نمی‌بینند
+        tmp = model_path.with_name(model_path.name + ".tmp")
+        joblib.dump(model, tmp)
+        tmp.replace(model_path)
+        if preprocessor is not None:
+            preprocessor.save(preprocessor_path(model_path))
+
+        metadata = build_metadata(model_path, model, metrics=metrics, preprocessor=preprocessor)
+        write_sidecar(model_path, metadata)
+
+        # نسخه قدیمی کش‌شده (اگر بود) دیگر معتبر نیست
+        self._cache.pop(name, None)
+        self._preprocessors.pop(name, None)
+        return metadata
+
+    def describe_existing(self, name: str, metrics: dict | None = None) -> dict:
+        """
+        ساخت فایل metadata برای مدلی که قبلاً بدون sidecar ذخیره شده است.
+
+        مدل یک بار unpickle می‌شود؛ اگر با نسخه دیگری از sklearn ساخته شده باشد، نسخه اصلی
+        از InconsistentVersionWarning خوانده و در metadata ثبت می‌شود.
+        """
+        model_path = self.path(name)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", InconsistentVersionWarning)
+            model = joblib.load(model_path)
+        versions = [w.message.original_sklearn_version for w in caught if issubclass(w.category, InconsistentVersionWarning)]
+
+        metadata = build_metadata(
+            model_path, model, metrics=metrics,
+            preprocessor=load_preprocessor(model_path),
+            sklearn_version=versions[0] if versions else None,
+        )
+        write_sidecar(model_path, metadata)
+        return metadata
+
+    # -------------------------------------------------------------------------
+    # metadata و سازگاری (بدون unpickle)
+    # -------------------------------------------------------------------------
+    def metadata(self, name: str) -> dict | None:
+        return read_sidecar(self.path(name))
+
+    def check(self, name: str, feature_names: list[str] | None = None, verify_hash: bool = False) -> list[str]:
+        """
+        بررسی سازگاری یک مدل فقط از روی metadata.
+
+        خروجی:
+        - لیست مشکلات (خالی یعنی سازگار)؛ مثلاً نبود sidecar، نسخه متفاوت sklearn،
+          نام ویژگی‌های متفاوت یا (با verify_hash) تغییر محتوای فایل
+        """
+        model_path = self.path(name)
+        if not model_path.exists():
+            return [f"{name}: file not found in {self.root}"]
+
+        meta = read_sidecar(model_path)
+        if meta is None:
+            return [f"{name}: no metadata sidecar ({sidecar_path(model_path).name})"]
+
+        problems = []
+        if _minor(meta.get("sklearn_version", "")) != _minor(sklearn.__version__):
+            problems.append(
+                f"{name}: trained with scikit-learn {meta.get('sklearn_version')}, running {sklearn.__version__}"
+            )
+        if feature_names is not None and meta.get("feature_names") not in (None, list(feature_names)):
+            problems.append(f"{name}: feature names differ from the model metadata")
+        if meta.get("size_bytes") != model_path.stat().st_size:
+            problems.append(f"{name}: file size differs from the model metadata")
+        elif verify_hash and meta.get("sha256") != file_sha256(model_path):
+            problems.append(f"{name}: sha256 differs from the model metadata")
+        return problems
+
+    # -------------------------------------------------------------------------
+    # بارگذاری با کش LRU
+    # -------------------------------------------------------------------------
+    def load(self, name: str, strict: bool = False):
+        """
+        بارگذاری مدل (از کش LRU یا از دیسک با mmap_mode).
+
+        - اگر فایل روی دیسک تغییر کرده باشد (mtime متفاوت) نسخه کش‌شده کنار گذاشته می‌شود
+        - مشکلات check قبل از unpickle گزارش می‌شوند: strict=True => ValueError، وگرنه warning
+        """
+        model_path = self.path(name)
+        mtime = model_path.stat().st_mtime_ns
+
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            self._cache.move_to_end(name)
+            return cached[1]
+
+        problems = self.check(name)
+        if problems:
+            if strict:
+                raise ValueError("; ".join(problems))
+            for p in problems:
+                warnings.warn(p, stacklevel=2)
+
+        t0 = time.perf_counter()
+        with warnings.catch_warnings():
+            # نسخه متفاوت sklearn در بالا (از روی metadata) گزارش شده است
+            if problems:
+                warnings.simplefilter("ignore", InconsistentVersionWarning)
+            model = joblib.load(model_path, mmap_mode=self.mmap_mode)
+        self.load_times[name] = time.perf_counter() - t0
+
+        self._cache[name] = (mtime, model)
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        return model
+
+    def preprocessor(self, name: str) -> FeaturePreprocessor | None:
+        """پیش‌پردازنده کنار مدل (کش‌شده)؛ برای مدل‌های قدیمی None."""
+        path = preprocessor_path(self.path(name))
+        mtime = path.stat().st_mtime_ns if path.exists() else -1
+        cached = self._preprocessors.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_preprocessor(self.path(name)))
+            self._preprocessors[name] = cached
+        return cached[1]
+
+    def cached(self) -> list[str]:
+        """نام مدل‌های موجود در کش (از قدیمی‌ترین به تازه‌ترین استفاده)."""
+        return list(self._cache)
+
+    def report(self) -> pd.DataFrame:
+        """جدول زمان بارگذاری هر مدل (ms) به همراه اندازه فایل و وضعیت کش."""
+        rows = []
+        for name, seconds in self.load_times.items():
+            path = self.path(name)
+            rows.append({
+                "model": name,
+                "load_ms": seconds * 1000.0,
+                "size_kb": path.stat().st_size / 1024.0 if path.exists() else float("nan"),
+                "cached": name in self._cache,
+            })
+        return pd.DataFrame(rows, columns=["model", "load_ms", "size_kb", "cached"])
+
+
+# -----------------------------------------------------------------------------
+# رجیستری پیش‌فرض پروسه (روی config.TRAINED_MODELS_DIR)
+# -----------------------------------------------------------------------------
+_DEFAULT_REGISTRY: ModelRegistry | None = None
+
+
+def default_registry() -> ModelRegistry:
+    global _DEFAULT_REGISTRY
+    if _DEFAULT_REGISTRY is None or _DEFAULT_REGISTRY.root != Path(config.TRAINED_MODELS_DIR):
+        _DEFAULT_REGISTRY = ModelRegistry()
+    return _DEFAULT_REGISTRY
+
+
+if __name__ == "__main__":
+    # python -m src.model_registry
+    # ساخت metadata برای مدل‌های بدون sidecar (با متریک‌های model_metrics.csv) و گزارش سازگاری
+    registry = default_registry()
+    metrics = {}
+    if config.MODEL_METRICS_CSV.exists():
+        table = pd.read_csv(config.MODEL_METRICS_CSV)
+        metrics = {f"{r['model']}.joblib": {"rmse": r["rmse"], "r2": r["r2"]} for r in table.to_dict("records")}
+
+    for path in sorted(registry.root.glob("*.joblib")):
+        if path.name.endswith(".preprocessor.joblib"):
+            continue
+        if registry.metadata(path.name) is None:
+            registry.describe_existing(path.name, metrics=metrics.get(path.name))
+            print("Wrote", sidecar_path(path).name)
+        for problem in registry.check(path.name, verify_hash=True) or [f"{path.name}: OK"]:
+            print(problem)
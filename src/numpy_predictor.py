@@ -0,0 +1,174 @@
+"""
+هدف این فایل:
+- پیش‌بینی SNR فقط با NumPy از روی فایل .npz صادرشده (export_numpy.py)، بدون sklearn و joblib
+
+مشکل:
+- هر پیش‌بینی با مدل ذخیره‌شده یعنی import کردن sklearn (صدها میلی‌ثانیه) و unpickle کامل estimator.
+- ولی ridge.joblib در عمل فقط یک ضرب داخلی است و Pipeline(StandardScaler, SVR) فقط
+  یک استانداردسازی و جمع kernel RBF روی support vectorها؛ gateway/دستگاه‌های edge به sklearn نیاز ندارند.
+
+راه‌حل:
+- فایل .npz فقط آرایه‌های عددی (بدون pickle؛ np.load با allow_pickle=False):
+    format_version, kind ("linear" یا "svr_rbf"), feature_names
+    medians (اختیاری): میانه‌های FeaturePreprocessor برای پر کردن NaN
+    scaler_mean, scaler_scale (اختیاری): StandardScaler داخل Pipeline
+    linear:  coef, intercept                     => y = x·coef + intercept
+    svr_rbf: support_vectors, dual_coef, gamma, intercept
+             => y = Σ dual_coef_i · exp(-gamma·‖x - sv_i‖²) + intercept
+- این ماژول فقط numpy و کتابخانه استاندارد را import می‌کند (هیچ import نسبی از src)؛
+  پس می‌توان همین یک فایل را کنار .npz روی gateway کپی کرد.
+
+مسیرها:
+- predict(X): batch؛ فاصله‌های RBF به صورت ‖x‖² + ‖sv‖² - 2·x·svᵀ (یک ضرب ماتریسی برای هر بلوک سطر)
+- predict_one(x): مسیر سریع تک‌سطری (چند عمل برداری روی آرایه‌های از پیش آماده، در حد میکروثانیه)
+- predict_record(record): یک uplink به صورت dict (همان قواعد FeaturePreprocessor.transform_one)
+
+دقت:
+- تبدیل‌ها همان ترتیب عملیات sklearn را دارند ((x - mean) / scale، سپس ضرب داخلی یا kernel)؛
+  اختلاف با مدل sklearn فقط در حد خطای گرد کردن float64 است (sanity_check و export_numpy بررسی می‌کنند).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Mapping
+
+import numpy as np
+
+
+# نسخه قالب فایل .npz؛ با تغییر ناسازگار کلیدها افزایش می‌یابد
+FORMAT_VERSION = 1
+KINDS = ("linear", "svr_rbf")
+
+# پسوند فایل صادرشده در کنار فایل مدل (ridge.joblib => ridge.npz)
+NPZ_SUFFIX = ".npz"
+
+# حداکثر سطرهای هر بلوک در predict مدل svr_rbf (ماتریس فاصله بلوک × n_support_vectors)
+_SVR_BLOCK_ROWS = 4096
+
+
+def _f64(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def record_to_row(record: Mapping[str, object], feature_names: list[str], medians: np.ndarray | None) -> np.ndarray:
+    """
+    یک uplink (dict) به آرایه float64 با شکل (n_features,) (مشترک NumpyPredictor و flat_forest.FlatForest).
+
+    همان قواعد FeaturePreprocessor.transform_one: کلید اضافی نادیده، کلید گمشده/None/NaN/غیرعددی => میانه.
+    """
+    if medians is None:
+        raise ValueError("This export has no preprocessor medians; pass a numeric feature vector instead")
+    row = np.empty(len(feature_names), dtype=np.float64)
+    for j, name in enumerate(feature_names):
+        try:
+            v = float(record.get(name))
+        except (TypeError, ValueError):
+            v = medians[j]
+        row[j] = medians[j] if v != v else v
+    return row
+
+
+class NumpyPredictor:
+    """
+    پیش‌بینی‌کننده بدون sklearn روی آرایه‌های یک فایل .npz.
+
+    فیلدها:
+    - kind، feature_names، n_features
+    - medians: میانه‌های آموزش برای predict_record (None اگر مدل بدون پیش‌پردازنده صادر شده باشد)
+    - بقیه آرایه‌ها float64 و پیوسته در حافظه (برای predict_one بدون کپی)
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        version = int(arrays["format_version"])
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format version {version} (expected {FORMAT_VERSION})")
+        self.kind = str(arrays["kind"])
+        if self.kind not in KINDS:
+            raise ValueError(f"Unknown model kind {self.kind!r} (expected one of {KINDS})")
+
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+        n = len(self.feature_names)
+        self.medians = _f64(arrays["medians"]) if "medians" in arrays else None
+        self.intercept = float(arrays["intercept"])
+
+        # StandardScaler اختیاری؛ بدون آن x مستقیماً به مدل داده می‌شود
+        if "scaler_mean" in arrays:
+            self.scaler_mean = _f64(arrays["scaler_mean"])
+            self.scaler_scale = _f64(arrays["scaler_scale"])
+        else:
+            self.scaler_mean = self.scaler_scale = None
+
+        if self.kind == "linear":
+            self.coef = _f64(arrays["coef"]).ravel()
+            if len(self.coef) != n:
+                raise ValueError(f"coef has {len(self.coef)} entries for {n} features")
+        else:
+            self.support_vectors = _f64(arrays["support_vectors"])
+            self.dual_coef = _f64(arrays["dual_coef"]).ravel()
+            self.gamma = float(arrays["gamma"])
+            if self.support_vectors.shape != (len(self.dual_coef), n):
+                raise ValueError(
+                    f"support_vectors shape {self.support_vectors.shape} does not match "
+                    f"{len(self.dual_coef)} dual coefficients and {n} features"
+                )
+            # ‖sv‖² یک بار محاسبه می‌شود (مسیر batch)
+            self.sv_sq_norms = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+
+    @classmethod
+    def load(cls, path: Path) -> "NumpyPredictor":
+        with np.load(path, allow_pickle=False) as f:
+            return cls({key: f[key] for key in f.files})
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    # -------------------------------------------------------------------------
+    # ورودی
+    # -------------------------------------------------------------------------
+    def _scale(self, X: np.ndarray) -> np.ndarray:
+        if self.scaler_mean is None:
+            return X
+        return (X - self.scaler_mean) / self.scaler_scale
+
+    def transform_one(self, record: Mapping[str, object]) -> np.ndarray:
+        """یک uplink (dict) به آرایه float64 با شکل (n_features,) (record_to_row)."""
+        return record_to_row(record, self.feature_names, self.medians)
+
+    # -------------------------------------------------------------------------
+    # پیش‌بینی
+    # -------------------------------------------------------------------------
+    def predict(self, X) -> np.ndarray:
+        """پیش‌بینی batch؛ X با شکل (n, n_features) به ترتیب feature_names (بدون NaN)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X must have shape (n, {self.n_features}), got {X.shape}")
+        Z = self._scale(X)
+        if self.kind == "linear":
+            return Z @ self.coef + self.intercept
+
+        out = np.empty(len(Z), dtype=np.float64)
+        for start in range(0, len(Z), _SVR_BLOCK_ROWS):
+            block = Z[start:start + _SVR_BLOCK_ROWS]
+            d2 = np.einsum("ij,ij->i", block, block)[:, None] + self.sv_sq_norms - 2.0 * (block @ self.support_vectors.T)
+            np.maximum(d2, 0.0, out=d2)  # خطای گرد کردن نباید فاصله منفی بدهد
+            out[start:start + len(block)] = np.exp(-self.gamma * d2) @ self.dual_coef + self.intercept
+        return out
+
+    def predict_one(self, x) -> float:
+        """پیش‌بینی یک سطر (آرایه با n_features مقدار)."""
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if len(x) != self.n_features:
+            raise ValueError(f"x must have {self.n_features} values, got {len(x)}")
+        z = self._scale(x)
+        if self.kind == "linear":
+            return float(z @ self.coef) + self.intercept
+        # تفاضل مستقیم (مانند libsvm) به جای بسط ‖x‖² + ‖sv‖² - 2·x·sv
+        diff = self.support_vectors - z
+        d2 = np.einsum("ij,ij->i", diff, diff)
+        return float(np.exp(-self.gamma * d2) @ self.dual_coef) + self.intercept
+
+    def predict_record(self, record: Mapping[str, object]) -> float:
+        """پیش‌بینی یک uplink (dict از نام ستون به مقدار)."""
+        return self.predict_one(self.transform_one(record))
@@ -0,0 +1,245 @@
+"""
+هدف این فایل:
+- یک مدل SNR «افزایشی» (online) کنار baselineهای Ridge/RF/SVR که با هر uplink جدید به‌روز می‌شود
+
+مشکل:
+- با هر داده جدید، train_baselines باید از صفر روی کل دیتاست اجرا شود.
+
+راه‌حل: Recursive Least Squares (RLSRegressor)
+- رگرسیون خطی روی ویژگی‌های استانداردشده + intercept، با وضعیت (w, P):
+    P = معکوس ماتریس (ZᵀZ + D) (با فراموشی λ)، w = ضرایب فعلی
+    D = diag(α, ..., α, 1/INTERCEPT_PRIOR): جریمه ridge فقط روی ضرایب؛ intercept (مانند sklearn Ridge)
+    عملاً جریمه نمی‌شود (واریانس پیشین بسیار بزرگ)
+- به‌روزرسانی هر نمونه O(d²) (d = تعداد ویژگی‌ها + 1؛ برای این دیتاست حدود 14):
+    k = P·z / (λ + zᵀ·P·z)
+    w ← w + k·(y - zᵀ·w)
+    P ← (P - k·(P·z)ᵀ) / λ
+- با λ = 1 نتیجه بعد از n نمونه دقیقاً جواب بسته (ZᵀZ + D)⁻¹Zᵀy روی همان n نمونه استانداردشده است، یعنی
+  sklearn Ridge(alpha=α) روی همان ویژگی‌ها تا اثر جریمه 1/INTERCEPT_PRIOR روی intercept (در حد 1e-6)؛
+  λ < 1 نمونه‌های قدیمی را به تدریج فراموش می‌کند (تعقیب تغییر کانال/فصل)
+- warm-up: مقیاس‌بندی (میانگین/انحراف معیار هر ویژگی) از اولین ONLINE_WARMUP نمونه یاد گرفته و سپس
+  ثابت می‌ماند؛ ویژگی‌های ثابت در warm-up کنار گذاشته می‌شوند (جهت بدون تحریک، P را با λ < 1 منفجر می‌کند).
+  پس warm-up باید از چند دستگاه باشد: در log مرتب بر اساس زمان دیتاست، اولین uplinkها همه از EN1 با
+  فاصله ثابت‌اند و distance عملاً کنار می‌رود (آموزش اولیه در train_baselines روی split تصادفی این مشکل را ندارد)
+- partial_fit / predict_partial_fit (پیش‌بینی prequential: هر نمونه اول پیش‌بینی، سپس یادگیری)
+- fit = شروع از صفر + partial_fit؛ پس مانند بقیه مدل‌ها در train_baselines آموزش و با ModelRegistry ذخیره می‌شود
+
+استفاده:
+- train_baselines: مدل rls کنار ridge/rf/svr (models_trained/rls.joblib)
+- run_pipeline --online-update: پیش‌بینی prequential و ذخیره checkpoint مدل به‌روزشده در models_trained/
+  (در حالت --stream هر ONLINE_CHECKPOINT_ROWS سطر)
+- benchmarks/replay.py: مقایسه RMSE prequential و سرعت به‌روزرسانی با بازآموزی دوره‌ای ridge.joblib
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+
+from . import config
+
+
+# واریانس پیشین intercept در P₀ (جریمه 1/INTERCEPT_PRIOR)؛ بزرگ تا intercept مانند sklearn Ridge آزاد باشد،
+# ولی محدود تا P₀ معکوس‌پذیر بماند
+INTERCEPT_PRIOR = 1e6
+
+
+class RLSRegressor(RegressorMixin, BaseEstimator):
+    """
+    رگرسیون خطی Recursive Least Squares با مقیاس‌بندی warm-up.
+
+    پارامترها:
+    - alpha: جریمه ridge ضرایب (P₀ = diag(1/alpha, ..., 1/alpha, INTERCEPT_PRIOR))
+    - forgetting: ضریب فراموشی λ در (0, 1]
+    - warmup: تعداد نمونه‌های اول برای یادگیری میانگین/انحراف معیار ویژگی‌ها
+
+    وضعیت یادگرفته‌شده (پس از warm-up):
+    - mean_، scale_ و active_ (ویژگی‌های غیرثابت)
+    - w_ (ضرایب فضای استانداردشده، آخرین درایه intercept) و P_
+    - n_samples_seen_
+    """
+
+    def __init__(self, alpha: float | None = None, forgetting: float | None = None, warmup: int | None = None):
+        self.alpha = alpha
+        self.forgetting = forgetting
+        self.warmup = warmup
+
+    # -------------------------------------------------------------------------
+    # پارامترها و وضعیت
+    # -------------------------------------------------------------------------
+    def _params(self) -> tuple[float, float, int]:
+        alpha = float(config.ONLINE_ALPHA if self.alpha is None else self.alpha)
+        lam = float(config.ONLINE_FORGETTING if self.forgetting is None else self.forgetting)
+        warmup = int(config.ONLINE_WARMUP if self.warmup is None else self.warmup)
+        if alpha <= 0:
+            raise ValueError(f"alpha must be > 0, got {alpha}")
+        if not 0 < lam <= 1:
+            raise ValueError(f"forgetting must be in (0, 1], got {lam}")
+        if warmup < 1:
+            raise ValueError(f"warmup must be >= 1, got {warmup}")
+        return alpha, lam, warmup
+
+    def _reset(self, n_features: int) -> None:
+        self.n_features_in_ = n_features
+        self.n_samples_seen_ = 0
+        self.w_ = None
+        self.P_ = None
+        self._warm_X: list[np.ndarray] = []
+        self._warm_y: list[np.ndarray] = []
+        self._warm_sum = 0.0
+
+    @property
+    def warmed_up(self) -> bool:
+        return getattr(self, "w_", None) is not None
+
+    def _finish_warmup(self) -> None:
+        """یادگیری مقیاس از نمونه‌های warm-up و اجرای RLS روی همان نمونه‌ها."""
+        X = np.concatenate(self._warm_X)
+        y = np.concatenate(self._warm_y)
+        alpha, _, _ = self._params()
+        self.mean_ = X.mean(axis=0)
+        scale = X.std(axis=0)
+        # ستون ثابت می‌تواند به دلیل گرد کردن میانگین std حدود 1e-16 داشته باشد (نه دقیقاً صفر)؛
+        # استانداردسازی با آن مقادیر بعدی را ~1e16 برابر و ماتریس P را بدحالت می‌کند
+        self.active_ = scale > np.sqrt(np.finfo(np.float64).eps) * np.maximum(np.abs(self.mean_), 1.0)
+        self.scale_ = np.where(self.active_, scale, 1.0)
+        d = int(self.active_.sum()) + 1
+        self.w_ = np.zeros(d)
+        self.P_ = np.eye(d) / alpha
+        self.P_[-1, -1] = INTERCEPT_PRIOR
+        self._warm_X, self._warm_y = [], []
+        self._update(self._design(X), y)
+
+    def _design(self, X: np.ndarray) -> np.ndarray:
+        """ماتریس طراحی z: ویژگی‌های فعال استانداردشده + ستون 1 (intercept)."""
+        Z = (X[:, self.active_] - self.mean_[self.active_]) / self.scale_[self.active_]
+        return np.hstack([Z, np.ones((len(X), 1))])
+
+    def _update(self, Z: np.ndarray, y: np.ndarray, predictions: np.ndarray | None = None) -> None:
+        """
+        حلقه RLS نمونه به نمونه (O(d²) برای هر نمونه).
+
+        P_ و w_ کپی و در پایان جایگزین می‌شوند (مدل بارگذاری‌شده با mmap آرایه‌های فقط‌خواندنی دارد).
+        predictions: اگر داده شود، پیش‌بینی هر نمونه قبل از یادگیری آن (prequential) در آن نوشته می‌شود.
+        """
+        _, lam, _ = self._params()
+        w = np.array(self.w_, dtype=np.float64)
+        P = np.array(self.P_, dtype=np.float64)
+        learned = 0
+        # ضرب‌های داخلی با (a * b).sum() به جای @: نتیجه BLAS برای آرایه‌های کوچک به هم‌ترازی (alignment)
+        # حافظه بستگی دارد و وضعیت نهایی را به اندازه batchهای partial_fit وابسته می‌کرد؛ ترتیب جمع
+        # sum در NumPy ثابت است، پس fit یک‌جا و partial_fit تکه‌تکه بیت‌به‌بیت همان w_/P_ را می‌دهند
+        for i in range(len(Z)):
+            z = Z[i]
+            pred = (z * w).sum()
+            if predictions is not None:
+                predictions[i] = pred
+            if y[i] != y[i]:
+                continue
+            learned += 1
+            Pz = (P * z).sum(axis=1)
+            k = Pz / (lam + (z * Pz).sum())
+            w = w + k * (y[i] - pred)
+            P = P - np.outer(k, Pz)
+            if lam != 1.0:
+                P = P / lam
+            P = 0.5 * (P + P.T)  # حفظ تقارن در برابر خطای گرد کردن
+        self.w_, self.P_ = w, P
+        self.n_samples_seen_ += learned
+
+    # -------------------------------------------------------------------------
+    # API سازگار با sklearn
+    # -------------------------------------------------------------------------
+    def _as_array(self, X) -> np.ndarray:
+        if hasattr(X, "columns"):
+            names = np.asarray([str(c) for c in X.columns], dtype=object)
+            if not hasattr(self, "feature_names_in_"):
+                self.feature_names_in_ = names
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2:
+            raise ValueError(f"X must be 2-D, got shape {X.shape}")
+        return X
+
+    def fit(self, X, y) -> "RLSRegressor":
+        """آموزش از صفر (معادل partial_fit روی یک مدل خالی)."""
+        self.__dict__.pop("feature_names_in_", None)
+        self._reset(np.asarray(X).shape[1])
+        self.partial_fit(X, y)
+        if not self.warmed_up:
+            if not self._warm_y or not sum(len(b) for b in self._warm_y):
+                raise ValueError("fit needs at least one sample")
+            # داده کمتر از warm-up: مقیاس از همه نمونه‌های موجود
+            self._finish_warmup()
+        return self
+
+    def partial_fit(self, X, y) -> "RLSRegressor":
+        """به‌روزرسانی با نمونه‌های جدید (به همان ترتیب ورود)."""
+        self.predict_partial_fit(X, y)
+        return self
+
+    def predict_partial_fit(self, X, y) -> np.ndarray:
+        """
+        پیش‌بینی prequential: پیش‌بینی هر نمونه با مدل قبل از دیدن آن، سپس یادگیری همان نمونه.
+
+        نمونه‌های قبل از پایان warm-up با میانگین SNR نمونه‌های قبلی پیش‌بینی می‌شوند.
+        نمونه‌های بدون SNR (NaN) فقط پیش‌بینی می‌شوند و در یادگیری شرکت نمی‌کنند.
+        """
+        X = self._as_array(X)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        if len(X) != len(y):
+            raise ValueError("X and y must have the same length")
+        if getattr(self, "n_features_in_", None) is None:
+            self._reset(X.shape[1])
+        elif X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, the model expects {self.n_features_in_}")
+
+        pred = np.empty(len(y))
+        start = 0
+        if not self.warmed_up:
+            _, _, warmup = self._params()
+            seen = sum(len(b) for b in self._warm_y)
+            keep = []
+            while start < len(y) and seen < warmup:
+                pred[start] = self._warm_sum / seen if seen else 0.0
+                if y[start] == y[start]:
+                    self._warm_sum += y[start]
+                    seen += 1
+                    keep.append(start)
+                start += 1
+            self._warm_X.append(X[keep])
+            self._warm_y.append(y[keep])
+            if seen >= warmup:
+                self._finish_warmup()
+        if start < len(y):
+            self._update(self._design(X[start:]), y[start:], predictions=pred[start:])
+        return pred
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if not self.warmed_up:
+            raise ValueError("RLSRegressor is not fitted yet (warm-up not finished)")
+        return self._design(X) @ self.w_
+
+    # -------------------------------------------------------------------------
+    # ضرایب در فضای ویژگی‌های خام (برای گزارش)
+    # -------------------------------------------------------------------------
+    @property
+    def coef_(self) -> np.ndarray:
+        coef = np.zeros(self.n_features_in_)
+        coef[self.active_] = self.w_[:-1] / self.scale_[self.active_]
+        return coef
+
+    @property
+    def intercept_(self) -> float:
+        return float(self.w_[-1] - self.coef_ @ self.mean_)
+
+
+def checkpoint(registry, name: str, model: RLSRegressor, preprocessor=None) -> dict:
+    """
+    ذخیره وضعیت فعلی مدل online در models_trained/ (همان قالب ModelRegistry.register).
+
+    متریک‌های قبلی metadata (مثلاً rmse/r2 ثبت‌شده در train_baselines) حفظ و فقط n_samples_seen به‌روز می‌شود.
+    """
+    metrics = dict((registry.metadata(name) or {}).get("metrics") or {})
+    metrics["n_samples_seen"] = int(model.n_samples_seen_)
+    return registry.register(name, model, metrics=metrics, preprocessor=preprocessor)
@@ -0,0 +1,204 @@
+"""
+هدف این فایل:
+- یک پیش‌پردازنده «fit‌شده» (FeaturePreprocessor) برای ویژگی‌های مدل SNR
+
+مشکل safe_numeric_X:
+- در هر فراخوانی کل DataFrame کپی می‌شود.
+- NaNها با میانه «همان batch» پر می‌شوند؛ برای inference تک‌نمونه‌ای یا batchهای کوچک
+  میانه از خود داده ورودی ساخته می‌شود و با زمان آموزش سازگار نیست.
+
+راه‌حل:
+- در train_baselines، روی X_train یک بار fit می‌شود و یاد می‌گیرد:
+  * ترتیب ستون‌ها (feature_names)
+  * نوع هر ستون در زمان آموزش (dtypes؛ برای گزارش/بررسی)
+  * میانه هر ستون روی داده آموزش (medians) برای پر کردن NaN
+  * اندازه پنجره ویژگی‌های تاریخچه (rolling_window) اگر مدل با rolling_features آموزش دیده باشد
+- کنار هر مدل ذخیره می‌شود: models_trained/<name>.preprocessor.joblib
+- در run_pipeline به جای safe_numeric_X استفاده می‌شود:
+  * transform: ستون به ستون مستقیماً در یک آرایه float64 از پیش تخصیص‌یافته نوشته می‌شود
+  * transform_one: مسیر سریع برای یک uplink (dict) بدون ساخت DataFrame
+
+سازگاری batch و online:
+- هر دو مسیر دقیقاً همان تبدیل را انجام می‌دهند: float64(value) و جایگزینی NaN با میانه آموزش.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Mapping
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+# پسوند فایل پیش‌پردازنده در کنار فایل مدل (ridge.joblib => ridge.preprocessor.joblib)
+PREPROCESSOR_SUFFIX = ".preprocessor.joblib"
+
+
+def preprocessor_path(model_path: Path) -> Path:
+    """مسیر فایل پیش‌پردازنده مربوط به یک فایل مدل (در همان پوشه)."""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + PREPROCESSOR_SUFFIX)
+
+
+@dataclass
+class FeaturePreprocessor:
+    """
+    پیش‌پردازنده ویژگی‌ها با پارامترهای یادگرفته‌شده از داده آموزش.
+
+    فیلدها:
+    - feature_names: ترتیب ستون‌هایی که مدل انتظار دارد
+    - dtypes: نوع هر ستون در زمان آموزش (رشته dtype)
+    - medians: میانه هر ستون روی داده آموزش (float64، هم‌ترتیب با feature_names)
+    - rolling_window: اندازه پنجره rolling_features در زمان آموزش؛ None یعنی مدل فقط ویژگی‌های
+      لحظه‌ای را می‌بیند (فایل‌های قدیمی‌تر این فیلد را ندارند و همان None خوانده می‌شوند)
+    """
+    feature_names: list[str]
+    dtypes: dict[str, str]
+    medians: np.ndarray
+    rolling_window: int | None = None
+    _index: dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.medians = np.asarray(self.medians, dtype=np.float64)
+        self._index = {name: j for j, name in enumerate(self.feature_names)}
+
+    def __getstate__(self):
+        # _index از feature_names ساخته می‌شود؛ در فایل ذخیره نمی‌شود
+        state = self.__dict__.copy()
+        state.pop("_index", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__post_init__()
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    # -------------------------------------------------------------------------
+    # fit
+    # -------------------------------------------------------------------------
+    @classmethod
+    def fit(cls, X: pd.DataFrame, rolling_window: int | None = None) -> "FeaturePreprocessor":
+        """
+        یادگیری ترتیب ستون‌ها، نوع‌ها و میانه‌ها از داده آموزش.
+
+        ستون‌های غیرعددی مانند safe_numeric_X با pd.to_numeric(errors="coerce") عددی
+        فرض می‌شوند؛ میانه روی مقادیر غیر NaN محاسبه می‌شود.
+        rolling_window: اگر X شامل ویژگی‌های rolling_features است، اندازه پنجره آن‌ها (برای serve)
+        """
+        names = [str(c) for c in X.columns]
+        dtypes = {name: str(X[name].dtype) for name in names}
+
+        medians = np.empty(len(names), dtype=np.float64)
+        for j, name in enumerate(names):
+            values = _column_as_float(X[name])
+            medians[j] = np.nanmedian(values) if np.isfinite(values).any() else 0.0
+
+        return cls(feature_names=names, dtypes=dtypes, medians=medians, rolling_window=rolling_window)
+
+    # -------------------------------------------------------------------------
+    # transform (batch)
+    # -------------------------------------------------------------------------
+    def transform(self, X: pd.DataFrame, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        تبدیل یک DataFrame به آرایه float64 با شکل (n, n_features).
+
+        - ستون‌ها به ترتیب feature_names انتخاب می‌شوند (ستون اضافی نادیده گرفته می‌شود)
+        - هر ستون مستقیماً در out[:, j] نوشته می‌شود (بدون کپی کل DataFrame)
+        - NaN (یا مقدار غیرعددی) با میانه آموزش پر می‌شود
+
+        out:
+        - اگر داده شود (شکل (n, n_features) و float64) همان آرایه پر و برگردانده می‌شود؛
+          برای استفاده مجدد از یک buffer در حالت stream.
+        """
+        missing = [c for c in self.feature_names if c not in X.columns]
+        if missing:
+            raise ValueError(f"Missing columns required by preprocessor: {missing}")
+
+        n = len(X)
+        if out is None:
+            out = np.empty((n, self.n_features), dtype=np.float64)
+        elif out.shape != (n, self.n_features) or out.dtype != np.float64:
+            raise ValueError(f"out must be float64 with shape {(n, self.n_features)}, got {out.dtype} {out.shape}")
+
+        for j, name in enumerate(self.feature_names):
+            col = out[:, j]
+            col[:] = _column_as_float(X[name])
+            nan = np.isnan(col)
+            if nan.any():
+                col[nan] = self.medians[j]
+        return out
+
+    def transform_frame(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        مانند transform ولی خروجی DataFrame با نام ستون‌ها (بدون کپی آرایه).
+
+        مدل‌های sklearn با نام ستون‌ها آموزش دیده‌اند (feature_names_in_)؛ با این خروجی
+        هشدار «X does not have valid feature names» داده نمی‌شود.
+        """
+        return pd.DataFrame(self.transform(X), columns=self.feature_names, index=X.index, copy=False)
+
+    # -------------------------------------------------------------------------
+    # transform (تک uplink)
+    # -------------------------------------------------------------------------
+    def transform_one(self, record: Mapping[str, object], out: np.ndarray | None = None) -> np.ndarray:
+        """
+        تبدیل یک uplink (dict از نام ستون به مقدار) به آرایه float64 با شکل (1, n_features).
+
+        - کلیدهای اضافی نادیده گرفته می‌شوند
+        - کلید گمشده، None، NaN یا مقدار غیرعددی => میانه آموزش (همان رفتار transform)
+        - out: buffer اختیاری با شکل (1, n_features) برای جلوگیری از تخصیص حافظه
+        """
+        if out is None:
+            out = np.empty((1, self.n_features), dtype=np.float64)
+        row = out[0]
+        medians = self.medians
+
+        for j, name in enumerate(self.feature_names):
+            value = record.get(name)
+            try:
+                v = float(value)
+            except (TypeError, ValueError):
+                v = medians[j]
+            row[j] = medians[j] if v != v else v
+        return out
+
+    # -------------------------------------------------------------------------
+    # ذخیره / بارگذاری
+    # -------------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path: Path) -> "FeaturePreprocessor":
+        return joblib.load(path)
+
+
+def _column_as_float(col: pd.Series) -> np.ndarray:
+    """
+    یک ستون به صورت آرایه float64 (مقدار گمشده/غیرعددی => NaN).
+
+    ستون‌های عددی بدون NaN مستقیماً تبدیل می‌شوند؛ ستون‌های غیرعددی (رشته/category)
+    مانند safe_numeric_X با pd.to_numeric(errors="coerce").
+    """
+    if not pd.api.types.is_numeric_dtype(col.dtype):
+        col = pd.to_numeric(col.astype(object), errors="coerce")
+    return col.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def load_preprocessor(model_path: Path) -> FeaturePreprocessor | None:
+    """
+    بارگذاری پیش‌پردازنده کنار یک مدل؛ اگر فایل وجود نداشته باشد None
+    (مدل‌های قدیمی‌تر که قبل از FeaturePreprocessor ذخیره شده‌اند).
+    """
+    path = preprocessor_path(model_path)
+    if not path.exists():
+        return None
+    return FeaturePreprocessor.load(path)
@@ -0,0 +1,374 @@
+"""
+هدف این فایل:
+- ساخت ویژگی‌های «تاریخچه هر دستگاه» برای مدل SNR از ستون‌هایی که تا الان دور ریخته می‌شدند
+  (timestamp، device_id و counter در config.DROP_COLS هستند چون هیچ ویژگی‌ای از آن‌ها ساخته نمی‌شد)
+
+ویژگی‌ها (برای هر uplink، فقط از uplinkهای قبلی همان دستگاه؛ SNR همین uplink وارد ویژگی‌ها نمی‌شود):
+- snr_lag1 / rssi_lag1: مقدار uplink قبلی دستگاه
+- snr_roll_mean / snr_roll_var / rssi_roll_mean / rssi_roll_var:
+  میانگین و واریانس (جمعیتی، ddof=0) آخرین W uplink قبلی (W = config.ROLLING_WINDOW)
+- inter_arrival_s: فاصله زمانی (ثانیه) تا uplink قبلی دستگاه
+- loss_rate: نرخ گم شدن بسته از فاصله frame counterها در آخرین W فاصله (شامل همین uplink):
+    فاصله g = counter - counter قبلی (حداقل 1)، بسته‌های گم‌شده = g - 1
+    loss_rate = Σ(g - 1) / Σg
+  اگر counter به عقب برگردد (rejoin/reset دستگاه) پنجره فاصله‌ها خالی می‌شود (مانند device_controller)
+- اولین uplink هر دستگاه ویژگی ندارد (NaN)؛ FeaturePreprocessor آن را با میانه آموزش پر می‌کند
+
+«قبلی» یعنی ترتیب ورود uplinkها (ترتیب سطرهای log)؛ در دیتاست، uplinkهای هر دستگاه
+بر اساس زمان مرتب هستند.
+
+دو مسیر با مقادیر بیت‌به‌بیت برابر:
+- batch (rolling_features): groupby برداری با NumPy؛ سطرها یک بار بر اساس دستگاه مرتب (پایدار) می‌شوند
+  و برای هر lag یک ستون از ماتریس پنجره (n × W) ساخته می‌شود
+- online (RollingFeatureState): برای هر دستگاه بافرهای حلقوی با اندازه ثابت W که بین chunkها/درخواست‌ها
+  حفظ می‌شوند؛ هر chunk مانند batch یک‌جا و برداری پردازش می‌شود (lagهای قبل از chunk از بافر)، پس هزینه
+  هر uplink O(W) = O(1) است، حتی برای یک دستگاه با chunk طولانی
+- هر دو مسیر ماتریس پنجره را با همان چیدمان (قدیمی‌ترین => جدیدترین) می‌سازند و آمار را با یک تابع
+  مشترک (_window_stats) و ترتیب جمع ثابت حساب می‌کنند؛ پس مدلی که با train_baselines --rolling-features
+  آموزش دیده روی جریان زنده (run_pipeline --stream، serve) بدون محاسبه دوباره تاریخچه همان ویژگی‌ها را می‌بیند
+"""
+
+from __future__ import annotations
+
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .device_slots import DeviceSlots
+
+
+# ستون‌های خام لازم برای ساخت ویژگی‌ها (snr/rssi اگر نباشند NaN فرض می‌شوند)
+SOURCE_COLS = ("timestamp", "device_id", "counter", config.TARGET_COL, "rssi")
+
+# نام ویژگی‌های ساخته‌شده (به همین ترتیب)
+ROLLING_FEATURES = (
+    "snr_lag1",
+    "rssi_lag1",
+    "snr_roll_mean",
+    "snr_roll_var",
+    "rssi_roll_mean",
+    "rssi_roll_var",
+    "inter_arrival_s",
+    "loss_rate",
+)
+
+# مقدار int64 معادل NaT
+_NAT = np.iinfo(np.int64).min
+
+
+# -----------------------------------------------------------------------------
+# توابع مشترک دو مسیر
+# -----------------------------------------------------------------------------
+def _window_stats(values: np.ndarray, valid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    میانگین و واریانس (ddof=0) هر سطر ماتریس پنجره (n × W) روی خانه‌های معتبر.
+
+    جمع‌ها ستون به ستون (قدیمی‌ترین => جدیدترین) انجام می‌شوند، نه با sum(axis=1) که ترتیب جمع آن
+    به اندازه آرایه بستگی دارد؛ پس نتیجه هر سطر مستقل از n و یکسان در batch و online است.
+    """
+    count = valid.sum(axis=1)
+    total = np.zeros(len(values), dtype=np.float64)
+    for j in range(values.shape[1]):
+        total = total + np.where(valid[:, j], values[:, j], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        sq = np.zeros(len(values), dtype=np.float64)
+        for j in range(values.shape[1]):
+            d = np.where(valid[:, j], values[:, j] - mean, 0.0)
+            sq = sq + d * d
+        var = sq / count
+    return mean, var
+
+
+def _loss_rate(gaps: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Σ(g - 1) / Σg روی خانه‌های معتبر پنجره فاصله counterها (بدون فاصله => NaN)."""
+    lost = np.zeros(len(gaps), dtype=np.float64)
+    sent = np.zeros(len(gaps), dtype=np.float64)
+    for j in range(gaps.shape[1]):
+        lost = lost + np.where(valid[:, j], gaps[:, j] - 1.0, 0.0)
+        sent = sent + np.where(valid[:, j], gaps[:, j], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return lost / sent
+
+
+def _inter_arrival(ts: np.ndarray, prev_ts: np.ndarray, has_prev: np.ndarray) -> np.ndarray:
+    """فاصله زمانی (ثانیه) تا uplink قبلی؛ بدون uplink قبلی یا با NaT => NaN."""
+    ok = has_prev & (ts != _NAT) & (prev_ts != _NAT)
+    out = np.full(len(ts), np.nan)
+    out[ok] = (ts[ok] - prev_ts[ok]).astype(np.float64) / 1e9
+    return out
+
+
+def _timestamps_ns(values) -> np.ndarray:
+    """timestamp به صورت int64 نانوثانیه (NaT => _NAT)؛ رشته ISO/datetime هر دو پذیرفته می‌شوند."""
+    ts = pd.to_datetime(pd.Series(values), errors="coerce").to_numpy(dtype="datetime64[ns]")
+    return ts.view(np.int64)
+
+
+def _source_arrays(df: pd.DataFrame) -> tuple[np.ndarray, ...]:
+    """(device_id، timestamp ns، counter، snr، rssi) به صورت آرایه‌های NumPy."""
+    missing = [c for c in ("timestamp", "device_id", "counter") if c not in df.columns]
+    if missing:
+        raise ValueError(f"Rolling features need the columns {missing}")
+
+    def measurement(name: str) -> np.ndarray:
+        if name not in df.columns:
+            return np.full(len(df), np.nan)
+        return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    device = np.asarray(df["device_id"].astype(str), dtype=object)
+    counter = pd.to_numeric(df["counter"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return device, _timestamps_ns(df["timestamp"]), counter, measurement(config.TARGET_COL), measurement("rssi")
+
+
+def _frame(index, snr_lag1, rssi_lag1, snr_stats, rssi_stats, inter, loss) -> pd.DataFrame:
+    return pd.DataFrame(
+        dict(zip(ROLLING_FEATURES, (snr_lag1, rssi_lag1, *snr_stats, *rssi_stats, inter, loss))),
+        index=index,
+    )
+
+
+# -----------------------------------------------------------------------------
+# batch: groupby برداری
+# -----------------------------------------------------------------------------
+def rolling_features(df: pd.DataFrame, window: int | None = None) -> pd.DataFrame:
+    """
+    ویژگی‌های تاریخچه هر uplink برای کل log (ترتیب سطرها = ترتیب ورود).
+
+    ورودی:
+    - df: شامل timestamp، device_id و counter (و snr/rssi)
+    - window: اندازه پنجره (پیش‌فرض config.ROLLING_WINDOW)
+
+    خروجی:
+    - DataFrame با ستون‌های ROLLING_FEATURES و همان index ورودی
+    """
+    W = int(config.ROLLING_WINDOW if window is None else window)
+    if W < 1:
+        raise ValueError(f"window must be >= 1, got {W}")
+    device, ts, counter, snr, rssi = _source_arrays(df)
+    n = len(df)
+
+    # مرتب‌سازی پایدار بر اساس دستگاه => uplinkهای هر دستگاه پشت سر هم و به ترتیب ورود
+    codes, _ = pd.factorize(device)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    pos = np.arange(n)
+    new_group = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]] if n else np.zeros(0, dtype=bool)
+    rank = pos - np.maximum.accumulate(np.where(new_group, pos, 0))
+
+    def lagged(values: np.ndarray, k: int, limit: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """مقدار k سطر قبل در همان گروه (و اعتبار آن) برای هر سطر مرتب‌شده."""
+        ok = limit >= k
+        out = np.full(n, np.nan)
+        src = pos[ok] - k
+        out[ok] = values[src]
+        return out, ok
+
+    # ماتریس پنجره SNR/RSSI: ستون j = lag (W - j)، یعنی قدیمی‌ترین => جدیدترین
+    s_snr, s_rssi = snr[order], rssi[order]
+    snr_win = np.empty((n, W))
+    rssi_win = np.empty((n, W))
+    filled = np.empty((n, W), dtype=bool)
+    for j in range(W):
+        snr_win[:, j], filled[:, j] = lagged(s_snr, W - j, rank)
+        rssi_win[:, j], _ = lagged(s_rssi, W - j, rank)
+
+    # فاصله counterها: rejoin (counter کمتر از قبلی) شروع یک بخش جدید است
+    s_counter = counter[order]
+    prev_counter, has_prev = lagged(s_counter, 1, rank)
+    with np.errstate(invalid="ignore"):
+        reset = has_prev & (s_counter < prev_counter)
+        gap = np.maximum(s_counter - prev_counter, 1.0)
+    seg_rank = pos - np.maximum.accumulate(np.where(new_group | reset, pos, 0))
+
+    # پنجره فاصله‌ها: ستون j = lag (W - 1 - j) (شامل همین uplink) درون همان بخش؛
+    # اولین uplink هر بخش فاصله ندارد، پس lag معتبر حداکثر seg_rank - 1 است
+    gap_win = np.empty((n, W))
+    gap_filled = np.empty((n, W), dtype=bool)
+    for j in range(W):
+        gap_win[:, j], gap_filled[:, j] = lagged(gap, W - 1 - j, seg_rank - 1)
+
+    prev_ts = np.full(n, _NAT, dtype=np.int64)
+    prev_ts[has_prev] = ts[order][pos[has_prev] - 1]
+
+    sorted_feats = (
+        snr_win[:, -1],
+        rssi_win[:, -1],
+        _window_stats(snr_win, filled & ~np.isnan(snr_win)),
+        _window_stats(rssi_win, filled & ~np.isnan(rssi_win)),
+        _inter_arrival(ts[order], prev_ts, has_prev),
+        _loss_rate(gap_win, gap_filled & ~np.isnan(gap_win)),
+    )
+
+    # بازگرداندن به ترتیب اصلی سطرها
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[order] = pos
+
+    def unsort(x):
+        return tuple(a[inverse] for a in x) if isinstance(x, tuple) else x[inverse]
+
+    return _frame(df.index, *(unsort(f) for f in sorted_feats))
+
+
+def add_rolling_features(df: pd.DataFrame, window: int | None = None) -> pd.DataFrame:
+    """df به همراه ستون‌های ROLLING_FEATURES (ستون‌های هم‌نام قبلی جایگزین می‌شوند)."""
+    feats = rolling_features(df, window)
+    return pd.concat([df.drop(columns=[c for c in ROLLING_FEATURES if c in df.columns]), feats], axis=1)
+
+
+def uses_rolling_features(preprocessor) -> bool:
+    """آیا مدلی که این پیش‌پردازنده کنار آن است با ویژگی‌های تاریخچه آموزش دیده؟"""
+    return preprocessor is not None and getattr(preprocessor, "rolling_window", None) is not None
+
+
+# -----------------------------------------------------------------------------
+# online: بافرهای حلقوی هر دستگاه
+# -----------------------------------------------------------------------------
+class RollingFeatureState(DeviceSlots):
+    """
+    وضعیت تاریخچه همه دستگاه‌ها در آرایه‌های فشرده (یک slot برای هر device_id؛ مانند DeviceTPCController).
+
+    آرایه‌های وضعیت (طول = ظرفیت؛ slotها و رشد آرایه‌ها در DeviceSlots):
+    - snr_buf / rssi_buf (ظرفیت × W) و pos/count: آخرین W اندازه‌گیری دستگاه (بافر حلقوی)
+    - gap_buf (ظرفیت × W) و gap_pos/gap_count: آخرین W فاصله frame counter
+    - last_ts (int64 ns) و last_counter: آخرین uplink دیده‌شده
+    """
+
+    def __init__(self, window: int | None = None, capacity: int = 1024):
+        self.window = int(config.ROLLING_WINDOW if window is None else window)
+        if self.window < 1:
+            raise ValueError(f"window must be >= 1, got {self.window}")
+
+        super().__init__(capacity)
+        W = self.window
+        self._state("snr_buf", 0.0, np.float64, width=W)
+        self._state("rssi_buf", 0.0, np.float64, width=W)
+        self._state("pos", 0, np.int64)
+        self._state("count", 0, np.int64)
+        self._state("gap_buf", 0.0, np.float64, width=W)
+        self._state("gap_pos", 0, np.int64)
+        self._state("gap_count", 0, np.int64)
+        self._state("last_ts", _NAT, np.int64)
+        self._state("last_counter", np.nan, np.float64)
+
+    def _chronological(self, buf: np.ndarray, pos: np.ndarray, count: np.ndarray, slots: np.ndarray):
+        """محتوای بافر حلقوی slotها به ترتیب قدیمی‌ترین => جدیدترین (و خانه‌های پرشده)."""
+        W = self.window
+        cols = (pos[slots, None] + np.arange(W)) % W
+        values = buf[slots[:, None], cols]
+        filled = np.arange(W) >= (W - np.minimum(count[slots], W))[:, None]
+        return values, filled
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+    def update_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        ویژگی‌های یک chunk از log (به ترتیب ورود) و به‌روزرسانی تاریخچه؛ وضعیت بین فراخوانی‌ها حفظ می‌شود.
+
+        ویژگی‌ها به تصمیم قبلی وابسته نیستند، پس مانند rolling_features کل chunk یک‌جا و برداری پردازش می‌شود
+        (هزینه O(n·W) مستقل از تعداد دستگاه‌ها): lagهایی که از اول chunk عقب‌تر می‌روند از بافر حلقوی
+        دستگاه خوانده می‌شوند. نتیجه برابر rolling_features روی کل log است.
+        """
+        device, ts, counter, snr, rssi = _source_arrays(df)
+        n, W = len(df), self.window
+        if n == 0:
+            out = [np.empty(0) for _ in ROLLING_FEATURES]
+            return _frame(df.index, *out[:2], tuple(out[2:4]), tuple(out[4:6]), *out[6:])
+        slots = self.slots(device)
+
+        # مرتب‌سازی پایدار بر اساس slot => uplinkهای هر دستگاه پشت سر هم و به ترتیب ورود
+        order = np.argsort(slots, kind="stable")
+        slots = slots[order]
+        ts, counter, snr, rssi = ts[order], counter[order], snr[order], rssi[order]
+        pos = np.arange(n)
+        first = np.r_[True, slots[1:] != slots[:-1]]
+        rank = pos - np.maximum.accumulate(np.where(first, pos, 0))
+        seen = self.count[slots] > 0  # دستگاه قبل از این chunk uplink داشته است
+
+        # تاریخچه قبل از chunk هر سطر (قدیمی‌ترین => جدیدترین)
+        hist_snr, hist_filled = self._chronological(self.snr_buf, self.pos, self.count, slots)
+        hist_rssi, _ = self._chronological(self.rssi_buf, self.pos, self.count, slots)
+        hist_gap, hist_gap_filled = self._chronological(self.gap_buf, self.gap_pos, self.gap_count, slots)
+
+        def window(values: np.ndarray, hist: np.ndarray, hist_ok: np.ndarray, reach: np.ndarray, lag0: int):
+            """
+            ماتریس پنجره (n × W): ستون j = lag (W - j - 1 + lag0)؛ lag < reach از همین chunk، بقیه از hist
+            (خانه W - (lag - reach + 1) تاریخچه).
+            """
+            # ستون‌ها پیوسته (order="F")؛ هر ستون با یک np.where کامل نوشته می‌شود
+            out = np.empty((n, W), order="F")
+            ok = np.empty((n, W), dtype=bool, order="F")
+            for j in range(W):
+                lag = W - 1 - j + lag0
+                own = reach > lag
+                back = lag - reach  # چند خانه قبل از chunk (0 = جدیدترین خانه تاریخچه)
+                col = np.clip(W - 1 - back, 0, W - 1)
+                out[:, j] = np.where(own, values[np.maximum(pos - lag, 0)], hist[pos, col])
+                ok[:, j] = own | (hist_ok[pos, col] & (back < W))
+            return out, ok
+
+        # SNR/RSSI: فقط uplinkهای قبلی (lag 1..W)
+        snr_win, filled = window(snr, hist_snr, hist_filled, rank + 1, 1)
+        rssi_win, _ = window(rssi, hist_rssi, hist_filled, rank + 1, 1)
+        snr_lag1 = np.where(filled[:, -1], snr_win[:, -1], np.nan)
+        rssi_lag1 = np.where(filled[:, -1], rssi_win[:, -1], np.nan)
+
+        has_prev = (rank > 0) | seen
+        prev_ts = np.where(rank > 0, np.r_[_NAT, ts[:-1]], self.last_ts[slots])
+        inter = _inter_arrival(ts, prev_ts, has_prev)
+
+        # فاصله counterها: rejoin پنجره فاصله‌ها را خالی می‌کند و خود فاصله‌ای اضافه نمی‌کند؛
+        # q = تعداد فاصله‌های اضافه‌شده در بخش فعلی تا همین سطر (بخش = از اول chunk یا از آخرین rejoin)
+        prev_counter = np.where(rank > 0, np.r_[np.nan, counter[:-1]], self.last_counter[slots])
+        with np.errstate(invalid="ignore"):
+            reset = has_prev & (counter < prev_counter)
+            gap = np.maximum(counter - prev_counter, 1.0)
+        seg_rank = pos - np.maximum.accumulate(np.where(first | reset, pos, 0))
+        carry = (first & seen & ~reset)[pos - seg_rank]  # بخش ادامه پنجره فاصله‌های قبل از chunk است
+        q = seg_rank + carry
+        gap_hist_ok = hist_gap_filled & carry[:, None]
+        gap_win, gap_filled = window(gap, hist_gap, gap_hist_ok, q, 0)
+        # سطری که فاصله‌ای اضافه نکرده (اولین uplink دستگاه یا rejoin) پنجره خالی دارد
+        gap_filled &= (q > 0)[:, None]
+
+        sorted_feats = (
+            snr_lag1,
+            rssi_lag1,
+            _window_stats(snr_win, filled & ~np.isnan(snr_win)),
+            _window_stats(rssi_win, filled & ~np.isnan(rssi_win)),
+            inter,
+            _loss_rate(gap_win, gap_filled & ~np.isnan(gap_win)),
+        )
+
+        # وضعیت جدید هر دستگاه از آخرین سطر آن: بافرها به ترتیب زمانی با pos = 0
+        last = np.r_[np.flatnonzero(first)[1:], n] - 1
+        ls = slots[last]
+        self.snr_buf[ls] = np.c_[snr_win[last, 1:], snr[last]]
+        self.rssi_buf[ls] = np.c_[rssi_win[last, 1:], rssi[last]]
+        self.pos[ls] = 0
+        self.count[ls] += rank[last] + 1
+        self.gap_buf[ls] = gap_win[last]
+        self.gap_pos[ls] = 0
+        self.gap_count[ls] = np.where(carry[last], self.gap_count[ls], 0) + q[last]
+        self.last_ts[ls] = ts[last]
+        self.last_counter[ls] = counter[last]
+
+        inverse = np.empty(n, dtype=np.int64)
+        inverse[order] = pos
+
+        def unsort(x):
+            return tuple(a[inverse] for a in x) if isinstance(x, tuple) else x[inverse]
+
+        return _frame(df.index, *(unsort(f) for f in sorted_feats))
+
+    def update(self, record: Mapping[str, object]) -> dict[str, float]:
+        """
+        ویژگی‌های یک uplink (حالت online؛ dict شامل device_id، timestamp، counter و در صورت وجود snr/rssi)
+        و افزودن آن به تاریخچه دستگاه.
+        """
+        row = {c: [record.get(c)] for c in SOURCE_COLS}
+        feats = self.update_frame(pd.DataFrame(row))
+        return {name: float(feats[name].iloc[0]) for name in ROLLING_FEATURES}
@@ -14,7 +14,8 @@
    که sf_new و tp_new تصمیم TPC بر اساس SNR پیش‌بینی‌شده هستند.
 
 3) outputs/figures/*.png
-   نمودارهای کلیدی برای گزارش و ارائه:
+   نمودارهای کلیدی برای گزارش و ارائه (src/figures.py؛ از داده تجمیع‌شده، رسم موازی،
+   رد کردن نمودارهای بدون تغییر):
    - snr_true_vs_pred.png
    - sf_distribution.png
    - tp_distribution.png
@@ -29,78 +30,441 @@
 
 from __future__ import annotations
 
+import argparse
+import warnings
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-import joblib
-import matplotlib.pyplot as plt
 
 from . import config
-from .io_utils import ensure_dirs, load_dataset, detect_target_col, safe_numeric_X, save_csv
-from .tpc import decide_tpc
-from .energy import normalized_energy
+from .figures import FigureAggregates, render_figures
+from .io_utils import (
+    append_csv,
+    detect_target_col,
+    ensure_dirs,
+    iter_dataset,
+    load_dataset,
+    safe_numeric_X,
+    save_csv,
+)
+from .instrument import iterate, session, stage, traced
+from .model_registry import default_registry
+from .preprocessing import FeaturePreprocessor
+from .online_model import checkpoint
+from .rolling_features import SOURCE_COLS, RollingFeatureState, rolling_features, uses_rolling_features
+from .tpc import decide_tpc_batch, decide_tpc_optimal
+from .energy import INVALID_PAYLOAD, normalized_energy_batch, normalized_toa_energy, payload_bytes_from_length
 
 
-def main():
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     """
-    اجرای کامل پایپ‌لاین پروژه.
+    خواندن آرگومان‌های خط فرمان.
 
-    مراحل:
-    1) ساخت پوشه‌های خروجی (اگر وجود ندارند)
-    2) خواندن دیتاست (در این نسخه از raw استفاده می‌شود)
-    3) حذف ستون‌های غیرمفید برای ML (DROP_COLS)
-    4) جداسازی X و y (هدف: snr)
-    5) لود مدل منتخب (SELECTED_TRAINED_MODEL از models_trained)
-    6) پیش‌بینی SNR برای همه نمونه‌ها
-    7) ذخیره CSV پیش‌بینی‌ها
-    8) اجرای الگوریتم تصمیم‌گیری TPC برای هر نمونه:
-       - خروجی: sf_new, tp_new, me و energy_norm
-    9) ذخیره CSV تصمیم‌ها
-    10) تولید نمودارهای گزارش (برای ارائه)
+    --energy-model: انتخاب مدل انرژی برای ستون energy_norm
+      - proxy: شاخص ساده 10^(TP/10) * 2^SF (پیش‌فرض config.ENERGY_MODEL)
+      - toa:   مدل فیزیکی Time-on-Air با طول payload هر نمونه (ستون length)
+    --tpc-mode: الگوریتم تصمیم برای sf_new/tp_new
+      - greedy:  decide_tpc_batch (پیش‌فرض config.TPC_MODE)
+      - optimal: decide_tpc_optimal (کم‌مصرف‌ترین نقطه قابل قبول روی کل grid)
+    --with-optimal: ستون‌های تصمیم بهینه (sf_opt, tp_opt, me_opt, energy_norm_opt) را هم
+      کنار تصمیم اصلی ذخیره می‌کند تا summarize_results مقایسه greedy/optimal را گزارش دهد.
+    --input: مسیر CSV ورودی (پیش‌فرض config.DATA_RAW)
+    --stage: اجرای بخشی از پایپ‌لاین (برای dag.py که هر بخش را جدا cache می‌کند)
+      - all:     همه مراحل (پیش‌فرض)
+      - predict: فقط مراحل 2 تا 7 (پیش‌بینی SNR و ذخیره snr_predictions.csv)
+      - tpc:     فقط مراحل 8 تا 10؛ snr_pred از snr_predictions.csv موجود خوانده می‌شود
+    --stream, --chunk-size: پردازش جریانی ورودی با حافظه محدود (به run_stream مراجعه کنید)
+    --model: نام مدل در models_trained/ (پیش‌فرض config.SELECTED_TRAINED_MODEL)
+    --online-update: مدل افزایشی (مثلاً --model rls.joblib) هر uplink را اول پیش‌بینی و سپس با SNR واقعی آن
+      به‌روز می‌شود (prequential)؛ مدل به‌روزشده در models_trained/ ذخیره می‌شود (online_model.py)
+    --out-dir: پوشه خروجی جایگزین (مثلاً برای benchmarkها، تا خروجی‌های اصلی بازنویسی نشوند)
+    --trace, --trace-memory: ثبت زمان/حافظه هر مرحله (instrument.py) در outputs/traces
+      (با --out-dir در <out_dir>/traces)
+    --no-figures: مرحله 9 (نمودارها) اجرا نمی‌شود
+    --figure-workers, --force-figures: تعداد پروسه‌های رسم؛ رسم دوباره حتی اگر داده تغییر نکرده باشد
     """
-    # -------------------------------------------------------------------------
-    # 1) Ensure output directories exist
-    # -------------------------------------------------------------------------
-    ensure_dirs()
+    parser = argparse.ArgumentParser(description="End-to-end SNR prediction + TPC pipeline")
+    parser.add_argument(
+        "--energy-model",
+        choices=["proxy", "toa"],
+        default=config.ENERGY_MODEL,
+        help="energy model used for energy_norm (default: config.ENERGY_MODEL)",
+    )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=None,
+        help="input CSV (default: config.DATA_RAW)",
+    )
+    parser.add_argument(
+        "--stage",
+        choices=["all", "predict", "tpc"],
+        default="all",
+        help="run only SNR prediction (writes snr_predictions.csv) or only TPC + figures (reads it back)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="process the input in chunks with bounded memory and append outputs incrementally",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=config.STREAM_CHUNK_ROWS,
+        help="rows per chunk in --stream mode (default: config.STREAM_CHUNK_ROWS)",
+    )
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="trained model in models_trained/ to use, e.g. rls.joblib (default: config.SELECTED_TRAINED_MODEL)",
+    )
+    parser.add_argument(
+        "--online-update",
+        action="store_true",
+        help="predict each uplink, then update the model with its measured SNR and checkpoint it (incremental models only)",
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=Path,
+        default=None,
+        help="write predictions/ and figures/ under this directory instead of config.OUTPUT_DIR",
+    )
+    parser.add_argument(
+        "--tpc-mode",
+        choices=["greedy", "optimal"],
+        default=config.TPC_MODE,
+        help="decision used for sf_new/tp_new (default: config.TPC_MODE)",
+    )
+    parser.add_argument(
+        "--with-optimal",
+        action="store_true",
+        help="also write the exhaustive optimal decision as sf_opt/tp_opt/me_opt/energy_norm_opt",
+    )
+    parser.add_argument(
+        "--no-figures",
+        action="store_true",
+        help="skip step 9 (report figures)",
+    )
+    parser.add_argument(
+        "--figure-workers",
+        type=int,
+        default=config.FIG_WORKERS,
+        help="processes used to render figures (default: one per figure, up to the CPU count)",
+    )
+    parser.add_argument(
+        "--force-figures",
+        action="store_true",
+        help="re-render figures even if their aggregated data is unchanged",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help=(
+            f"record per-stage wall/CPU time, memory and rows to config.TRACE_DIR or <out-dir>/traces "
+            f"(or set {config.TRACE_ENV_VAR}=1)"
+        ),
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="with --trace: measure per-stage peak allocations with tracemalloc (slower)",
+    )
+    args = parser.parse_args(argv)
+    args.model = args.model or config.SELECTED_TRAINED_MODEL
+    if args.stream and args.stage != "all":
+        parser.error("--stage predict/tpc is not supported with --stream")
+    if args.online_update and args.stage == "tpc":
+        parser.error("--online-update needs the prediction step (not available with --stage tpc)")
+    return args
+
+
+def output_paths(out_dir: Path | None) -> tuple[Path, Path, Path]:
+    """
+    مسیر فایل‌های خروجی: (snr_predictions.csv, tpc_decisions.csv, پوشه نمودارها).
+
+    بدون --out-dir همان مسیرهای config؛ با --out-dir زیر <out_dir>/predictions و <out_dir>/figures.
+    """
+    if out_dir is None:
+        return config.SNR_PREDICTIONS_CSV, config.TPC_DECISIONS_CSV, config.FIG_DIR
+    out_dir = Path(out_dir)
+    (out_dir / "figures").mkdir(parents=True, exist_ok=True)
+    return (
+        out_dir / "predictions" / config.SNR_PREDICTIONS_CSV.name,
+        out_dir / "predictions" / config.TPC_DECISIONS_CSV.name,
+        out_dir / "figures",
+    )
+
+
+@traced("tpc_decisions", rows_from=0)
+def tpc_decisions(
+    snr_pred: np.ndarray,
+    payload: np.ndarray | None = None,
+    tpc_mode: str = "greedy",
+    with_optimal: bool = False
+) -> dict[str, np.ndarray]:
+    """
+    اجرای تصمیم TPC و محاسبه energy_norm برای یک آرایه از SNRهای پیش‌بینی‌شده.
+
+    ورودی‌ها:
+    - snr_pred: SNR پیش‌بینی‌شده برای هر نمونه
+    - payload: طول payload فیزیکی (بایت) هر نمونه؛ اگر داده شود مدل انرژی toa استفاده می‌شود
+    - tpc_mode: "greedy" (decide_tpc_batch) یا "optimal" (decide_tpc_optimal)
+    - with_optimal: افزودن ستون‌های *_opt از تصمیم بهینه برای مقایسه
+
+    خروجی:
+    - دیکشنری ستون‌ها برای tpc_decisions.csv
+    """
+    def energy_of(dec) -> np.ndarray:
+        if payload is not None:
+            return normalized_toa_energy(dec.tp, dec.sf, payload, tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+        return normalized_energy_batch(dec.tp, dec.sf, tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+
+    # تصمیم بهینه فقط در صورت نیاز محاسبه می‌شود (حالت optimal یا ستون‌های مقایسه‌ای)
+    optimal = None
+    if tpc_mode == "optimal" or with_optimal:
+        optimal = decide_tpc_optimal(snr_pred, payload_bytes=payload)
+
+    batch = optimal if tpc_mode == "optimal" else decide_tpc_batch(snr_pred)
+
+    decisions = {
+        "sf_new": batch.sf,   # SF انتخابی TPC
+        "tp_new": batch.tp,   # TP انتخابی TPC (dBm)
+        "me": batch.me,       # Margin after decision (Me)
+        # انرژی نرمال‌شده نسبت به baseline (SF=12, TP=14)
+        "energy_norm": energy_of(batch),
+    }
+
+    # ستون‌های مقایسه‌ای تصمیم بهینه (برای گزارش greedy در برابر optimal)
+    if with_optimal:
+        decisions.update({
+            "sf_opt": optimal.sf,
+            "tp_opt": optimal.tp,
+            "me_opt": optimal.me,
+            "energy_norm_opt": energy_of(optimal),
+        })
+
+    return decisions
+
+
+def payload_of(X: pd.DataFrame, energy_model: str) -> np.ndarray | None:
+    """
+    طول payload فیزیکی هر نمونه برای مدل انرژی toa (برای proxy => None).
+
+    سطرهایی با length گمشده یا خارج از بازه LoRa اجرا را متوقف نمی‌کنند: energy_norm آن‌ها NaN می‌شود
+    (KPIها و نمودارها NaN را نادیده می‌گیرند) و تعدادشان با یک warning گزارش می‌شود.
+    """
+    if energy_model != "toa":
+        return None
+    if config.PAYLOAD_LENGTH_COL not in X.columns:
+        raise ValueError(f"Energy model 'toa' needs the '{config.PAYLOAD_LENGTH_COL}' column in the dataset")
+    payload = payload_bytes_from_length(X[config.PAYLOAD_LENGTH_COL].to_numpy())
+    bad = np.flatnonzero(payload == INVALID_PAYLOAD)
+    if bad.size:
+        warnings.warn(
+            f"{bad.size} of {len(payload)} rows have a missing or out-of-range '{config.PAYLOAD_LENGTH_COL}' "
+            f"(e.g. rows {X.index[bad[:5]].tolist()}); their ToA energy_norm is NaN"
+        )
+    return payload
+
+
+def predict(model, Xn: pd.DataFrame, y_true, online_update: bool, model_name: str | None = None) -> np.ndarray:
+    """
+    پیش‌بینی SNR؛ با online_update به صورت prequential (هر uplink اول پیش‌بینی، سپس یادگیری با y_true).
+
+    فقط مدل‌های افزایشی (predict_partial_fit؛ مثلاً online_model.RLSRegressor) به‌روزرسانی را پشتیبانی می‌کنند.
+    """
+    with stage("predict", rows=len(Xn), online=online_update):
+        if not online_update:
+            return model.predict(Xn)
+        if not hasattr(model, "predict_partial_fit"):
+            raise ValueError(
+                f"--online-update needs an incremental model (e.g. rls.joblib); "
+                f"{model_name or config.SELECTED_TRAINED_MODEL} is {type(model).__name__}"
+            )
+        return model.predict_partial_fit(Xn, np.asarray(y_true, dtype=np.float64))
+
+
+@traced("model_features", rows_from=0)
+def model_features(X: pd.DataFrame, preprocessor: FeaturePreprocessor | None) -> pd.DataFrame:
+    """
+    ویژگی‌های عددی ورودی مدل.
+
+    - اگر پیش‌پردازنده کنار مدل ذخیره شده باشد: ترتیب ستون‌ها و میانه‌های زمان آموزش
+      (FeaturePreprocessor.transform_frame؛ بدون کپی کل DataFrame)
+    - در غیر این صورت (مدل‌های قدیمی‌تر): safe_numeric_X با میانه همان batch
+    """
+    if preprocessor is None:
+        return safe_numeric_X(X)
+    return preprocessor.transform_frame(X)
+
+
+def run_stream(
+    args: argparse.Namespace,
+    model,
+    preprocessor: FeaturePreprocessor | None = None,
+    figures: FigureAggregates | None = None,
+    registry=None
+) -> int:
+    """
+    اجرای پایپ‌لاین به صورت جریانی (chunk به chunk) با حافظه محدود.
+
+    تفاوت با حالت عادی:
+    - کل دیتاست هرگز در حافظه بارگذاری نمی‌شود؛ هر بار فقط args.chunk_size سطر خوانده می‌شود
+    - پیش‌بینی SNR و تصمیم TPC برای هر chunk انجام و بلافاصله به انتهای
+      snr_predictions.csv و tpc_decisions.csv اضافه (append) می‌شود
+    - بنابراین اوج مصرف حافظه مستقل از تعداد سطرهای ورودی (359 یا 500 میلیون) ثابت می‌ماند
+
+    - اگر figures داده شود، شمارش‌های نمودارها chunk به chunk به آن اضافه می‌شوند
+      (حافظه فقط به تعداد binها بستگی دارد؛ رسم پس از پایان در main انجام می‌شود)
+    - اگر مدل با ویژگی‌های تاریخچه آموزش دیده باشد، RollingFeatureState بین chunkها حفظ می‌شود
+      (بافرهای حلقوی هر دستگاه؛ مقادیر برابر حالت عادی و مستقل از اندازه chunk)
+    - با --online-update مدل chunk به chunk به‌روز و هر ONLINE_CHECKPOINT_ROWS سطر (و در پایان)
+      از طریق registry در models_trained/ ذخیره می‌شود
+
+    محدودیت:
+    - اگر پیش‌پردازنده مدل موجود نباشد، safe_numeric_X مقادیر گمشده را با میانه همان chunk پر می‌کند
+      (با پیش‌پردازنده، میانه آموزش استفاده می‌شود و نتیجه مستقل از اندازه chunk است)
+
+    خروجی:
+    - تعداد کل سطرهای پردازش‌شده
+    """
+    pred_csv, dec_csv, _ = output_paths(args.out_dir)
+    n_rows = 0
+    since_checkpoint = 0
+
+    # خروجی‌ها قبل از اولین chunk از نو ساخته می‌شوند (فقط سطر عنوان)؛ اگر ورودی هیچ chunkی نداشته باشد
+    # هم نتایج اجرای قبلی باقی نمی‌مانند
+    empty = pd.DataFrame(tpc_decisions(
+        np.empty(0),
+        payload=None if args.energy_model != "toa" else np.empty(0, dtype=np.int64),
+        tpc_mode=args.tpc_mode,
+        with_optimal=args.with_optimal,
+    ))
+    append_csv(pd.DataFrame(columns=["snr_true", "snr_pred"]), pred_csv, header=True)
+    append_csv(empty, dec_csv, header=True)
+
+    rolling = RollingFeatureState(preprocessor.rolling_window) if uses_rolling_features(preprocessor) else None
+    chunks = iterate("read_chunk", iter_dataset(args.chunk_size, path=args.input, drop_unused=rolling is None))
+    for chunk in chunks:
+        if chunk.empty:  # مثلاً CSV فقط با سطر عنوان
+            continue
+        if rolling is not None:
+            with stage("rolling_features", rows=len(chunk)):
+                chunk = chunk.join(rolling.update_frame(chunk))
+
+        # همان مراحل 3 و 4 حالت عادی: حذف ستون‌های غیر ML و جداسازی X/y
+        drop_cols = [c for c in config.DROP_COLS if c in chunk.columns]
+        chunk = chunk.drop(columns=drop_cols)
+        target = detect_target_col(chunk)
+        X = chunk.drop(columns=[target])
+
+        # مراحل 6 و 8: پیش‌بینی SNR و تصمیم TPC برای این chunk
+        Xn = model_features(X, preprocessor)
+        snr_pred = predict(model, Xn, chunk[target].to_numpy(), args.online_update, args.model)
+        pred_df = pd.DataFrame({
+            "snr_true": chunk[target].to_numpy(),
+            "snr_pred": snr_pred,
+        })
+        decisions = tpc_decisions(
+            snr_pred,
+            payload=payload_of(X, args.energy_model),
+            tpc_mode=args.tpc_mode,
+            with_optimal=args.with_optimal,
+        )
+        dec_df = pd.DataFrame(decisions)
 
+        if figures is not None:
+            with stage("figures.aggregate", rows=len(chunk)):
+                figures.add(pred_df["snr_true"].to_numpy(), snr_pred, decisions)
+
+        # مراحل 7 و 9: نوشتن افزایشی به انتهای فایل‌هایی که بالا از نو ساخته شدند
+        with stage("append_csv", rows=len(chunk)):
+            append_csv(pred_df, pred_csv, header=False)
+            append_csv(dec_df, dec_csv, header=False)
+        n_rows += len(chunk)
+
+        since_checkpoint += len(chunk)
+        if args.online_update and since_checkpoint >= config.ONLINE_CHECKPOINT_ROWS:
+            with stage("checkpoint", rows=since_checkpoint):
+                checkpoint(registry, args.model, model, preprocessor)
+            since_checkpoint = 0
+
+    if args.online_update and since_checkpoint:
+        with stage("checkpoint", rows=since_checkpoint):
+            checkpoint(registry, args.model, model, preprocessor)
+    return n_rows
+
+
+def predict_snr(args: argparse.Namespace, pred_csv: Path) -> tuple[pd.DataFrame, pd.DataFrame, object]:
+    """
+    مراحل 2 تا 7 پایپ‌لاین: خواندن دیتاست، پیش‌بینی SNR با مدل منتخب و ذخیره snr_predictions.csv.
+
+    خروجی:
+    - (pred_df با ستون‌های snr_true/snr_pred، ویژگی‌های X برای مدل انرژی، ModelRegistry)
+    """
     # -------------------------------------------------------------------------
     # 2) Load dataset
     # prefer_processed=False یعنی از دیتای خام استفاده کن (چون processed فعلاً نداریم/لازم نیست)
+    # --input اگر داده شود همان فایل خوانده می‌شود
+    # drop_unused=True یعنی ستون‌های DROP_COLS اصلاً خوانده/ساخته نمی‌شوند (نوع‌ها طبق DATASET_SCHEMA)
     # copy() برای جلوگیری از تغییر ناخواسته روی df اصلی
     # -------------------------------------------------------------------------
-    df = load_dataset(prefer_processed=False).copy()
+    with stage("load_dataset") as st:
+        df = load_dataset(prefer_processed=False, path=args.input, drop_unused=True).copy()
+        st.rows = len(df)
 
     # -------------------------------------------------------------------------
     # 3) Drop non-ML columns (ستون‌های شناسه‌ای/زمانی/متنی که برای ML مناسب نیستند)
     # این ستون‌ها در config.DROP_COLS تعریف شده‌اند.
     # -------------------------------------------------------------------------
-    drop_cols = [c for c in config.DROP_COLS if c in df.columns]
-    df = df.drop(columns=drop_cols)
+    with stage("split_xy", rows=len(df)):
+        drop_cols = [c for c in config.DROP_COLS if c in df.columns]
+        df = df.drop(columns=drop_cols)
 
-    # -------------------------------------------------------------------------
-    # 4) Detect target column and split to X/y
-    # target معمولاً "snr" است (طبق config.TARGET_COL)
-    # -------------------------------------------------------------------------
-    target = detect_target_col(df)
+        # ---------------------------------------------------------------------
+        # 4) Detect target column and split to X/y
+        # target معمولاً "snr" است (طبق config.TARGET_COL)
+        # ---------------------------------------------------------------------
+        target = detect_target_col(df)
 
-    # X = همه ستون‌ها به جز ستون هدف
-    X = df.drop(columns=[target]).copy()
+        # X = همه ستون‌ها به جز ستون هدف
+        X = df.drop(columns=[target]).copy()
 
-    # y_true = SNR واقعی برای مقایسه با پیش‌بینی مدل
-    y_true = df[target].copy()
+        # y_true = SNR واقعی برای مقایسه با پیش‌بینی مدل
+        y_true = df[target].copy()
 
     # -------------------------------------------------------------------------
     # 5) Load trained model (مدل آموزش‌داده‌شده توسط خودمان)
-    # مدل منتخب از config.SELECTED_TRAINED_MODEL می‌آید (مثلاً ridge.joblib)
+    # مدل منتخب از --model یا config.SELECTED_TRAINED_MODEL می‌آید (مثلاً ridge.joblib)
     # -------------------------------------------------------------------------
-    model_path = config.TRAINED_MODELS_DIR / config.SELECTED_TRAINED_MODEL
-    model = joblib.load(model_path)
+    # ModelRegistry: بررسی سازگاری از روی metadata، بارگذاری با mmap و ثبت زمان بارگذاری
+    registry = default_registry()
+    with stage("load_model", model=args.model):
+        model = registry.load(args.model)
+
+        # پیش‌پردازنده fit‌شده کنار مدل (<name>.preprocessor.joblib)؛ برای مدل‌های قدیمی None
+        preprocessor = registry.preprocessor(args.model)
+
+    # ویژگی‌های تاریخچه هر دستگاه، فقط اگر مدل با train_baselines --rolling-features آموزش دیده باشد
+    # (ستون‌های منبع جداگانه خوانده می‌شوند؛ پنجره همان پنجره زمان آموزش است)
+    if uses_rolling_features(preprocessor):
+        with stage("rolling_features", rows=len(X)):
+            source = load_dataset(prefer_processed=False, path=args.input, columns=list(SOURCE_COLS))
+            X = X.join(rolling_features(source, preprocessor.rolling_window))
 
     # -------------------------------------------------------------------------
     # 6) Make sure X is numeric and predict SNR
-    # safe_numeric_X ستون‌های غیرعددی را به عدد تبدیل می‌کند و NaNها را پر می‌کند
+    # FeaturePreprocessor ستون‌ها را به ترتیب آموزش در یک آرایه float64 می‌نویسد و NaNها را
+    # با میانه آموزش پر می‌کند؛ اگر موجود نباشد safe_numeric_X (میانه همین batch) استفاده می‌شود
+    # با --online-update مدل افزایشی پس از پیش‌بینی هر uplink با SNR واقعی آن به‌روز و در پایان ذخیره می‌شود
     # -------------------------------------------------------------------------
-    Xn = safe_numeric_X(X)
-    snr_pred = model.predict(Xn)
+    Xn = model_features(X, preprocessor)
+    snr_pred = predict(model, Xn, y_true.to_numpy(), args.online_update, args.model)
+    if args.online_update:
+        with stage("checkpoint"):
+            checkpoint(registry, args.model, model, preprocessor)
+        print(f"Updated {args.model}: {model.n_samples_seen_} samples seen")
 
     # -------------------------------------------------------------------------
     # 7) Save predictions to CSV
@@ -110,90 +474,164 @@ def main():
         "snr_true": y_true.values,
         "snr_pred": snr_pred,
     })
-    save_csv(pred_df, config.SNR_PREDICTIONS_CSV)
-
-    # -------------------------------------------------------------------------
-    # 8) Run TPC decisions per sample (بر اساس SNR پیش‌بینی‌شده)
-    # برای هر snr_pred:
-    #  - decide_tpc یک تصمیم (sf,tp) و margin Me می‌دهد
-    #  - سپس energy_norm را نسبت به baseline محاسبه می‌کنیم
-    # -------------------------------------------------------------------------
-    decisions = []
-    for sp in snr_pred:
-        d = decide_tpc(float(sp))
-
-        decisions.append({
-            "sf_new": d.sf,   # SF انتخابی TPC
-            "tp_new": d.tp,   # TP انتخابی TPC (dBm)
-            "me": d.me,       # Margin after decision (Me)
-            # انرژی نرمال‌شده نسبت به baseline (SF=12, TP=14)
-            "energy_norm": normalized_energy(
-                d.tp,
-                d.sf,
-                tp_ref=config.BASELINE_TP,
-                sf_ref=config.BASELINE_SF
-            ),
-        })
+    with stage("save_predictions", rows=len(pred_df)):
+        save_csv(pred_df, pred_csv)
+
+    return pred_df, X, registry
+
+
+def load_predictions(args: argparse.Namespace, pred_csv: Path) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    """
+    خواندن پیش‌بینی‌های ذخیره‌شده برای --stage tpc (به جای مراحل 2 تا 7).
+
+    - snr_predictions.csv باید قبلاً با --stage predict (یا all) روی همان ورودی ساخته شده باشد
+    - برای مدل انرژی toa فقط ستون طول payload از دیتاست ورودی خوانده می‌شود
+      (سطرها به همان ترتیب پیش‌بینی‌ها هستند)
+
+    خروجی:
+    - (pred_df، DataFrame تک‌ستونی payload یا None برای proxy)
+    """
+    if not pred_csv.exists():
+        raise FileNotFoundError(f"{pred_csv} not found; run with --stage predict first")
+    with stage("load_predictions") as st:
+        # snr_true با همان نوع شِمای ستون هدف (float32) خوانده می‌شود تا نمودارها با حالت all یکسان باشند
+        # snr_pred با repr کامل float64 ذخیره شده؛ float_precision="round_trip" همان بیت‌ها را بازمی‌گرداند
+        # (parser پیش‌فرض pandas ممکن است یک ulp خطا داشته باشد و Me را جابه‌جا کند)
+        snr_dtype = config.DATASET_SCHEMA.get(config.TARGET_COL, "float64")
+        pred_df = pd.read_csv(
+            pred_csv,
+            dtype={"snr_true": snr_dtype, "snr_pred": "float64"},
+            float_precision="round_trip",
+        )
+        st.rows = len(pred_df)
+
+    X = None
+    if args.energy_model == "toa":
+        with stage("load_dataset", rows=len(pred_df)):
+            X = load_dataset(prefer_processed=False, path=args.input, columns=[config.PAYLOAD_LENGTH_COL])
+        if len(X) != len(pred_df):
+            raise ValueError(f"{pred_csv} has {len(pred_df)} rows but the input dataset has {len(X)}; rerun --stage predict")
+    return pred_df, X
+
+
+def report_figures(status: dict[str, str], fig_dir: Path) -> None:
+    """چاپ تعداد نمودارهای رسم‌شده و نمودارهای بدون تغییر (رد‌شده)."""
+    rendered = [name for name, st in status.items() if st == "rendered"]
+    print(f"Saved figures in: {fig_dir} ({len(rendered)} rendered, {len(status) - len(rendered)} unchanged)")
+
+
+def main(argv: list[str] | None = None):
+    """
+    نقطه شروع: خواندن آرگومان‌ها و اجرای run (با --trace داخل یک session ثبت مراحل).
+    """
+    args = parse_args(argv)
+    trace_dir = None if args.out_dir is None else Path(args.out_dir) / "traces"
+    with session("run_pipeline", enabled=args.trace, trace_memory=args.trace_memory, out_dir=trace_dir):
+        run(args)
+
+
+def run(args: argparse.Namespace):
+    """
+    اجرای کامل پایپ‌لاین پروژه.
+
+    مراحل:
+    1) ساخت پوشه‌های خروجی (اگر وجود ندارند)
+    2) خواندن دیتاست (در این نسخه از raw استفاده می‌شود)
+    3) حذف ستون‌های غیرمفید برای ML (DROP_COLS)
+    4) جداسازی X و y (هدف: snr)
+    5) لود مدل منتخب (--model یا SELECTED_TRAINED_MODEL از models_trained)
+    6) پیش‌بینی SNR برای همه نمونه‌ها
+    7) ذخیره CSV پیش‌بینی‌ها
+    8) اجرای الگوریتم تصمیم‌گیری TPC به صورت برداری برای همه نمونه‌ها:
+       - خروجی: sf_new, tp_new, me و energy_norm
+    9) ذخیره CSV تصمیم‌ها
+    10) تولید نمودارهای گزارش (برای ارائه)
+
+    با --stage predict فقط مراحل 1 تا 7 و با --stage tpc فقط مراحل 1 و 8 تا 10 اجرا می‌شوند
+    (در حالت tpc، snr_pred از snr_predictions.csv خوانده می‌شود؛ load_predictions).
+
+    هر مرحله در یک instrument.stage است (بدون --trace هیچ اندازه‌گیری‌ای انجام نمی‌شود).
+    """
+
+    # -------------------------------------------------------------------------
+    # 1) Ensure output directories exist
+    # -------------------------------------------------------------------------
+    ensure_dirs()
+    pred_csv, dec_csv, fig_dir = output_paths(args.out_dir)
+
+    # -------------------------------------------------------------------------
+    # حالت جریانی (--stream): همه مراحل به صورت chunk به chunk در run_stream انجام می‌شوند
+    # -------------------------------------------------------------------------
+    if args.stream:
+        registry = default_registry()
+        with stage("load_model", model=args.model):
+            model = registry.load(args.model)
+        figures = None if args.no_figures else FigureAggregates()
+        n_rows = run_stream(args, model, registry.preprocessor(args.model), figures, registry)
+        print(f"Loaded {args.model} in {registry.load_times[args.model] * 1000:.1f} ms")
+        print(f"Streamed {n_rows} rows in chunks of {args.chunk_size}")
+        print("Saved predictions:", pred_csv)
+        print("Saved decisions:", dec_csv)
+        if n_rows == 0:
+            print("Warning: the input has no rows; the outputs contain only their header and no figures were rendered")
+        elif figures is not None:
+            report_figures(render_figures(figures, fig_dir, workers=args.figure_workers, force=args.force_figures), fig_dir)
+        return
+
+    # -------------------------------------------------------------------------
+    # 2) تا 7) پیش‌بینی SNR و ذخیره snr_predictions.csv (predict_snr)
+    # با --stage tpc این مراحل اجرا نمی‌شوند و پیش‌بینی‌های ذخیره‌شده قبلی خوانده می‌شوند
+    # -------------------------------------------------------------------------
+    registry = None
+    if args.stage == "tpc":
+        pred_df, X = load_predictions(args, pred_csv)
+    else:
+        pred_df, X, registry = predict_snr(args, pred_csv)
+        if args.stage == "predict":
+            print(f"Loaded {args.model} in {registry.load_times[args.model] * 1000:.1f} ms")
+            print("Saved predictions:", pred_csv)
+            return
+    snr_pred = pred_df["snr_pred"].to_numpy()
+
+    # -------------------------------------------------------------------------
+    # 8) Run TPC decisions for all samples at once (بر اساس SNR پیش‌بینی‌شده)
+    # decide_tpc_batch همان منطق decide_tpc را به صورت برداری روی کل آرایه اجرا می‌کند
+    # و خروجی ستونی (sf, tp, me) می‌دهد؛ دیگر حلقه Python به ازای هر نمونه نداریم.
+    # در حالت --tpc-mode optimal به جای آن decide_tpc_optimal (جستجوی کامل grid) استفاده می‌شود.
+    # سپس energy_norm را نسبت به baseline (SF=12, TP=14) با یک gather از جدول انرژی محاسبه می‌کنیم
+    # (جدول proxy یا جدول Time-on-Air، بسته به --energy-model).
+    # -------------------------------------------------------------------------
+    # مدل انرژی: proxy (فقط SF/TP) یا toa (Time-on-Air با طول payload هر نمونه)
+    payload = payload_of(X, args.energy_model)
+
+    decisions = tpc_decisions(snr_pred, payload=payload, tpc_mode=args.tpc_mode, with_optimal=args.with_optimal)
 
     dec_df = pd.DataFrame(decisions)
-    save_csv(dec_df, config.TPC_DECISIONS_CSV)
+    with stage("save_decisions", rows=len(dec_df)):
+        save_csv(dec_df, dec_csv)
 
     # -------------------------------------------------------------------------
     # 9) Generate figures for report (نمودارهای ارائه)
     # این نمودارها خروجی‌های بصری اصلی پروژه هستند.
+    # ابتدا همه داده به شمارش‌های NumPy (histogram یک‌بعدی و دوبعدی) تبدیل می‌شود؛
+    # سپس figures.render_figures فقط نمودارهایی را که داده‌شان تغییر کرده، به صورت موازی رسم می‌کند.
     # -------------------------------------------------------------------------
-
-    # 9.1) True vs Pred: آیا مدل SNR را خوب پیش‌بینی کرده؟
-    plt.figure()
-    plt.scatter(pred_df["snr_true"], pred_df["snr_pred"])
-    plt.xlabel("SNR true (dB)")
-    plt.ylabel("SNR predicted (dB)")
-    plt.title("SNR: True vs Predicted")
-    plt.savefig(config.FIG_DIR / "snr_true_vs_pred.png", dpi=200, bbox_inches="tight")
-    plt.close()
-
-    # 9.2) Distribution of chosen SF: TPC چه SFهایی را بیشتر انتخاب کرده؟
-    plt.figure()
-    dec_df["sf_new"].value_counts().sort_index().plot(kind="bar")
-    plt.xlabel("SF chosen")
-    plt.ylabel("Count")
-    plt.title("TPC Output: SF Distribution")
-    plt.savefig(config.FIG_DIR / "sf_distribution.png", dpi=200, bbox_inches="tight")
-    plt.close()
-
-    # 9.3) Distribution of chosen TP: TPC چه TPهایی را بیشتر انتخاب کرده؟
-    plt.figure()
-    plt.hist(dec_df["tp_new"], bins=13)  # مناسب برای بازه 2..14 با گام 1
-    plt.xlabel("TP chosen (dBm)")
-    plt.ylabel("Count")
-    plt.title("TPC Output: TP Distribution")
-    plt.savefig(config.FIG_DIR / "tp_distribution.png", dpi=200, bbox_inches="tight")
-    plt.close()
-
-    # 9.4) Margin histogram: وضعیت margin بعد از تصمیم‌گیری چطور است؟
-    plt.figure()
-    plt.hist(dec_df["me"], bins=20)
-    plt.xlabel("Margin Me (dB)")
-    plt.ylabel("Count")
-    plt.title("Margin Distribution after TPC")
-    plt.savefig(config.FIG_DIR / "me_distribution.png", dpi=200, bbox_inches="tight")
-    plt.close()
-
-    # 9.5) Energy norm histogram: انرژی نسبی نسبت به baseline چگونه تغییر کرده؟
-    plt.figure()
-    plt.hist(dec_df["energy_norm"], bins=20)
-    plt.xlabel("Normalized energy (vs baseline SF=12, TP=14)")
-    plt.ylabel("Count")
-    plt.title("Energy Reduction Proxy")
-    plt.savefig(config.FIG_DIR / "energy_norm_hist.png", dpi=200, bbox_inches="tight")
-    plt.close()
+    figure_status = None
+    if not args.no_figures:
+        with stage("figures.aggregate", rows=len(pred_df)):
+            figures = FigureAggregates()
+            figures.add(pred_df["snr_true"].to_numpy(), snr_pred, decisions)
+        figure_status = render_figures(figures, fig_dir, workers=args.figure_workers, force=args.force_figures)
 
     # -------------------------------------------------------------------------
     # 10) Print outputs path for quick navigation
     # -------------------------------------------------------------------------
-    print("Saved predictions:", config.SNR_PREDICTIONS_CSV)
-    print("Saved decisions:", config.TPC_DECISIONS_CSV)
-    print("Saved figures in:", config.FIG_DIR)
+    if registry is not None:
+        print(f"Loaded {args.model} in {registry.load_times[args.model] * 1000:.1f} ms")
+        print("Saved predictions:", pred_csv)
+    print("Saved decisions:", dec_csv)
+    if figure_status is not None:
+        report_figures(figure_status, fig_dir)
 
 
 if __name__ == "__main__":
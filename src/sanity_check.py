@@ -9,13 +9,60 @@
 3) Head: چند ردیف اول برای دیدن نمونه داده‌ها
 4) Missing values: بررسی مقدارهای گمشده (NaN) در ستون‌ها
 5) Describe: آمار توصیفی اولیه برای تشخیص داده‌های غیرعادی (مثلاً min/max عجیب)
+6) TPC batch parity: برابری خروجی decide_tpc_batch با decide_tpc اسکالر در همه نواحی SNR
+7) TPC decision table: برابری lookup جدول تصمیم (و نسخه ذخیره/mmap شده آن) با decide_tpc_batch
+8) Energy batch parity: برابری normalized_energy_batch (gather از grid) با normalized_energy اسکالر
+9) Time-on-Air model: یکنوایی airtime در SF و payload، NaN برای length نامعتبر و مقایسه airtime/energy با ستون‌های اندازه‌گیری‌شده
+10) Optimal TPC: مقایسه decide_tpc_optimal با جستجوی کامل اسکالر و با تصمیم greedy
+11) Preprocessor parity: برابری FeaturePreprocessor.transform (batch) و transform_one (تک uplink)
+12) Synthetic CSV round-trip: خواندن CSV ساخته‌شده با encoder برداری synth.py و مقایسه با داده تولیدشده
+13) Streaming KPIs: KPIهای یک‌گذره kpi_stream.py در برابر محاسبه دقیق، و برابری ادغام shardها با یک گذر
+14) Device TPC controller: برابری process_log برداری (در چند chunk) با پردازش uplink به uplink با decide_tpc
+15) Rolling features: برابری بیت‌به‌بیت rolling_features (batch) با بافرهای حلقوی online و مقایسه با groupby-rolling پانداس
+16) Online RLS model: برابری RLSRegressor با جواب بسته Ridge و مستقل بودن نتیجه از اندازه batchهای partial_fit
+17) NumPy export: برابری پیش‌بینی numpy_predictor (از فایل .npz) با Ridge و StandardScaler+SVR در sklearn
+18) Flat forest: برابری دقیق (بیت‌به‌بیت) FlatForest بارگذاری‌شده با memory-map با RandomForestRegressor در sklearn
 
 این فایل معمولاً قبل از train_baselines یا run_pipeline اجرا می‌شود.
 """
 
 from pathlib import Path
+import tempfile
+import numpy as np
 import pandas as pd
 
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from src import config
+from src.energy import (
+    INVALID_PAYLOAD,
+    MAX_PHY_PAYLOAD_BYTES,
+    airtime_table,
+    lora_airtime,
+    lora_airtime_batch,
+    normalized_energy,
+    normalized_energy_batch,
+    normalized_toa_energy,
+    payload_bytes_from_length,
+    toa_energy,
+)
+from src.io_utils import load_dataset as io_load_dataset
+from src.device_controller import DeviceTPCController
+from src.export_numpy import PARITY_ATOL, check_parity, export_forest, export_model
+from src.flat_forest import FlatForest
+from src.kpi_stream import KPIAggregator, aggregate_csv, aggregate_files, csv_shards
+from src.numpy_predictor import NumpyPredictor
+from src.online_model import INTERCEPT_PRIOR, RLSRegressor
+from src.preprocessing import FeaturePreprocessor
+from src.rolling_features import ROLLING_FEATURES, RollingFeatureState, rolling_features
+from src.synth import DECIMALS, PathLossModel, iter_synthetic, write_synthetic_csv
+from src.tpc import decide_tpc, decide_tpc_batch, decide_tpc_optimal
+from src.tpc_table import TPCDecisionTable
+
 
 # مسیر پیش‌فرض دیتاست خام
 # نکته: این مسیر نسبت به «ریشه پروژه» تعریف شده است.
@@ -32,8 +79,11 @@ def load_dataset(path: Path) -> pd.DataFrame:
 
     خروجی:
     - DataFrame پانداس
+
+    نکته: از io_utils.load_dataset استفاده می‌شود تا کش ستونی دیتاست (در صورت وجود)
+    هم اینجا به کار برود و CSV دوباره parse نشود.
     """
-    return pd.read_csv(path)
+    return io_load_dataset(prefer_processed=False, path=path)
 
 
 def report_basic_stats(df: pd.DataFrame) -> None:
@@ -59,6 +109,527 @@ def report_basic_stats(df: pd.DataFrame) -> None:
     print("\nDescribe (first 20 rows):\n", df.describe(include="all").T.head(20))
 
 
+def check_tpc_batch_parity() -> None:
+    """
+    بررسی برابری دقیق decide_tpc_batch با decide_tpc (نسخه اسکالر مرجع).
+
+    نمونه‌های SNR طوری انتخاب می‌شوند که همه نواحی تصمیم را پوشش دهند:
+    - SNR بسیار پایین (لینک حتی با SF_MAX/TP_MAX هم ایمن نمی‌شود)
+    - ناحیه‌هایی که SF یا TP افزایش می‌یابد
+    - ناحیه‌هایی که SF و TP کاهش می‌یابند تا SF_MIN/TP_MIN
+    - دقیقاً روی مرزهای تصمیم (Me = 0) و یک ulp قبل/بعد از آن‌ها
+    - NaN
+    همچنین چند مقدار شروع (sf_start, tp_start) متفاوت هم آزموده می‌شود.
+    در صورت عدم تطابق، AssertionError می‌دهد.
+    """
+    # مرزهای تصمیم: SNRهایی که در آن‌ها Me(sf, tp) = 0 می‌شود
+    sfs = range(config.SF_MIN, config.SF_MAX + 1)
+    tps = np.arange(config.TP_MIN, config.TP_MAX + 1, dtype=float)
+    edges = np.array([
+        config.SNR_LIMIT_BY_SF[sf] + config.LINK_MARGIN_DB + config.BASELINE_TP - tp
+        for sf in sfs for tp in tps
+    ])
+
+    snr = np.concatenate([
+        np.arange(-60.0, 40.0, 0.05),
+        edges,
+        np.nextafter(edges, -np.inf),
+        np.nextafter(edges, np.inf),
+        [np.nan, -np.inf, np.inf],
+    ])
+
+    starts = [(None, None), (config.SF_MIN, float(config.TP_MIN)), (10, 8.0), (config.SF_MAX, 5.5)]
+    for sf_start, tp_start in starts:
+        batch = decide_tpc_batch(snr, sf_start=sf_start, tp_start=tp_start)
+        for i, s in enumerate(snr):
+            d = decide_tpc(float(s), sf_start=sf_start, tp_start=tp_start)
+            same_me = (d.me == batch.me[i]) or (np.isnan(d.me) and np.isnan(batch.me[i]))
+            assert d.sf == batch.sf[i] and d.tp == batch.tp[i] and same_me, (
+                f"TPC batch mismatch at snr={s!r}, start={(sf_start, tp_start)}: "
+                f"scalar={d}, batch=({batch.sf[i]}, {batch.tp[i]}, {batch.me[i]})"
+            )
+
+    print(f"\nTPC batch parity: OK ({len(snr) * len(starts)} samples)")
+
+
+def _tpc_probe_snr() -> np.ndarray:
+    """نمونه‌های SNR پوشش‌دهنده همه نواحی تصمیم (شامل مرزها، ulpهای مجاور و NaN)."""
+    sfs = range(config.SF_MIN, config.SF_MAX + 1)
+    tps = np.arange(config.TP_MIN - 1, config.TP_MAX + 2, 0.5)
+    edges = np.array([
+        config.SNR_LIMIT_BY_SF[sf] + config.LINK_MARGIN_DB + config.BASELINE_TP - tp
+        for sf in sfs for tp in tps
+    ])
+    return np.concatenate([
+        np.arange(-60.0, 40.0, 0.01),
+        edges,
+        np.nextafter(edges, -np.inf),
+        np.nextafter(edges, np.inf),
+        [np.nan, -np.inf, np.inf],
+    ])
+
+
+def check_tpc_table_parity() -> None:
+    """
+    بررسی برابری TPCDecisionTable.lookup با decide_tpc_batch.
+
+    هم جدول ساخته‌شده در حافظه و هم نسخه ذخیره‌شده روی دیسک (باز شده با mmap) آزموده می‌شوند.
+    """
+    snr = _tpc_probe_snr()
+    starts = [(None, None), (10, 8.0), (config.SF_MAX, 5.5)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (sf_start, tp_start) in enumerate(starts):
+            ref = decide_tpc_batch(snr, sf_start=sf_start, tp_start=tp_start)
+            table = TPCDecisionTable.build(sf_start=sf_start, tp_start=tp_start)
+
+            path = Path(tmp) / f"tpc_table_{i}.bin"
+            table.save(path)
+            mapped = TPCDecisionTable.load(path, mmap=True)
+
+            for t in (table, mapped):
+                got = t.lookup(snr)
+                assert np.array_equal(got.sf, ref.sf), f"SF mismatch (start={(sf_start, tp_start)})"
+                assert np.array_equal(got.tp, ref.tp), f"TP mismatch (start={(sf_start, tp_start)})"
+                assert np.array_equal(got.me, ref.me, equal_nan=True), f"Me mismatch (start={(sf_start, tp_start)})"
+
+    print(f"TPC decision table parity: OK ({len(table)} regions, {len(snr) * len(starts)} samples)")
+
+
+def check_energy_batch_parity() -> None:
+    """
+    بررسی برابری normalized_energy_batch با normalized_energy اسکالر.
+
+    هم نقاط روی grid (SF/TP صحیح داخل بازه config) و هم نقاط خارج از grid
+    (TP کسری یا خارج از بازه) آزموده می‌شوند؛ نقاط روی grid باید بیت‌به‌بیت برابر باشند.
+    """
+    sf = np.repeat(np.arange(config.SF_MIN, config.SF_MAX + 1), 4 * (config.TP_MAX - config.TP_MIN + 3))
+    tp = np.tile(np.arange(config.TP_MIN - 1, config.TP_MAX + 2, 0.25), config.SF_MAX - config.SF_MIN + 1)
+
+    got = normalized_energy_batch(tp, sf, tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+    ref = np.array([
+        normalized_energy(float(t), int(s), tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+        for t, s in zip(tp, sf)
+    ])
+
+    on_grid = (tp == np.floor(tp)) & (tp >= config.TP_MIN) & (tp <= config.TP_MAX)
+    assert np.array_equal(got[on_grid], ref[on_grid]), "Energy grid gather differs from scalar normalized_energy"
+    assert np.allclose(got, ref, rtol=1e-12, atol=0.0), "Off-grid batch energy differs from scalar normalized_energy"
+
+    # broadcast: یک SF ثابت برای آرایه‌ای از TPها
+    assert np.array_equal(normalized_energy(tp[on_grid], 9), normalized_energy_batch(tp[on_grid], 9))
+
+    print(f"Energy batch parity: OK ({len(tp)} samples, {int(on_grid.sum())} on grid)")
+
+
+def check_toa_against_measurements(df: pd.DataFrame) -> None:
+    """
+    مقایسه مدل انرژی Time-on-Air با ستون‌های اندازه‌گیری‌شده دیتاست.
+
+    - خواص مدل (مستقل از دیتاست): Time-on-Air با افزایش SF اکیداً و با افزایش payload غیرنزولی زیاد می‌شود،
+      انرژی ToA با افزایش TP کم نمی‌شود، و length گمشده/خارج از بازه به INVALID_PAYLOAD و airtime برابر NaN می‌رسد
+    - airtime: تخمین فرمول LoRa برای (sf, length) هر سطر با ستون airtime مقایسه می‌شود
+      (MAE و بیشترین خطا بر حسب ms). MAE باید کمتر از 1 ms باشد.
+    - energy: ستون energy دیتاست انرژی کل گره (نه فقط رادیو) است، پس فقط همبستگی و نسبت
+      میانه‌ها گزارش می‌شود تا واحد/مقیاس دو مقدار قابل مقایسه باشد.
+    - برابری gather جدول airtime با نسخه اسکالر هم بررسی می‌شود.
+    """
+    table = airtime_table()
+    assert (np.diff(table, axis=0) > 0).all(), "Time-on-Air must grow strictly with SF"
+    assert (np.diff(table, axis=1) >= 0).all(), "Time-on-Air must not shrink with a longer payload"
+    tps = np.arange(config.TP_MIN, config.TP_MAX + 1, dtype=np.float64)
+    sfs = np.arange(config.SF_MIN, config.SF_MAX + 1)
+    grid = toa_energy(tps[None, :], sfs[:, None], 40)
+    assert (np.diff(grid, axis=1) >= 0).all(), "ToA energy must not shrink with a higher TP"
+    bad_lengths = np.array([np.nan, -8.0, np.inf, 8.0 * (MAX_PHY_PAYLOAD_BYTES + 1)])
+    bad = payload_bytes_from_length(bad_lengths)
+    assert (bad == INVALID_PAYLOAD).all(), "invalid lengths must map to INVALID_PAYLOAD"
+    assert np.isnan(lora_airtime_batch(9, bad)).all(), "invalid payloads must give a NaN airtime"
+
+    needed = {"sf", config.PAYLOAD_LENGTH_COL, "airtime", "energy"}
+    if not needed.issubset(df.columns):
+        print(f"\nToA model check skipped (missing columns: {sorted(needed - set(df.columns))})")
+        return
+
+    sf = df["sf"].to_numpy()
+    payload = payload_bytes_from_length(df[config.PAYLOAD_LENGTH_COL].to_numpy())
+
+    est_airtime = lora_airtime_batch(sf, payload)
+    ref_scalar = np.array([lora_airtime(int(s), int(p)) for s, p in zip(sf, payload)])
+    assert np.array_equal(est_airtime, ref_scalar), "Airtime table gather differs from scalar lora_airtime"
+
+    err_ms = np.abs(est_airtime - df["airtime"].to_numpy()) * 1000.0
+    print(f"\nToA airtime vs measured: MAE = {err_ms.mean():.4f} ms, max = {err_ms.max():.4f} ms")
+    assert err_ms.mean() < 1.0, f"Time-on-Air formula disagrees with the measured airtime (MAE {err_ms.mean():.3f} ms)"
+
+    # انرژی: TP واقعی هر uplink در دیتاست نیست، پس با TP=baseline تخمین می‌زنیم
+    est_energy = toa_energy(float(config.BASELINE_TP), sf, payload)
+    measured = df["energy"].to_numpy()
+    corr = float(np.corrcoef(est_energy, measured)[0, 1])
+    ratio = float(np.median(measured) / np.median(est_energy))
+    print(f"ToA energy vs measured: corr = {corr:.3f}, median(measured)/median(estimated) = {ratio:.2f}")
+
+
+def check_tpc_optimal() -> None:
+    """
+    بررسی decide_tpc_optimal:
+    1) برابری با یک جستجوی کامل اسکالر (حلقه ساده روی همه SF/TPها) برای هر دو مدل انرژی
+    2) انرژی optimal هیچ‌گاه بیشتر از greedy نیست، وقتی greedy تصمیم قابل قبول (Me >= 0) داشته باشد
+    3) نتیجه مستقل از chunk_size است
+    """
+    rng = np.random.default_rng(config.RANDOM_STATE)
+    snr = np.concatenate([rng.uniform(-40.0, 30.0, 2000), [np.nan]])
+    payload = rng.integers(13, 256, len(snr))
+
+    grid = [(sf, float(tp)) for sf in range(config.SF_MIN, config.SF_MAX + 1)
+            for tp in range(config.TP_MIN, config.TP_MAX + 1)]
+
+    def me(s: float, sf: int, tp: float) -> float:
+        return (s + (tp - config.BASELINE_TP)) - config.SNR_LIMIT_BY_SF[sf] - config.LINK_MARGIN_DB
+
+    for use_payload in (False, True):
+        pl = payload if use_payload else None
+        opt = decide_tpc_optimal(snr, payload_bytes=pl, chunk_size=97)
+        same = decide_tpc_optimal(snr, payload_bytes=pl)
+        assert np.array_equal(opt.sf, same.sf) and np.array_equal(opt.tp, same.tp), "chunk_size changes the result"
+
+        def energy(sf, tp, i):
+            if use_payload:
+                return float(normalized_toa_energy(tp, sf, payload[i]))
+            return normalized_energy(tp, sf)
+
+        for i, s in enumerate(snr):
+            ok = [(energy(sf, tp, i), sf, tp) for sf, tp in grid if me(s, sf, tp) >= 0]
+            want = min(ok)[1:] if ok else (config.SF_MAX, float(config.TP_MAX))
+            assert (opt.sf[i], opt.tp[i]) == want, f"optimal mismatch at snr={s!r}: got {(opt.sf[i], opt.tp[i])}, want {want}"
+
+        greedy = decide_tpc_batch(snr)
+        e_opt = normalized_toa_energy(opt.tp, opt.sf, payload) if use_payload else normalized_energy_batch(opt.tp, opt.sf)
+        e_gr = normalized_toa_energy(greedy.tp, greedy.sf, payload) if use_payload else normalized_energy_batch(greedy.tp, greedy.sf)
+        feasible = greedy.me >= 0
+        assert (e_opt[feasible] <= e_gr[feasible] * (1 + 1e-12)).all(), "optimal uses more energy than greedy"
+
+    print(f"Optimal TPC: OK ({len(snr)} samples, proxy and ToA energy)")
+
+
+def check_preprocessor_parity(df: pd.DataFrame) -> None:
+    """
+    بررسی برابری مسیر batch و مسیر تک‌نمونه FeaturePreprocessor.
+
+    چند مقدار NaN/غیرعددی عمداً وارد می‌شود تا جایگزینی با میانه آموزش در هر دو مسیر آزموده شود؛
+    خروجی‌ها باید بیت‌به‌بیت برابر باشند و هیچ NaN باقی نماند.
+    """
+    X = df.drop(columns=[c for c in config.DROP_COLS + [config.TARGET_COL] if c in df.columns])
+    pre = FeaturePreprocessor.fit(X)
+
+    values = X.to_numpy(dtype=np.float64, copy=True)
+    rng = np.random.default_rng(0)
+    values[rng.integers(0, len(X), size=20), rng.integers(0, X.shape[1], size=20)] = np.nan
+    X = pd.DataFrame(values, columns=X.columns)
+
+    batch = pre.transform(X)
+    records = X.to_dict("records")
+    records[0] = {**records[0], X.columns[0]: "n/a"}   # مقدار غیرعددی
+    records[1] = {k: v for k, v in records[1].items() if k != X.columns[1]}  # کلید گمشده
+    batch[0, 0] = pre.medians[0]
+    batch[1, 1] = pre.medians[1]
+
+    online = np.vstack([pre.transform_one(r) for r in records])
+    assert not np.isnan(batch).any(), "FeaturePreprocessor.transform left NaN values"
+    assert np.array_equal(batch, online), "FeaturePreprocessor batch and single-record paths differ"
+
+    print(f"Preprocessor parity: OK ({len(X)} rows, {pre.n_features} features)")
+
+
+def check_synth_roundtrip(df: pd.DataFrame) -> None:
+    """
+    بررسی encoder برداری CSV در synth.py.
+
+    یک دیتاست مصنوعی کوچک (چند chunk) نوشته و با load_dataset (همان reader پایپ‌لاین) خوانده می‌شود؛
+    هر ستون باید با خروجی iter_synthetic (با همان seed) تا دقت اعشار CSV برابر باشد.
+    """
+    model = PathLossModel.fit(df)
+    kwargs = dict(devices=7, chunk_rows=1_000, seed=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "synth.csv"
+        write_synthetic_csv(path, model, 2_500, **kwargs)
+        back = io_load_dataset(prefer_processed=False, path=path, use_cache=False)
+    ref = pd.concat(iter_synthetic(model, 2_500, **kwargs), ignore_index=True)
+
+    assert list(back.columns) == list(ref.columns), "synthetic CSV columns differ"
+    for c in ref.columns:
+        if c in DECIMALS:
+            tol = 0.5 * 10.0 ** -DECIMALS[c] + 1e-9
+            ok = np.allclose(back[c].to_numpy(np.float64), ref[c].to_numpy(np.float64), rtol=0, atol=tol)
+        else:
+            ok = (back[c].astype(str).to_numpy() == ref[c].astype(str).to_numpy()).all()
+        assert ok, f"synthetic CSV round-trip mismatch in column {c}"
+
+    print(f"Synthetic CSV round-trip: OK ({len(back)} rows, {back['device_id'].nunique()} devices)")
+
+
+def check_kpi_stream() -> None:
+    """
+    بررسی KPIAggregator و خواندن shardهای CSV (kpi_stream.py).
+
+    - میانگین، درصدها و جدول‌های SF/TP باید با محاسبه دقیق pandas برابر باشند
+    - میانه‌های sketch حداکثر alpha خطای نسبی دارند
+    - ادغام shardهای بایتی یک فایل باید همان شمارش‌ها و bucketهای یک گذر کامل را بدهد
+    """
+    rng = np.random.default_rng(0)
+    n = 20_000
+    dec = pd.DataFrame({
+        "sf_new": rng.integers(config.SF_MIN, config.SF_MAX + 1, n),
+        "tp_new": rng.integers(config.TP_MIN, config.TP_MAX + 1, n).astype(float),
+        "me": rng.normal(0.0, 6.0, n),
+        "energy_norm": rng.lognormal(-2.0, 1.5, n),
+    })
+    dec.loc[::97, "me"] = 0.0  # مقادیر صفر در bucket جداگانه sketch
+
+    agg = KPIAggregator()
+    for start in range(0, n, 3_000):
+        agg.add(dec.iloc[start:start + 3_000])
+    kpi = agg.summary()
+
+    assert kpi["count"] == n
+    for col in ("energy_norm", "me"):
+        assert np.isclose(kpi[f"{col}_mean"], dec[col].mean(), rtol=1e-12, atol=1e-12), f"{col} mean differs"
+        exact = dec[col].median()
+        assert abs(kpi[f"{col}_median"] - exact) <= agg.sketches[col].alpha * abs(exact) + 1e-12, f"{col} median outside alpha"
+    assert kpi["tp_median"] == dec["tp_new"].median() and np.isclose(kpi["tp_mean"], dec["tp_new"].mean())
+    assert kpi["sf_mode"] == dec["sf_new"].mode().iloc[0]
+    assert kpi["sf_top_counts"] == {str(k): int(v) for k, v in dec["sf_new"].value_counts().items()}
+    assert np.isclose(kpi["pct_me_ge_0"], (dec["me"] >= 0).mean() * 100)
+    assert np.isclose(kpi["pct_energy_below_0_5"], (dec["energy_norm"] < 0.5).mean() * 100)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "kpi.csv"
+        dec.to_csv(path, index=False)
+        whole = aggregate_csv(path, block_bytes=50_000)
+        shards = csv_shards(path, 5)
+        merged = KPIAggregator()
+        for start, end in shards:
+            merged.merge(aggregate_csv(path, start, end, block_bytes=50_000))
+        parallel = aggregate_files([path], workers=2, block_bytes=50_000)
+
+    for other in (merged, parallel):
+        assert other.rows == whole.rows == n, "shard row counts differ"
+        assert other.thresholds == whole.thresholds, "shard threshold counts differ"
+        assert all(other.tables[c].counts == whole.tables[c].counts for c in whole.tables), "shard count tables differ"
+        for col, sk in whole.sketches.items():
+            for store in ("positive", "negative"):
+                a, b = getattr(other.sketches[col], store).nonzero(), getattr(sk, store).nonzero()
+                assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1]), f"{col} sketch buckets differ"
+        assert np.isclose(other.moments["me"].std, whole.moments["me"].std, rtol=1e-9)
+
+    print(f"Streaming KPIs: OK ({n} rows, {len(shards)} shards, median error <= {agg.sketches['me'].alpha:g})")
+
+
+def check_device_controller() -> None:
+    """
+    بررسی DeviceTPCController.
+
+    مرجع: حلقه Python ساده به ازای هر uplink با decide_tpc اسکالر، شروع از (SF, TP) فعلی دستگاه،
+    پنجره حلقوی SNR و همان قاعده hysteresis و reset با frame counter.
+    process_log (در سه chunk) و update تک‌uplink باید دقیقاً همان sf/tp/me را بدهند؛ با 4 دستگاه
+    (حلقه اسکالر هر دستگاه) و با 1000 دستگاه (دورهای برداری).
+    """
+    rng = np.random.default_rng(3)
+    n, window, hyst = 6_000, 4, 2.0
+    for n_dev in (4, 1_000):
+        devices = np.array([f"EN{i}" for i in range(n_dev)], dtype=object)[rng.integers(0, n_dev, n)]
+        snr = rng.normal(-2.0, 9.0, n)
+        counters = rng.integers(0, 50 * n // n_dev, n)  # گاهی به عقب برمی‌گردد => reset
+
+        # --- مرجع اسکالر ---
+        state = {}
+        ref = []
+        for dev, x, cnt in zip(devices.tolist(), snr.tolist(), counters.tolist()):
+            st = state.get(dev)
+            if st is None or cnt < st["counter"]:
+                st = {"sf": config.BASELINE_SF, "tp": float(config.BASELINE_TP), "buf": [0.0] * window, "pos": 0, "count": 0}
+                state[dev] = st
+            st["counter"] = cnt
+            st["buf"][st["pos"]] = x
+            st["pos"] = (st["pos"] + 1) % window
+            st["count"] += 1
+            mean = float(np.sum(np.array(st["buf"]))) / min(st["count"], window)
+            me_now = (mean + (st["tp"] - config.BASELINE_TP)) - config.SNR_LIMIT_BY_SF[st["sf"]] - config.LINK_MARGIN_DB
+            if me_now < 0 or me_now >= hyst:
+                dec = decide_tpc(mean, sf_start=st["sf"], tp_start=st["tp"])
+                st["sf"], st["tp"], me_now = dec.sf, dec.tp, dec.me
+            ref.append((st["sf"], st["tp"], me_now))
+        ref = np.array(ref)
+
+        ctrl = DeviceTPCController(window=window, hysteresis_db=hyst, capacity=8)
+        parts = [ctrl.process_log(devices[a:b], snr[a:b], counters[a:b]) for a, b in ((0, 1_000), (1_000, 4_500), (4_500, n - 50))]
+        online = [ctrl.update(d, x, c) for d, x, c in zip(devices[n - 50:], snr[n - 50:], counters[n - 50:])]
+        got_sf = np.concatenate([p.sf for p in parts] + [[d.sf for d in online]])
+        got_tp = np.concatenate([p.tp for p in parts] + [[d.tp for d in online]])
+        got_me = np.concatenate([p.me for p in parts] + [[d.me for d in online]])
+
+        assert np.array_equal(got_sf, ref[:, 0]), f"controller SF differs from the scalar reference ({n_dev} devices)"
+        assert np.array_equal(got_tp, ref[:, 1]), f"controller TP differs from the scalar reference ({n_dev} devices)"
+        assert np.array_equal(got_me, ref[:, 2]), f"controller margin differs from the scalar reference ({n_dev} devices)"
+        assert len(ctrl) == len(state)
+
+    print(f"Device TPC controller: OK ({n} uplinks, 4 and 1000 devices, window={window}, hysteresis={hyst} dB)")
+
+
+def check_rolling_features(df: pd.DataFrame) -> None:
+    """
+    بررسی rolling_features.
+
+    - دیتاست واقعی و یک log مصنوعی (دستگاه‌های درهم، reset شمارنده، SNR گمشده):
+      rolling_features (batch) == RollingFeatureState.update_frame در chunkهای نامساوی == update تک‌رکورد
+      (array_equal؛ NaNها هم باید در همان خانه‌ها باشند)
+    - مرجع مستقل: lag/میانگین/واریانس با groupby().shift().rolling() پانداس (تا خطای گرد کردن)
+    """
+    rng = np.random.default_rng(5)
+    n, n_dev, window = 3_000, 25, 5
+    synth = pd.DataFrame({
+        "timestamp": pd.Timestamp("2022-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 10**7, n)), unit="s"),
+        "device_id": np.array([f"EN{i}" for i in range(n_dev)])[rng.integers(0, n_dev, n)],
+        "counter": rng.integers(0, 200, n),  # گاهی به عقب برمی‌گردد => rejoin
+        "snr": np.where(rng.random(n) < 0.05, np.nan, rng.normal(0.0, 8.0, n)),
+        "rssi": rng.integers(-120, -60, n).astype(np.int16),
+    })
+
+    for name, log, W in (("dataset", df, config.ROLLING_WINDOW), ("synthetic", synth, window)):
+        batch = rolling_features(log, W).to_numpy()
+
+        state = RollingFeatureState(W, capacity=2)
+        cuts = [0, len(log) // 7, len(log) // 2, len(log) - 20, len(log)]
+        parts = [state.update_frame(log.iloc[a:b]).to_numpy() for a, b in zip(cuts[:-2], cuts[1:-1])]
+        tail = log.iloc[cuts[-2]:].astype({"timestamp": str}).to_dict("records")
+        online = pd.DataFrame([state.update(r) for r in tail], columns=list(ROLLING_FEATURES)).to_numpy()
+        got = np.vstack(parts + [online])
+        assert np.array_equal(batch, got, equal_nan=True), f"rolling features ({name}): online differs from batch"
+
+        g = log.groupby("device_id", observed=True, sort=False)
+        for col in ("snr", "rssi"):
+            prev = g[col].shift(1).astype("float64")
+            roll = prev.groupby(log["device_id"], observed=True).rolling(W, min_periods=1)
+            mean = roll.mean().reset_index(level=0, drop=True).sort_index()
+            var = roll.var(ddof=0).reset_index(level=0, drop=True).sort_index()
+            feats = pd.DataFrame(batch, columns=ROLLING_FEATURES, index=log.index)
+            assert np.array_equal(feats[f"{col}_lag1"].to_numpy(), prev.to_numpy(), equal_nan=True)
+            assert np.allclose(feats[f"{col}_roll_mean"], mean, equal_nan=True, atol=1e-9)
+            assert np.allclose(feats[f"{col}_roll_var"], var, equal_nan=True, atol=1e-6)
+
+    print(f"Rolling features: OK ({len(df)} + {n} uplinks, batch == online, window={config.ROLLING_WINDOW}/{window})")
+
+
+def check_online_model(df: pd.DataFrame) -> None:
+    """
+    بررسی RLSRegressor روی ویژگی‌های دیتاست (پس از FeaturePreprocessor).
+
+    - با forgetting=1 ضرایب پس از fit برابر جواب بسته (ZᵀZ + D)⁻¹Zᵀy روی همان ماتریس طراحی هستند
+      (D = diag(α, ..., α, 1/INTERCEPT_PRIOR)) و پیش‌بینی‌ها همان sklearn Ridge (intercept بدون جریمه)
+    - partial_fit در batchهای نامساوی (شامل batchهای کوچک‌تر از warm-up) دقیقاً همان وضعیت fit یک‌جا را می‌دهد
+    - پیش‌بینی prequential هر نمونه فقط به نمونه‌های قبلی بستگی دارد
+    """
+    X_frame = df.drop(columns=[config.TARGET_COL] + [c for c in config.DROP_COLS if c in df.columns])
+    X = FeaturePreprocessor.fit(X_frame).transform(X_frame)
+    y = df[config.TARGET_COL].to_numpy(dtype=np.float64)
+
+    whole = RLSRegressor(alpha=1.0, forgetting=1.0, warmup=40).fit(X, y)
+    Z = whole._design(X)
+    penalty = np.eye(Z.shape[1])
+    penalty[-1, -1] = 1.0 / INTERCEPT_PRIOR
+    closed = np.linalg.solve(Z.T @ Z + penalty, Z.T @ y)
+    assert np.allclose(whole.w_, closed, rtol=1e-8, atol=1e-8), "RLS differs from the closed-form ridge solution"
+    ridge = Ridge(alpha=1.0).fit(Z[:, :-1], y)
+    assert np.allclose(whole.predict(X), ridge.predict(Z[:, :-1]), rtol=0, atol=1e-5), "RLS differs from sklearn Ridge"
+
+    parts = RLSRegressor(alpha=1.0, forgetting=1.0, warmup=40)
+    cuts = [0, 7, 30, 41, 200, len(y)]
+    pred = np.concatenate([parts.predict_partial_fit(X[a:b], y[a:b]) for a, b in zip(cuts[:-1], cuts[1:])])
+    assert np.array_equal(parts.w_, whole.w_) and np.array_equal(parts.P_, whole.P_), "partial_fit depends on batch sizes"
+    assert parts.n_samples_seen_ == len(y)
+
+    # prequential: پیش‌بینی نمونه i با مدلی که فقط i نمونه اول را دیده است
+    i = 250
+    prefix = RLSRegressor(alpha=1.0, forgetting=1.0, warmup=40).fit(X[:i], y[:i])
+    assert np.isclose(prefix.predict(X[i:i + 1])[0], pred[i], rtol=0, atol=1e-12)
+
+    rmse = float(np.sqrt(np.mean((pred[40:] - y[40:]) ** 2)))
+    print(f"Online RLS model: OK ({len(y)} samples, {Z.shape[1]} weights, prequential RMSE {rmse:.3f} dB)")
+
+
+def check_numpy_export(df: pd.DataFrame) -> None:
+    """
+    صدور Ridge و Pipeline(StandardScaler, SVR) آموزش‌داده‌شده روی دیتاست به .npz و مقایسه NumpyPredictor
+    (batch، predict_one و predict_record با NaN/کلید گمشده) با model.predict در sklearn.
+
+    مدل‌ها همین‌جا آموزش می‌بینند تا بررسی به نسخه sklearn مدل‌های models_trained/ وابسته نباشد.
+    """
+    X = df.drop(columns=[c for c in config.DROP_COLS + [config.TARGET_COL] if c in df.columns])
+    y = df[config.TARGET_COL].to_numpy(dtype=np.float64)
+    pre = FeaturePreprocessor.fit(X)
+    X_model = pre.transform_frame(X)
+
+    # چند مقدار گمشده/غیرعددی برای مسیر predict_record (میانه‌های ذخیره‌شده در .npz)
+    X_probe = X.astype(object)
+    X_probe.iloc[0, 0] = None
+    X_probe.iloc[-1, 2] = "n/a"
+
+    models = {
+        "ridge": Ridge(alpha=1.0),
+        "svr": Pipeline([("scaler", StandardScaler()), ("svr", SVR(C=10.0, gamma="scale", epsilon=0.1))]),
+    }
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, model in models.items():
+            model.fit(X_model, y)
+            predictor = NumpyPredictor.load(export_model(model, Path(tmp) / f"{name}.npz", preprocessor=pre))
+            parity = check_parity(model, predictor, X_probe, pre)
+            diff = max(parity["batch"], parity["one"], parity["record"])
+            assert diff <= PARITY_ATOL, f"NumPy {name} predictions differ from sklearn by {diff:.3g}"
+            worst = max(worst, diff)
+
+        try:
+            export_model(RandomForestRegressor(n_estimators=2).fit(X_model, y), Path(tmp) / "rf.npz", preprocessor=pre)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("export_model accepted an unsupported model")
+
+    print(f"NumPy export: OK (ridge + svr, {len(X)} rows, max |numpy - sklearn| = {worst:.2g} dB)")
+
+
+def check_flat_forest(df: pd.DataFrame) -> None:
+    """
+    صدور یک RandomForestRegressor کوچک به .forest.bin و مقایسه FlatForest (mmap؛ batch، predict_one و
+    predict_record) با model.predict در sklearn؛ اختلاف باید دقیقاً صفر باشد، حتی برای سطرهای دارای NaN.
+    """
+    X = df.drop(columns=[c for c in config.DROP_COLS + [config.TARGET_COL] if c in df.columns])
+    y = df[config.TARGET_COL].to_numpy(dtype=np.float64)
+    pre = FeaturePreprocessor.fit(X)
+    X_model = pre.transform_frame(X)
+
+    X_probe = X.astype(object)
+    X_probe.iloc[0, 0] = None
+    X_probe.iloc[-1, 2] = "n/a"
+
+    model = RandomForestRegressor(n_estimators=30, max_depth=12, random_state=config.RANDOM_STATE, n_jobs=1)
+    model.fit(X_model, y)
+    with tempfile.TemporaryDirectory() as tmp:
+        forest = FlatForest.load(export_forest(model, Path(tmp) / "rf.forest.bin", preprocessor=pre))
+        assert not forest.value.flags.writeable, "FlatForest.load should memory-map the node arrays read-only"
+        parity = check_parity(model, forest, X_probe, pre)
+
+        # NaN خام (بدون پیش‌پردازنده): مسیر missing_go_to_left درخت‌های sklearn
+        X_nan = np.array(X_model.iloc[:200], dtype=np.float64)
+        X_nan[::7, 0] = np.nan
+        X_nan[::5, -1] = np.nan
+        nan_diff = float(np.max(np.abs(forest.predict(X_nan) - model.predict(pd.DataFrame(X_nan, columns=X_model.columns)))))
+
+    diff = max(parity["batch"], parity["one"], parity["record"], nan_diff)
+    assert diff == 0.0, f"Flat forest predictions differ from sklearn by {diff:.3g}"
+    print(f"Flat forest: OK ({model.n_estimators} trees, {len(X)} rows + NaN rows, |flat - sklearn| = 0)")
+
+
 def main():
     """
     نقطه شروع اجرای اسکریپت.
@@ -66,9 +637,34 @@ def main():
     مراحل:
     1) خواندن دیتاست خام از مسیر پیش‌فرض
     2) چاپ گزارش آماری اولیه
+    3) بررسی برابری TPC برداری و جدول تصمیم با نسخه اسکالر
+    4) بررسی برابری انرژی آرایه‌ای با نسخه اسکالر
+    5) مقایسه مدل Time-on-Air با airtime/energy اندازه‌گیری‌شده
+    6) بررسی درستی حالت optimal در TPC
+    7) بررسی برابری پیش‌پردازنده batch و تک‌نمونه
+    8) بررسی round-trip CSV مصنوعی (synth.py)
+    9) بررسی KPIهای جریانی و ادغام shardها (kpi_stream.py)
+    10) بررسی کنترل‌کننده TPC حالت‌دار هر دستگاه در برابر مرجع اسکالر (device_controller.py)
+    11) بررسی برابری ویژگی‌های تاریخچه batch و online (rolling_features.py)
+    12) بررسی مدل افزایشی RLS (online_model.py)
+    13) بررسی برابری پیش‌بینی‌کننده NumPy با مدل‌های sklearn (export_numpy.py)
+    14) بررسی برابری دقیق جنگل تخت با RandomForestRegressor (flat_forest.py)
     """
     df = load_dataset(DATA_PATH_DEFAULT)
     report_basic_stats(df)
+    check_tpc_batch_parity()
+    check_tpc_table_parity()
+    check_energy_batch_parity()
+    check_toa_against_measurements(df)
+    check_tpc_optimal()
+    check_preprocessor_parity(df)
+    check_synth_roundtrip(df)
+    check_kpi_stream()
+    check_device_controller()
+    check_rolling_features(df)
+    check_online_model(df)
+    check_numpy_export(df)
+    check_flat_forest(df)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,531 @@
+"""
+هدف این فایل:
+- یک سرویس ماندگار (long-running) پیش‌بینی SNR + تصمیم TPC روی HTTP/JSON با asyncio
+- یک load generator داخلی برای اندازه‌گیری تأخیر (p50/p99) و توان عملیاتی (throughput)
+
+مشکل:
+- run_pipeline برای هر اجرا مدل، دیتاست و matplotlib را از نو بارگذاری می‌کند؛
+  برای گرفتن تصمیم TPC یک uplink منفرد این هزینه بسیار بیشتر از خود محاسبه است.
+
+راه‌حل:
+- مدل منتخب (config.SELECTED_TRAINED_MODEL)، پیش‌پردازنده آن و جدول تصمیم TPC فقط یک بار
+  هنگام شروع سرویس بارگذاری می‌شوند (TPCEngine).
+- درخواست‌های هم‌زمان در یک صف جمع و به صورت micro-batch پردازش می‌شوند (MicroBatcher):
+  * اولین درخواست حداکثر SERVE_MAX_LATENCY_MS منتظر درخواست‌های بعدی می‌ماند
+  * یا تا وقتی batch به SERVE_MAX_BATCH سطر برسد
+  * سپس پیش‌بینی + TPC + انرژی یک بار برای کل batch (برداری) اجرا می‌شود
+
+API:
+- POST /decide  با body یک رکورد JSON (dict ویژگی‌ها) یا لیستی از رکوردها
+  خروجی: {"sf", "tp", "me", "energy_norm", "snr_pred"} برای هر رکورد (یا لیست آن‌ها)
+  اگر مدل با ویژگی‌های تاریخچه آموزش دیده باشد (train_baselines --rolling-features)، هر رکورد باید
+  device_id، timestamp و counter داشته باشد؛ snr/rssi اندازه‌گیری‌شده همان uplink (در صورت وجود)
+  به تاریخچه دستگاه اضافه می‌شوند (RollingFeatureState؛ وضعیت در حافظه سرویس)
+- GET /health   وضعیت سرویس و آمار batchها
+- --flat-forest: به جای rf.joblib (sklearn)، جنگل تخت rf.forest.bin (flat_forest.py؛ ساخته‌شده با
+  python -m src.export_numpy) با memory-map بارگذاری می‌شود؛ پیش‌بینی‌ها بیت‌به‌بیت همان‌اند، ولی شروع سرویس
+  و batchهای کوچک (بدون اعتبارسنجی sklearn و thread pool) بسیار سریع‌ترند
+
+اجرا:
+- سرویس:                python -m src.serve
+- با جنگل تخت:          python -m src.serve --flat-forest   (SELECTED_TRAINED_MODEL = "rf.joblib")
+- benchmark داخلی:      python -m src.serve --bench --concurrency 64 --requests 20000
+- load generator خارجی: python -m src.serve --loadgen --host 127.0.0.1 --port 8765
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .energy import MAX_PHY_PAYLOAD_BYTES, normalized_energy_batch, normalized_toa_energy, payload_bytes_from_length
+from .export_numpy import FOREST_MODELS, forest_path
+from .flat_forest import FlatForest, source_fingerprint
+from .io_utils import load_dataset, safe_numeric_X
+from .model_registry import default_registry
+from .rolling_features import SOURCE_COLS, RollingFeatureState, uses_rolling_features
+from .tpc_table import get_decision_table
+
+
+# -----------------------------------------------------------------------------
+# موتور تصمیم (مدل + پیش‌پردازنده + جدول TPC؛ فقط یک بار بارگذاری می‌شود)
+# -----------------------------------------------------------------------------
+class TPCEngine:
+    """
+    اجرای پیش‌بینی SNR، تصمیم TPC و energy_norm برای یک batch از رکوردها.
+
+    - پیش‌پردازنده (در صورت وجود) هر رکورد را مستقیماً در یک buffer از پیش تخصیص‌یافته می‌نویسد
+    - تصمیم TPC با جدول تصمیم (TPCDecisionTable.lookup) گرفته می‌شود که بیت‌به‌بیت با
+      decide_tpc_batch برابر است
+    - energy_norm مانند run_pipeline نسبت به baseline (BASELINE_SF, BASELINE_TP)
+    - ویژگی‌های تاریخچه (در صورت نیاز مدل) از بافرهای حلقوی هر دستگاه با O(1) به ازای هر رکورد؛
+      batchها یکی‌یکی اجرا می‌شوند، پس ترتیب به‌روزرسانی همان ترتیب ورود درخواست‌هاست
+    """
+
+    def __init__(self, model, preprocessor=None, energy_model: str | None = None, max_batch: int | None = None):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.energy_model = energy_model or config.ENERGY_MODEL
+        self.table = get_decision_table(config.TPC_TABLE_PATH)
+
+        if preprocessor is not None:
+            self.feature_names = list(preprocessor.feature_names)
+        else:
+            self.feature_names = [str(c) for c in getattr(model, "feature_names_in_", [])]
+        self.rolling = RollingFeatureState(preprocessor.rolling_window) if uses_rolling_features(preprocessor) else None
+
+        # buffer ویژگی‌ها برای بزرگ‌ترین batch مجاز (batchهای بزرگ‌تر buffer جدید می‌گیرند)
+        max_batch = max_batch or config.SERVE_MAX_BATCH
+        self._buffer = np.empty((max_batch, len(self.feature_names)), dtype=np.float64)
+
+    @classmethod
+    def from_config(
+        cls,
+        model_name: str | None = None,
+        energy_model: str | None = None,
+        max_batch: int | None = None,
+        flat_forest: bool = False,
+    ):
+        """
+        بارگذاری مدل منتخب config (و پیش‌پردازنده کنار آن) از models_trained/ با ModelRegistry.
+
+        flat_forest: به جای خود مدل، <stem>.forest.bin کنار آن (FlatForest با memory-map)؛ اگر مدل جنگل
+        نباشد (model_class در metadata)، یا فایل نباشد یا از نسخه دیگری از مدل ساخته شده باشد (sha256) ValueError
+        """
+        name = model_name or config.SELECTED_TRAINED_MODEL
+        registry = default_registry()
+        if not flat_forest:
+            return cls(registry.load(name), registry.preprocessor(name), energy_model, max_batch)
+
+        metadata = registry.metadata(name)
+        if metadata is None:
+            raise ValueError(f"{name} has no metadata sidecar; retrain it with python -m src.train_baselines")
+        model_class = str(metadata.get("model_class", ""))
+        if model_class.rsplit(".", 1)[-1] not in {c.__name__ for c in FOREST_MODELS}:
+            raise ValueError(
+                f"--flat-forest needs a forest model ({', '.join(c.__name__ for c in FOREST_MODELS)}), "
+                f"but {name} is {model_class or 'of unknown type'}; set config.SELECTED_TRAINED_MODEL = \"rf.joblib\""
+            )
+        path = forest_path(registry.path(name))
+        forest = FlatForest.load(path) if path.exists() else None
+        if forest is None or forest.source != source_fingerprint(metadata["sha256"]):
+            raise ValueError(f"{path.name} is missing or stale for {name}; run: python -m src.export_numpy {name}")
+        return cls(forest, registry.preprocessor(name), energy_model, max_batch)
+
+    def validate(self, records: list[Mapping]) -> None:
+        """
+        بررسی ورودی قبل از ورود به صف (خطا => پاسخ 400 فقط برای همان درخواست).
+
+        هر خطایی که اینجا گرفته نشود داخل engine.decide کل batch (درخواست‌های دیگر کلاینت‌ها) را با 500
+        شکست می‌دهد؛ برای همین length مدل toa همین‌جا (عددی، متناهی و payload داخل 0..255 بایت) بررسی می‌شود.
+        """
+        for r in records:
+            if not isinstance(r, Mapping):
+                raise ValueError("each record must be a JSON object of feature values")
+            if self.energy_model == "toa":
+                self._validate_length(r.get(config.PAYLOAD_LENGTH_COL))
+            if self.rolling is not None and any(r.get(c) is None for c in ("device_id", "timestamp", "counter")):
+                raise ValueError("this model uses per-device history: every record needs device_id, timestamp and counter")
+
+    @staticmethod
+    def _validate_length(value) -> None:
+        col = config.PAYLOAD_LENGTH_COL
+        if value is None:
+            raise ValueError(f"energy model 'toa' needs '{col}' in every record")
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            length = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{col}' must be a number, got {value!r}") from None
+        if not np.isfinite(length) or not 0 <= int(payload_bytes_from_length(length)) <= MAX_PHY_PAYLOAD_BYTES:
+            raise ValueError(f"'{col}' = {value!r} is not a LoRa payload of 0..{MAX_PHY_PAYLOAD_BYTES} bytes")
+
+    def features(self, records: list[Mapping]) -> pd.DataFrame:
+        """ماتریس ویژگی‌های batch (با نام ستون‌ها، همان‌طور که مدل آموزش دیده است)."""
+        n = len(records)
+        if self.preprocessor is None:
+            # مدل‌های قدیمی بدون پیش‌پردازنده: همان مسیر safe_numeric_X در run_pipeline
+            return safe_numeric_X(pd.DataFrame.from_records(records, columns=self.feature_names))
+
+        if self.rolling is not None:
+            history = self.rolling.update_frame(pd.DataFrame.from_records(records, columns=list(SOURCE_COLS)))
+            records = [{**r, **h} for r, h in zip(records, history.to_dict("records"))]
+
+        X = self._buffer[:n] if n <= len(self._buffer) else np.empty((n, len(self.feature_names)))
+        for i, record in enumerate(records):
+            self.preprocessor.transform_one(record, out=X[i:i + 1])
+        return pd.DataFrame(X, columns=self.feature_names, copy=False)
+
+    def decide(self, records: list[Mapping]) -> dict[str, np.ndarray]:
+        """پیش‌بینی + TPC + انرژی برای یک batch؛ خروجی ستونی (هم‌ترتیب با records)."""
+        snr_pred = np.asarray(self.model.predict(self.features(records)), dtype=np.float64)
+        dec = self.table.lookup(snr_pred)
+
+        if self.energy_model == "toa":
+            length = np.array([r[config.PAYLOAD_LENGTH_COL] for r in records], dtype=np.float64)
+            energy = normalized_toa_energy(
+                dec.tp, dec.sf, payload_bytes_from_length(length),
+                tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF,
+            )
+        else:
+            energy = normalized_energy_batch(dec.tp, dec.sf, tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+
+        return {"sf": dec.sf, "tp": dec.tp, "me": dec.me, "energy_norm": energy, "snr_pred": snr_pred}
+
+
+# -----------------------------------------------------------------------------
+# micro-batcher
+# -----------------------------------------------------------------------------
+class MicroBatcher:
+    """
+    جمع کردن درخواست‌های هم‌زمان در batchهای کوچک با بودجه تأخیر مشخص.
+
+    - submit(records): رکوردهای یک درخواست را در صف می‌گذارد و منتظر نتیجه همان‌ها می‌ماند
+    - run(): حلقه پس‌زمینه؛ batch را تا max_batch سطر یا پایان بودجه تأخیر پر می‌کند و
+      engine.decide را در یک thread جداگانه اجرا می‌کند تا event loop در این مدت
+      درخواست‌های جدید را بپذیرد (در هر لحظه فقط یک batch در حال اجراست)
+    - اگر batch با خطا تمام شود، درخواست‌ها جداگانه دوباره اجرا می‌شوند (_isolate)
+    """
+
+    def __init__(self, engine: TPCEngine, max_batch: int | None = None, max_latency_ms: float | None = None):
+        self.engine = engine
+        self.max_batch = int(max_batch or config.SERVE_MAX_BATCH)
+        self.max_latency_s = float(config.SERVE_MAX_LATENCY_MS if max_latency_ms is None else max_latency_ms) / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.n_batches = 0
+        self.n_rows = 0
+
+    async def submit(self, records: list[Mapping]) -> list[dict]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def _collect(self) -> list[tuple[list[Mapping], asyncio.Future]]:
+        """یک batch از صف: اولین آیتم بدون محدودیت زمان، بقیه تا پایان بودجه تأخیر."""
+        loop = asyncio.get_running_loop()
+        first = await self.queue.get()
+        pending = [first]
+        n = len(first[0])
+        deadline = loop.time() + self.max_latency_s
+
+        while n < self.max_batch:
+            if self.queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            pending.append(item)
+            n += len(item[0])
+        return pending
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            records = [r for recs, _ in pending for r in recs]
+
+            try:
+                out = await loop.run_in_executor(None, self.engine.decide, records)
+            except Exception as exc:
+                await self._isolate(pending, exc)
+                continue
+
+            self.n_batches += 1
+            self.n_rows += len(records)
+
+            # تبدیل ستونی به رکوردی و تقسیم بین درخواست‌ها به همان ترتیب ورود
+            cols = {k: v.tolist() for k, v in out.items()}
+            rows = [dict(zip(cols, values)) for values in zip(*cols.values())]
+            start = 0
+            for recs, future in pending:
+                if not future.done():
+                    future.set_result(rows[start:start + len(recs)])
+                start += len(recs)
+
+    async def _isolate(self, pending: list[tuple[list[Mapping], asyncio.Future]], exc: Exception) -> None:
+        """
+        شکست یک batch: هر درخواست جداگانه دوباره اجرا می‌شود تا فقط درخواست خراب خطا بگیرد.
+
+        با ویژگی‌های تاریخچه اجرای دوباره تاریخچه دستگاه‌ها را دو بار به‌روز می‌کند، پس در آن حالت
+        (و وقتی batch فقط یک درخواست دارد) همه درخواست‌های batch همان خطا را می‌گیرند.
+        """
+        if len(pending) == 1 or self.engine.rolling is not None:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        loop = asyncio.get_running_loop()
+        for recs, future in pending:
+            try:
+                out = await loop.run_in_executor(None, self.engine.decide, recs)
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+                continue
+            self.n_batches += 1
+            self.n_rows += len(recs)
+            cols = {k: v.tolist() for k, v in out.items()}
+            if not future.done():
+                future.set_result([dict(zip(cols, values)) for values in zip(*cols.values())])
+
+
+# -----------------------------------------------------------------------------
+# HTTP/1.1 حداقلی روی asyncio streams (keep-alive)
+# -----------------------------------------------------------------------------
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def _http_response(status: int, payload, keep_alive: bool) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+class TPCServer:
+    """سرور HTTP/JSON: هر اتصال می‌تواند چند درخواست پشت سر هم (keep-alive) بفرستد."""
+
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+
+    async def route(self, method: str, target: str, body: bytes) -> tuple[int, object]:
+        if target == "/health":
+            return 200, {
+                "status": "ok",
+                "model": config.SELECTED_TRAINED_MODEL,
+                "energy_model": self.batcher.engine.energy_model,
+                "batches": self.batcher.n_batches,
+                "rows": self.batcher.n_rows,
+                "mean_batch_size": self.batcher.n_rows / max(self.batcher.n_batches, 1),
+            }
+        if target != "/decide":
+            return 404, {"error": f"unknown path {target}"}
+        if method != "POST":
+            return 405, {"error": "use POST /decide"}
+
+        try:
+            data = json.loads(body)
+            single = isinstance(data, dict)
+            records = [data] if single else data
+            if not isinstance(records, list):
+                raise ValueError("body must be a JSON object or a list of objects")
+            self.batcher.engine.validate(records)
+        except ValueError as exc:  # json.JSONDecodeError هم زیرکلاس ValueError است
+            return 400, {"error": str(exc)}
+
+        if not records:
+            return 200, []
+        try:
+            rows = await self.batcher.submit(records)
+        except Exception as exc:
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}
+        return 200, rows[0] if single else rows
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    writer.write(_http_response(400, {"error": "malformed request line"}, keep_alive=False))
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                status, payload = await self.route(method, target, body)
+                writer.write(_http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start_server(
+    host: str | None = None,
+    port: int | None = None,
+    engine: TPCEngine | None = None,
+    max_batch: int | None = None,
+    max_latency_ms: float | None = None
+) -> tuple[asyncio.base_events.Server, MicroBatcher, asyncio.Task]:
+    """
+    راه‌اندازی سرور و حلقه micro-batcher.
+
+    خروجی:
+    - (server, batcher, batch_task)؛ port=0 یعنی یک پورت آزاد تصادفی (برای benchmark داخلی)
+    """
+    engine = engine or TPCEngine.from_config(max_batch=max_batch)
+    batcher = MicroBatcher(engine, max_batch=max_batch, max_latency_ms=max_latency_ms)
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(
+        TPCServer(batcher).handle,
+        host or config.SERVE_HOST,
+        config.SERVE_PORT if port is None else port,
+    )
+    return server, batcher, batch_task
+
+
+# -----------------------------------------------------------------------------
+# load generator
+# -----------------------------------------------------------------------------
+def sample_records(n: int = 1000) -> list[dict]:
+    """
+    رکوردهای نمونه برای load generator: سطرهای دیتاست (بدون ستون هدف).
+
+    device_id، timestamp (رشته ISO) و counter هم نگه داشته می‌شوند تا مدل‌های دارای ویژگی تاریخچه
+    هم قابل benchmark باشند (برای بقیه مدل‌ها کلید اضافی نادیده گرفته می‌شود).
+    """
+    df = load_dataset(prefer_processed=False)
+    ids = df[["device_id", "counter"]].astype({"device_id": str, "counter": "int64"})
+    ids["timestamp"] = df["timestamp"].astype(str)
+    df = df.drop(columns=[c for c in config.DROP_COLS + [config.TARGET_COL] if c in df.columns])
+    records = [{**f, **i} for f, i in zip(df.astype("float64").to_dict("records"), ids.to_dict("records"))]
+    return [records[i % len(records)] for i in range(n)]
+
+
+async def _client(host: str, port: int, bodies: list[bytes], latencies: list[float]) -> None:
+    """یک کلاینت keep-alive که bodies را یکی‌یکی ارسال و تأخیر هر کدام را ثبت می‌کند."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            request = (
+                f"POST /decide HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+            t0 = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode("latin-1").split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            if not head.startswith(b"HTTP/1.1 200"):
+                raise RuntimeError(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    finally:
+        writer.close()
+
+
+async def load_generator(host: str, port: int, n_requests: int = 10_000, concurrency: int = 64) -> dict:
+    """
+    ارسال n_requests درخواست تک‌رکوردی با concurrency اتصال هم‌زمان.
+
+    خروجی:
+    - دیکشنری: تعداد، throughput (req/s)، p50/p99/max تأخیر (ms)
+    """
+    bodies = [json.dumps(r).encode("utf-8") for r in sample_records(min(n_requests, 5000))]
+    per_client = [[bodies[i % len(bodies)] for i in range(c, n_requests, concurrency)] for c in range(concurrency)]
+
+    latencies: list[float] = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, b, latencies) for b in per_client if b))
+    wall = time.perf_counter() - t0
+
+    lat_ms = np.asarray(latencies) * 1000.0
+    return {
+        "requests": len(lat_ms),
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "throughput_rps": len(lat_ms) / wall,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+        "max_ms": float(lat_ms.max()),
+    }
+
+
+def print_report(stats: dict, batcher: MicroBatcher | None = None) -> None:
+    print(f"requests:    {stats['requests']} (concurrency {stats['concurrency']})")
+    print(f"throughput:  {stats['throughput_rps']:.0f} req/s")
+    print(f"latency:     p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+    if batcher is not None:
+        print(f"batches:     {batcher.n_batches} (mean size {batcher.n_rows / max(batcher.n_batches, 1):.1f})")
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Micro-batching SNR prediction + TPC service")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--bench", action="store_true", help="start an in-process server and run the load generator against it")
+    mode.add_argument("--loadgen", action="store_true", help="run the load generator against a running server")
+    parser.add_argument("--host", default=config.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVE_PORT)
+    parser.add_argument("--max-batch", type=int, default=config.SERVE_MAX_BATCH, help="max rows per micro-batch")
+    parser.add_argument("--max-latency-ms", type=float, default=config.SERVE_MAX_LATENCY_MS, help="batching latency budget")
+    parser.add_argument("--energy-model", choices=["proxy", "toa"], default=config.ENERGY_MODEL)
+    parser.add_argument(
+        "--flat-forest",
+        action="store_true",
+        help="serve the selected forest from its flattened <stem>.forest.bin (python -m src.export_numpy)",
+    )
+    parser.add_argument("--requests", type=int, default=10_000, help="load generator: number of requests")
+    parser.add_argument("--concurrency", type=int, default=64, help="load generator: concurrent connections")
+    return parser.parse_args(argv)
+
+
+async def _amain(args: argparse.Namespace) -> None:
+    if args.loadgen:
+        print_report(await load_generator(args.host, args.port, args.requests, args.concurrency))
+        return
+
+    engine = TPCEngine.from_config(energy_model=args.energy_model, max_batch=args.max_batch, flat_forest=args.flat_forest)
+    server, batcher, batch_task = await start_server(
+        args.host, 0 if args.bench else args.port, engine, args.max_batch, args.max_latency_ms
+    )
+    host, port = server.sockets[0].getsockname()[:2]
+
+    try:
+        if args.bench:
+            print_report(await load_generator(host, port, args.requests, args.concurrency), batcher)
+            return
+        print(f"Serving {config.SELECTED_TRAINED_MODEL} on http://{host}:{port} (POST /decide, GET /health)")
+        async with server:
+            await server.serve_forever()
+    finally:
+        server.close()
+        batch_task.cancel()
+
+
+def main(argv: list[str] | None = None):
+    try:
+        asyncio.run(_amain(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    # python -m src.serve [--bench | --loadgen]
+    main()
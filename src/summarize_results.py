@@ -7,114 +7,84 @@
 - آیا انرژی (proxy) نسبت به baseline کاهش یافته؟
 - TPC بیشتر چه SF/TPهایی را انتخاب کرده؟
 - Margin (Me) بعد از تصمیم‌گیری چقدر «ایمن» بوده (چند درصد Me>=0)؟
+- اگر run_pipeline با --with-optimal اجرا شده باشد: تصمیم greedy در برابر optimal چقدر انرژی مصرف می‌کند؟
+
+همه KPIها در «یک گذر» chunk به chunk با src/kpi_stream.py محاسبه می‌شوند (حافظه ثابت):
+- میانگین‌ها/min/max از گشتاورهای جاری، SF/TP از جدول تعداد، درصدها از شمارنده‌های آستانه‌ای
+- میانه energy_norm و me از sketch تقریبی با خطای نسبی حداکثر config.KPI_SKETCH_ALPHA
+- با --workers فایل به بازه‌های بایتی تقسیم و shardها موازی جمع و سپس ادغام می‌شوند؛
+  با چند --input خروجی چند اجرای جداگانه (مثلاً shardهای run_pipeline --stream) یک‌جا خلاصه می‌شود
 
 این فایل معمولاً بعد از run_pipeline اجرا می‌شود.
 """
 
-import pandas as pd
-from src import config
-
-
-def top_counts(series: pd.Series, n: int = 5) -> dict:
-    """
-    استخراج پرتکرارترین مقادیر یک سری (برای خلاصه‌سازی در گزارش).
-
-    ورودی:
-    - series: ستون مورد نظر (مثلاً sf_new یا tp_new)
-    - n: تعداد آیتم‌های پرتکرار که می‌خواهیم نگه داریم
+import argparse
+from pathlib import Path
 
-    خروجی:
-    - یک دیکشنری از نوع:
-      {"value1": count1, "value2": count2, ...}
-      تبدیل کلیدها به str برای چاپ/ذخیره تمیزتر انجام می‌شود.
-    """
-    vc = series.value_counts().head(n)
-    return {str(k): int(v) for k, v in vc.items()}
-
-
-def main():
+from src import config
+from src.instrument import session, stage
+from src.kpi_stream import aggregate_files
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Summary KPIs of tpc_decisions.csv")
+    parser.add_argument(
+        "--input",
+        type=Path,
+        nargs="+",
+        default=[config.TPC_DECISIONS_CSV],
+        help="one or more decision CSVs summarized together (default: config.TPC_DECISIONS_CSV)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config.KPI_WORKERS,
+        help="processes aggregating byte-range shards of each file in parallel (default: config.KPI_WORKERS)",
+    )
+    parser.add_argument("--trace", action="store_true", help="record per-stage timings to config.TRACE_DIR (instrument.py)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    """نقطه شروع: خواندن آرگومان‌ها و اجرای summarize (با --trace داخل یک session ثبت مراحل)."""
+    args = parse_args(argv)
+    with session("summarize_results", enabled=args.trace):
+        summarize(args.input, workers=args.workers)
+
+
+def summarize(paths: list[Path] | None = None, workers: int = 1) -> dict:
     """
     اجرای اصلی استخراج نتایج خلاصه.
 
     مراحل:
-    1) خواندن فایل tpc_decisions.csv
-    2) کنترل اینکه ستون‌های ضروری موجود باشند
-    3) محاسبه KPIهای انرژی، SF، TP و Margin
-    4) رُند کردن خروجی برای چاپ خواناتر
-    5) چاپ دیکشنری نهایی
+    1) خواندن فایل(های) tpc_decisions.csv در یک گذر و جمع کردن KPIها (kpi_stream.aggregate_files)
+       - کنترل ستون‌های ضروری هنگام خواندن سرستون‌ها انجام می‌شود
+    2) محاسبه KPIهای انرژی، SF، TP و Margin از نتیجه ادغام‌شده
+    3) رُند کردن خروجی برای چاپ خواناتر
+    4) چاپ دیکشنری نهایی
+
+    خروجی:
+    - دیکشنری KPIها (بدون رُند)
     """
-    # -------------------------------------------------------------------------
-    # 1) Load decisions file created by run_pipeline.py
-    # -------------------------------------------------------------------------
-    dec = pd.read_csv(config.TPC_DECISIONS_CSV)
+    paths = [config.TPC_DECISIONS_CSV] if paths is None else list(paths)
 
     # -------------------------------------------------------------------------
-    # 2) Basic schema sanity check
-    # اگر این ستون‌ها نباشند یعنی run_pipeline درست تولید نکرده یا فایل اشتباه است
+    # 1) Aggregate decisions file(s) created by run_pipeline.py
+    # اگر ستون‌های sf_new/tp_new/me/energy_norm نباشند (run_pipeline درست تولید نکرده یا فایل
+    # اشتباه است) ValueError داده می‌شود؛ ستون‌های *_opt در صورت وجود مقایسه greedy/optimal را فعال می‌کنند
     # -------------------------------------------------------------------------
-    required = {"sf_new", "tp_new", "me", "energy_norm"}
-    missing = required - set(dec.columns)
-    if missing:
-        raise ValueError(f"Missing required columns in tpc_decisions.csv: {missing}")
+    with stage("aggregate", workers=workers) as st:
+        agg = aggregate_files(paths, workers=workers)
+        st.rows = agg.rows
 
     # -------------------------------------------------------------------------
-    # 3) Compute KPIs (Key Performance Indicators)
+    # 2) Compute KPIs (Key Performance Indicators)
     # -------------------------------------------------------------------------
-    summary = {
-        "count": int(len(dec)),
-
-        # -----------------------------
-        # Energy (Proxy) KPIs
-        # -----------------------------
-        # میانگین energy_norm (نسبت به baseline)
-        "energy_norm_mean": float(dec["energy_norm"].mean()),
-
-        # میانه energy_norm (گاهی از میانگین مقاوم‌تر است، مخصوصاً اگر outlier داشته باشیم)
-        "energy_norm_median": float(dec["energy_norm"].median()),
-
-        # درصد نمونه‌هایی که energy_norm < 1 => بهتر از baseline
-        "pct_energy_below_1": float((dec["energy_norm"] < 1.0).mean() * 100),
-
-        # درصد نمونه‌هایی که energy_norm < 0.5 => حداقل 50% بهتر از baseline (proxy)
-        "pct_energy_below_0_5": float((dec["energy_norm"] < 0.5).mean() * 100),
-
-        # -----------------------------
-        # SF KPIs
-        # -----------------------------
-        # پرتکرارترین SF انتخابی (Mode)
-        "sf_mode": int(dec["sf_new"].mode().iloc[0]),
-
-        # حداقل و حداکثر SF انتخاب‌شده
-        "sf_min": int(dec["sf_new"].min()),
-        "sf_max": int(dec["sf_new"].max()),
-
-        # پرتکرارترین SFها و تعدادشان (برای تحلیل رفتار الگوریتم)
-        "sf_top_counts": top_counts(dec["sf_new"], n=6),
-
-        # -----------------------------
-        # TP KPIs
-        # -----------------------------
-        "tp_mean": float(dec["tp_new"].mean()),
-        "tp_median": float(dec["tp_new"].median()),
-        "tp_min": float(dec["tp_new"].min()),
-        "tp_max": float(dec["tp_new"].max()),
-
-        # چون tp_new ممکن است float باشد، برای جمع‌بندی بهتر round می‌کنیم
-        # (در پروژه شما معمولاً گام 1 dBm است، پس round(1) کافی است)
-        "tp_top_counts": top_counts(dec["tp_new"].round(1), n=8),
-
-        # -----------------------------
-        # Margin (Me) KPIs
-        # -----------------------------
-        "me_mean": float(dec["me"].mean()),
-        "me_median": float(dec["me"].median()),
-
-        # درصد نمونه‌هایی که margin غیرمنفی است (یعنی لینک از نظر شرط ما “ایمن/قابل قبول” است)
-        "pct_me_ge_0": float((dec["me"] >= 0.0).mean() * 100),
-    }
+    with stage("kpis", rows=agg.rows):
+        summary = agg.summary()
 
     # -------------------------------------------------------------------------
-    # 4) Optional: round floats for nicer printing
+    # 3) Optional: round floats for nicer printing
     # این بخش فقط خروجی چاپی را تمیز می‌کند و روی محاسبات اثری ندارد.
     # -------------------------------------------------------------------------
     pretty = {}
@@ -125,9 +95,10 @@ def main():
             pretty[k] = v
 
     # -------------------------------------------------------------------------
-    # 5) Print final summary
+    # 4) Print final summary
     # -------------------------------------------------------------------------
     print(pretty)
+    return summary
 
 
 if __name__ == "__main__":
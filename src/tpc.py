@@ -18,7 +18,11 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+
+import numpy as np
+
 from . import config
+from .energy import MAX_PHY_PAYLOAD_BYTES, airtime_table, energy_grid, tx_current_ma
 
 
 # -----------------------------------------------------------------------------
@@ -140,3 +144,220 @@ def decide_tpc(
     # خروجی نهایی: SF/TP و margin نهایی
     # -------------------------------------------------------------------------
     return TPCDecision(sf=sf, tp=tp, me=float(me(sf, tp)))
+
+
+# -----------------------------------------------------------------------------
+# خروجی ستونی تصمیم TPC برای یک batch از نمونه‌ها
+# -----------------------------------------------------------------------------
+@dataclass
+class TPCBatchDecision:
+    """
+    ساختار خروجی تصمیم TPC برای چند نمونه به صورت ستونی (columnar).
+
+    به جای لیستی از TPCDecision، هر فیلد یک آرایه NumPy هم‌طول با ورودی است:
+    sf: آرایه SFهای انتخابی (int)
+    tp: آرایه توان‌های انتخابی (dBm، float)
+    me: آرایه margin نهایی هر نمونه (dB)
+    """
+    sf: np.ndarray
+    tp: np.ndarray
+    me: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.sf)
+
+
+def snr_limit_array(sf: np.ndarray) -> np.ndarray:
+    """
+    نسخه برداری snr_limit: آستانه SNR_limit را برای یک آرایه از SFها برمی‌گرداند.
+
+    به جای lookup دیکشنری برای هر عنصر، یک جدول آرایه‌ای (ایندکس = SF) ساخته
+    و با یک gather همه مقادیر را یکجا استخراج می‌کنیم.
+    اگر SFی خارج از config.SNR_LIMIT_BY_SF باشد، مانند snr_limit خطای KeyError می‌دهد.
+    """
+    sf = np.asarray(sf, dtype=np.int64)
+    known = np.array(sorted(config.SNR_LIMIT_BY_SF), dtype=np.int64)
+
+    lut = np.full(int(known.max()) + 1, np.nan)
+    lut[known] = [config.SNR_LIMIT_BY_SF[int(k)] for k in known]
+
+    valid = (sf >= 0) & (sf < len(lut))
+    if not valid.all() or np.isnan(lut[sf]).any():
+        bad = np.unique(sf[~valid] if not valid.all() else sf[np.isnan(lut[sf])])
+        raise KeyError(f"SF values not in config.SNR_LIMIT_BY_SF: {bad.tolist()}")
+
+    return lut[sf]
+
+
+def decide_tpc_batch(
+    snr_pred: np.ndarray,
+    sf_start: int | np.ndarray | None = None,
+    tp_start: float | np.ndarray | None = None
+) -> TPCBatchDecision:
+    """
+    نسخه برداری (vectorized) از decide_tpc برای تعداد زیادی نمونه.
+
+    معنای تصمیم دقیقاً همان decide_tpc است (همان چهار مرحله A1, A2, B1, B2)،
+    با این تفاوت که هر حلقه while به جای اجرا روی یک نمونه، روی کل آرایه با ماسک
+    اجرا می‌شود: در هر تکرار فقط نمونه‌هایی که هنوز شرط حلقه را دارند یک گام جلو می‌روند.
+    تعداد تکرارها حداکثر به اندازه بازه SF/TP است (نه تعداد نمونه‌ها)،
+    بنابراین هیچ کار Python به ازای هر نمونه انجام نمی‌شود.
+
+    ورودی‌ها:
+    - snr_pred: آرایه SNRهای پیش‌بینی‌شده (هر شکلی؛ خروجی هم‌شکل ورودی است)
+    - sf_start, tp_start: مقدار شروع؛ اسکالر یا آرایه هم‌شکل snr_pred
+      (اگر None باشد از baseline استفاده می‌شود، مانند decide_tpc)
+
+    خروجی:
+    - TPCBatchDecision شامل آرایه‌های sf، tp و me
+    """
+    snr = np.asarray(snr_pred, dtype=np.float64)
+
+    # -------------------------------------------------------------------------
+    # مقدار شروع SF و TP (broadcast به شکل ورودی و کپی برای تغییر درجا)
+    # -------------------------------------------------------------------------
+    sf0 = config.BASELINE_SF if sf_start is None else sf_start
+    tp0 = float(config.BASELINE_TP) if tp_start is None else tp_start
+    sf = np.broadcast_to(np.asarray(sf0, dtype=np.int64), snr.shape).copy()
+    tp = np.broadcast_to(np.asarray(tp0, dtype=np.float64), snr.shape).copy()
+
+    # نماهای یک‌بعدی (بدون کپی برای sf/tp) تا با ایندکس‌های صحیح کار کنیم
+    snr_f, sf_f, tp_f = snr.ravel(), sf.reshape(-1), tp.reshape(-1)
+
+    # همان فرمول me() در decide_tpc، با همان ترتیب عملیات (برای برابری دقیق اعداد)
+    def me(idx: np.ndarray, d_sf: int = 0, d_tp: float = 0.0) -> np.ndarray:
+        snr_eff = snr_f[idx] + ((tp_f[idx] + d_tp) - config.BASELINE_TP)
+        return snr_eff - snr_limit_array(sf_f[idx] + d_sf) - config.LINK_MARGIN_DB
+
+    # -------------------------------------------------------------------------
+    # A1) افزایش SF برای نمونه‌هایی که margin منفی دارند (تا SF_MAX)
+    # idx فقط نمونه‌هایی را نگه می‌دارد که هنوز داخل حلقه هستند و در هر تکرار کوچک‌تر می‌شود
+    # -------------------------------------------------------------------------
+    idx = np.flatnonzero(sf_f < config.SF_MAX)
+    while idx.size:
+        idx = idx[me(idx) < 0]
+        sf_f[idx] += 1
+        idx = idx[sf_f[idx] < config.SF_MAX]
+
+    # -------------------------------------------------------------------------
+    # A2) افزایش TP اگر هنوز margin منفی است (تا TP_MAX)
+    # -------------------------------------------------------------------------
+    idx = np.flatnonzero(tp_f < config.TP_MAX)
+    while idx.size:
+        idx = idx[me(idx) < 0]
+        tp_f[idx] += 1.0
+        idx = idx[tp_f[idx] < config.TP_MAX]
+
+    # -------------------------------------------------------------------------
+    # B1) کاهش SF تا جایی که margin غیرمنفی بماند
+    # -------------------------------------------------------------------------
+    idx = np.flatnonzero(sf_f > config.SF_MIN)
+    while idx.size:
+        idx = idx[me(idx, d_sf=-1) >= 0]
+        sf_f[idx] -= 1
+        idx = idx[sf_f[idx] > config.SF_MIN]
+
+    # -------------------------------------------------------------------------
+    # B2) کاهش TP تا جایی که margin غیرمنفی بماند
+    # -------------------------------------------------------------------------
+    idx = np.flatnonzero(tp_f > config.TP_MIN)
+    while idx.size:
+        idx = idx[me(idx, d_tp=-1.0) >= 0]
+        tp_f[idx] -= 1.0
+        idx = idx[tp_f[idx] > config.TP_MIN]
+
+    # -------------------------------------------------------------------------
+    # خروجی نهایی ستونی
+    # -------------------------------------------------------------------------
+    me_all = me(np.arange(snr_f.size)).reshape(snr.shape)
+    return TPCBatchDecision(sf=sf, tp=tp, me=me_all)
+
+
+def decide_tpc_optimal(
+    snr_pred: np.ndarray,
+    payload_bytes: np.ndarray | None = None,
+    chunk_size: int | None = None
+) -> TPCBatchDecision:
+    """
+    تصمیم TPC «بهینه» با جستجوی کامل روی همه ترکیب‌های (SF, TP).
+
+    تفاوت با decide_tpc:
+    - decide_tpc حریصانه (greedy) است: ابتدا SF و سپس TP را کم می‌کند و ممکن است
+      کم‌مصرف‌ترین نقطه‌ای که هنوز Me >= 0 دارد را از دست بدهد.
+    - اینجا برای هر نمونه همه نقاط grid (SF_MIN..SF_MAX × TP_MIN..TP_MAX با گام 1 dBm)
+      ارزیابی می‌شوند و از بین نقاط «قابل قبول» (Me >= 0) نقطه با کمترین انرژی انتخاب می‌شود.
+
+    پیاده‌سازی:
+    - برای یک بسته از N نمونه، margin همه نقاط به صورت یک آرایه broadcast شده
+      (N × |SF| × |TP|) محاسبه می‌شود و argmin انرژی روی نقاط قابل قبول گرفته می‌شود.
+    - برای محدود ماندن حافظه، نمونه‌ها در بسته‌های chunk_size سطری پردازش می‌شوند
+      (پیش‌فرض config.TPC_OPTIMAL_CHUNK_ROWS).
+
+    مدل انرژی:
+    - اگر payload_bytes داده نشود: جدول proxy (energy_grid) نسبت به baseline
+    - اگر payload_bytes داده شود: انرژی Time-on-Air (جریان فرستنده × airtime برای طول payload هر نمونه)؛
+      سطرهایی که payload معتبر ندارند (energy.INVALID_PAYLOAD) با جدول proxy رتبه‌بندی می‌شوند
+
+    اگر هیچ نقطه‌ای Me >= 0 نداشته باشد (یا SNR برابر NaN باشد)، مقاوم‌ترین نقطه grid
+    (بیشترین margin؛ با جدول پیش‌فرض یعنی SF_MAX و TP_MAX) انتخاب می‌شود، مانند decide_tpc.
+
+    خروجی:
+    - TPCBatchDecision شامل آرایه‌های sf، tp و me
+    """
+    snr = np.asarray(snr_pred, dtype=np.float64)
+    shape = snr.shape
+    snr = snr.ravel()
+    chunk_size = int(chunk_size or config.TPC_OPTIMAL_CHUNK_ROWS)
+
+    # -------------------------------------------------------------------------
+    # محورهای grid و بخش ثابت margin برای هر نقطه: (TP - baseline) - SNR_limit(SF) - LM
+    # -------------------------------------------------------------------------
+    sfs = np.arange(config.SF_MIN, config.SF_MAX + 1, dtype=np.int64)
+    tps = np.arange(config.TP_MIN, config.TP_MAX + 1, dtype=np.float64)
+    lim = snr_limit_array(sfs)
+    n_tp = len(tps)
+
+    # مقاوم‌ترین نقطه (برای حالتی که هیچ نقطه قابل قبولی وجود ندارد)
+    offset = (tps[None, :] - config.BASELINE_TP) - lim[:, None]
+    fallback = int(np.argmax(offset.ravel()))
+
+    proxy = energy_grid(tp_ref=config.BASELINE_TP, sf_ref=config.BASELINE_SF)
+    if payload_bytes is not None:
+        payload = np.broadcast_to(np.asarray(payload_bytes, dtype=np.int64), shape).ravel()
+        current = tx_current_ma(tps)
+        airtime = airtime_table()
+
+    best = np.empty(len(snr), dtype=np.int64)
+
+    for start in range(0, len(snr), chunk_size):
+        stop = min(start + chunk_size, len(snr))
+        s = snr[start:stop]
+
+        # me با همان ترتیب عملیات decide_tpc: (snr + (tp - baseline)) - lim - LM
+        me = (s[:, None, None] + (tps[None, None, :] - config.BASELINE_TP)) \
+            - lim[None, :, None] - config.LINK_MARGIN_DB
+        feasible = me >= 0
+
+        # انرژی هر نقطه (برای proxy یکسان برای همه سطرها؛ برای ToA وابسته به طول payload)
+        if payload_bytes is None:
+            energy = np.where(feasible, proxy[None, :, :], np.inf)
+        else:
+            p = payload[start:stop]
+            ok = (p >= 0) & (p <= MAX_PHY_PAYLOAD_BYTES)
+            at = airtime[:, np.where(ok, p, 0)].T          # (n, |SF|)
+            cost = at[:, :, None] * current[None, None, :]
+            if not ok.all():
+                cost[~ok] = proxy
+            energy = np.where(feasible, cost, np.inf)
+
+        flat = energy.reshape(len(s), -1)
+        idx = np.argmin(flat, axis=1)
+        none_ok = ~feasible.reshape(len(s), -1).any(axis=1)
+        idx[none_ok] = fallback
+        best[start:stop] = idx
+
+    sf = sfs[best // n_tp]
+    tp = tps[best % n_tp]
+    me = (snr + (tp - config.BASELINE_TP)) - lim[best // n_tp] - config.LINK_MARGIN_DB
+
+    return TPCBatchDecision(sf=sf.reshape(shape), tp=tp.reshape(shape), me=me.reshape(shape))
@@ -0,0 +1,343 @@
+"""
+هدف این فایل:
+- ساخت یک «جدول تصمیم» (Decision Table) از پیش محاسبه‌شده برای TPC
+- پاسخ دادن به تصمیم‌های TPC با یک جستجوی دودویی (np.searchsorted) به جای اجرای الگوریتم
+
+ایده اصلی:
+- خروجی decide_tpc فقط به snr_pred و ثابت‌های config بستگی دارد
+  (SNR_LIMIT_BY_SF, LINK_MARGIN_DB, SF_MIN/MAX, TP_MIN/MAX, BASELINE_TP و نقطه شروع).
+- همه تصمیم‌های الگوریتم از مقایسه‌هایی به شکل Me(sf, tp) >= 0 ساخته می‌شوند و
+  هر کدام از این مقایسه‌ها فقط در یک SNR مشخص (مرز) تغییر می‌کند.
+- پس (SF, TP) انتخابی یک تابع «پله‌ای» (piecewise-constant) از SNR است با تعداد کمی مرز.
+- این مرزها یک بار ساخته و ذخیره می‌شوند؛ هر lookup بعدی فقط O(log n) است.
+
+فرمت فایل باینری (برای memory-map در gatewayها):
+- یک header ثابت 64 بایتی (magic, version, n, LM, baseline_tp, نقطه شروع, fingerprint)
+- سپس آرایه‌های پشت سر هم: lo (float64), tp (float64), lim (float64), sf (int8)
+  که lo[i] کران پایین ناحیه i است (lo[0] = -inf)
+
+نکته:
+- fingerprint از مقادیر config ساخته می‌شود؛ اگر یکی از آن‌ها تغییر کند جدول «کهنه» (stale)
+  محسوب شده و get_decision_table آن را دوباره می‌سازد.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from . import config
+from .tpc import TPCBatchDecision, decide_tpc
+
+
+# -----------------------------------------------------------------------------
+# ساختار header فایل باینری (دقیقاً 64 بایت، little-endian)
+# -----------------------------------------------------------------------------
+_MAGIC = b"TPCT"
+_VERSION = 1
+_HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("n", "<u8"),
+    ("link_margin", "<f8"),
+    ("baseline_tp", "<f8"),
+    ("sf_start", "<i8"),
+    ("tp_start", "<f8"),
+    ("fingerprint", "S16"),
+])
+
+
+def config_fingerprint(sf_start: int | None = None, tp_start: float | None = None) -> bytes:
+    """
+    ساخت یک اثر انگشت (hash) 16 بایتی از همه مقادیر config که تصمیم TPC به آن‌ها وابسته است.
+
+    اگر هر کدام از این مقادیر (یا نقطه شروع) تغییر کند، fingerprint هم تغییر می‌کند
+    و جدول قبلی دیگر معتبر نیست.
+    """
+    sf0 = config.BASELINE_SF if sf_start is None else int(sf_start)
+    tp0 = float(config.BASELINE_TP) if tp_start is None else float(tp_start)
+    payload = {
+        "snr_limit_by_sf": sorted((int(k), float(v)) for k, v in config.SNR_LIMIT_BY_SF.items()),
+        "link_margin_db": float(config.LINK_MARGIN_DB),
+        "sf_range": [int(config.SF_MIN), int(config.SF_MAX)],
+        "tp_range": [float(config.TP_MIN), float(config.TP_MAX)],
+        "baseline_tp": float(config.BASELINE_TP),
+        "start": [sf0, tp0],
+    }
+    blob = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+def _exact_threshold(sf: int, tp: float) -> float:
+    """
+    کوچک‌ترین SNR (در دقت float64) که برای آن Me(sf, tp) >= 0 برقرار است.
+
+    مقدار تقریبی مرز از حل Me = 0 به دست می‌آید؛ سپس با یک دو-بخشی (bisection) روی
+    اعداد float64 اطراف آن، مرز دقیقاً با همان ترتیب عملیات decide_tpc تعیین می‌شود
+    (در غیر این صورت نزدیک مرز ممکن بود جدول و الگوریتم یک ulp اختلاف داشته باشند).
+    """
+    lim = config.SNR_LIMIT_BY_SF[sf]
+
+    def ok(s: float) -> bool:
+        return (s + (tp - config.BASELINE_TP)) - lim - config.LINK_MARGIN_DB >= 0
+
+    b = lim + config.LINK_MARGIN_DB + config.BASELINE_TP - tp
+    lo, hi = b - 1.0, b + 1.0
+    while ok(lo):
+        lo -= 1.0
+    while not ok(hi):
+        hi += 1.0
+
+    # lo همیشه شرط را ندارد و hi همیشه دارد؛ تا وقتی دو float مجاور شوند نصف می‌کنیم
+    while True:
+        mid = lo + (hi - lo) / 2.0
+        if mid == lo or mid == hi:
+            return hi
+        if ok(mid):
+            hi = mid
+        else:
+            lo = mid
+
+
+class TPCDecisionTable:
+    """
+    جدول تصمیم TPC: نگاشت SNR -> (SF, TP) به صورت ناحیه‌های پیوسته.
+
+    ویژگی‌ها:
+    - lo: کران پایین هر ناحیه (ناحیه i برابر [lo[i], lo[i+1]) است؛ lo[0] = -inf)
+    - sf, tp: تصمیم ثابت داخل هر ناحیه
+    - lim: SNR_limit مربوط به sf هر ناحیه (تا lookup به config وابسته نباشد)
+    - fingerprint: اثر انگشت config در زمان ساخت جدول
+
+    استفاده:
+        table = TPCDecisionTable.build()
+        dec = table.lookup(snr_pred)   # خروجی TPCBatchDecision مشابه decide_tpc_batch
+    """
+
+    def __init__(
+        self,
+        lo: np.ndarray,
+        sf: np.ndarray,
+        tp: np.ndarray,
+        lim: np.ndarray,
+        link_margin: float,
+        baseline_tp: float,
+        sf_start: int,
+        tp_start: float,
+        fingerprint: bytes,
+    ):
+        self.lo = lo
+        self.sf = sf
+        self.tp = tp
+        self.lim = lim
+        self.link_margin = float(link_margin)
+        self.baseline_tp = float(baseline_tp)
+        self.sf_start = int(sf_start)
+        self.tp_start = float(tp_start)
+        self.fingerprint = bytes(fingerprint)
+
+    def __len__(self) -> int:
+        return len(self.lo)
+
+    # -------------------------------------------------------------------------
+    # ساخت جدول از روی config
+    # -------------------------------------------------------------------------
+    @classmethod
+    def build(cls, sf_start: int | None = None, tp_start: float | None = None) -> "TPCDecisionTable":
+        """
+        ساخت جدول از مقادیر فعلی config.
+
+        مراحل:
+        1) محاسبه همه مرزهای ممکن Me(sf, tp) = 0 برای همه SFها و همه TPهای قابل دسترس
+           (TPها همیشه tp_start + k با k صحیح هستند)
+        2) مرتب‌سازی و حذف تکراری‌ها
+        3) اجرای decide_tpc مرجع روی یک نقطه نماینده از هر ناحیه
+        4) ادغام ناحیه‌های مجاور با تصمیم یکسان (برای فشرده‌تر شدن جدول)
+        """
+        sf0 = config.BASELINE_SF if sf_start is None else int(sf_start)
+        tp0 = float(config.BASELINE_TP) if tp_start is None else float(tp_start)
+
+        # 1) همه مرزها (فقط TPهایی که الگوریتم از tp0 با گام 1 می‌تواند به آن‌ها برسد)
+        k_lo = int(np.floor(min(config.TP_MIN, tp0) - 1 - tp0))
+        k_hi = int(np.ceil(max(config.TP_MAX, tp0) + 1 - tp0))
+        tps = [tp0 + float(k) for k in range(k_lo, k_hi + 1)]
+        edges = {_exact_threshold(int(sf), tp) for sf in config.SNR_LIMIT_BY_SF for tp in tps}
+
+        # 2) مرزهای مرتب؛ ناحیه اول از -inf شروع می‌شود
+        edges = np.array(sorted(edges), dtype=np.float64)
+        lo = np.concatenate([[-np.inf], edges])
+
+        # 3) نقطه نماینده هر ناحیه: خود کران پایین (ناحیه‌ها از چپ بسته‌اند)
+        reps = np.concatenate([[np.nextafter(edges[0], -np.inf)], edges])
+        decisions = [decide_tpc(float(s), sf_start=sf0, tp_start=tp0) for s in reps]
+        sf = np.array([d.sf for d in decisions], dtype=np.int8)
+        tp = np.array([d.tp for d in decisions], dtype=np.float64)
+
+        # 4) ادغام ناحیه‌های پشت سر هم با (sf, tp) یکسان
+        keep = np.ones(len(lo), dtype=bool)
+        keep[1:] = (sf[1:] != sf[:-1]) | (tp[1:] != tp[:-1])
+        lo, sf, tp = lo[keep], sf[keep], tp[keep]
+        lim = np.array([config.SNR_LIMIT_BY_SF[int(s)] for s in sf], dtype=np.float64)
+
+        return cls(
+            lo=lo,
+            sf=sf,
+            tp=tp,
+            lim=lim,
+            link_margin=config.LINK_MARGIN_DB,
+            baseline_tp=config.BASELINE_TP,
+            sf_start=sf0,
+            tp_start=tp0,
+            fingerprint=config_fingerprint(sf0, tp0),
+        )
+
+    # -------------------------------------------------------------------------
+    # پاسخ به درخواست‌ها
+    # -------------------------------------------------------------------------
+    def lookup(self, snr_pred: np.ndarray) -> TPCBatchDecision:
+        """
+        تصمیم TPC برای یک آرایه SNR با جستجوی دودویی روی مرزها.
+
+        خروجی دقیقاً برابر decide_tpc_batch (با همان نقطه شروع) است:
+        - sf/tp از ناحیه‌ای که SNR در آن قرار دارد خوانده می‌شود
+        - me با همان فرمول و ترتیب عملیات decide_tpc محاسبه می‌شود
+        - برای NaN (مانند الگوریتم اصلی) تصمیم همان نقطه شروع و me = NaN است
+        """
+        snr = np.asarray(snr_pred, dtype=np.float64)
+        region = np.searchsorted(self.lo, snr, side="right") - 1
+
+        sf = self.sf[region].astype(np.int64)
+        tp = self.tp[region]
+        lim = self.lim[region]
+        me = (snr + (tp - self.baseline_tp)) - lim - self.link_margin
+
+        nan = np.isnan(snr)
+        if nan.any():
+            sf[nan] = self.sf_start
+            tp = np.where(nan, self.tp_start, tp)
+
+        return TPCBatchDecision(sf=sf, tp=tp, me=me)
+
+    def is_stale(self) -> bool:
+        """آیا config از زمان ساخت جدول تغییر کرده است؟"""
+        return self.fingerprint != config_fingerprint(self.sf_start, self.tp_start)
+
+    # -------------------------------------------------------------------------
+    # ذخیره/بارگذاری باینری
+    # -------------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        """
+        ذخیره جدول در یک فایل باینری فشرده (header + آرایه‌های پشت سر هم).
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        header = np.zeros(1, dtype=_HEADER_DTYPE)
+        header["magic"] = _MAGIC
+        header["version"] = _VERSION
+        header["n"] = len(self.lo)
+        header["link_margin"] = self.link_margin
+        header["baseline_tp"] = self.baseline_tp
+        header["sf_start"] = self.sf_start
+        header["tp_start"] = self.tp_start
+        header["fingerprint"] = self.fingerprint
+
+        with open(path, "wb") as f:
+            header.tofile(f)
+            np.ascontiguousarray(self.lo, dtype="<f8").tofile(f)
+            np.ascontiguousarray(self.tp, dtype="<f8").tofile(f)
+            np.ascontiguousarray(self.lim, dtype="<f8").tofile(f)
+            np.ascontiguousarray(self.sf, dtype="i1").tofile(f)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "TPCDecisionTable":
+        """
+        بارگذاری جدول از فایل باینری.
+
+        اگر mmap=True باشد آرایه‌ها به صورت np.memmap (فقط خواندنی) باز می‌شوند؛
+        یعنی چند پروسه روی یک gateway صفحات حافظه یکسانی را به اشتراک می‌گذارند.
+        """
+        path = Path(path)
+        header = np.fromfile(path, dtype=_HEADER_DTYPE, count=1)
+        if len(header) != 1 or header["magic"][0] != _MAGIC:
+            raise ValueError(f"Not a TPC decision table file: {path}")
+        if int(header["version"][0]) != _VERSION:
+            raise ValueError(f"Unsupported TPC table version {int(header['version'][0])} in {path}")
+
+        n = int(header["n"][0])
+        offset = _HEADER_DTYPE.itemsize
+
+        def read(dtype: str, count: int):
+            nonlocal offset
+            if mmap:
+                arr = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+            else:
+                arr = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+            offset += np.dtype(dtype).itemsize * count
+            return arr
+
+        lo = read("<f8", n)
+        tp = read("<f8", n)
+        lim = read("<f8", n)
+        sf = read("i1", n)
+
+        return cls(
+            lo=lo,
+            sf=sf,
+            tp=tp,
+            lim=lim,
+            link_margin=float(header["link_margin"][0]),
+            baseline_tp=float(header["baseline_tp"][0]),
+            sf_start=int(header["sf_start"][0]),
+            tp_start=float(header["tp_start"][0]),
+            fingerprint=bytes(header["fingerprint"][0]),
+        )
+
+
+# -----------------------------------------------------------------------------
+# کش درون‌پروسه‌ای جدول (برای اینکه فقط یک بار ساخته/لود شود)
+# -----------------------------------------------------------------------------
+_TABLE_CACHE: dict[tuple[int | None, float | None], TPCDecisionTable] = {}
+
+
+def get_decision_table(
+    path: Path | None = None,
+    sf_start: int | None = None,
+    tp_start: float | None = None
+) -> TPCDecisionTable:
+    """
+    دریافت جدول تصمیم معتبر برای config فعلی.
+
+    منطق:
+    1) اگر جدولی در کش پروسه باشد و هنوز stale نشده باشد => همان را برمی‌گرداند
+    2) اگر فایل path وجود داشته باشد و fingerprint آن با config فعلی یکی باشد => mmap می‌شود
+    3) در غیر این صورت جدول از نو ساخته و (اگر path داده شده باشد) روی دیسک ذخیره می‌شود
+
+    بنابراین تغییر هر مقدار مرتبط در config به صورت خودکار باعث بازسازی جدول می‌شود.
+    """
+    key = (sf_start, tp_start)
+    table = _TABLE_CACHE.get(key)
+    if table is not None and not table.is_stale():
+        return table
+
+    table = None
+    expected = config_fingerprint(sf_start, tp_start)
+    if path is not None and Path(path).exists():
+        try:
+            table = TPCDecisionTable.load(path)
+        except ValueError:
+            table = None
+        # fingerprint شامل config و نقطه شروع است؛ اگر یکی نباشد فایل قابل استفاده نیست
+        if table is not None and table.fingerprint != expected:
+            table = None
+
+    if table is None:
+        table = TPCDecisionTable.build(sf_start=sf_start, tp_start=tp_start)
+        if path is not None:
+            table.save(path)
+
+    _TABLE_CACHE[key] = table
+    return table
@@ -1,6 +1,6 @@
 """
 هدف این اسکریپت:
-- آموزش مجدد چند مدل baseline (Ridge / RandomForest / SVR) روی دیتاست پروژه
+- آموزش مجدد چند مدل baseline (Ridge / RandomForest / SVR و مدل افزایشی RLS) روی دیتاست پروژه
 - ارزیابی منصفانه آن‌ها روی یک Test split ثابت (با random_state مشخص)
 - ذخیره مدل‌های آموزش‌داده‌شده در پوشه models_trained/ به صورت joblib
 - ذخیره جدول متریک‌ها (RMSE و R²) در outputs/predictions/model_metrics.csv
@@ -15,10 +15,15 @@
 
 from __future__ import annotations
 
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import joblib
+from threadpoolctl import threadpool_limits
 
 # ابزارهای استاندارد آموزش/ارزیابی
 from sklearn.model_selection import train_test_split
@@ -34,7 +39,12 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.svm import SVR
 
 from . import config
-from .io_utils import ensure_dirs, load_dataset, split_xy, safe_numeric_X, save_csv
+from .instrument import session, stage
+from .io_utils import ensure_dirs, load_dataset, split_xy, save_csv
+from .model_registry import ModelRegistry
+from .online_model import RLSRegressor
+from .preprocessing import FeaturePreprocessor
+from .rolling_features import add_rolling_features
 
 
 # -----------------------------------------------------------------------------
@@ -52,22 +62,192 @@ TRAINED_MODELS_DIR = Path("models_trained")
 DROP_COLS_DEFAULT = ["num", "timestamp", "device_id", "counter"]  # قابل تغییر
 
 
-def main():
+def device_time_split(X: pd.DataFrame, y: pd.Series, device_ids: pd.Series, test_size: float):
+    """
+    split زمانی هر دستگاه: آخرین ceil(test_size × n) uplink هر دستگاه (به ترتیب سطرهای log) test است.
+
+    ویژگی‌های تاریخچه هر سطر فقط از uplinkهای قبلی همان دستگاه ساخته می‌شوند؛ با این split هیچ سطر train
+    SNR یک سطر test را در ویژگی‌هایش ندارد (برخلاف train_test_split تصادفی).
+    خروجی: (X_train, X_test, y_train, y_test) مانند train_test_split
+    """
+    rank = device_ids.groupby(device_ids, sort=False).cumcount().to_numpy()
+    size = device_ids.map(device_ids.value_counts()).to_numpy()
+    test = rank >= size - np.ceil(size * test_size)
+    return X[~test], X[test], y[~test], y[test]
+
+
+def build_models(rf_n_jobs: int = -1) -> dict[str, object]:
+    """
+    تعریف مدل‌های baseline.
+
+    Ridge:
+    - یک baseline خطی و سریع
+    - مناسب برای داده‌های کوچک، پایدار و قابل توضیح
+
+    RandomForest:
+    - مدل غیرخطی قوی برای روابط پیچیده
+    - معمولاً نیاز به scaling ندارد
+    - rf_n_jobs: تعداد thread درخت‌ها (در حالت موازی از بودجه thread آن worker می‌آید)
+
+    SVR:
+    - به scaling حساس است، پس با StandardScaler در Pipeline قرار داده شده
+
+    RLS (online_model.RLSRegressor):
+    - رگرسیون خطی افزایشی؛ بعد از این آموزش اولیه با partial_fit (run_pipeline --online-update)
+      uplink به uplink به‌روز می‌شود، بدون اجرای دوباره این اسکریپت
+    """
+    return {
+        "ridge": Ridge(alpha=1.0, random_state=config.RANDOM_STATE),
+        "rf": RandomForestRegressor(
+            n_estimators=300,
+            random_state=config.RANDOM_STATE,
+            n_jobs=rf_n_jobs
+        ),
+        "svr": Pipeline([
+            ("scaler", StandardScaler()),
+            ("svr", SVR(C=10.0, gamma="scale", epsilon=0.1)),
+        ]),
+        "rls": RLSRegressor(),
+    }
+
+
+def fit_and_evaluate(name: str, model, X_train, y_train, X_test, y_test) -> tuple[object, dict]:
+    """
+    آموزش یک مدل و ارزیابی روی Test set.
+
+    خروجی:
+    - (مدل آموزش‌دیده, سطر متریک‌ها)
+      fit_wall_s: زمان دیواری fit
+      fit_cpu_s: زمان CPU پروسه در fit (مجموع همه threadها؛ برای RF چندنخی از wall بیشتر است)
+    """
+    # آموزش مدل
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    model.fit(X_train, y_train)
+    fit_wall, fit_cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    # پیش‌بینی روی Test
+    pred = model.predict(X_test)
+
+    # محاسبه متریک‌ها
+    rmse = float(np.sqrt(mean_squared_error(y_test, pred)))
+    r2 = float(r2_score(y_test, pred))
+    return model, {"model": name, "rmse": rmse, "r2": r2, "fit_wall_s": fit_wall, "fit_cpu_s": fit_cpu}
+
+
+def thread_budgets(names: list[str], n_cpus: int | None = None) -> dict[str, int]:
+    """
+    بودجه thread هر مدل در حالت موازی (تا مجموع threadها از تعداد هسته‌ها بیشتر نشود).
+
+    Ridge و SVR تک‌نخی هستند (1 thread)؛ باقی هسته‌ها به RandomForest می‌رسد.
+    """
+    n_cpus = n_cpus or os.cpu_count() or 1
+    budgets = {name: 1 for name in names}
+    if "rf" in budgets:
+        budgets["rf"] = max(1, n_cpus - (len(names) - 1))
+    return budgets
+
+
+def _fit_worker(name: str, model, data_dir: str, columns: list[str], n_threads: int) -> tuple[object, dict]:
+    """
+    اجرای fit_and_evaluate در یک پروسه worker.
+
+    داده‌ها pickle نمی‌شوند: هر worker فایل‌های .npy مشترک را با mmap باز می‌کند
+    (صفحات حافظه بین همه workerها از page cache مشترک است).
+    threadpool_limits تعداد threadهای BLAS/OpenMP این worker را به n_threads محدود می‌کند؛
+    n_jobs مدل پس از آموزش به مقدار اولیه‌اش برمی‌گردد.
+    """
+    def load(stem: str):
+        return np.load(Path(data_dir) / f"{stem}.npy", mmap_mode="r")
+
+    X_train = pd.DataFrame(load("X_train"), columns=columns, copy=False)
+    X_test = pd.DataFrame(load("X_test"), columns=columns, copy=False)
+
+    # n_jobs فقط برای آموزش داخل این worker محدود می‌شود؛ مدل ذخیره‌شده همان مقدار build_models را نگه می‌دارد
+    limit_jobs = hasattr(model, "n_jobs")
+    if limit_jobs:
+        n_jobs = model.n_jobs
+        model.set_params(n_jobs=n_threads)
+    with threadpool_limits(limits=n_threads):
+        fitted, row = fit_and_evaluate(name, model, X_train, load("y_train"), X_test, load("y_test"))
+    if limit_jobs:
+        fitted.set_params(n_jobs=n_jobs)
+    return fitted, row
+
+
+def fit_parallel(models: dict[str, object], X_train, y_train, X_test, y_test, workers: int | None = None) -> list[tuple[object, dict]]:
+    """
+    آموزش هم‌زمان مدل‌های مستقل در یک ProcessPoolExecutor.
+
+    - X/y یک بار در فایل‌های .npy موقت نوشته می‌شوند و workerها با mmap می‌خوانند
+    - بودجه thread هر مدل از thread_budgets می‌آید (RF بیش از هسته‌ها thread نمی‌سازد)
+    - زمان کل ≈ زمان کندترین مدل (نه مجموع زمان‌ها)
+
+    خروجی:
+    - لیست (مدل آموزش‌دیده, سطر متریک‌ها) به همان ترتیب models
+    """
+    budgets = thread_budgets(list(models))
+    columns = [str(c) for c in X_train.columns]
+
+    with tempfile.TemporaryDirectory(prefix="train_baselines-") as data_dir:
+        for stem, arr in (("X_train", X_train), ("y_train", y_train), ("X_test", X_test), ("y_test", y_test)):
+            np.save(Path(data_dir) / f"{stem}.npy", np.ascontiguousarray(np.asarray(arr, dtype=np.float64)))
+
+        with ProcessPoolExecutor(max_workers=workers or len(models)) as pool:
+            futures = [
+                pool.submit(_fit_worker, name, model, data_dir, columns, budgets[name])
+                for name, model in models.items()
+            ]
+            return [f.result() for f in futures]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Train and evaluate the baseline SNR models")
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="fit the models concurrently in a process pool (shared memmapped data, per-model thread budgets)",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="process pool size in --parallel mode (default: one per model)")
+    parser.add_argument(
+        "--rolling-features",
+        action="store_true",
+        help="add per-device history features (lags, rolling mean/var, inter-arrival, loss rate; rolling_features.py)",
+    )
+    parser.add_argument(
+        "--rolling-window",
+        type=int,
+        default=config.ROLLING_WINDOW,
+        help="uplinks per rolling window with --rolling-features",
+    )
+    parser.add_argument("--trace", action="store_true", help="record per-stage timings to config.TRACE_DIR (instrument.py)")
+    parser.add_argument("--trace-memory", action="store_true", help="with --trace: per-stage peak allocations via tracemalloc")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    """نقطه شروع: خواندن آرگومان‌ها و اجرای run (با --trace داخل یک session ثبت مراحل)."""
+    args = parse_args(argv)
+    with session("train_baselines", enabled=args.trace, trace_memory=args.trace_memory):
+        run(args)
+
+
+def run(args: argparse.Namespace):
     """
     اجرای کامل آموزش و ارزیابی baselineها.
 
     مراحل:
     1) آماده‌سازی پوشه‌های خروجی (ensure_dirs)
-    2) بارگذاری دیتاست خام
+    2) بارگذاری دیتاست خام (با --rolling-features: ساخت ویژگی‌های تاریخچه هر دستگاه)
     3) حذف ستون‌های غیرمفید برای ML
     4) جداسازی X و y (هدف: snr)
-    5) تبدیل ویژگی‌ها به عددی (safe_numeric_X)
-    6) train/test split ثابت
-    7) تعریف مدل‌ها و آموزش هر کدام
-    8) ارزیابی روی Test set با RMSE و R²
-    9) ذخیره مدل‌ها در models_trained/
+    5) train/test split ثابت (با --rolling-features: زمانی برای هر دستگاه)
+    6) fit پیش‌پردازنده روی X_train و تبدیل ویژگی‌ها به عددی (FeaturePreprocessor)
+    7) تعریف مدل‌ها (build_models) و آموزش هر کدام (پشت سر هم یا با --parallel هم‌زمان)
+    8) ارزیابی روی Test set با RMSE و R² و ثبت زمان wall/CPU آموزش
+    9) ذخیره مدل‌ها (و پیش‌پردازنده کنار هر مدل) در models_trained/
     10) ذخیره جدول متریک‌ها در outputs/predictions/model_metrics.csv
     """
+
     # -------------------------------------------------------------------------
     # 1) ساخت پوشه‌های خروجی (outputs/...) و پوشه مدل‌های آموزش‌داده‌شده
     # -------------------------------------------------------------------------
@@ -77,14 +257,25 @@ def main():
     # -------------------------------------------------------------------------
     # 2) بارگذاری دیتاست
     # prefer_processed=False یعنی از raw استفاده می‌کنیم (در پروژه شما processed فعلاً استفاده نمی‌شود)
+    # drop_unused=True: ستون‌های config.DROP_COLS از ابتدا خوانده نمی‌شوند (مرحله 3 فقط احتیاطی است)
+    # با --rolling-features همه ستون‌ها لازم‌اند: ویژگی‌ها از timestamp/device_id/counter ساخته می‌شوند
+    # (SNR هر uplink در ویژگی‌های uplinkهای بعدی همان دستگاه است؛ پس split در مرحله 5 باید زمانی باشد)
     # -------------------------------------------------------------------------
-    df = load_dataset(prefer_processed=False)
+    with stage("load_dataset") as st:
+        df = load_dataset(prefer_processed=False, drop_unused=not args.rolling_features)
+        st.rows = len(df)
+
+    rolling_window = args.rolling_window if args.rolling_features else None
+    if rolling_window is not None:
+        with stage("rolling_features", rows=len(df), window=rolling_window):
+            df = add_rolling_features(df, rolling_window)
 
     # -------------------------------------------------------------------------
     # 3) حذف ستون‌های غیرلازم در صورت وجود
     # (این کار ریسک ورود ستون‌های غیرعددی یا شناسه‌ای به مدل را کم می‌کند)
     # -------------------------------------------------------------------------
     drop_cols = [c for c in DROP_COLS_DEFAULT if c in df.columns]
+    device_ids = df["device_id"].astype(str) if rolling_window is not None else None
     df = df.drop(columns=drop_cols)
 
     # -------------------------------------------------------------------------
@@ -96,70 +287,59 @@ def main():
     X, y, target = split_xy(df)
 
     # -------------------------------------------------------------------------
-    # 5) تبدیل X به عددی و مدیریت NaN
-    # این مرحله مطمئن می‌کند sklearn با خطای dtype مواجه نمی‌شود.
-    # -------------------------------------------------------------------------
-    X = safe_numeric_X(X)
-
-    # -------------------------------------------------------------------------
-    # 6) تقسیم Train/Test ثابت برای مقایسه منصفانه
+    # 5) تقسیم Train/Test ثابت برای مقایسه منصفانه
     # تمام مدل‌ها دقیقاً روی یک Test set ارزیابی می‌شوند
+    # با --rolling-features: split زمانی هر دستگاه (device_time_split)؛ split تصادفی SNR سطرهای test را
+    # از طریق lag/پنجره به ویژگی‌های سطرهای train می‌برد
     # -------------------------------------------------------------------------
-    X_train, X_test, y_train, y_test = train_test_split(
-        X,
-        y,
-        test_size=config.TEST_SIZE,
-        random_state=config.RANDOM_STATE
-    )
+    with stage("train_test_split", rows=len(X), by_time=device_ids is not None):
+        if device_ids is not None:
+            X_train, X_test, y_train, y_test = device_time_split(X, y, device_ids, config.TEST_SIZE)
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X,
+                y,
+                test_size=config.TEST_SIZE,
+                random_state=config.RANDOM_STATE
+            )
 
     # -------------------------------------------------------------------------
-    # 7) تعریف مدل‌ها
-    #
-    # Ridge:
-    # - یک baseline خطی و سریع
-    # - مناسب برای داده‌های کوچک، پایدار و قابل توضیح
-    #
-    # RandomForest:
-    # - مدل غیرخطی قوی برای روابط پیچیده
-    # - معمولاً نیاز به scaling ندارد
-    #
-    # SVR:
-    # - به scaling حساس است، پس با StandardScaler در Pipeline قرار داده شده
-    # -------------------------------------------------------------------------
-    models = {
-        "ridge": Ridge(alpha=1.0, random_state=config.RANDOM_STATE),
-        "rf": RandomForestRegressor(
-            n_estimators=300,
-            random_state=config.RANDOM_STATE,
-            n_jobs=-1
-        ),
-        "svr": Pipeline([
-            ("scaler", StandardScaler()),
-            ("svr", SVR(C=10.0, gamma="scale", epsilon=0.1)),
-        ]),
-    }
-
-    rows = []
+    # 6) تبدیل X به عددی و مدیریت NaN با FeaturePreprocessor
+    # ترتیب ستون‌ها، نوع‌ها و میانه‌ها فقط از X_train یاد گرفته می‌شوند
+    # (test و inference بعدی با میانه آموزش پر می‌شوند، نه میانه batch خودشان)
+    # -------------------------------------------------------------------------
+    with stage("preprocess", rows=len(X_train) + len(X_test)):
+        preprocessor = FeaturePreprocessor.fit(X_train, rolling_window=rolling_window)
+        X_train = preprocessor.transform_frame(X_train)
+        X_test = preprocessor.transform_frame(X_test)
 
     # -------------------------------------------------------------------------
-    # 8) حلقه آموزش + ارزیابی + ذخیره مدل
+    # 7) تعریف مدل‌ها (build_models)
+    # 8) آموزش + ارزیابی: پشت سر هم، یا با --parallel هم‌زمان در یک process pool
     # -------------------------------------------------------------------------
-    for name, model in models.items():
-        # آموزش مدل
-        model.fit(X_train, y_train)
-
-        # پیش‌بینی روی Test
-        pred = model.predict(X_test)
+    models = build_models()
 
-        # محاسبه متریک‌ها
-        rmse = float(np.sqrt(mean_squared_error(y_test, pred)))
-        r2 = float(r2_score(y_test, pred))
+    t0 = time.perf_counter()
+    if args.parallel:
+        # مراحل داخل workerها ثبت نمی‌شوند؛ کل آموزش موازی یک مرحله است
+        with stage("fit_parallel", rows=len(X_train), models=len(models)):
+            results = fit_parallel(models, X_train, y_train, X_test, y_test, workers=args.workers)
+    else:
+        results = []
+        for name, model in models.items():
+            with stage(f"fit.{name}", rows=len(X_train)):
+                results.append(fit_and_evaluate(name, model, X_train, y_train, X_test, y_test))
+    train_wall = time.perf_counter() - t0
 
-        # ذخیره متریک برای جدول خروجی
-        rows.append({"model": name, "rmse": rmse, "r2": r2})
-
-        # ذخیره مدل آموزش‌داده‌شده برای استفاده در run_pipeline.py
-        joblib.dump(model, TRAINED_MODELS_DIR / f"{name}.joblib")
+    # ذخیره مدل‌های آموزش‌داده‌شده برای استفاده در run_pipeline.py (از طریق ModelRegistry)
+    # کنار هر مدل: پیش‌پردازنده (<name>.preprocessor.joblib) و metadata (<name>.meta.json)
+    registry = ModelRegistry(TRAINED_MODELS_DIR)
+    rows = []
+    for model, row in results:
+        metrics = {k: v for k, v in row.items() if k != "model"}
+        with stage(f"register.{row['model']}"):
+            registry.register(f"{row['model']}.joblib", model, metrics=metrics, preprocessor=preprocessor)
+        rows.append(row)
 
     # -------------------------------------------------------------------------
     # 9) ساخت جدول نتایج و مرتب‌سازی بر اساس RMSE (کمتر بهتر)
@@ -169,10 +349,12 @@ def main():
     # -------------------------------------------------------------------------
     # 10) ذخیره متریک‌ها در خروجی استاندارد پروژه
     # -------------------------------------------------------------------------
-    save_csv(metrics, config.MODEL_METRICS_CSV)
+    with stage("save_metrics", rows=len(metrics)):
+        save_csv(metrics, config.MODEL_METRICS_CSV)
 
     # چاپ نتایج برای مشاهده سریع در ترمینال/نوت‌بوک
     print(metrics)
+    print(f"Training wall time: {train_wall:.2f} s ({'parallel' if args.parallel else 'sequential'})")
     print("Saved models to:", TRAINED_MODELS_DIR)
 
 
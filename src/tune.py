@@ -0,0 +1,377 @@
+"""
+هدف این فایل:
+- جستجوی hyperparameter برای هر خانواده مدل train_baselines (Ridge / RandomForest / SVR)
+  با روش successive halving و بودجه زمان دیواری/CPU
+- خروجی: یک جدول رتبه‌بندی‌شده (outputs/tables/tuning_results.csv) که علاوه بر دقت،
+  هزینه inference (تأخیر پیش‌بینی به ازای هر سطر) را هم نشان می‌دهد تا انتخاب
+  config.SELECTED_TRAINED_MODEL بر اساس دقت «و» هزینه انجام شود.
+
+Successive halving:
+- دور 0: همه کاندیداها روی تعداد کمی سطر آموزش (r_min) در همه foldها ارزیابی می‌شوند
+- در هر دور فقط 1/factor بهترین‌ها (کمترین RMSE میانگین foldها) باقی می‌مانند
+  و تعداد سطر آموزش factor برابر می‌شود، تا آخرین دور که کل fold آموزش استفاده می‌شود
+
+کش foldها (FoldCache):
+- اندیس foldها و ترتیب زیرنمونه‌گیری هر fold فقط یک بار ساخته می‌شوند
+- ماتریس‌های (X_train, y_train, X_val) هر (fold, r) و نسخه scale‌شده آن‌ها
+  (StandardScaler برای SVR) فقط یک بار محاسبه و بین همه کاندیداها مشترک است
+
+اجرا:
+    python -m src.tune
+    python -m src.tune --family svr ridge --wall-budget 120 --n-jobs 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from . import config
+from .io_utils import ensure_dirs, load_dataset, save_csv, split_xy
+from .preprocessing import FeaturePreprocessor
+from .train_baselines import build_models
+
+
+# -----------------------------------------------------------------------------
+# فضای جستجو برای هر خانواده (کلیدها همان نام مدل‌ها در build_models)
+# scaled=True یعنی کاندیداها روی ماتریس‌های scale‌شده کش آموزش می‌بینند
+# (معادل Pipeline([StandardScaler, ...]) در train_baselines)
+# -----------------------------------------------------------------------------
+SEARCH_SPACES = {
+    "ridge": {
+        "scaled": False,
+        "params": {"alpha": [0.001, 0.01, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0]},
+    },
+    "rf": {
+        "scaled": False,
+        "params": {
+            "n_estimators": [100, 300],
+            "max_depth": [None, 12],
+            "min_samples_leaf": [1, 3, 5],
+            "max_features": [1.0, 0.5],
+        },
+    },
+    "svr": {
+        "scaled": True,
+        "params": {
+            "C": [1.0, 3.0, 10.0, 30.0, 100.0],
+            "gamma": ["scale", 0.03, 0.1, 0.3],
+            "epsilon": [0.05, 0.1, 0.3],
+        },
+    },
+}
+
+# حداقل تعداد سطر آموزش در اولین دور halving
+MIN_RESOURCES = 40
+
+# تعداد تکرار پیش‌بینی تک‌سطری برای اندازه‌گیری تأخیر
+SINGLE_ROW_REPEATS = 20
+
+
+def make_estimator(family: str, params: dict):
+    """
+    ساخت estimator یک کاندیدا از مدل پایه build_models.
+
+    - SVR: فقط مرحله svr از Pipeline (scaling از ماتریس‌های کش‌شده می‌آید)
+    - RF: n_jobs=1 چون موازی‌سازی در سطح کاندیداها انجام می‌شود
+    """
+    base = build_models(rf_n_jobs=1)[family]
+    if family == "svr":
+        base = base.named_steps["svr"]
+    return clone(base).set_params(**params)
+
+
+def candidates(family: str) -> list[dict]:
+    """همه ترکیب‌های فضای جستجو (grid) برای یک خانواده."""
+    grid = SEARCH_SPACES[family]["params"]
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def halving_schedule(n_candidates: int, max_resources: int, factor: int, min_resources: int = MIN_RESOURCES) -> list[int]:
+    """
+    تعداد سطر آموزش در هر دور: r_i = r_max / factor^(n_rounds-1-i)
+
+    تعداد دورها طوری انتخاب می‌شود که در آخرین دور حدود یک کاندیدا باقی بماند
+    و r_min از min_resources کمتر نشود.
+    """
+    n_rounds = 1 + int(math.floor(math.log(max(n_candidates, 1), factor)))
+    while n_rounds > 1 and max_resources / factor ** (n_rounds - 1) < min_resources:
+        n_rounds -= 1
+    return [int(max_resources / factor ** (n_rounds - 1 - i)) for i in range(n_rounds)]
+
+
+class FoldCache:
+    """
+    کش foldهای cross-validation و ماتریس‌های هر (fold, r, scaled).
+
+    - اندیس foldها با KFold(shuffle) یک بار ساخته می‌شوند
+    - سطرهای آموزش هر fold یک بار (با seed ثابت) بُر زده می‌شوند؛ زیرنمونه r سطری
+      همیشه r سطر اول همین ترتیب است (زیرنمونه‌های بزرگ‌تر شامل کوچک‌ترها هستند)
+    - ماتریس‌ها (و scaler) برای هر کلید فقط یک بار ساخته می‌شوند
+    """
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, n_folds: int, random_state: int):
+        self.X = np.ascontiguousarray(X, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        rng = np.random.default_rng(random_state)
+
+        kfold = KFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+        self.folds = [(rng.permutation(tr), va) for tr, va in kfold.split(self.X)]
+        self._matrices: dict[tuple[int, int, bool], tuple[np.ndarray, ...]] = {}
+
+    @property
+    def n_folds(self) -> int:
+        return len(self.folds)
+
+    @property
+    def max_resources(self) -> int:
+        return min(len(tr) for tr, _ in self.folds)
+
+    def get(self, fold: int, r: int, scaled: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(X_train, y_train, X_val, y_val) برای fold با r سطر آموزش."""
+        key = (fold, r, scaled)
+        if key not in self._matrices:
+            tr, va = self.folds[fold]
+            tr = tr[:r]
+            X_tr, X_va = self.X[tr], self.X[va]
+            if scaled:
+                scaler = StandardScaler().fit(X_tr)
+                X_tr, X_va = scaler.transform(X_tr), scaler.transform(X_va)
+            self._matrices[key] = (X_tr, self.y[tr], X_va, self.y[va])
+        return self._matrices[key]
+
+
+def _evaluate(cand: int, family: str, params: dict, fold: int, X_tr, y_tr, X_va, y_va) -> dict:
+    """
+    آموزش و ارزیابی کاندیدای شماره cand روی یک fold (در پروسه worker).
+
+    علاوه بر RMSE/R²، زمان fit (wall/CPU) و تأخیر پیش‌بینی اندازه‌گیری می‌شود:
+    - latency_us_per_row: زمان predict کل fold اعتبارسنجی تقسیم بر تعداد سطرها
+    - single_row_latency_us: میانه زمان predict یک سطر (مسیر inference تک uplink)
+    """
+    model = make_estimator(family, params)
+
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    model.fit(X_tr, y_tr)
+    fit_wall = time.perf_counter() - wall0
+
+    t0 = time.perf_counter()
+    pred = model.predict(X_va)
+    batch_s = time.perf_counter() - t0
+
+    row = X_va[:1]
+    single = []
+    for _ in range(SINGLE_ROW_REPEATS):
+        t0 = time.perf_counter()
+        model.predict(row)
+        single.append(time.perf_counter() - t0)
+
+    return {
+        "cand": cand,
+        "fold": fold,
+        "pid": os.getpid(),
+        "rmse": float(np.sqrt(mean_squared_error(y_va, pred))),
+        "r2": float(r2_score(y_va, pred)),
+        "fit_wall_s": fit_wall,
+        "cpu_s": time.process_time() - cpu0,
+        "latency_us_per_row": batch_s / len(X_va) * 1e6,
+        "single_row_latency_us": float(np.median(single)) * 1e6,
+    }
+
+
+class Budget:
+    """بودجه زمان دیواری و CPU (CPU = پروسه اصلی + مجموع CPU گزارش‌شده از workerها)."""
+
+    def __init__(self, wall_s: float | None, cpu_s: float | None):
+        self.wall_s, self.cpu_s = wall_s, cpu_s
+        self.wall0, self.cpu0 = time.perf_counter(), time.process_time()
+        self.worker_cpu = 0.0
+
+    @property
+    def wall(self) -> float:
+        return time.perf_counter() - self.wall0
+
+    @property
+    def cpu(self) -> float:
+        return time.process_time() - self.cpu0 + self.worker_cpu
+
+    def exhausted(self) -> bool:
+        return (self.wall_s is not None and self.wall >= self.wall_s) or (self.cpu_s is not None and self.cpu >= self.cpu_s)
+
+
+def successive_halving(
+    family: str,
+    cache: FoldCache,
+    factor: int,
+    budget: Budget,
+    n_jobs: int = -1
+) -> list[dict]:
+    """
+    اجرای successive halving برای یک خانواده.
+
+    خروجی:
+    - یک سطر به ازای هر کاندیدا با نتایج آخرین دوری که «کامل» (همه foldها) ارزیابی شده است
+    """
+    scaled = SEARCH_SPACES[family]["scaled"]
+    pool = candidates(family)
+    schedule = halving_schedule(len(pool), cache.max_resources, factor)
+
+    results = {i: None for i in range(len(pool))}
+    alive = list(range(len(pool)))
+
+    with Parallel(n_jobs=n_jobs, return_as="generator_unordered") as parallel:
+        for rnd, r in enumerate(schedule):
+            if budget.exhausted():
+                break
+
+            tasks = (
+                delayed(_evaluate)(i, family, pool[i], f, *cache.get(f, r, scaled))
+                for i in alive for f in range(cache.n_folds)
+            )
+            folds_done: dict[int, list[dict]] = {i: [] for i in alive}
+
+            # نتایج به ترتیب اتمام می‌رسند؛ اگر بودجه تمام شود بقیه کارهای این دور لغو می‌شوند
+            gen = parallel(tasks)
+            for res in gen:
+                folds_done[res["cand"]].append(res)
+                if res["pid"] != os.getpid():
+                    # CPU workerهای جداگانه؛ کارهایی که در همین پروسه اجرا شده‌اند در process_time هستند
+                    budget.worker_cpu += res["cpu_s"]
+                if budget.exhausted():
+                    break
+            with warnings.catch_warnings():
+                # لغو عمدی کارهای باقی‌مانده پس از پایان بودجه
+                warnings.simplefilter("ignore", UserWarning)
+                gen.close()
+
+            # فقط کاندیداهایی که همه foldهای این دور را کامل کرده‌اند به‌روزرسانی می‌شوند
+            complete = [i for i in alive if len(folds_done[i]) == cache.n_folds]
+            for i in complete:
+                folds = pd.DataFrame(folds_done[i])
+                results[i] = {
+                    "family": family,
+                    "params": json.dumps(pool[i]),
+                    "round": rnd,
+                    "n_resources": r,
+                    "cv_rmse": folds["rmse"].mean(),
+                    "cv_rmse_std": folds["rmse"].std(ddof=0),
+                    "cv_r2": folds["r2"].mean(),
+                    "fit_wall_s": folds["fit_wall_s"].mean(),
+                    "latency_us_per_row": folds["latency_us_per_row"].mean(),
+                    "single_row_latency_us": folds["single_row_latency_us"].median(),
+                }
+            if len(complete) < len(alive):
+                break
+
+            # نگه داشتن 1/factor بهترین کاندیداها برای دور بعد
+            n_keep = max(1, int(math.ceil(len(alive) / factor)))
+            alive = sorted(alive, key=lambda i: results[i]["cv_rmse"])[:n_keep]
+
+    return [row for row in results.values() if row is not None]
+
+
+def rank(rows: list[dict]) -> pd.DataFrame:
+    """
+    رتبه‌بندی: ابتدا کاندیداهایی که به بالاترین دور کامل‌شده «خانواده خودشان» رسیده‌اند (finalist=True)،
+    سپس بقیه؛ در هر گروه بر اساس cv_rmse (کمتر بهتر).
+
+    n_resources بین خانواده‌ها مقایسه نمی‌شود: خانواده‌ای که بودجه زودتر برایش تمام شده
+    فقط به خاطر دور کمتر پایین‌تر از یک خانواده بدتر قرار نمی‌گیرد. cv_rmse خانواده‌هایی با
+    n_resources متفاوت روی تعداد سطر آموزش متفاوت اندازه‌گیری شده است (main این را گزارش می‌کند).
+    """
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    table["finalist"] = table["n_resources"] == table.groupby("family")["n_resources"].transform("max")
+    table = table.sort_values(["finalist", "cv_rmse"], ascending=[False, True], ignore_index=True)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    return table
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search for the baseline models")
+    parser.add_argument("--family", nargs="+", choices=list(SEARCH_SPACES), default=list(SEARCH_SPACES))
+    parser.add_argument("--folds", type=int, default=config.TUNE_CV_FOLDS)
+    parser.add_argument("--factor", type=int, default=config.TUNE_HALVING_FACTOR)
+    parser.add_argument("--wall-budget", type=float, default=config.TUNE_WALL_BUDGET_S, help="total wall-clock budget (s)")
+    parser.add_argument("--cpu-budget", type=float, default=config.TUNE_CPU_BUDGET_S, help="total CPU budget (s)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel candidate evaluations (joblib)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    """
+    مراحل:
+    1) بارگذاری دیتاست و همان train/test split ثابت train_baselines
+       (جستجو فقط روی بخش آموزش انجام می‌شود؛ Test set دست‌نخورده می‌ماند)
+    2) ساخت FoldCache (foldها و ماتریس‌های scale‌شده یک بار)
+    3) successive halving برای هر خانواده، با بودجه مشترک زمان دیواری/CPU
+    4) ذخیره جدول رتبه‌بندی‌شده در config.TUNING_RESULTS_CSV
+    """
+    args = parse_args(argv)
+    ensure_dirs()
+
+    # -------------------------------------------------------------------------
+    # 1) داده آموزش (همان split و پیش‌پردازش train_baselines)
+    # -------------------------------------------------------------------------
+    df = load_dataset(prefer_processed=False, drop_unused=True)
+    X, y, _ = split_xy(df)
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=config.TEST_SIZE, random_state=config.RANDOM_STATE)
+    X_train = FeaturePreprocessor.fit(X_train).transform(X_train)
+
+    # -------------------------------------------------------------------------
+    # 2) کش foldها
+    # -------------------------------------------------------------------------
+    cache = FoldCache(X_train, y_train.to_numpy(), n_folds=args.folds, random_state=config.RANDOM_STATE)
+
+    # -------------------------------------------------------------------------
+    # 3) جستجو برای هر خانواده (بودجه بین همه خانواده‌ها مشترک است)
+    # -------------------------------------------------------------------------
+    budget = Budget(args.wall_budget, args.cpu_budget)
+    rows = []
+    for family in args.family:
+        family_rows = successive_halving(family, cache, args.factor, budget, n_jobs=args.n_jobs)
+        rows.extend(family_rows)
+        print(f"{family}: {len(family_rows)} candidates evaluated (wall {budget.wall:.1f} s, cpu {budget.cpu:.1f} s)")
+        if budget.exhausted():
+            print("Budget exhausted; remaining families skipped")
+            break
+
+    # -------------------------------------------------------------------------
+    # 4) جدول رتبه‌بندی‌شده
+    # -------------------------------------------------------------------------
+    table = rank(rows)
+    if table.empty:
+        print("No completed configurations (budget exhausted before the first round finished); nothing saved")
+        return
+    save_csv(table, config.TUNING_RESULTS_CSV)
+
+    cols = ["rank", "family", "params", "n_resources", "cv_rmse", "cv_r2", "latency_us_per_row", "single_row_latency_us"]
+    with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+        print(table[cols].head(15).to_string(index=False))
+    rungs = table[table["finalist"]].groupby("family", sort=False)["n_resources"].first()
+    if rungs.nunique() > 1:
+        print(
+            "Note: families stopped at different training sizes "
+            f"({', '.join(f'{f}: {n} rows' for f, n in rungs.items())}); cv_rmse across them compares different budgets"
+        )
+    print("Saved tuning results:", config.TUNING_RESULTS_CSV)
+
+
+if __name__ == "__main__":
+    # اجرای مستقیم فایل: python -m src.tune
+    main()